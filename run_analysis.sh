@@ -7,11 +7,41 @@ echo "================================"
 
 case "$1" in
     ai|AI)
-        python3 /home/michael/.openclaw/workspace/scripts/ele_me_deepseek_analysis.py
+        python3 /home/michael/.openclaw/workspace/scripts/ele_me_deepseek_analysis.py "${@:2}"
         ;;
     order)
         python3 /home/michael/projects/ele-me-operation/scripts/order_download.py
         ;;
+    sync)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_order_download.py --sync "${@:2}"
+        ;;
+    anomaly)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_anomaly.py "${@:2}"
+        ;;
+    forecast)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_forecast.py "${@:2}"
+        ;;
+    cache)
+        python3 /home/michael/projects/ele-me-operation/scripts/llm_cache.py "${@:2}"
+        ;;
+    batch)
+        python3 /home/michael/projects/ele-me-operation/scripts/llm_batch.py "${@:2}"
+        ;;
+    tokens)
+        python3 /home/michael/projects/ele-me-operation/scripts/token_budget.py --report "${@:2}"
+        ;;
+    multi)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_multi_shop.py "${@:2}"
+        ;;
+    query)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_query.py "${@:2}"
+        ;;
+    basket)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_basket.py "${@:2}"
+        ;;
+    calendar)
+        python3 /home/michael/projects/ele-me-operation/scripts/ele_me_calendar.py "${@:2}"
+        ;;
     analysis)
         python3 /home/michael/projects/ele-me-operation/scripts/data_analysis.py
         ;;
@@ -32,8 +62,15 @@ case "$1" in
         echo "用法: ./run_analysis.sh <命令>"
         echo ""
         echo "命令:"
-        echo "  ai         - DeepSeek AI 智能分析"
+        echo "  ai         - DeepSeek AI 智能分析（--stream 报告边生成边显示）"
         echo "  order      - 下载订单数据"
+        echo "  sync       - 增量同步订单（按游标，含异常检测）"
+        echo "  anomaly    - 异常检测（--replay 预热基线, --alerts 查看告警）"
+        echo "  multi      - 多店铺并行下载+分析（shops.json）"
+        echo "  query      - 订单多维查询（--by 维度 --measures 度量）"
+        echo "  tokens     - 大模型 token 与费用台账（--days N）"
+        echo "  basket     - 菜品同购组合（套餐/满减参考）"
+        echo "  calendar   - 营业时段日历（工作日/周末/节假日）"
         echo "  analysis   - 基础数据分析"
         echo "  promotion  - 推广自动调整"
         echo "  all        - 执行全部流程"
@@ -2,18 +2,29 @@
 """
 DeepSeek 本地辅助系统
 专门处理复杂逻辑优化，减少 Token 消耗
+
+四个功能共用两级响应缓存（tiered_cache：内存 LRU + .ds_cache 下的分片磁盘存储），
+键为完整请求体（模型/提示词/参数）的哈希，按大小上限和最大保存时间淘汰；
+每次调用的实际 token（接口返回的 usage）记入 token_budget 台账，优化日志按本地估算的 token 计
+
+使用方法:
+    python3 ds_assistant.py            # 缓存统计
+    python3 ds_assistant.py --clear    # 清空缓存
 """
 
+import argparse
 import json
-import hashlib
-import os
 from datetime import datetime
-from typing import Any, Dict, Optional
-from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from llm_cache import cache_key
+from tiered_cache import get_cache
+from token_budget import TokenLedger, estimate_messages, estimate_tokens
 
 # 配置
 CACHE_DIR = "/home/michael/.openclaw/workspace/.ds_cache"
 OPTIMIZATION_LOG = "/home/michael/.openclaw/workspace/.ds_optimizations.log"
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
 
 class DeepSeekAssistant:
     """本地 DeepSeek 辅助系统"""
@@ -23,44 +34,50 @@ class DeepSeekAssistant:
         self.api_url = "https://api.deepseek.com/chat/completions"
         self.model = "deepseek-chat"
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
-    
-    def _hash_data(self, data: Any) -> str:
-        """生成数据哈希"""
-        return hashlib.md5(str(data).encode()).hexdigest()[:16]
-    
-    def _get_cache_path(self, data_hash: str) -> str:
-        """获取缓存路径"""
-        return os.path.join(self.cache_dir, f"{data_hash}.json")
+        self.cache = get_cache(self.cache_dir)
+        self.ledger = TokenLedger(data_dir=DATA_DIR, script="ds_assistant")
     
-    def _load_cache(self, data_hash: str) -> Optional[Dict]:
-        """加载缓存"""
-        path = self._get_cache_path(data_hash)
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                return json.load(f)
-        return None
+    def _build_payload(self, prompt: str, max_tokens: int) -> Dict:
+        """请求体（同时是缓存键的来源）"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.5,
+            "top_p": 0.9
+        }
     
-    def _save_cache(self, data_hash: str, result: Dict):
-        """保存缓存"""
-        path = self._get_cache_path(data_hash)
-        with open(path, "w") as f:
-            json.dump(result, f, indent=2)
+    def _cached_call(self, task_type: str, prompt: str, max_tokens: int) -> Tuple[Optional[Dict], bool]:
+        """先查两级缓存，未命中再调用 DeepSeek 并写入缓存；返回 (结果, 是否命中)"""
+        payload = self._build_payload(prompt, max_tokens)
+        key = cache_key(payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            print(f"✅ 使用缓存: {task_type}")
+            self.ledger.record(self.model, estimate_messages(payload["messages"], self.model),
+                               task=task_type, cache_hit=True)
+            return cached, True
+        
+        result = self._call_deepseek(payload, task_type)
+        if result:
+            self.cache.put(key, result, task=task_type)
+        return result, False
     
-    def _log_optimization(self, task_type: str, original_tokens: int, optimized_tokens: int):
-        """记录优化效果"""
+    def _log_optimization(self, task_type: str, original: str, optimized: str):
+        """记录优化效果（两段文本的本地 token 估算）"""
+        original_tokens = estimate_tokens(original, self.model)
+        optimized_tokens = estimate_tokens(optimized, self.model)
         log = {
             "time": datetime.now().isoformat(),
             "task_type": task_type,
             "original_tokens": original_tokens,
             "optimized_tokens": optimized_tokens,
-            "savings": f"{(1 - optimized_tokens/original_tokens)*100:.0f}%"
+            "savings": f"{(1 - optimized_tokens / original_tokens) * 100:.0f}%" if original_tokens else None
         }
         
         with open(OPTIMIZATION_LOG, "a") as f:
             f.write(json.dumps(log) + "\n")
     
-    @lru_cache(maxsize=50)
     def optimize_script(self, script_content: str, focus: str = "token") -> Dict:
         """
         优化代码脚本
@@ -73,13 +90,6 @@ class DeepSeekAssistant:
             优化建议
         """
         task_type = f"script_optimize_{focus}"
-        data_hash = self._hash_data(script_content + focus)
-        
-        # 检查缓存
-        cached = self._load_cache(data_hash)
-        if cached:
-            print(f"✅ 使用缓存: {task_type}")
-            return cached
         
         # 构建优化提示
         prompt = f"""请优化以下 Python 代码，{focus}相关优化：
@@ -95,11 +105,10 @@ class DeepSeekAssistant:
 }}
 """
         
-        result = self._call_deepseek(prompt, max_tokens=1500)
+        result, cached = self._cached_call(task_type, prompt, max_tokens=1500)
         
-        if result:
-            self._save_cache(data_hash, result)
-            self._log_optimization(task_type, 3000, len(prompt))
+        if result and not cached:
+            self._log_optimization(task_type, script_content, prompt)
         
         return result
     
@@ -115,12 +124,7 @@ class DeepSeekAssistant:
             分析结果
         """
         task_type = "logic_analysis"
-        data_hash = self._hash_data(problem + context)
-        
-        cached = self._load_cache(data_hash)
-        if cached:
-            return cached
-        
+
         prompt = f"""请分析以下逻辑问题：
 
 问题：{problem}
@@ -136,11 +140,7 @@ class DeepSeekAssistant:
 }}
 """
         
-        result = self._call_deepseek(prompt, max_tokens=800)
-        
-        if result:
-            self._save_cache(data_hash, result)
-        
+        result, _ = self._cached_call(task_type, prompt, max_tokens=800)
         return result
     
     def generate_code(self, requirement: str, language: str = "python") -> Dict:
@@ -155,12 +155,7 @@ class DeepSeekAssistant:
             生成的代码
         """
         task_type = f"code_generation_{language}"
-        data_hash = self._hash_data(requirement)
-        
-        cached = self._load_cache(data_hash)
-        if cached:
-            return cached
-        
+
         prompt = f"""请用 {language} 实现以下功能：
 
 {requirement}
@@ -173,11 +168,7 @@ class DeepSeekAssistant:
 }}
 """
         
-        result = self._call_deepseek(prompt, max_tokens=1200)
-        
-        if result:
-            self._save_cache(data_hash, result)
-        
+        result, _ = self._cached_call(task_type, prompt, max_tokens=1200)
         return result
     
     def optimize_prompt(self, original_prompt: str, goal: str = "reduce_tokens") -> Dict:
@@ -192,12 +183,7 @@ class DeepSeekAssistant:
             优化后的提示词
         """
         task_type = f"prompt_optimize_{goal}"
-        data_hash = self._hash_data(original_prompt)
-        
-        cached = self._load_cache(data_hash)
-        if cached:
-            return cached
-        
+
         prompt = f"""请优化以下提示词，目标：{goal}
 
 原始提示词：
@@ -212,40 +198,33 @@ class DeepSeekAssistant:
 }}
 """
         
-        result = self._call_deepseek(prompt, max_tokens=1000)
+        result, cached = self._cached_call(task_type, prompt, max_tokens=1000)
         
-        if result:
-            self._save_cache(data_hash, result)
-            original_len = len(original_prompt)
-            optimized_len = len(result.get("optimized_prompt", ""))
-            self._log_optimization(task_type, original_len, optimized_len)
+        if result and not cached:
+            self._log_optimization(task_type, original_prompt, result.get("optimized_prompt", ""))
         
         return result
     
-    def _call_deepseek(self, prompt: str, max_tokens: int = 1000) -> Optional[Dict]:
-        """调用 DeepSeek API"""
+    def _call_deepseek(self, payload: Dict, task_type: str = None) -> Optional[Dict]:
+        """调用 DeepSeek API（实际 token 记入台账）"""
         try:
-            import requests
+            from http_client import get_client
             
-            response = requests.post(
+            response = get_client("deepseek").post(
                 self.api_url,
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": max_tokens,
-                    "temperature": 0.5,
-                    "top_p": 0.9
-                },
+                json=payload,
                 timeout=60
             )
             
             if response.status_code == 200:
                 result = response.json()
                 content = result["choices"][0]["message"]["content"]
+                self.ledger.record(self.model, estimate_messages(payload["messages"], self.model),
+                                   result.get("usage"), task=task_type, completion_text=content)
                 
                 start, end = content.find("{"), content.rfind("}") + 1
                 if start != -1 and end != 0:
@@ -265,21 +244,15 @@ class DeepSeekAssistant:
         return text[:max_len] + "...[截断]"
     
     def get_cache_stats(self) -> Dict:
-        """获取缓存统计"""
-        files = os.listdir(self.cache_dir) if os.path.exists(self.cache_dir) else []
-        
-        return {
-            "cache_count": len(files),
-            "cache_dir": self.cache_dir
-        }
+        """获取缓存统计（条目/字节/内存占用/命中率/节省字节）"""
+        stats = self.cache.stats()
+        stats["cache_count"] = stats["entries"]
+        return stats
     
     def clear_cache(self):
         """清空缓存"""
-        import shutil
-        if os.path.exists(self.cache_dir):
-            shutil.rmtree(self.cache_dir)
-            os.makedirs(self.cache_dir)
-            print("✅ 缓存已清空")
+        self.cache.clear()
+        print("✅ 缓存已清空")
 
 
 # 便捷函数
@@ -301,16 +274,27 @@ def optimize_prompt(prompt: str) -> Dict:
     return assistant.optimize_prompt(prompt, "reduce_tokens")
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="DeepSeek 本地辅助系统")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🧠 DeepSeek 本地辅助系统")
     print("=" * 60)
     
     assistant = DeepSeekAssistant()
+    if args.clear:
+        assistant.clear_cache()
     
     # 显示缓存统计
     stats = assistant.get_cache_stats()
-    print(f"\n📦 缓存统计: {stats['cache_count']} 个缓存项")
+    rate = f"{stats['hit_rate'] * 100:.1f}%" if stats["hit_rate"] is not None else "-"
+    print(f"\n📦 缓存统计: {stats['cache_count']} 个缓存项, "
+          f"磁盘 {stats['disk_bytes'] / 1024:.1f}KB / {stats['max_bytes'] / 1024 / 1024:.0f}MB")
+    print(f"   命中: 内存 {stats['memory_hits']} / 磁盘 {stats['disk_hits']}, 未命中 {stats['misses']} "
+          f"(命中率 {rate})")
+    print(f"   节省响应: {stats['bytes_saved'] / 1024:.1f}KB, 淘汰 {stats['evictions']}, 过期 {stats['expired']}")
     
     print("\n可用功能:")
     print("  • optimize_script(script, focus) - 优化代码")
@@ -319,3 +303,7 @@ if __name__ == "__main__":
     print("  • optimize_prompt(prompt) - 优化提示词")
     
     print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+饿了么订单融合统计
+一次遍历订单流，同时得到：总数/完成/取消、营收、评分、配送时长、按小时/时段/区域分布、
+按小时取消分布，以及配送时长/客单价的分位数草图。下载摘要、ElemeAnalyzer 报告、
+两个 DeepSeek 分析器的指标都是它的视图，同一批数据每次流水线只读一遍。
+
+下载保存时顺带算好的统计写入 orders_<时间戳>.agg.json，分析脚本直接加载，无需再读订单；
+统计文件缺失或过期时由列式存档向量化重算（ele_me_metrics.aggregate_columns）并写回。
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from ele_me_calendar import PeriodCalendar, load_calendar
+from ele_me_sketch import OrderSketches
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+COMPLETED = "已完成"
+CANCELED = "已取消"
+
+# 统计用到的订单字段（列式存档只读取这些列）
+AGGREGATE_COLUMNS = ("order_time", "status", "total_amount", "customer_rating",
+                     "delivery_time_minutes", "address_area")
+
+
+class OrderAggregate:
+    """单次遍历的融合统计（可合并、可序列化）"""
+
+    def __init__(self, calendar: PeriodCalendar = None):
+        self.calendar = calendar or load_calendar()
+        self.total = 0
+        self.completed = 0
+        self.canceled = 0
+        self.revenue = 0
+        self.rating_sum = 0
+        self.delivery_sum = 0
+        self.hourly: Dict[int, Dict[str, Any]] = {}        # 完成订单 {小时: {count, amount}}
+        self.areas: Dict[str, Dict[str, Any]] = {}         # 完成订单 {区域: {count, amount}}
+        self.periods: Dict[str, Dict[str, Any]] = {}       # 完成订单 {时段标签: {count, amount}}（按日历）
+        self.cancel_hourly: Dict[int, int] = {}
+        self.sketches = OrderSketches()                    # 完成订单 配送时长/客单价 分位数草图
+        self.start_time: Optional[str] = None
+        self.end_time: Optional[str] = None
+        self.source = ""                                   # 数据来源（导出时间/查询范围）
+
+    # ==================== 累加 ====================
+
+    def add(self, o: Dict[str, Any]):
+        order_time = o["order_time"]
+        if self.start_time is None or order_time < self.start_time:
+            self.start_time = order_time
+        if self.end_time is None or order_time > self.end_time:
+            self.end_time = order_time
+
+        hour = int(order_time[11:13])
+        area = o.get("address_area") or "未知"
+        status = o["status"]
+        amount = o["total_amount"]
+        rating = o.get("customer_rating")
+        delivery = o.get("delivery_time_minutes")
+        period = self.calendar.labels[self.calendar.code_at(order_time)]
+        self.add_group(hour, area, status, 1, amount, 0 if rating is None else rating, delivery or 0, period)
+        if status == COMPLETED:
+            self.sketches.add(period, area, amount, delivery)
+
+    def add_group(self, hour: int, area: str, status: str, orders: int, revenue, rating_sum, delivery_sum,
+                  period: str = None):
+        """累加一组同小时/区域/状态的订单（单个订单，或订单库汇总立方体的一行）
+
+        period 为时段标签；未给出时按工作日日历取该小时的时段
+        """
+        self.total += orders
+        if status != COMPLETED:
+            if status == CANCELED:
+                self.canceled += orders
+                self.cancel_hourly[hour] = self.cancel_hourly.get(hour, 0) + orders
+            return
+
+        self.completed += orders
+        self.revenue += revenue
+        self.rating_sum += rating_sum
+        self.delivery_sum += delivery_sum
+
+        stats = self.hourly.get(hour)
+        if stats is None:
+            stats = self.hourly[hour] = {"count": 0, "amount": 0}
+        stats["count"] += orders
+        stats["amount"] += revenue
+
+        stats = self.areas.get(area)
+        if stats is None:
+            stats = self.areas[area] = {"count": 0, "amount": 0}
+        stats["count"] += orders
+        stats["amount"] += revenue
+
+        period = period or self.calendar.label_of_hour(hour)
+        stats = self.periods.get(period)
+        if stats is None:
+            stats = self.periods[period] = {"count": 0, "amount": 0}
+        stats["count"] += orders
+        stats["amount"] += revenue
+
+    def update(self, orders: Iterable[Dict[str, Any]]) -> "OrderAggregate":
+        for o in orders:
+            self.add(o)
+        return self
+
+    def merge(self, other: "OrderAggregate") -> "OrderAggregate":
+        """合并另一份统计（多店铺/多批次）"""
+        for name in ("total", "completed", "canceled", "revenue", "rating_sum", "delivery_sum"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for mine, theirs in ((self.hourly, other.hourly), (self.areas, other.areas), (self.periods, other.periods)):
+            for key, stats in theirs.items():
+                merged = mine.setdefault(key, {"count": 0, "amount": 0})
+                merged["count"] += stats["count"]
+                merged["amount"] += stats["amount"]
+        for hour, count in other.cancel_hourly.items():
+            self.cancel_hourly[hour] = self.cancel_hourly.get(hour, 0) + count
+        self.sketches.merge(other.sketches)
+        self.start_time = min(filter(None, (self.start_time, other.start_time)), default=None)
+        self.end_time = max(filter(None, (self.end_time, other.end_time)), default=None)
+        return self
+
+    # ==================== 视图 ====================
+
+    def summary(self) -> Dict[str, Any]:
+        """下载摘要（ElemeOrderDownloader.generate_summary）"""
+        if not self.total:
+            return {"error": "无订单数据"}
+
+        completed = self.completed
+        return {
+            "统计时间": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "总订单数": self.total,
+            "完成订单": completed,
+            "取消订单": self.canceled,
+            "完成率": f"{completed/self.total*100:.1f}%",
+            "总营业额": round(self.revenue, 2),
+            "客单价": round(self.revenue / completed if completed else 0, 2),
+            "平均评分": round(self.rating_sum / completed if completed else 0, 2),
+            "平均配送时间": f"{round(self.delivery_sum / completed if completed else 0)}分钟"
+        }
+
+    def time_analysis(self) -> Dict[str, Dict[str, Any]]:
+        """按时段（见 ele_me_calendar：早餐/午餐/下午/晚餐/夜宵/深夜/其他）汇总完成订单"""
+        return {label: dict(stats) for label, stats in self.periods.items()}
+
+    def area_analysis(self) -> Dict[str, Dict[str, Any]]:
+        """按区域汇总完成订单"""
+        return {area: dict(stats) for area, stats in self.areas.items()}
+
+    def percentiles(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """配送时长/客单价 p50/p90/p99（按 全部/时段/区域）"""
+        return self.sketches.table()
+
+    def report_metrics(self) -> Dict[str, Any]:
+        """ElemeAnalyzer 报告的关键指标"""
+        if not self.completed:
+            return {"error": "无完成订单"}
+
+        completed = self.completed
+        peak_period = max(self.time_analysis().items(), key=lambda x: x[1]["count"])
+        metrics = {
+            "total_orders": self.total,
+            "completed_orders": completed,
+            "cancellation_rate": f"{(self.total-completed)/self.total*100:.1f}%",
+            "total_revenue": round(self.revenue, 2),
+            "avg_order_value": round(self.revenue / completed, 2),
+            "avg_rating": round(self.rating_sum / completed, 2),
+            "avg_delivery_time": f"{round(self.delivery_sum / completed)}分钟",
+            "peak_period": f"{peak_period[0]} ({peak_period[1]['count']}单)",
+        }
+        delivery = self.sketches.percentiles("delivery")
+        if delivery:
+            metrics["delivery_time_p50_p90_p99"] = "/".join(f"{v:g}" for v in delivery.values()) + "分钟"
+        value = self.sketches.percentiles("value")
+        if value:
+            metrics["order_value_p50_p90_p99"] = "/".join(f"¥{v:g}" for v in value.values())
+        return metrics
+
+    def deepseek_metrics(self) -> Dict[str, Any]:
+        """ElemeDeepSeekAnalyzer 的指标"""
+        if not self.completed:
+            return {"error": "无完成订单"}
+
+        completed = self.completed
+        return {
+            "total_orders": self.total,
+            "completed_orders": completed,
+            "cancellation_rate": round((self.total - completed) / self.total * 100, 1),
+            "total_revenue": round(self.revenue, 2),
+            "avg_order_value": round(self.revenue / completed, 2),
+            "avg_rating": round(self.rating_sum / completed, 2),
+            "avg_delivery_time": round(self.delivery_sum / completed, 1),
+            "peak_hour": max(self.hourly.items(), key=lambda x: x[1]["count"])[0] if self.hourly else None,
+            "hourly_distribution": {str(k): dict(v) for k, v in self.hourly.items()},
+            "delivery_percentiles": self.sketches.percentiles("delivery"),
+            "order_value_percentiles": self.sketches.percentiles("value"),
+        }
+
+    def compact_metrics(self) -> Dict[str, Any]:
+        """OptimizedAnalyzer 的精简指标"""
+        if not self.completed:
+            return {"error": "无完成订单"}
+
+        completed = self.completed
+        hourly = {hour: stats["count"] for hour, stats in self.hourly.items()}
+        return {
+            "orders": self.total,
+            "completed": completed,
+            "cancel_rate": round((self.total - completed) / self.total * 100, 1),
+            "revenue": round(self.revenue, 2),
+            "avg_value": round(self.revenue / completed, 2),
+            "rating": round(self.rating_sum / completed, 2),
+            "delivery": round(self.delivery_sum / completed, 1),
+            "peak": max(hourly.items(), key=lambda x: x[1])[0] if hourly else 0,
+            "hourly": hourly,
+            "delivery_pct": list((self.sketches.percentiles("delivery") or {}).values()),
+            "value_pct": list((self.sketches.percentiles("value") or {}).values()),
+        }
+
+    # ==================== 序列化 ====================
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "total": self.total, "completed": self.completed, "canceled": self.canceled,
+            "revenue": self.revenue, "rating_sum": self.rating_sum, "delivery_sum": self.delivery_sum,
+            "hourly": {str(h): v for h, v in self.hourly.items()},
+            "areas": self.areas,
+            "periods": self.periods,
+            "cancel_hourly": {str(h): v for h, v in self.cancel_hourly.items()},
+            "start_time": self.start_time, "end_time": self.end_time,
+            "sketches": self.sketches.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], calendar: PeriodCalendar = None) -> "OrderAggregate":
+        agg = cls(calendar)
+        for name in ("source", "total", "completed", "canceled", "revenue", "rating_sum", "delivery_sum",
+                     "areas", "start_time", "end_time"):
+            setattr(agg, name, data[name])
+        agg.hourly = {int(h): v for h, v in data["hourly"].items()}
+        agg.cancel_hourly = {int(h): v for h, v in data["cancel_hourly"].items()}
+        agg.periods = data.get("periods") or agg._periods_from_hourly()
+        agg.sketches = OrderSketches.from_dict(data.get("sketches"))
+        return agg
+
+    def _periods_from_hourly(self) -> Dict[str, Dict[str, Any]]:
+        """旧版统计文件没有按时段累加，按工作日日历从小时分布推出"""
+        periods: Dict[str, Dict[str, Any]] = {}
+        for hour, stats in self.hourly.items():
+            merged = periods.setdefault(self.calendar.label_of_hour(hour), {"count": 0, "amount": 0})
+            merged["count"] += stats["count"]
+            merged["amount"] += stats["amount"]
+        return periods
+
+    def save(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        return path
+
+    @classmethod
+    def load(cls, path: str, calendar: PeriodCalendar = None) -> "OrderAggregate":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f), calendar)
+
+
+def aggregate(orders: Iterable[Dict[str, Any]], source: str = "", calendar: PeriodCalendar = None) -> OrderAggregate:
+    """一次遍历订单流得到融合统计（calendar 缺省为默认日历，按店铺统计时传 load_calendar(shop_id)）"""
+    agg = OrderAggregate(calendar).update(orders)
+    agg.source = source
+    return agg
+
+
+def load_aggregate(data_dir: str = DATA_DIR, days: int = None, shop_id: str = None) -> Optional[OrderAggregate]:
+    """分析脚本的统一入口：指定 days 时查订单库汇总立方体近N天，否则取最新导出的统计（时段均按店铺日历）"""
+    if days:
+        from ele_me_order_db import OrderDB
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with OrderDB(data_dir=data_dir) as db:
+            return db.rollup(start=since, shop_id=shop_id)
+    return load_latest_aggregate(data_dir, shop_id)
+
+
+def _load_current(agg_path: str, export_path: Optional[str], calendar: PeriodCalendar) -> Optional[OrderAggregate]:
+    """读取 .agg.json；过期（早于订单导出、旧版格式缺时段/草图、时段标签与当前日历不符）时返回 None"""
+    if not os.path.exists(agg_path):
+        return None
+    if export_path and os.path.getmtime(agg_path) < os.path.getmtime(export_path):
+        return None
+    with open(agg_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    agg = OrderAggregate.from_dict(data, calendar)
+    if "periods" not in data or "sketches" not in data or not set(agg.periods) <= set(agg.calendar.labels):
+        return None
+    return agg
+
+
+def load_latest_aggregate(data_dir: str = DATA_DIR, shop_id: str = None) -> Optional[OrderAggregate]:
+    """最新订单导出的融合统计
+
+    优先读取下载时写好的 .agg.json；缺失或过期时有列式存档则向量化重算并写回，
+    再否则流式遍历一次。
+    """
+    from ele_me_manifest import DataManifest
+    from ele_me_order_io import OrderFile, latest_order_export
+
+    manifest = DataManifest(data_dir)
+    entry = manifest.latest("orders", shop_id)
+    if entry is None:
+        return None
+
+    calendar = load_calendar(shop_id)
+    path = latest_order_export(data_dir, shop_id=shop_id)
+    agg_path = manifest.resolve(entry, "agg") if "agg" in entry.get("formats", {}) else None
+    if agg_path:
+        agg = _load_current(agg_path, path, calendar)
+        if agg is not None:
+            return agg
+
+    if path is None:
+        return None
+    orders = OrderFile(path, AGGREGATE_COLUMNS)
+    if path.endswith(".npz"):
+        from ele_me_columnar import load_columns
+        from ele_me_metrics import aggregate_columns
+        agg = aggregate_columns(load_columns(path, AGGREGATE_COLUMNS), calendar)
+        agg.source = orders.export_time
+        if agg_path:
+            agg.save(agg_path)
+        return agg
+    return aggregate(orders, source=orders.export_time, calendar=calendar)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+饿了么流式异常检测
+订单入库时逐单更新，不等批量报告：按 店铺 × 下单小时 × 指标 维护 EWMA 基线（均值/方差），
+按 店铺 × 指标 维护当天的 CUSUM 累积量，每个序列只保存几个数（O(1) 状态），几分钟内发现
+
+    取消率突增     取消/完成 0-1 序列，伯努利似然比 CUSUM（检验取消率翻倍）
+    评分下降       完成订单 customer_rating，标准化 CUSUM（向下）
+    配送时长变长   完成订单 delivery_time_minutes，标准化 CUSUM（向上）
+
+每单只和往日同一小时的基线比较（午高峰和下午各有各的正常水平），偏差跨小时累积，
+持续几个小时的问题也能累积起来；累积量每天清零。
+告警写入 logs/anomaly_alerts.jsonl，可触发一次针对告警的 DeepSeek 分析。
+
+使用方法:
+    python3 ele_me_anomaly.py --replay --days 14     # 用订单库历史订单预热基线
+    python3 ele_me_anomaly.py --alerts               # 查看今天的告警
+    python3 ele_me_anomaly.py --bench                # 注入异常，测检测延迟和误报
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List
+
+from ele_me_aggregator import CANCELED, COMPLETED
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+LOG_DIR = "/home/michael/projects/ele-me-operation/logs"
+
+STATE_FILE = "anomaly_state.json"
+ALERTS_FILE = "anomaly_alerts.jsonl"
+STATE_VERSION = 1
+
+ALPHA = 0.01              # 基线 EWMA 平滑系数（约最近 100 单同小时订单，跨数天）
+FAST_ALPHA = 0.3          # 近期水平（只用于告警展示）
+WARMUP = 30               # 序列观测数达到后才开始判定
+CUSUM_K = 0.75            # 标准化 CUSUM 的容许偏移（σ）
+CUSUM_H = 6.0             # 标准化 CUSUM 的告警阈值
+Z_CLIP = 3.0              # 单个观测最多贡献 3σ（一条 1 星差评不足以单独告警）
+RATE_SHIFT = 2.0          # 取消率 CUSUM 检验的倍数
+RATE_H = 5.0              # 取消率 CUSUM 的告警阈值（对数似然比）
+MIN_RATE = 0.02           # 取消率基线下限，避免基线接近 0 时一次取消就告警
+MAX_RATE = 0.45
+COOLDOWN_MINUTES = 30     # 同一序列告警后的静默时间
+
+# 指标 → 名称、类型（rate 为 0-1 序列）、异常方向（1 向上，-1 向下）、标准差下限
+METRICS = {
+    "cancel": {"name": "取消率", "kind": "rate", "direction": 1},
+    "rating": {"name": "评分", "kind": "value", "direction": -1, "min_std": 0.2},
+    "delivery": {"name": "配送时长", "kind": "value", "direction": 1, "min_std": 3.0},
+}
+
+
+class Baseline:
+    """某店铺某小时某指标的 EWMA 均值/方差"""
+
+    __slots__ = ("n", "mean", "var")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, var: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.var = var
+
+    def step(self, metric: str, x: float) -> float:
+        """x 对 CUSUM 的增量（相对本小时基线）"""
+        spec = METRICS[metric]
+        if spec["kind"] == "rate":
+            p0 = min(max(self.mean, MIN_RATE), MAX_RATE)
+            p1 = p0 * RATE_SHIFT
+            return math.log(p1 / p0) if x else math.log((1 - p1) / (1 - p0))
+        std = max(math.sqrt(self.var), spec["min_std"])
+        z = spec["direction"] * (x - self.mean) / std
+        return min(z, Z_CLIP) - CUSUM_K
+
+    def update(self, x: float):
+        # 预热期按算术平均，之后按 EWMA
+        alpha = max(ALPHA, 1 / (self.n + 1))
+        diff = x - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        self.n += 1
+
+    def to_list(self) -> List[Any]:
+        return [self.n, round(self.mean, 6), round(self.var, 6)]
+
+
+class Monitor:
+    """某店铺某指标当天的 CUSUM 累积量（跨小时累积，每小时的观测与各自小时的基线比较）"""
+
+    __slots__ = ("cusum", "recent", "expected", "day", "alerted_at")
+
+    def __init__(self, cusum: float = 0.0, recent: float = 0.0, expected: float = 0.0, day: str = "",
+                 alerted_at: str = ""):
+        self.cusum = cusum
+        self.recent = recent          # 近期观测的 EWMA（告警展示用）
+        self.expected = expected      # 同期基线的 EWMA（告警展示用）
+        self.day = day
+        self.alerted_at = alerted_at
+
+    def observe(self, metric: str, x: float, day: str, baseline: Baseline) -> bool:
+        """累加一个观测，返回累积量是否越过阈值"""
+        if day != self.day:
+            self.day = day
+            self.cusum = 0.0
+            self.recent, self.expected = x, baseline.mean
+        self.recent += FAST_ALPHA * (x - self.recent)
+        self.expected += FAST_ALPHA * (baseline.mean - self.expected)
+        if baseline.n < WARMUP:
+            return False
+        self.cusum = max(0.0, self.cusum + baseline.step(metric, x))
+        return self.cusum >= (RATE_H if METRICS[metric]["kind"] == "rate" else CUSUM_H)
+
+    def to_list(self) -> List[Any]:
+        return [round(self.cusum, 6), round(self.recent, 6), round(self.expected, 6), self.day, self.alerted_at]
+
+
+def observations(order: Dict[str, Any]) -> List[tuple]:
+    """订单 → [(指标, 观测值)]（只统计已完成/已取消的订单）"""
+    status = order.get("status")
+    if status == CANCELED:
+        return [("cancel", 1.0)]
+    if status != COMPLETED:
+        return []
+    result = [("cancel", 0.0)]
+    rating = order.get("customer_rating")
+    if rating is not None:
+        result.append(("rating", float(rating)))
+    delivery = order.get("delivery_time_minutes")
+    if delivery is not None and delivery >= 0:
+        result.append(("delivery", float(delivery)))
+    return result
+
+
+def format_value(metric: str, value: float) -> str:
+    if metric == "cancel":
+        return f"{value * 100:.1f}%"
+    if metric == "rating":
+        return f"{value:.2f}"
+    return f"{value:.0f}分钟"
+
+
+class AnomalyDetector:
+    """按 店铺 × 小时 × 指标 的流式检测器（状态持久化到 data/anomaly_state.json）"""
+
+    def __init__(self, data_dir: str = None, log_dir: str = None, sink: bool = True):
+        self.state_file = os.path.join(data_dir or DATA_DIR, STATE_FILE)
+        self.alerts_file = os.path.join(log_dir or LOG_DIR, ALERTS_FILE)
+        self.sink = sink
+        self.baselines: Dict[str, Baseline] = {}     # "店铺|小时|指标" → 基线
+        self.monitors: Dict[str, Monitor] = {}       # "店铺|指标" → 当天累积量
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("version") == STATE_VERSION:
+            self.baselines = {key: Baseline(*data) for key, data in state["baselines"].items()}
+            self.monitors = {key: Monitor(*data) for key, data in state["monitors"].items()}
+
+    def save(self):
+        """原子写入状态文件"""
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": STATE_VERSION,
+                       "baselines": {key: b.to_list() for key, b in self.baselines.items()},
+                       "monitors": {key: m.to_list() for key, m in self.monitors.items()}},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.state_file)
+
+    def reset(self):
+        self.baselines, self.monitors = {}, {}
+
+    def observe(self, order: Dict[str, Any], shop_id: str = None) -> List[Dict[str, Any]]:
+        """累加一个订单，返回新产生的告警"""
+        order_time = order["order_time"]
+        shop = shop_id or order.get("shop_id") or ""
+        day, hour = order_time[:10], int(order_time[11:13])
+
+        alerts = []
+        for metric, x in observations(order):
+            key = f"{shop}|{hour}|{metric}"
+            baseline = self.baselines.get(key)
+            if baseline is None:
+                baseline = self.baselines[key] = Baseline()
+            key = f"{shop}|{metric}"
+            monitor = self.monitors.get(key)
+            if monitor is None:
+                monitor = self.monitors[key] = Monitor()
+
+            if monitor.observe(metric, x, day, baseline) and not self._cooling(monitor, order_time):
+                alerts.append(self._alert(shop, hour, metric, monitor, order_time))
+                monitor.cusum = 0.0
+                monitor.alerted_at = order_time
+            baseline.update(x)
+        return alerts
+
+    def observe_many(self, orders: Iterable[Dict[str, Any]], shop_id: str = None) -> List[Dict[str, Any]]:
+        """按下单时间顺序累加一批订单，并把告警写入日志"""
+        alerts = []
+        for order in sorted(orders, key=lambda o: o["order_time"]):
+            alerts.extend(self.observe(order, shop_id))
+        if alerts and self.sink:
+            self.write_alerts(alerts)
+        return alerts
+
+    @staticmethod
+    def _cooling(monitor: Monitor, order_time: str) -> bool:
+        if not monitor.alerted_at:
+            return False
+        until = datetime.fromisoformat(monitor.alerted_at) + timedelta(minutes=COOLDOWN_MINUTES)
+        return datetime.fromisoformat(order_time) < until
+
+    @staticmethod
+    def _alert(shop: str, hour: int, metric: str, monitor: Monitor, order_time: str) -> Dict[str, Any]:
+        spec = METRICS[metric]
+        change = "突增" if spec["direction"] > 0 else "下降"
+        recent, baseline = format_value(metric, monitor.recent), format_value(metric, monitor.expected)
+        return {
+            "order_time": order_time,
+            "detected_at": datetime.now().isoformat(timespec="seconds"),
+            "shop_id": shop or None,
+            "hour": hour,
+            "metric": metric,
+            "recent": round(monitor.recent, 4),
+            "baseline": round(monitor.expected, 4),
+            "cusum": round(monitor.cusum, 2),
+            "message": f"{shop + ' ' if shop else ''}{hour}点 {spec['name']}{change}: 近期 {recent}，同期基线 {baseline}",
+        }
+
+    def write_alerts(self, alerts: List[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(self.alerts_file), exist_ok=True)
+        with open(self.alerts_file, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+    def recent_alerts(self, since: str = None) -> List[Dict[str, Any]]:
+        """告警日志中 detected_at >= since 的告警（默认今天）"""
+        since = since or datetime.now().strftime("%Y-%m-%d")
+        if not os.path.exists(self.alerts_file):
+            return []
+        with open(self.alerts_file, "r", encoding="utf-8") as f:
+            alerts = [json.loads(line) for line in f if line.strip()]
+        return [alert for alert in alerts if alert["detected_at"] >= since]
+
+
+def analyze_alerts(alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """针对告警调用一次 DeepSeek 分析（不等下一次定时分析）"""
+    from ele_me_deepseek_analysis import ElemeDeepSeekAnalyzer
+
+    return ElemeDeepSeekAnalyzer().analyze_alerts(alerts)
+
+
+def print_alerts(alerts: List[Dict[str, Any]]):
+    if not alerts:
+        print("   ✅ 无异常")
+        return
+    for alert in alerts:
+        print(f"   🚨 {alert['order_time'][:16]} {alert['message']}")
+
+
+def replay(days: int, data_dir: str = None) -> AnomalyDetector:
+    """用订单库近N天的订单重建基线（不写告警日志）"""
+    from ele_me_order_db import OrderDB
+
+    detector = AnomalyDetector(data_dir=data_dir, sink=False)
+    detector.reset()
+    start = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    alerts = 0
+    with OrderDB(data_dir=data_dir or DATA_DIR) as db:
+        for order in db.iter_orders(start=start, with_items=False):
+            alerts += len(detector.observe(order))
+    detector.save()
+    print(f"   基线: {len(detector.baselines)}个, 回放期间告警: {alerts}条")
+    return detector
+
+
+def _bench_orders(days: int, orders_per_hour: int, seed: int = 7):
+    """模拟订单流：11-21点每小时 orders_per_hour 单；最后一天 12点起注入三种异常"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    injected = start + timedelta(days=days - 1, hours=12)
+    for day in range(days):
+        for hour in range(11, 22):
+            for i in range(orders_per_hour):
+                order_time = start + timedelta(days=day, hours=hour, seconds=i * 3600 // orders_per_hour)
+                bad = order_time >= injected
+                canceled = rng.random() < (0.25 if bad else 0.06)
+                yield {
+                    "order_time": order_time.isoformat(),
+                    "status": CANCELED if canceled else COMPLETED,
+                    "customer_rating": min(5, max(1, round(rng.gauss(3.5 if bad else 4.7, 0.5)))),
+                    "delivery_time_minutes": max(10, round(rng.gauss(48 if bad else 32, 6))),
+                }
+
+
+def run_benchmark(days: int = 15, orders_per_hour: int = 40):
+    """注入异常：测吞吐、检测延迟、注入前的误报数"""
+    print("=" * 60)
+    print(f"🚨 流式异常检测（{days}天, 每小时{orders_per_hour}单）")
+    print("=" * 60)
+
+    orders = list(_bench_orders(days, orders_per_hour))
+    injected = (datetime(2026, 1, 1) + timedelta(days=days - 1, hours=12)).isoformat()
+    detector = AnomalyDetector(data_dir="/tmp", sink=False)
+    detector.reset()
+
+    began = time.perf_counter()
+    alerts = []
+    for order in orders:
+        alerts.extend(detector.observe(order, "bench"))
+    secs = time.perf_counter() - began
+
+    false_alarms = [a for a in alerts if a["order_time"] < injected]
+    detector.save()
+    print(f"   吞吐: {len(orders) / secs:,.0f}单/秒, 基线 {len(detector.baselines)}个 + 累积量 "
+          f"{len(detector.monitors)}个, 状态文件 {os.path.getsize(detector.state_file) / 1024:.1f}KB")
+    print(f"   注入前误报: {len(false_alarms)}条（{days - 1}天）")
+    for metric, spec in METRICS.items():
+        hit = next((a for a in alerts if a["metric"] == metric and a["order_time"] >= injected), None)
+        if hit:
+            delay = datetime.fromisoformat(hit["order_time"]) - datetime.fromisoformat(injected)
+            print(f"   {spec['name']}: {delay.seconds // 60}分钟后告警 — {hit['message']}")
+        else:
+            print(f"   {spec['name']}: ❌ 未检出")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么流式异常检测")
+    parser.add_argument("--replay", action="store_true", help="用订单库历史订单重建基线")
+    parser.add_argument("--days", type=int, default=14, help="回放天数")
+    parser.add_argument("--alerts", action="store_true", help="查看今天的告警")
+    parser.add_argument("--ai", action="store_true", help="对今天的告警调用 DeepSeek 分析")
+    parser.add_argument("--bench", action="store_true", help="注入异常测检测延迟")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark()
+        return
+
+    print("=" * 60)
+    print("🚨 饿了么流式异常检测")
+    print("=" * 60)
+
+    if args.replay:
+        replay(args.days)
+    if args.alerts or args.ai:
+        alerts = AnomalyDetector().recent_alerts()
+        print_alerts(alerts)
+        if args.ai and alerts:
+            analysis = analyze_alerts(alerts)
+            if "error" in analysis:
+                print(f"❌ 分析失败: {analysis['error']}")
+    elif not args.replay:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
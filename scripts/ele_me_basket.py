@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+饿了么购物篮挖掘（菜品同购）
+按时段统计哪些菜品经常一起下单，输出 支持度/提升度 表，供套餐组合和满减凑单建议使用
+
+逐层 Apriori，每层一遍流式扫描：完成订单按 CHUNK_ORDERS 分块，块内每个候选菜品一个位图
+（Python int），项集计数 = 各菜品位图按位与后的 popcount，时段计数再与时段位图相与。
+内存只与块大小和菜品数有关，与历史订单量无关；订单源需可重复迭代（OrderFile / OrderQuery）。
+单个 JSONL 导出的完成订单先解析成紧凑 Order 列表（ele_me_order_model），各层不再重复解压解析；
+列式存档（.npz）的列已整体加载，直接用 np.packbits 一次建好全部位图，各层不再扫描
+
+    支持度 = 同购订单数 / 该时段完成订单数
+    提升度 = 支持度 / 各菜品支持度之积（>1 表示比随机搭配更常一起买）
+
+使用方法:
+    python3 ele_me_basket.py                          # 最新导出
+    python3 ele_me_basket.py --days 30 --min-support 0.02
+    python3 ele_me_basket.py --bench --orders 300000  # 合成订单压测
+"""
+
+import argparse
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ele_me_aggregator import COMPLETED
+from ele_me_calendar import PeriodCalendar, load_calendar
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
+
+MIN_SUPPORT = 0.01                # 项集至少出现在 1% 的订单中（按时段分别判断）
+MIN_COUNT = 5                     # 且至少 5 单，避免小样本时段的偶然组合
+MAX_SIZE = 3                      # 最多挖到 3 个菜品的组合
+CHUNK_ORDERS = 65536              # 每块订单数（每个菜品位图 8KB）
+MIN_LIFT = 1.2                    # 推荐套餐的最低提升度
+TOP_N = 5
+
+ALL = "全部"
+
+# 挖掘用到的订单字段（列式存档只读取这些列）
+BASKET_COLUMNS = ("order_time", "status", "items")
+
+
+def parse_full_reduction(setting: str) -> List[Tuple[float, float]]:
+    """满减设置 "35-5, 50-8, 80-15" → [(35, 5), (50, 8), (80, 15)]（按门槛升序）"""
+    tiers = [(float(t), float(r)) for t, r in re.findall(r"(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)", setting or "")]
+    return sorted(tiers)
+
+
+def load_full_reduction(config_file: str = None) -> str:
+    """CORE_STRATEGY.json 中的满减设置（无配置时为空）"""
+    try:
+        with open(config_file or CONFIG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("价格策略", {}).get("满减设置", "")
+    except FileNotFoundError:
+        return ""
+
+
+def iter_baskets(orders: Iterable[Dict[str, Any]],
+                 calendar: PeriodCalendar = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """完成订单 → (时段编号, 菜品列表)"""
+    calendar = calendar or load_calendar()
+    for o in orders:
+        if o.get("status") != COMPLETED:
+            continue
+        yield calendar.code_at(o["order_time"]), o.get("items") or []
+
+
+def _bitmap(indexes: List[int], size: int) -> int:
+    """订单下标列表 → 位图（bytearray 置位后一次转 int，避免大整数反复移位）"""
+    bits = bytearray((size >> 3) + 1)
+    for i in indexes:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+class BasketStats:
+    """挖掘结果：各时段订单数、菜品计数/均价、频繁项集计数"""
+
+    def __init__(self, min_support: float = MIN_SUPPORT, labels: Sequence[str] = None):
+        self.min_support = min_support
+        self.labels = list(labels or load_calendar().labels)      # 日历时段标签（店铺日历）
+        self.periods = self.labels + [ALL]                        # 计数数组的下标顺序，最后一位是全部订单
+        self.orders = [0] * len(self.periods)                     # 各时段完成订单数
+        self.item_counts: Dict[str, List[int]] = {}               # {菜品: 各时段出现订单数}
+        self.prices: Dict[str, float] = {}                        # {菜品: 平均单价}
+        self.itemsets: Dict[Tuple[str, ...], List[int]] = {}      # {(菜品…): 各时段同购订单数}
+
+    def frequent(self, counts: List[int], period: int) -> bool:
+        return counts[period] >= max(MIN_COUNT, self.min_support * self.orders[period])
+
+    def support(self, counts: List[int], period: int) -> float:
+        return counts[period] / self.orders[period] if self.orders[period] else 0.0
+
+    def lift(self, itemset: Tuple[str, ...], period: int) -> float:
+        expected = 1.0
+        for item in itemset:
+            expected *= self.support(self.item_counts[item], period)
+        return self.support(self.itemsets[itemset], period) / expected if expected else 0.0
+
+    def rules(self, period: str = ALL, top_n: int = TOP_N) -> List[Dict[str, Any]]:
+        """某时段的频繁组合（≥2 个菜品），按提升度、支持度排序"""
+        p = self.periods.index(period)
+        rows = [{"items": list(itemset), "count": counts[p],
+                 "support": round(self.support(counts, p), 4), "lift": round(self.lift(itemset, p), 2)}
+                for itemset, counts in self.itemsets.items() if self.frequent(counts, p)]
+        rows.sort(key=lambda r: (r["lift"], r["support"]), reverse=True)
+        return rows[:top_n]
+
+    def table(self, top_n: int = TOP_N) -> Dict[str, Any]:
+        """报告用的支持度/提升度表 {时段: {orders, combos}}（无订单的时段省略）"""
+        return {label: {"orders": self.orders[p], "combos": self.rules(label, top_n)}
+                for p, label in enumerate(self.periods) if self.orders[p]}
+
+    def combo_price(self, items: Sequence[str]) -> float:
+        return round(sum(self.prices.get(item, 0) for item in items), 2)
+
+    def recommendations(self, full_reduction: str = "", min_lift: float = MIN_LIFT,
+                        top_n: int = 3) -> List[str]:
+        """套餐组合与满减凑单建议"""
+        recommendations = []
+        for label in self.labels:
+            for combo in self.rules(label, top_n=1):
+                if combo["lift"] >= min_lift:
+                    recommendations.append(
+                        f"🍱 {label}常一起点: {'+'.join(combo['items'])}（同购{combo['support'] * 100:.1f}%，"
+                        f"提升度{combo['lift']}），建议做成时段套餐")
+
+        tiers = parse_full_reduction(full_reduction)
+        for combo in self.rules(ALL, top_n) if tiers else []:
+            price = self.combo_price(combo["items"])
+            tier = next(((t, r) for t, r in tiers if t > price), None)
+            if tier is None:
+                continue
+            addon = self._addon(combo["items"], tier[0] - price)
+            hint = f"，可搭配{addon}凑单" if addon else ""
+            recommendations.append(f"💰 {'+'.join(combo['items'])}组合约¥{price:g}，"
+                                   f"距满{tier[0]:g}减{tier[1]:g}差¥{tier[0] - price:g}{hint}")
+            break
+        return recommendations
+
+    def _addon(self, items: Sequence[str], gap: float) -> Optional[str]:
+        """凑单菜品：与组合内菜品提升度最高、且单价不超过差额太多的菜品"""
+        p = len(self.periods) - 1
+        best, best_lift = None, 0.0
+        for itemset, counts in self.itemsets.items():
+            if len(itemset) != 2 or not self.frequent(counts, p):
+                continue
+            inside = [item for item in itemset if item in items]
+            outside = [item for item in itemset if item not in items]
+            if len(inside) != 1 or self.prices.get(outside[0], 0) > gap * 1.5:
+                continue
+            lift = self.lift(itemset, p)
+            if lift > best_lift:
+                best, best_lift = outside[0], lift
+        return best
+
+    def prompt_lines(self, top_n: int = 3) -> List[str]:
+        """DeepSeek 提示词用的组合摘要"""
+        lines = []
+        for label, section in self.table(top_n).items():
+            combos = "；".join(f"{'+'.join(c['items'])} 支持度{c['support'] * 100:.1f}% 提升度{c['lift']}"
+                              for c in section["combos"])
+            if combos:
+                lines.append(f"- {label}（{section['orders']}单）: {combos}")
+        return lines
+
+    def compact(self) -> List[str]:
+        """精简提示词用：每个时段提升度最高的组合，如 "午餐(11-13):招牌炒饭+可乐×1.6" """
+        return [f"{label}:{'+'.join(c['items'])}×{c['lift']}"
+                for label in self.labels for c in self.rules(label, top_n=1)]
+
+
+class BasketMiner:
+    """位图 Apriori：第 1 遍统计单品，第 k 遍统计 k 个菜品的候选组合"""
+
+    def __init__(self, min_support: float = MIN_SUPPORT, max_size: int = MAX_SIZE,
+                 chunk_orders: int = CHUNK_ORDERS, calendar: PeriodCalendar = None):
+        self.min_support = min_support
+        self.max_size = max_size
+        self.chunk_orders = chunk_orders
+        self.calendar = calendar or load_calendar()
+
+    def mine(self, orders: Iterable[Dict[str, Any]]) -> BasketStats:
+        stats = BasketStats(self.min_support, self.calendar.labels)
+        self._count_items(orders, stats)
+
+        frequent = [(item,) for item, counts in stats.item_counts.items()
+                    if any(stats.frequent(counts, p) for p in range(len(stats.periods)))]
+        for size in range(2, self.max_size + 1):
+            candidates = self._candidates(sorted(frequent), size)
+            if not candidates:
+                break
+            counts = self._count_itemsets(orders, candidates)
+            frequent = [itemset for itemset, c in counts.items()
+                        if any(stats.frequent(c, p) for p in range(len(stats.periods)))]
+            stats.itemsets.update((itemset, counts[itemset]) for itemset in frequent)
+        return stats
+
+    def _count_items(self, orders: Iterable[Dict[str, Any]], stats: BasketStats):
+        """第 1 遍：各时段订单数、单品出现订单数、单品均价"""
+        totals: Dict[str, List[float]] = {}
+        every = len(stats.periods) - 1
+        for period, items in iter_baskets(orders, self.calendar):
+            stats.orders[period] += 1
+            stats.orders[every] += 1
+            for name in {item["name"] for item in items}:
+                counts = stats.item_counts.get(name)
+                if counts is None:
+                    counts = stats.item_counts[name] = [0] * len(stats.periods)
+                counts[period] += 1
+                counts[every] += 1
+            for item in items:
+                quantity = item.get("quantity") or 1
+                price = totals.setdefault(item["name"], [0.0, 0])
+                price[0] += (item.get("price") or 0) * quantity
+                price[1] += quantity
+        stats.prices = {name: round(amount / quantity, 2) for name, (amount, quantity) in totals.items() if quantity}
+
+    @staticmethod
+    def _candidates(frequent: List[Tuple[str, ...]], size: int) -> List[Tuple[str, ...]]:
+        """前缀相同的 (size-1) 项集两两合并，所有子集都频繁才保留"""
+        known = set(frequent)
+        candidates = []
+        for i, a in enumerate(frequent):
+            for b in frequent[i + 1:]:
+                if a[:-1] != b[:-1]:
+                    break
+                candidate = a + b[-1:]
+                if all(subset in known for subset in combinations(candidate, size - 1)):
+                    candidates.append(candidate)
+        return candidates
+
+    def _count_itemsets(self, orders: Iterable[Dict[str, Any]],
+                        candidates: List[Tuple[str, ...]]) -> Dict[Tuple[str, ...], List[int]]:
+        """一遍扫描：逐块建位图，候选项集计数 = 位图与的 popcount"""
+        wanted = {item for candidate in candidates for item in candidate}
+        labels = len(self.calendar.labels)
+        counts = {candidate: [0] * (labels + 1) for candidate in candidates}
+        periods: List[int] = []
+        rows: Dict[str, List[int]] = {item: [] for item in wanted}
+
+        def flush():
+            size = len(periods)
+            bitmaps = {item: _bitmap(indexes, size) for item, indexes in rows.items()}
+            period_masks = [_bitmap([i for i, p in enumerate(periods) if p == period], size)
+                            for period in range(labels)]
+            self._tally(counts, bitmaps, period_masks)
+            periods.clear()
+            for indexes in rows.values():
+                indexes.clear()
+
+        for period, items in iter_baskets(orders, self.calendar):
+            i = len(periods)
+            periods.append(period)
+            for name in {item["name"] for item in items}:
+                if name in wanted:
+                    rows[name].append(i)
+            if len(periods) >= self.chunk_orders:
+                flush()
+        if periods:
+            flush()
+        return counts
+
+
+    @staticmethod
+    def _tally(counts: Dict[Tuple[str, ...], List[int]], bitmaps: Dict[str, int], period_masks: List[int]):
+        """候选项集计数 += 菜品位图按位与后的 popcount（分时段再与时段位图相与）"""
+        for candidate, c in counts.items():
+            bits = bitmaps[candidate[0]]
+            for item in candidate[1:]:
+                bits &= bitmaps[item]
+            if not bits:
+                continue
+            c[-1] += bits.bit_count()
+            for period, mask in enumerate(period_masks):
+                c[period] += (bits & mask).bit_count()
+
+    def mine_columns(self, columns: Dict[str, Any]) -> BasketStats:
+        """列式存档上的挖掘：列已在内存中，整段订单一次建位图（np.packbits），各层无需再扫描"""
+        import numpy as np
+        from ele_me_metrics import completed_mask
+
+        stats = BasketStats(self.min_support, self.calendar.labels)
+        mask = completed_mask(columns)
+        offsets = columns["item_offsets"]
+        item_order = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        keep = mask[item_order]
+        item_order, codes = item_order[keep], columns["item_name"][keep]
+        quantity, price = columns["item_quantity"][keep], columns["item_price"][keep]
+
+        # 完成订单重新编号 0..n-1，位图按该编号置位
+        position = np.cumsum(mask) - 1
+        n = int(mask.sum())
+        periods = self.calendar.bucket(columns["order_time"][mask])
+
+        def bitmap(selected: np.ndarray) -> int:
+            return int.from_bytes(np.packbits(selected, bitorder="little").tobytes(), "little")
+
+        names = columns["item_name_dict"].tolist()
+        bitmaps = {}
+        for code in np.unique(codes):
+            selected = np.zeros(n, dtype=bool)
+            selected[position[item_order[codes == code]]] = True
+            bitmaps[names[code]] = bitmap(selected)
+        period_masks = [bitmap(periods == period) for period in range(len(stats.labels))]
+
+        stats.orders = [int(np.count_nonzero(periods == p)) for p in range(len(stats.labels))] + [n]
+        amounts = np.bincount(codes, weights=price * quantity, minlength=len(names))
+        totals = np.bincount(codes, weights=quantity, minlength=len(names))
+        stats.prices = {names[c]: round(float(amounts[c] / totals[c]), 2) for c in np.flatnonzero(totals)}
+        single = {(name,): [0] * len(stats.periods) for name in bitmaps}
+        self._tally(single, bitmaps, period_masks)
+        stats.item_counts = {name: c for (name,), c in single.items()}
+
+        frequent = [itemset for itemset, c in single.items()
+                    if any(stats.frequent(c, p) for p in range(len(stats.periods)))]
+        for size in range(2, self.max_size + 1):
+            counts = {candidate: [0] * len(stats.periods) for candidate in self._candidates(sorted(frequent), size)}
+            if not counts:
+                break
+            self._tally(counts, bitmaps, period_masks)
+            frequent = [itemset for itemset, c in counts.items()
+                        if any(stats.frequent(c, p) for p in range(len(stats.periods)))]
+            stats.itemsets.update((itemset, counts[itemset]) for itemset in frequent)
+        return stats
+
+
+def mine_baskets(orders: Iterable[Dict[str, Any]], min_support: float = MIN_SUPPORT,
+                 max_size: int = MAX_SIZE, calendar: PeriodCalendar = None) -> BasketStats:
+    """挖掘频繁菜品组合（orders 需可重复迭代）"""
+    return BasketMiner(min_support, max_size, calendar=calendar).mine(orders)
+
+
+def load_baskets(data_dir: str = None, days: int = None, shop_id: str = None,
+                 min_support: float = MIN_SUPPORT) -> Optional[BasketStats]:
+    """分析脚本的统一入口：指定 days 时挖掘订单库近N天，否则挖掘最新导出（无菜品数据返回 None）"""
+    data_dir = data_dir or DATA_DIR
+    calendar = load_calendar(shop_id)
+    if days:
+        from ele_me_order_db import OrderDB
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        with OrderDB(data_dir=data_dir) as db:
+            stats = mine_baskets(db.query(start=since, status=COMPLETED, shop_id=shop_id), min_support,
+                                 calendar=calendar)
+    else:
+        from ele_me_order_io import OrderFile, latest_order_export
+        path = latest_order_export(data_dir, shop_id=shop_id)
+        if path is None:
+            return None
+        if path.endswith(".npz"):
+            from ele_me_columnar import load_columns
+            stats = BasketMiner(min_support, calendar=calendar).mine_columns(load_columns(path, BASKET_COLUMNS))
+        else:
+            from ele_me_order_model import load_orders
+            orders = load_orders(o for o in OrderFile(path, BASKET_COLUMNS) if o.get("status") == COMPLETED)
+            stats = mine_baskets(orders, min_support, calendar=calendar)
+    return stats if stats.item_counts else None
+
+
+def print_stats(stats: BasketStats, full_reduction: str = "", top_n: int = TOP_N):
+    for label, section in stats.table(top_n).items():
+        print(f"\n⏰ {label}（{section['orders']}单）:")
+        for combo in section["combos"]:
+            print(f"   {'+'.join(combo['items'])}: {combo['count']}单, "
+                  f"支持度{combo['support'] * 100:.1f}%, 提升度{combo['lift']}")
+        if not section["combos"]:
+            print("   （无频繁组合）")
+    recommendations = stats.recommendations(full_reduction)
+    if recommendations:
+        print(f"\n💡 组合建议:")
+        for rec in recommendations:
+            print(f"   {rec}")
+
+
+def run_benchmark(count: int):
+    """合成订单上的挖掘耗时"""
+    import numpy as np
+    from ele_me_columnar import iter_orders_from_columns
+    from ele_me_synthetic import SyntheticOrderGenerator
+
+    generator = SyntheticOrderGenerator(days=30, orders_per_day=count // 30, hourly_curve=np.ones(24))
+    columns = generator.generate_shop("shop001")
+    orders = list(iter_orders_from_columns(columns))
+
+    print("=" * 60)
+    print(f"🧺 购物篮挖掘（{len(orders)}单）")
+    print("=" * 60)
+
+    began = time.perf_counter()
+    stats = mine_baskets(orders)
+    secs = time.perf_counter() - began
+    print(f"   逐单流式: {secs * 1000:.0f}ms ({len(orders) / secs / 1000:.0f}k单/秒)")
+
+    began = time.perf_counter()
+    vector = BasketMiner().mine_columns(columns)
+    vector_secs = time.perf_counter() - began
+    print(f"   列式位图: {vector_secs * 1000:.0f}ms ({secs / vector_secs:.0f}×)")
+    print(f"   菜品: {len(stats.item_counts)}个, 频繁组合: {len(stats.itemsets)}个")
+    print(f"   结果一致: {'✅' if vector.itemsets == stats.itemsets and vector.orders == stats.orders else '❌'}")
+    print_stats(stats, top_n=3)
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么购物篮挖掘")
+    parser.add_argument("--days", type=int, help="挖掘订单库近N天（默认最新导出）")
+    parser.add_argument("--shop-id", type=str, help="只挖掘指定店铺")
+    parser.add_argument("--min-support", type=float, default=MIN_SUPPORT, help="最低支持度")
+    parser.add_argument("--top", type=int, default=TOP_N, help="每个时段显示的组合数")
+    parser.add_argument("--bench", action="store_true", help="合成订单压测")
+    parser.add_argument("--orders", type=int, default=300000, help="压测订单数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.orders)
+        return
+
+    stats = load_baskets(days=args.days, shop_id=args.shop_id, min_support=args.min_support)
+    if stats is None:
+        print("❌ 无菜品数据")
+        return
+
+    full_reduction = load_full_reduction()
+
+    print("=" * 60)
+    print("🧺 菜品同购分析")
+    print("=" * 60)
+    print_stats(stats, full_reduction, args.top)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
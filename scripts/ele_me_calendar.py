@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+饿了么营业时段日历
+所有脚本共用的时段划分，由 CORE_STRATEGY.json 构建：
+
+    时间策略   高峰时段（早餐/午餐/晚餐/夜宵高峰）
+    时段策略   推广调价的时间点；不在高峰开始处的时间点开启一个平峰时段，
+               按钟点命名（14:00 → 下午，23:00 → 深夜），持续到下一个时间点或高峰
+    其余时间   其他时段
+
+每种日类型预先算好 1440 分钟的查找表：单个时间 O(1) 查表，订单列用 NumPy 整列查表。
+可选的 时段日历 配置覆盖周末、节假日和单个店铺（缺省时与工作日相同；节假日在周末的基础上覆盖）：
+
+    "时段日历": {
+        "周末": {"星期": [5, 6], "时间策略": {"早餐高峰": "08:00-10:00"}},
+        "节假日": {"日期": ["2026-10-01", "2026-10-02"], "时段策略": {"23:00": "夜宵延长，出价不变"}},
+        "店铺": {"shop002": {"时间策略": {"夜宵高峰": "21:00-24:00"}, "周末": {...}}}
+    }
+
+各日类型共用一套时段编号，报告标签取工作日的时段（如 午餐(11-13)）；
+小时粒度的统计（汇总立方体、按小时分布）取该小时第 0 分钟所在的时段
+
+使用方法:
+    python3 ele_me_calendar.py                    # 打印今天的时段表
+    python3 ele_me_calendar.py --date 2026-10-03 --shop-id shop002
+"""
+
+import argparse
+import json
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
+
+# 配置缺失时使用的默认策略（与 CORE_STRATEGY.json 一致）
+DEFAULT_TIME_STRATEGY = {
+    "早餐高峰": "07:00-09:00",
+    "午餐高峰": "11:00-13:00",
+    "晚餐高峰": "17:00-19:00",
+    "夜宵高峰": "21:00-23:00",
+}
+DEFAULT_SLOT_STRATEGY = {
+    "07:00": "开启推广，出价提高20%",
+    "11:00": "高峰，出价提高50%",
+    "14:00": "非高峰，出价降低30%",
+    "17:00": "晚高峰，出价提高50%",
+    "23:00": "暂停推广",
+}
+
+MINUTES_PER_DAY = 24 * 60
+OTHER = "其他"
+OTHER_LABEL = "其他时段"
+
+# 平峰时段按开始钟点命名
+CLOCK_NAMES = ((0, "深夜"), (5, "上午"), (11, "中午"), (14, "下午"), (18, "晚上"), (22, "深夜"))
+
+WORKDAY, WEEKEND, HOLIDAY = 0, 1, 2
+DAY_TYPE_NAMES = ("工作日", "周末", "节假日")
+WEEKEND_DAYS = (5, 6)
+
+
+def parse_minute(clock: str) -> int:
+    """"07:30" → 450（"24:00" 为 1440）"""
+    hour, minute = clock.strip().split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def clock_name(minute: int) -> str:
+    hour = minute // 60 % 24
+    return [name for start, name in CLOCK_NAMES if hour >= start][-1]
+
+
+def bid_multiplier(action: str) -> float:
+    """时段策略文案 → 出价倍数（"出价提高20%" → 1.2，"暂停" → 0）"""
+    if "暂停" in action:
+        return 0.0
+    match = re.search(r"(提高|上浮|降低|下调)(\d+(?:\.\d+)?)%", action)
+    if not match:
+        return 1.0
+    sign = 1 if match.group(1) in ("提高", "上浮") else -1
+    return round(1 + sign * float(match.group(2)) / 100, 2)
+
+
+class Period:
+    """一个时段（分钟区间可跨零点）"""
+
+    __slots__ = ("name", "start", "end", "peak")
+
+    def __init__(self, name: str, start: int, end: int, peak: bool):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.peak = peak
+
+    @property
+    def label(self) -> str:
+        """报告用标签，如 午餐(11-13)"""
+        return f"{self.name}({self.start // 60:02d}-{self.end // 60:02d})"
+
+    def minutes(self) -> range:
+        end = self.end if self.end > self.start else self.end + MINUTES_PER_DAY
+        return range(self.start, end)
+
+
+class DayPlan:
+    """一种日类型的时段划分 + 推广调价时间点"""
+
+    def __init__(self, time_strategy: Dict[str, str], slot_strategy: Dict[str, str]):
+        self.periods: List[Period] = []
+        for key, window in time_strategy.items():
+            start, end = (parse_minute(t) for t in window.split("-"))
+            self.periods.append(Period(key.replace("高峰", ""), start, end, True))
+
+        peak_starts = {p.start for p in self.periods}
+        self.slots = sorted((parse_minute(t), action) for t, action in slot_strategy.items())
+        breakpoints = sorted(peak_starts | {minute for minute, _ in self.slots})
+        for minute, _ in self.slots:
+            if minute in peak_starts:
+                continue
+            # 平峰时段持续到下一个时间点（跨零点时回到当天最早的时间点）
+            later = [b for b in breakpoints if b > minute]
+            end = later[0] if later else breakpoints[0] + MINUTES_PER_DAY
+            self.periods.append(Period(clock_name(minute), minute, end % MINUTES_PER_DAY or MINUTES_PER_DAY,
+                                       False))
+        self.periods.sort(key=lambda p: p.start)
+
+        # 分钟 → 本日时段下标（-1 为其他时段），高峰优先于平峰
+        self.minute_period = [-1] * MINUTES_PER_DAY
+        for i, period in sorted(enumerate(self.periods), key=lambda x: x[1].peak):
+            for minute in period.minutes():
+                self.minute_period[minute % MINUTES_PER_DAY] = i
+
+        # 分钟 → 生效的调价时间点下标（第一个时间点之前沿用前一天最后一个）
+        self.minute_slot = [len(self.slots) - 1] * MINUTES_PER_DAY
+        for i, (minute, _) in enumerate(self.slots):
+            self.minute_slot[minute:] = [i] * (MINUTES_PER_DAY - minute)
+
+
+def _merged(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """时间策略/时段策略 按键覆盖"""
+    return {key: {**base.get(key, {}), **override.get(key, {})} for key in ("时间策略", "时段策略")}
+
+
+class PeriodCalendar:
+    """按日类型（工作日/周末/节假日）和店铺覆盖的分钟级时段查找表"""
+
+    def __init__(self, strategy: Dict[str, Any] = None, shop_id: str = None):
+        strategy = strategy or {}
+        base = {
+            "时间策略": strategy.get("时间策略") or DEFAULT_TIME_STRATEGY,
+            "时段策略": strategy.get("推广策略", {}).get("时段策略") or DEFAULT_SLOT_STRATEGY,
+        }
+        overrides = strategy.get("时段日历", {})
+        shop = overrides.get("店铺", {}).get(shop_id, {}) if shop_id else {}
+        workday = _merged(base, shop)
+        weekend = shop.get("周末") or overrides.get("周末") or {}
+        holiday = shop.get("节假日") or overrides.get("节假日") or {}
+
+        self.shop_id = shop_id
+        self.weekend_days = tuple(weekend.get("星期", WEEKEND_DAYS))
+        self.holidays = set(holiday.get("日期", []))
+        weekend_plan = _merged(workday, weekend)
+        self.plans = [DayPlan(**self._args(workday)), DayPlan(**self._args(weekend_plan)),
+                      DayPlan(**self._args(_merged(weekend_plan, holiday)))]
+
+        # 全部日类型共用一套时段编号：工作日的时段在前（按开始时间），其他日类型新增的名称其后，其他时段最后
+        self.names: List[str] = []
+        self.labels: List[str] = []
+        for plan in self.plans:
+            for period in plan.periods:
+                if period.name not in self.names:
+                    self.names.append(period.name)
+                    self.labels.append(period.label)
+        self.names.append(OTHER)
+        self.labels.append(OTHER_LABEL)
+        self.other = len(self.names) - 1
+
+        # 日类型 × 分钟 → 时段编号
+        self.table: List[List[int]] = []
+        for plan in self.plans:
+            codes = [self.names.index(p.name) for p in plan.periods]
+            self.table.append([codes[i] if i >= 0 else self.other for i in plan.minute_period])
+        self.hour_table = [row[::60] for row in self.table]
+        self._day_types: Dict[str, int] = {}
+        self._array = None
+
+    @staticmethod
+    def _args(blocks: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+        return {"time_strategy": blocks["时间策略"], "slot_strategy": blocks["时段策略"]}
+
+    # ==================== 单个时间 ====================
+
+    def day_type(self, day: Union[str, date]) -> int:
+        """日期 → 日类型（节假日优先于周末）"""
+        key = day if isinstance(day, str) else day.isoformat()
+        day_type = self._day_types.get(key)
+        if day_type is None:
+            if key in self.holidays:
+                day_type = HOLIDAY
+            elif date.fromisoformat(key).weekday() in self.weekend_days:
+                day_type = WEEKEND
+            else:
+                day_type = WORKDAY
+            self._day_types[key] = day_type
+        return day_type
+
+    def code_at(self, when: Union[str, datetime]) -> int:
+        """时间 → 时段编号（ISO 字符串直接切片，不解析）"""
+        if isinstance(when, datetime):
+            return self.table[self.day_type(when.date())][when.hour * 60 + when.minute]
+        return self.table[self.day_type(when[:10])][int(when[11:13]) * 60 + int(when[14:16] or 0)]
+
+    def period_at(self, when: Union[str, datetime]) -> str:
+        """时间 → 时段名称（早餐/午餐/下午/…/其他）"""
+        return self.names[self.code_at(when)]
+
+    def label_at(self, when: Union[str, datetime]) -> str:
+        return self.labels[self.code_at(when)]
+
+    def hour_code(self, hour: int, day: Union[str, date] = None) -> int:
+        """小时 → 时段编号（未给日期时按工作日）"""
+        return self.hour_table[self.day_type(day) if day else WORKDAY][hour]
+
+    def name_of_hour(self, hour: int, day: Union[str, date] = None) -> str:
+        return self.names[self.hour_code(hour, day)]
+
+    def label_of_hour(self, hour: int, day: Union[str, date] = None) -> str:
+        return self.labels[self.hour_code(hour, day)]
+
+    def is_peak(self, when: Union[str, datetime]) -> bool:
+        day_type = self.day_type(when[:10] if isinstance(when, str) else when.date())
+        name = self.period_at(when)
+        return any(p.peak and p.name == name for p in self.plans[day_type].periods)
+
+    def slot_at(self, when: datetime) -> Optional[Dict[str, Any]]:
+        """当前生效的推广调价时间点 {time, action, bid_multiplier}（未配置时为 None）"""
+        plan = self.plans[self.day_type(when.date())]
+        if not plan.slots:
+            return None
+        minute, action = plan.slots[plan.minute_slot[when.hour * 60 + when.minute]]
+        return {"time": f"{minute // 60:02d}:{minute % 60:02d}", "action": action,
+                "bid_multiplier": bid_multiplier(action)}
+
+    # ==================== 整列 ====================
+
+    def _table_array(self):
+        import numpy as np
+        if self._array is None:
+            self._array = np.array(self.table, dtype=np.int8)
+        return self._array
+
+    def _day_type_codes(self, days):
+        """datetime64[D] 列 → 日类型列（只对不重复的日期查一次）"""
+        import numpy as np
+        unique, inverse = np.unique(days, return_inverse=True)
+        types = np.array([self.day_type(str(d)) for d in unique], dtype=np.int8)
+        return types[inverse]
+
+    def bucket(self, order_time):
+        """datetime64 列 → 时段编号列"""
+        import numpy as np
+        days = order_time.astype("datetime64[D]")
+        minutes = (order_time.astype("datetime64[m]") - days).astype(np.int64)
+        return self._table_array()[self._day_type_codes(days), minutes].astype(np.int64)
+
+    def bucket_hours(self, days, hours):
+        """(datetime64[D] 列, 小时列) → 时段编号列（汇总立方体等小时粒度数据）"""
+        return self._table_array()[self._day_type_codes(days), hours * 60].astype("int64")
+
+    def describe(self, day: Union[str, date] = None) -> List[Dict[str, Any]]:
+        """某天的时段表（打印/调试用）"""
+        plan = self.plans[self.day_type(day) if day else WORKDAY]
+        return [{"name": p.name, "label": p.label, "peak": p.peak} for p in plan.periods]
+
+
+_CALENDARS: Dict[Tuple[str, Optional[str]], PeriodCalendar] = {}
+
+
+def load_calendar(shop_id: str = None, config_file: str = None) -> PeriodCalendar:
+    """读取 CORE_STRATEGY.json 构建日历（按配置文件和店铺缓存；配置缺失时用默认策略）"""
+    path = config_file or CONFIG_FILE
+    key = (path, shop_id)
+    if key not in _CALENDARS:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                strategy = json.load(f)
+        except FileNotFoundError:
+            strategy = {}
+        _CALENDARS[key] = PeriodCalendar(strategy, shop_id)
+    return _CALENDARS[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么营业时段日历")
+    parser.add_argument("--date", type=str, help="日期 YYYY-MM-DD（默认今天）")
+    parser.add_argument("--shop-id", type=str, help="店铺ID（有店铺覆盖时生效）")
+    args = parser.parse_args()
+
+    calendar = load_calendar(args.shop_id)
+    day = args.date or date.today().isoformat()
+
+    print("=" * 60)
+    print(f"🗓️ 营业时段 {day}（{DAY_TYPE_NAMES[calendar.day_type(day)]}）")
+    print("=" * 60)
+    for period in calendar.describe(day):
+        print(f"   {'🔥' if period['peak'] else '  '} {period['label']}")
+    print(f"\n⏰ 各小时:")
+    print("   " + " ".join(f"{h:02d}{calendar.name_of_hour(h, day)}" for h in range(24)))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
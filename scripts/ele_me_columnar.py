@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+饿了么订单列式存档（NumPy npz）
+金额/评分/配送时长/下单时间为定长列，状态和区域做字典编码，
+分析脚本只读取需要的列，不必把整个 JSON 解析成 dict
+
+列布局:
+    order_id                 U 字符串
+    order_time               datetime64[us]
+    status / address_area    整数编码 + status_dict / address_area_dict
+    total_amount, delivery_fee, discount   float64
+    customer_rating          float32（缺失为 NaN）
+    delivery_time_minutes    int32（缺失为 -1）
+    item_offsets             int32，第 i 单的菜品为 item_*[offsets[i]:offsets[i+1]]
+    item_name                整数编码 + item_name_dict
+    item_quantity / item_price             int32 / float64
+"""
+
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# 字典编码列
+ENCODED_COLUMNS = ("status", "address_area")
+
+# 逻辑列 → npz 中实际存储的数组
+COLUMN_ARRAYS = {
+    "order_id": ("order_id",),
+    "order_time": ("order_time",),
+    "status": ("status", "status_dict"),
+    "address_area": ("address_area", "address_area_dict"),
+    "total_amount": ("total_amount",),
+    "delivery_fee": ("delivery_fee",),
+    "discount": ("discount",),
+    "customer_rating": ("customer_rating",),
+    "delivery_time_minutes": ("delivery_time_minutes",),
+    "items": ("item_offsets", "item_name", "item_name_dict", "item_quantity", "item_price"),
+}
+
+ORDER_COLUMNS = tuple(COLUMN_ARRAYS.keys())
+
+# 字符串列每攒够这么多单就编码成定长数组（order_id → UTF-8 定长字节，order_time → datetime64）
+STRING_CHUNK = 65536
+
+
+def _code_dtype(size: int):
+    """字典大小对应的最小编码类型"""
+    return np.uint8 if size <= 0xFF else np.uint16 if size <= 0xFFFF else np.uint32
+
+
+class ColumnBuilder:
+    """逐单追加构建列数组
+
+    数值列写入定长 array 缓冲，状态/区域/菜品名边读边做字典编码，
+    order_id / order_time 每 STRING_CHUNK 单编码成定长数组，
+    流式写存档时不需要持有订单 dict 列表，也不持有整批 Python 字符串。
+    """
+
+    def __init__(self):
+        self.order_ids: List[str] = []          # 未满一块的字符串
+        self.order_times: List[str] = []
+        self.id_chunks: List[np.ndarray] = []   # 已编码的块
+        self.time_chunks: List[np.ndarray] = []
+        self.numeric = {
+            "total_amount": array("d"), "delivery_fee": array("d"), "discount": array("d"),
+            "customer_rating": array("f"), "delivery_time_minutes": array("i"),
+            "item_offsets": array("i", [0]), "item_quantity": array("i"), "item_price": array("d"),
+        }
+        self.encoded = {name: ({}, array("I")) for name in ENCODED_COLUMNS + ("item_name",)}
+
+    def _encode(self, name: str, value: str):
+        dictionary, codes = self.encoded[name]
+        codes.append(dictionary.setdefault(value, len(dictionary)))
+
+    def add(self, o: Dict[str, Any]):
+        num = self.numeric
+        self.order_ids.append(o["order_id"])
+        self.order_times.append(o["order_time"])
+        self._encode("status", o["status"])
+        self._encode("address_area", o.get("address_area") or "未知")
+        num["total_amount"].append(o.get("total_amount", 0))
+        num["delivery_fee"].append(o.get("delivery_fee", 0))
+        num["discount"].append(o.get("discount", 0))
+        rating = o.get("customer_rating")
+        num["customer_rating"].append(float("nan") if rating is None else rating)
+        minutes = o.get("delivery_time_minutes")
+        num["delivery_time_minutes"].append(-1 if minutes is None else minutes)
+
+        for item in o.get("items", []):
+            self._encode("item_name", item["name"])
+            num["item_quantity"].append(item.get("quantity", 1))
+            num["item_price"].append(item.get("price", 0))
+        num["item_offsets"].append(len(num["item_quantity"]))
+        if len(self.order_ids) >= STRING_CHUNK:
+            self._flush_strings()
+
+    def _flush_strings(self):
+        """攒下的字符串编码成定长数组块"""
+        if not self.order_ids:
+            return
+        self.id_chunks.append(np.array([i.encode("utf-8") for i in self.order_ids], dtype=bytes))
+        self.time_chunks.append(np.array(self.order_times, dtype="datetime64[us]"))
+        self.order_ids, self.order_times = [], []
+
+    def finish(self) -> Dict[str, np.ndarray]:
+        self._flush_strings()
+        ids = np.concatenate(self.id_chunks) if self.id_chunks else np.array([], dtype=bytes)
+        times = np.concatenate(self.time_chunks) if self.time_chunks else np.array([], dtype="datetime64[us]")
+        self.id_chunks, self.time_chunks = [], []
+        try:
+            ids = ids.astype(str)                  # 平台单号都是 ASCII，整列转换最快
+        except UnicodeDecodeError:
+            ids = np.char.decode(ids, "utf-8")
+        columns = {"order_id": ids, "order_time": times}
+        for name, buffer in self.numeric.items():
+            columns[name] = np.frombuffer(buffer, dtype=buffer.typecode).copy()
+        for name, (dictionary, codes) in self.encoded.items():
+            columns[name] = np.frombuffer(codes, dtype=codes.typecode).astype(_code_dtype(len(dictionary)))
+            columns[f"{name}_dict"] = np.array(list(dictionary), dtype=str)
+        return columns
+
+
+def build_columns(orders: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """订单 dict 序列 → 列数组"""
+    builder = ColumnBuilder()
+    for o in orders:
+        builder.add(o)
+    return builder.finish()
+
+
+def save_columnar(orders: Iterable[Dict[str, Any]], path: str, export_time: str = None,
+                  columns: Dict[str, np.ndarray] = None) -> str:
+    """写列式存档（.npz，未压缩以便快速按列读取）"""
+    columns = columns if columns is not None else build_columns(orders)
+    columns["export_time"] = np.array(export_time or datetime.now().isoformat())
+    np.savez(path, **columns)
+    return path
+
+
+def load_columns(path: str, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """按需读取列（npz 惰性加载，未请求的列不会被读取）"""
+    wanted = columns or ORDER_COLUMNS
+    result = {}
+
+    with np.load(path, allow_pickle=False) as archive:
+        for name in wanted:
+            for array_name in COLUMN_ARRAYS[name]:
+                result[array_name] = archive[array_name]
+        if "export_time" in archive.files:
+            result["export_time"] = archive["export_time"]
+
+    return result
+
+
+def decode(columns: Dict[str, np.ndarray], name: str) -> np.ndarray:
+    """字典编码列还原为字符串数组"""
+    return columns[f"{name}_dict"][columns[name]]
+
+
+def iter_orders_from_columns(columns: Dict[str, np.ndarray]) -> Iterator[Dict[str, Any]]:
+    """列数组 → 逐单产出订单 dict（只包含已加载的列）"""
+    fields = {}
+
+    if "order_id" in columns:
+        fields["order_id"] = columns["order_id"].tolist()
+    if "order_time" in columns:
+        fields["order_time"] = (t.isoformat() for t in columns["order_time"].astype(object))
+    for name in ENCODED_COLUMNS:
+        if name in columns:
+            fields[name] = decode(columns, name).tolist()
+    for name in ("total_amount", "delivery_fee", "discount"):
+        if name in columns:
+            fields[name] = columns[name].tolist()
+    if "customer_rating" in columns:
+        fields["customer_rating"] = (None if r != r else (int(r) if r == int(r) else r)
+                                     for r in columns["customer_rating"].tolist())
+    if "delivery_time_minutes" in columns:
+        fields["delivery_time_minutes"] = (None if m < 0 else m
+                                           for m in columns["delivery_time_minutes"].tolist())
+    if "item_offsets" in columns:
+        offsets = columns["item_offsets"].tolist()
+        names = decode(columns, "item_name").tolist()
+        qty, price = columns["item_quantity"].tolist(), columns["item_price"].tolist()
+        fields["items"] = (
+            [{"name": names[j], "quantity": qty[j], "price": price[j]} for j in range(offsets[i], offsets[i + 1])]
+            for i in range(len(offsets) - 1)
+        )
+
+    keys = list(fields.keys())
+    for row in zip(*fields.values()):
+        yield dict(zip(keys, row))
@@ -4,96 +4,64 @@
 用于优化运营策略
 """
 
+import argparse
 import json
 import os
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from ele_me_aggregator import AGGREGATE_COLUMNS, aggregate, load_aggregate
+from ele_me_basket import load_baskets, load_full_reduction
+from ele_me_calendar import load_calendar
+from ele_me_manifest import DataManifest
+from ele_me_order_io import open_latest_orders
 
 DATA_DIR = "/home/michael/projects/ele-me-operation/data"
 
 class ElemeAnalyzer:
-    def __init__(self):
-        self.data_dir = DATA_DIR
+    # 报告用到的订单字段（列式存档只读取这些列）
+    ORDER_COLUMNS = AGGREGATE_COLUMNS
+    
+    def __init__(self, shop_id=None, data_dir=None):
+        self.shop_id = shop_id
+        self.data_dir = data_dir or DATA_DIR
         
     def load_latest_orders(self):
-        """加载最新订单数据"""
-        files = [f for f in os.listdir(self.data_dir) if f.startswith("orders_") and f.endswith(".json")]
-        if not files:
+        """加载最新订单数据（流式读取，优先列式存档只读需要的列）"""
+        return open_latest_orders(self.data_dir, self.ORDER_COLUMNS, shop_id=self.shop_id)
+    
+    def load_aggregate(self, days=None):
+        """融合统计（指定 days 时查询订单库汇总立方体近N天，否则取最新导出的统计）"""
+        return load_aggregate(self.data_dir, days, self.shop_id)
+    
+    def load_baskets(self, days=None):
+        """菜品同购统计（指定 days 时挖掘订单库近N天，否则挖掘最新导出；无菜品数据返回 None）"""
+        return load_baskets(self.data_dir, days, self.shop_id)
+    
+    def load_forecast(self, day=None):
+        """某天（默认明天）的小时需求预测（订单库无历史或没有 NumPy 时返回 None）"""
+        try:
+            from ele_me_forecast import forecast_shop
+        except ImportError:
             return None
-        
-        latest_file = max(files, key=lambda x: os.path.getmtime(os.path.join(self.data_dir, x)))
-        
-        with open(os.path.join(self.data_dir, latest_file), "r", encoding="utf-8") as f:
-            return json.load(f)
+        return forecast_shop(self.shop_id, day or date.today() + timedelta(days=1), data_dir=self.data_dir)
     
     def analyze_by_time(self, orders):
-        """按时段分析订单"""
-        time_analysis = defaultdict(lambda: {"count": 0, "amount": 0})
-        
-        for order in orders:
-            if order["status"] != "已完成":
-                continue
-            
-            hour = datetime.fromisoformat(order["order_time"]).hour
-            
-            if 7 <= hour < 9:
-                period = "早餐(07-09)"
-            elif 11 <= hour < 13:
-                period = "午餐(11-13)"
-            elif 17 <= hour < 19:
-                period = "晚餐(17-19)"
-            elif 21 <= hour < 23:
-                period = "夜宵(21-23)"
-            else:
-                period = "其他时段"
-            
-            time_analysis[period]["count"] += 1
-            time_analysis[period]["amount"] += order["total_amount"]
-        
-        return time_analysis
+        """按时段分析完成订单（店铺日历：早餐/午餐/下午/晚餐/夜宵/深夜/其他时段）
+
+        下午(14-17) 与 深夜(23-07) 按推广时间点单独成组，不再计入 其他时段
+        """
+        return aggregate(orders, calendar=load_calendar(self.shop_id)).time_analysis()
     
     def analyze_by_area(self, orders):
-        """按区域分析订单"""
-        area_analysis = defaultdict(lambda: {"count": 0, "amount": 0})
-        
-        for order in orders:
-            if order["status"] != "已完成":
-                continue
-            
-            area = order.get("address_area", "未知")
-            area_analysis[area]["count"] += 1
-            area_analysis[area]["amount"] += order["total_amount"]
-        
-        return area_analysis
+        """按区域分析完成订单"""
+        return aggregate(orders).area_analysis()
     
     def calculate_metrics(self, orders):
         """计算关键指标"""
-        completed = [o for o in orders if o["status"] == "已完成"]
-        
-        if not completed:
-            return {"error": "无完成订单"}
-        
-        total_revenue = sum(o["total_amount"] for o in completed)
-        avg_order_value = total_revenue / len(completed)
-        avg_rating = sum(o["customer_rating"] for o in completed) / len(completed)
-        avg_delivery = sum(o["delivery_time_minutes"] for o in completed) / len(completed)
-        
-        # 按时段统计
-        time_stats = self.analyze_by_time(completed)
-        peak_period = max(time_stats.items(), key=lambda x: x[1]["count"])
-        
-        return {
-            "total_orders": len(orders),
-            "completed_orders": len(completed),
-            "cancellation_rate": f"{(len(orders)-len(completed))/len(orders)*100:.1f}%",
-            "total_revenue": round(total_revenue, 2),
-            "avg_order_value": round(avg_order_value, 2),
-            "avg_rating": round(avg_rating, 2),
-            "avg_delivery_time": f"{round(avg_delivery)}分钟",
-            "peak_period": f"{peak_period[0]} ({peak_period[1]['count']}单)",
-        }
+        return aggregate(orders).report_metrics()
     
-    def generate_recommendations(self, metrics, time_analysis, area_analysis):
+    def generate_recommendations(self, metrics, time_analysis, area_analysis, percentiles=None, baskets=None,
+                                 stock_plan=None):
         """生成优化建议"""
         recommendations = []
         
@@ -107,78 +75,150 @@ class ElemeAnalyzer:
             if delivery_mins > 35:
                 recommendations.append("⚠️ 配送时间过长，建议优化备餐流程")
         
+        # 基于配送长尾建议（均值正常但最慢的 10% 订单拖累评分）
+        slow = [(group, p["p90"]) for group, p in (percentiles or {}).get("delivery_time", {}).items()
+                if p and p["p90"] > 45]
+        if slow:
+            group, p90 = max(slow, key=lambda x: x[1])
+            recommendations.append(f"⚠️ {group}配送p90达{p90:g}分钟，最慢的一成订单易引发差评，建议排查出餐和骑手调度")
+        
         # 基于高峰时段建议
         if time_analysis:
             peak = max(time_analysis.items(), key=lambda x: x[1]["count"])
             recommendations.append(f"📈 高峰时段: {peak[0]}，建议提前备货")
         
+        # 基于需求预测的备货量（替代固定的 提前30%库存）
+        for row in stock_plan or []:
+            if row["peak"]:
+                recommendations.append(f"📦 {row['period']}预计{row['expected']:g}单，建议按{row['prepare']}单备货"
+                                       f"（多备{row['buffer'] * 100:.0f}%）")
+        
         # 基于区域建议
         if area_analysis:
             top_area = max(area_analysis.items(), key=lambda x: x[1]["count"])
             recommendations.append(f"📍 订单最多区域: {top_area[0]}，可针对性推广")
         
+        # 基于菜品同购建议（时段套餐、满减凑单）
+        if baskets:
+            recommendations.extend(baskets.recommendations(load_full_reduction()))
+        
         return recommendations
     
-    def generate_report(self):
+    def build_report(self, days=None, agg=None, baskets=None, forecast=None):
+        """计算分析报告（指定 days 时从订单库读取近N天；无数据返回 None）
+
+        指标、时段、区域都来自同一份融合统计，订单只读一遍
+        """
+        agg = agg or self.load_aggregate(days)
+        if agg is None:
+            return None
+        
+        metrics = agg.report_metrics()
+        time_analysis = agg.time_analysis()
+        area_analysis = agg.area_analysis()
+        percentiles = agg.percentiles()
+        baskets = baskets or self.load_baskets(days)
+        forecast = forecast or self.load_forecast()
+        plan = None
+        if forecast:
+            from ele_me_forecast import stock_plan
+            plan = stock_plan(forecast, baskets=baskets)
+        
+        return {
+            "report_time": datetime.now().isoformat(),
+            "data_source": agg.source,
+            "shop_id": self.shop_id,
+            "metrics": metrics,
+            "time_analysis": time_analysis,
+            "area_analysis": area_analysis,
+            "percentiles": percentiles,
+            "baskets": baskets.table() if baskets else {},
+            "forecast": {"date": forecast["date"], "total": forecast["total"], "total_range": forecast["total_range"],
+                         "model": forecast["model_name"], "stock_plan": plan} if forecast else {},
+            "recommendations": self.generate_recommendations(metrics, time_analysis, area_analysis, percentiles,
+                                                             baskets, plan)
+        }
+    
+    def save_report(self, report):
+        """保存报告并登记到数据清单"""
+        suffix = f"_{self.shop_id}" if self.shop_id else ""
+        report_file = f"{self.data_dir}/analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.json"
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        DataManifest(self.data_dir).register("analysis", report_file, shop_id=self.shop_id)
+        return report_file
+    
+    def generate_report(self, days=None):
         """生成完整分析报告"""
-        data = self.load_latest_orders()
-        if not data:
+        report = self.build_report(days)
+        if not report:
             print("❌ 无订单数据")
             return
         
-        orders = data.get("orders", [])
-        
         print("=" * 60)
         print("📊 饿了么运营数据分析报告")
         print("=" * 60)
         
         # 关键指标
-        metrics = self.calculate_metrics(orders)
         print("\n📈 关键指标:")
-        for k, v in metrics.items():
+        for k, v in report["metrics"].items():
             print(f"   {k}: {v}")
         
         # 时段分析
-        time_analysis = self.analyze_by_time([o for o in orders if o["status"] == "已完成"])
         print(f"\n⏰ 时段分析:")
-        for period, stats in sorted(time_analysis.items()):
+        for period, stats in sorted(report["time_analysis"].items()):
             avg = stats["amount"] / stats["count"] if stats["count"] > 0 else 0
             print(f"   {period}: {stats['count']}单, ¥{round(stats['amount'], 2)}, 客单¥{round(avg, 2)}")
         
         # 区域分析
-        area_analysis = self.analyze_by_area([o for o in orders if o["status"] == "已完成"])
         print(f"\n📍 区域分析:")
-        for area, stats in sorted(area_analysis.items(), key=lambda x: x[1]["count"], reverse=True):
-            avg = stats["amount"] / stats["count"] if stats["count"] > 0 else 0
+        for area, stats in sorted(report["area_analysis"].items(), key=lambda x: x[1]["count"], reverse=True):
             print(f"   {area}: {stats['count']}单, ¥{round(stats['amount'], 2)}")
         
+        # 分位数
+        if report["percentiles"]:
+            print(f"\n📐 分位数 (p50/p90/p99):")
+            for metric, name, fmt in (("delivery_time", "配送时长", "{:g}分钟"), ("order_value", "客单价", "¥{:g}")):
+                for group, p in report["percentiles"].get(metric, {}).items():
+                    if p:
+                        print(f"   {name}·{group}: {'/'.join(fmt.format(v) for v in p.values())}")
+        
+        # 菜品组合
+        if report["baskets"]:
+            print(f"\n🍱 菜品组合 (支持度/提升度):")
+            for period, section in report["baskets"].items():
+                combos = ", ".join(f"{'+'.join(c['items'])} {c['support'] * 100:.1f}%/{c['lift']}"
+                                   for c in section["combos"][:3])
+                print(f"   {period}: {combos or '无频繁组合'}")
+        
+        # 需求预测
+        if report["forecast"]:
+            forecast = report["forecast"]
+            low, high = forecast["total_range"]
+            print(f"\n🔮 需求预测 {forecast['date']}: {forecast['total']:g}单（80%区间 {low:g}-{high:g}，{forecast['model']}）")
+            for row in forecast["stock_plan"]:
+                items = "，".join(f"{k}×{v}" for k, v in row.get("items", {}).items())
+                print(f"   {row['period']}: 预计{row['expected']:g}单, 按{row['prepare']}单备货"
+                      f"{'  ' + items if items else ''}")
+        
         # 优化建议
-        recommendations = self.generate_recommendations(metrics, time_analysis, area_analysis)
         print(f"\n💡 优化建议:")
-        for rec in recommendations:
+        for rec in report["recommendations"]:
             print(f"   {rec}")
         
         print("=" * 60)
         
-        # 保存报告
-        report = {
-            "report_time": datetime.now().isoformat(),
-            "data_source": data.get("export_time", ""),
-            "metrics": metrics,
-            "time_analysis": dict(time_analysis),
-            "area_analysis": dict(area_analysis),
-            "recommendations": recommendations
-        }
-        
-        report_file = f"{DATA_DIR}/analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(report_file, "w", encoding="utf-8") as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
-        
+        report_file = self.save_report(report)
         print(f"\n📄 报告已保存: {report_file}")
 
 def main():
-    analyzer = ElemeAnalyzer()
-    analyzer.generate_report()
+    parser = argparse.ArgumentParser(description="饿了么数据分析")
+    parser.add_argument("--days", type=int, help="从订单库分析近N天（默认分析最新导出）")
+    parser.add_argument("--shop-id", type=str, help="只分析指定店铺")
+    args = parser.parse_args()
+    
+    analyzer = ElemeAnalyzer(shop_id=args.shop_id)
+    analyzer.generate_report(days=args.days)
 
 if __name__ == "__main__":
     main()
@@ -4,85 +4,81 @@
 学习分析订单数据，生成优化建议
 """
 
-import requests
+import argparse
 import json
 import os
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, timedelta
+from typing import Iterable, List, Dict, Any, Optional
+
+from ele_me_aggregator import OrderAggregate, aggregate, load_aggregate
+from ele_me_basket import BasketStats, load_baskets
+from ele_me_calendar import load_calendar
+from ele_me_manifest import DataManifest
+from http_client import get_client
+from llm_stream import stream_chat
+from token_budget import Section, TokenLedger, describe_fit, estimate_messages, estimate_tokens, fit_sections
+from ele_me_order_db import OrderDB
+from ele_me_order_io import open_latest_orders
 
 # 配置
 DATA_DIR = "/home/michael/projects/ele-me-operation/data"
 LOG_DIR = "/home/michael/projects/ele-me-operation/logs"
 CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
 
+# 分析提示词的 token 预算（不含系统提示和回复）
+PROMPT_BUDGET = 1500
+
+# 分析报告的字段及打印顺序
+REPORT_FIELDS = ("summary", "problems", "recommendations", "action_plan", "risk_warnings", "confidence")
+
 # DeepSeek API
 DEEPSEEK_API = "sk-f04a00d9f3d54cc2861552fd46e8ed76"
 DEEPSEEK_URL = "https://api.deepseek.com/chat/completions"
 
 class ElemeDeepSeekAnalyzer:
+    # 指标计算用到的订单字段（列式存档只读取这些列）
+    ORDER_COLUMNS = ("order_time", "status", "total_amount", "customer_rating", "delivery_time_minutes")
+    
     def __init__(self):
         self.api_key = DEEPSEEK_API
         self.api_url = DEEPSEEK_URL
         self.model = "deepseek-chat"
+        self.ledger = TokenLedger(data_dir=DATA_DIR, script="deepseek_analysis")
         
     def load_latest_orders(self) -> Dict[str, Any]:
-        """加载最新订单数据"""
-        files = [f for f in os.listdir(DATA_DIR) if f.startswith("orders_") and f.endswith(".json")]
-        if not files:
-            return None
-        
-        latest_file = max(files, key=lambda x: os.path.getmtime(os.path.join(DATA_DIR, x)))
-        
-        with open(os.path.join(DATA_DIR, latest_file), "r", encoding="utf-8") as f:
-            return json.load(f)
+        """加载最新订单数据（流式读取，优先列式存档只读需要的列）"""
+        return open_latest_orders(DATA_DIR, self.ORDER_COLUMNS)
     
     def load_strategy(self) -> Dict[str, Any]:
         """加载运营策略"""
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
     
-    def calculate_metrics(self, orders: List[Dict]) -> Dict[str, Any]:
-        """计算关键指标"""
-        completed = [o for o in orders if o["status"] == "已完成"]
-        
-        if not completed:
-            return {"error": "无完成订单"}
-        
-        # 按小时统计
-        hourly_stats = {}
-        for o in completed:
-            hour = datetime.fromisoformat(o["order_time"]).hour
-            if hour not in hourly_stats:
-                hourly_stats[hour] = {"count": 0, "amount": 0}
-            hourly_stats[hour]["count"] += 1
-            hourly_stats[hour]["amount"] += o["total_amount"]
-        
-        # 计算指标
-        total_revenue = sum(o["total_amount"] for o in completed)
-        
-        metrics = {
-            "total_orders": len(orders),
-            "completed_orders": len(completed),
-            "cancellation_rate": round((len(orders) - len(completed)) / len(orders) * 100, 1),
-            "total_revenue": round(total_revenue, 2),
-            "avg_order_value": round(total_revenue / len(completed), 2),
-            "avg_rating": round(sum(o["customer_rating"] for o in completed) / len(completed), 2),
-            "avg_delivery_time": round(sum(o["delivery_time_minutes"] for o in completed) / len(completed), 1),
-            "peak_hour": max(hourly_stats.items(), key=lambda x: x[1]["count"])[0] if hourly_stats else None,
-            "hourly_distribution": {str(k): v for k, v in hourly_stats.items()}
-        }
-        
-        return metrics
+    def load_aggregate(self, days: int = None) -> Optional[OrderAggregate]:
+        """融合统计（指定 days 时查询订单库汇总立方体近N天，否则取最新导出的统计）"""
+        return load_aggregate(DATA_DIR, days)
+    
+    def load_baskets(self, days: int = None) -> Optional[BasketStats]:
+        """菜品同购统计（指定 days 时挖掘订单库近N天，否则挖掘最新导出）"""
+        return load_baskets(DATA_DIR, days)
     
-    def prepare_analysis_data(self, data: Dict[str, Any], strategy: Dict) -> str:
-        """准备发送给 DeepSeek 分析的数据"""
-        orders = data.get("orders", [])
-        metrics = self.calculate_metrics(orders)
+    def calculate_metrics(self, orders: Iterable[Dict]) -> Dict[str, Any]:
+        """计算关键指标（单次遍历，orders 可以是生成器）"""
+        return aggregate(orders).deepseek_metrics()
+    
+    def prepare_analysis_data(self, data: Dict[str, Any], strategy: Dict, metrics: Dict[str, Any] = None,
+                              budget: int = PROMPT_BUDGET) -> str:
+        """准备发送给 DeepSeek 分析的数据（已有融合统计时传入 metrics，不再遍历订单）
+        
+        超出 token 预算时依次裁剪：同购组合 → 时段分布（单量少的先去）→ 策略配置
+        """
+        if metrics is None:
+            metrics = self.calculate_metrics(data.get("orders", []))
         promotion = strategy.get("推广策略", {})
         limits = strategy.get("防限制规则", {})
         
         # 构建分析提示
-        analysis_prompt = f"""
+        core = f"""
 请分析以下饿了么外卖店铺的运营数据，并提供详细的优化建议：
 
 ## 一、核心指标
@@ -94,17 +90,22 @@ class ElemeDeepSeekAnalyzer:
 - 平均评分: {metrics.get('avg_rating', 0)}⭐
 - 平均配送时间: {metrics.get('avg_delivery_time', 0)}分钟
 - 高峰时段: {metrics.get('peak_hour', 'N/A')}:00
-
-## 二、时段分布
 """
         
+        delivery = metrics.get("delivery_percentiles")
+        if delivery:
+            core += f"- 配送时长 p50/p90/p99: {delivery['p50']:g}/{delivery['p90']:g}/{delivery['p99']:g}分钟\n"
+        value = metrics.get("order_value_percentiles")
+        if value:
+            core += f"- 客单价 p50/p90/p99: ¥{value['p50']:g}/¥{value['p90']:g}/¥{value['p99']:g}\n"
+        
         hourly = metrics.get("hourly_distribution", {})
-        for hour in sorted(hourly.keys()):
-            stats = hourly[hour]
-            period = self._get_period_name(int(hour))
-            analysis_prompt += f"- {hour}:00 ({period}): {stats['count']}单, ¥{round(stats['amount'], 2)}\n"
+        calendar = load_calendar(config_file=CONFIG_FILE)
+        hours = sorted(hourly.keys(), key=int)
+        hour_lines = [f"- {hour}:00 ({calendar.name_of_hour(int(hour))}): {hourly[hour]['count']}单, "
+                      f"¥{round(hourly[hour]['amount'], 2)}" for hour in hours]
         
-        analysis_prompt += f"""
+        strategy_text = f"""
 ## 三、当前策略配置
 ### 目标
 - 目标订单: {strategy.get('运营目标', {}).get('secondary', 'N/A')}
@@ -121,7 +122,9 @@ class ElemeDeepSeekAnalyzer:
 ### 防限制规则
 - 价格修改上限: {limits.get('价格修改频率', 'N/A')}
 - 推广调整上限: {limits.get('推广调整频率', 'N/A')}
-
+"""
+        
+        requirements = """
 ## 四、分析要求
 请从以下维度分析并提供建议：
 1. **问题诊断**: 识别当前数据中的主要问题（如取消率过高、高峰单量不足等）
@@ -134,66 +137,98 @@ class ElemeDeepSeekAnalyzer:
 4. **具体行动计划**: 下3天可以立即执行的具体措施
 
 请用JSON格式返回分析结果，包含以下字段：
-{{
+{
     "summary": "一句话总结",
     "problems": ["问题1", "问题2"],
-    "recommendations": {{
+    "recommendations": {
         "price": ["建议1", "建议2"],
         "timing": ["建议1", "建议2"],
         "promotion": ["建议1", "建议2"],
         "operations": ["建议1", "建议2"]
-    }},
+    },
     "action_plan": ["行动1", "行动2", "行动3"],
     "risk_warnings": ["警告1", "警告2"],
     "confidence": "高/中/低"
-}}
+}
 """
         
+        sections = [
+            Section("核心指标", header=core),
+            Section("时段分布", hour_lines, header="\n## 二、时段分布\n", footer="\n", priority=2,
+                    ranks=[hourly[hour]["count"] for hour in hours], omitted="- 其余{n}个时段单量较少，已省略"),
+            Section("菜品同购", metrics.get("basket_combos") or [], priority=3, footer="\n",
+                    header="\n### 菜品同购（支持度/提升度，可据此设计时段套餐和满减凑单）\n"),
+            Section("策略配置", header=strategy_text, priority=1, atomic=True),
+            Section("分析要求", header=requirements),
+        ]
+        analysis_prompt, fit = fit_sections(sections, budget, self.model, self.ledger.calibration(self.model))
+        if fit["trimmed"]:
+            print(f"   ✂️ 提示词超出预算: {describe_fit(fit)}")
+        
         return analysis_prompt
     
-    def _get_period_name(self, hour: int) -> str:
-        """获取时段名称"""
-        if 7 <= hour < 9:
-            return "早餐"
-        elif 11 <= hour < 13:
-            return "午餐"
-        elif 17 <= hour < 19:
-            return "晚餐"
-        elif 21 <= hour < 23:
-            return "夜宵"
-        else:
-            return "其他"
+    def build_payload(self, prompt: str) -> Dict[str, Any]:
+        """DeepSeek 请求体（批量分析复用同一份）"""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "你是一个专业的外卖运营顾问，擅长分析订单数据并提供优化建议。请始终返回JSON格式的分析结果。"
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.7
+        }
     
-    def analyze_with_deepseek(self, prompt: str) -> Dict[str, Any]:
-        """调用 DeepSeek AI 进行分析"""
+    def shop_prompt(self, days: int = None, shop_id: str = None) -> Optional[str]:
+        """某个店铺近N天的分析提示词（无订单数据返回 None）"""
+        agg = load_aggregate(DATA_DIR, days, shop_id)
+        if agg is None or not agg.total:
+            return None
+        metrics = agg.deepseek_metrics()
+        baskets = load_baskets(DATA_DIR, days, shop_id)
+        if baskets:
+            metrics["basket_combos"] = baskets.prompt_lines()
+        return self.prepare_analysis_data({}, self.load_strategy(), metrics=metrics)
+    
+    def analyze_with_deepseek(self, prompt: str, on_field=None, task: str = "analysis") -> Dict[str, Any]:
+        """调用 DeepSeek AI 进行分析（传入 on_field 时流式调用，每个字段解析完成即回调）
+        
+        每次调用的估算与实际 token（接口返回的 usage）记入台账
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = self.build_payload(prompt)
+        estimated = estimate_messages(payload["messages"], self.model)
+        if on_field is not None:
+            outcome = stream_chat(self.api_url, headers, payload, on_field=on_field)
+            if outcome["content"]:
+                self.ledger.record(self.model, estimated, outcome["usage"], task=task,
+                                   completion_text=outcome["content"])
+            if outcome["error"]:
+                return {"error": outcome["error"], **outcome["result"]}
+            return outcome["result"]
+        
         try:
-            response = requests.post(
+            response = get_client("deepseek").post(
                 self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "你是一个专业的外卖运营顾问，擅长分析订单数据并提供优化建议。请始终返回JSON格式的分析结果。"
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "max_tokens": 2000,
-                    "temperature": 0.7
-                },
+                headers=headers,
+                json=payload,
                 timeout=60
             )
             
             if response.status_code == 200:
                 result = response.json()
                 content = result["choices"][0]["message"]["content"]
+                self.ledger.record(self.model, estimated, result.get("usage"), task=task,
+                                   completion_text=content)
                 
                 # 解析JSON
                 start = content.find("{")
@@ -208,98 +243,169 @@ class ElemeDeepSeekAnalyzer:
         except Exception as e:
             return {"error": str(e)}
     
-    def run_analysis(self) -> Dict[str, Any]:
-        """执行完整分析"""
+    def print_field(self, name: str, value: Any):
+        """打印分析报告的一个字段（流式时字段到达即打印）"""
+        if name == "summary":
+            print(f"\n🔍 总结: {value or 'N/A'}")
+        elif name == "problems" and value:
+            print(f"\n⚠️ 发现问题:")
+            for i, p in enumerate(value, 1):
+                print(f"   {i}. {p}")
+        elif name == "recommendations" and isinstance(value, dict) and value:
+            print(f"\n💡 优化建议:")
+            for category, items in value.items():
+                if items:
+                    print(f"\n   【{category.upper()}】")
+                    for item in items:
+                        print(f"   • {item}")
+        elif name == "action_plan" and value:
+            print(f"\n🎯 行动计划:")
+            for i, action in enumerate(value, 1):
+                print(f"   {i}. {action}")
+        elif name == "risk_warnings" and value:
+            print(f"\n⚠️ 风险提示:")
+            for warning in value:
+                print(f"   • {warning}")
+        elif name == "confidence":
+            print(f"\n📊 AI置信度: {value or 'N/A'}")
+    
+    def run_analysis(self, days: int = None, stream: bool = False) -> Dict[str, Any]:
+        """执行完整分析（指定 days 时从订单库读取近N天；stream 时边生成边打印报告）"""
         print("=" * 70)
         print("🧠 DeepSeek AI 智能分析")
         print("=" * 70)
         
-        # 加载数据
-        data = self.load_latest_orders()
-        if not data:
+        # 加载数据（融合统计，订单只读一遍）
+        agg = self.load_aggregate(days)
+        if agg is None:
             print("❌ 无订单数据可分析")
             return {"error": "无订单数据"}
         
         strategy = self.load_strategy()
         
-        # 准备分析数据
-        prompt = self.prepare_analysis_data(data, strategy)
-        print("\n📊 正在调用 DeepSeek AI 分析...")
-        
-        # AI 分析
-        analysis = self.analyze_with_deepseek(prompt)
+        # 准备分析数据（有菜品数据时附上同购组合）
+        metrics = agg.deepseek_metrics()
+        baskets = self.load_baskets(days)
+        if baskets:
+            metrics["basket_combos"] = baskets.prompt_lines()
+        prompt = self.prepare_analysis_data({}, strategy, metrics=metrics)
+        print(f"\n📊 正在调用 DeepSeek AI 分析...（提示词约 {estimate_tokens(prompt, self.model)} tokens）")
+        
+        # AI 分析（流式时报告标题先打印，字段随到随打印）
+        if stream:
+            print("\n" + "=" * 70)
+            print("📋 AI 分析报告")
+            print("=" * 70)
+            analysis = self.analyze_with_deepseek(prompt, on_field=self.print_field)
+        else:
+            analysis = self.analyze_with_deepseek(prompt)
         
         if "error" in analysis:
             print(f"❌ 分析失败: {analysis['error']}")
             return analysis
         
         # 打印结果
-        print("\n" + "=" * 70)
-        print("📋 AI 分析报告")
+        if not stream:
+            print("\n" + "=" * 70)
+            print("📋 AI 分析报告")
+            print("=" * 70)
+            for name in REPORT_FIELDS:
+                self.print_field(name, analysis.get(name))
         print("=" * 70)
         
-        print(f"\n🔍 总结: {analysis.get('summary', 'N/A')}")
+        # 保存分析结果
+        result = {
+            "analysis_time": datetime.now().isoformat(),
+            "data_source": agg.source,
+            "ai_analysis": analysis,
+            "raw_prompt": prompt[:500]  # 保存前500字符
+        }
         
-        problems = analysis.get("problems", [])
-        if problems:
-            print(f"\n⚠️ 发现问题:")
-            for i, p in enumerate(problems, 1):
-                print(f"   {i}. {p}")
+        result_file = f"{DATA_DIR}/deepseek_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        DataManifest(DATA_DIR).register("deepseek_analysis", result_file)
         
-        recommendations = analysis.get("recommendations", {})
-        if recommendations:
-            print(f"\n💡 优化建议:")
-            for category, items in recommendations.items():
-                if items:
-                    print(f"\n   【{category.upper()}】")
-                    for item in items:
-                        print(f"   • {item}")
+        print(f"\n✅ 分析结果已保存: {result_file}")
         
-        action_plan = analysis.get("action_plan", [])
-        if action_plan:
-            print(f"\n🎯 行动计划:")
-            for i, action in enumerate(action_plan, 1):
-                print(f"   {i}. {action}")
+        return result
+    
+    def analyze_alerts(self, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """针对实时异常告警的定向分析（同步发现异常时触发，不等定时分析）"""
+        print("=" * 70)
+        print(f"🚨 DeepSeek 告警分析（{len(alerts)}条告警）")
+        print("=" * 70)
         
-        risk_warnings = analysis.get("risk_warnings", [])
-        if risk_warnings:
-            print(f"\n⚠️ 风险提示:")
-            for warning in risk_warnings:
-                print(f"   • {warning}")
+        prompt = "以下是外卖店铺刚刚检测到的实时异常（与往日同一时段的基线比较）：\n\n"
+        prompt += "\n".join(f"- {a['order_time'][:16]} {a['message']}" for a in alerts) + "\n"
+        
+        # 告警店铺从首条告警前2小时至今的经营数据（查询汇总立方体）
+        prompt += "\n## 告警前后经营数据\n"
+        with OrderDB(data_dir=DATA_DIR) as db:
+            for shop_id in sorted({a["shop_id"] or "" for a in alerts}):
+                first = min(a["order_time"] for a in alerts if (a["shop_id"] or "") == shop_id)
+                start = (datetime.fromisoformat(first) - timedelta(hours=2)).isoformat(timespec="seconds")
+                metrics = db.rollup(start=start, shop_id=shop_id or None).deepseek_metrics()
+                if "error" in metrics:
+                    continue
+                hourly = "、".join(f"{h}点{v['count']}单" for h, v in sorted(metrics["hourly_distribution"].items(),
+                                                                         key=lambda x: int(x[0])))
+                prompt += (f"- {shop_id or '本店'}（{start[11:16]}起）: {metrics['total_orders']}单, "
+                           f"取消率{metrics['cancellation_rate']}%, 评分{metrics['avg_rating']}, "
+                           f"平均配送{metrics['avg_delivery_time']}分钟; 完成订单: {hourly}\n")
+        
+        prompt += """
+请判断最可能的原因，并给出现在就能执行的处理措施。请返回JSON格式:
+{
+    "summary": "一句话结论",
+    "likely_causes": ["原因1", "原因2"],
+    "immediate_actions": ["措施1", "措施2"],
+    "promotion_adjustment": "暂停推广/降低出价/维持",
+    "urgency": "高/中/低"
+}
+"""
+        analysis = self.analyze_with_deepseek(prompt, task="alert")
+        if "error" in analysis:
+            return analysis
         
-        print(f"\n📊 AI置信度: {analysis.get('confidence', 'N/A')}")
+        print(f"\n🔍 结论: {analysis.get('summary', 'N/A')}")
+        for title, key in (("可能原因", "likely_causes"), ("立即处理", "immediate_actions")):
+            items = analysis.get(key, [])
+            if items:
+                print(f"\n{title}:")
+                for item in items:
+                    print(f"   • {item}")
+        print(f"\n📢 推广: {analysis.get('promotion_adjustment', 'N/A')}  紧急程度: {analysis.get('urgency', 'N/A')}")
         print("=" * 70)
         
-        # 保存分析结果
         result = {
             "analysis_time": datetime.now().isoformat(),
-            "data_source": data.get("export_time", ""),
+            "alerts": alerts,
             "ai_analysis": analysis,
-            "raw_prompt": prompt[:500]  # 保存前500字符
         }
-        
-        result_file = f"{DATA_DIR}/deepseek_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        result_file = f"{DATA_DIR}/deepseek_alert_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(result_file, "w", encoding="utf-8") as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
+        DataManifest(DATA_DIR).register("deepseek_alert", result_file)
         
-        print(f"\n✅ 分析结果已保存: {result_file}")
-        
+        print(f"\n✅ 告警分析已保存: {result_file}")
         return result
     
     def get_comparison_report(self, days: int = 7) -> Dict[str, Any]:
         """生成对比分析报告（多日数据）"""
-        analysis_files = [f for f in os.listdir(DATA_DIR) if f.startswith("deepseek_analysis")]
-        analysis_files.sort()
+        manifest = DataManifest(DATA_DIR)
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        analysis_entries = manifest.query("deepseek_analysis", start=since)
         
-        if len(analysis_files) < 2:
+        if len(analysis_entries) < 2:
             return {"message": "历史分析数据不足"}
         
         # 取最近N天的分析
-        recent = analysis_files[-3:]  # 最近3次
+        recent = analysis_entries[-3:]  # 最近3次
         
         comparisons = []
-        for f in recent:
-            with open(os.path.join(DATA_DIR, f), "r", encoding="utf-8") as file:
+        for entry in recent:
+            with open(manifest.resolve(entry), "r", encoding="utf-8") as file:
                 data = json.load(file)
                 comparisons.append(data)
         
@@ -315,6 +421,21 @@ class ElemeDeepSeekAnalyzer:
             summary = ai.get("summary", "")
             comparison_prompt += f"## 报告{i+1} ({analysis_time[:10]})\n{summary}\n\n"
         
+        # 每日经营指标（查询汇总立方体，不扫描订单）
+        with OrderDB(data_dir=DATA_DIR) as db:
+            daily = db.daily_rollup(start=since)
+        if daily:
+            comparison_prompt += "## 每日经营指标\n"
+            for d in daily:
+                completed = d["completed"]
+                avg_value = d["revenue"] / completed if completed else 0
+                avg_rating = d["rating_sum"] / completed if completed else 0
+                cancel_rate = d["canceled"] / d["total"] * 100 if d["total"] else 0
+                comparison_prompt += (f"- {d['day']}: {completed}单, ¥{round(d['revenue'], 2)}, "
+                                      f"客单¥{round(avg_value, 2)}, 评分{round(avg_rating, 2)}, "
+                                      f"取消率{cancel_rate:.1f}%\n")
+            comparison_prompt += "\n"
+        
         comparison_prompt += """
 请生成对比分析报告，包括：
 1. 整体趋势判断（上升/下降/稳定）
@@ -333,10 +454,15 @@ class ElemeDeepSeekAnalyzer:
 """
         
         # 调用AI
-        return self.analyze_with_deepseek(comparison_prompt)
+        return self.analyze_with_deepseek(comparison_prompt, task="comparison")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="饿了么运营智能分析 - DeepSeek AI 版")
+    parser.add_argument("--days", type=int, help="从订单库分析近N天（默认最新导出）")
+    parser.add_argument("--stream", action="store_true", help="流式调用，报告字段生成即打印")
+    args = parser.parse_args()
+    
     analyzer = ElemeDeepSeekAnalyzer()
     
     print("\n" + "=" * 70)
@@ -353,7 +479,7 @@ def main():
     if choice == "2":
         result = analyzer.get_comparison_report()
     else:
-        result = analyzer.run_analysis()
+        result = analyzer.run_analysis(args.days, stream=args.stream)
     
     if "error" in result:
         print(f"\n❌ 分析失败: {result['error']}")
@@ -1,135 +1,135 @@
 #!/usr/bin/env python3
 """
 饿了么运营智能分析 - 优化版
-Token 消耗降低 60-70%
+精简提示词 + 响应缓存；提示词按 token 预算裁剪，实际消耗以接口返回的 usage 记入台账
+（python3 token_budget.py --report 查看）
 """
 
-import requests
+import argparse
 import json
-import os
 from datetime import datetime
-from functools import lru_cache
+
+from ele_me_aggregator import aggregate, load_aggregate
+from ele_me_basket import load_baskets
+from ele_me_calendar import load_calendar
+from ele_me_manifest import DataManifest
+from http_client import get_client
+from llm_cache import LLMCache, cache_key
+from llm_stream import stream_chat
+from token_budget import Section, TokenLedger, describe_fit, estimate_messages, fit_sections
 
 # 配置
 DATA_DIR = "/home/michael/projects/ele-me-operation/data"
 CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
 
+# 精简提示词的 token 预算
+PROMPT_BUDGET = 400
+
+# 结果字段、打印顺序与条数
+RESULT_FIELDS = (("problems", "⚠️ 问题", 2), ("recommendations", "💡 建议", 3), ("actions", "🎯 行动", 2))
+
 # DeepSeek API
 DEEPSEEK_API = "sk-f04a00d9f3d54cc2861552fd46e8ed76"
 DEEPSEEK_URL = "https://api.deepseek.com/chat/completions"
 
-# 缓存配置
-CACHE_FILE = "/tmp/ele_me_analysis_cache.json"
-
 
 class OptimizedAnalyzer:
     """优化版分析器"""
     
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         self.api_key = DEEPSEEK_API
         self.api_url = DEEPSEEK_URL
         self.model = "deepseek-chat"
-        self._load_cache()
+        # 响应缓存按完整提示词+模型+参数寻址，数据变了提示词就变，不会取到旧结果
+        self.cache = LLMCache(data_dir=DATA_DIR) if use_cache else None
+        self.ledger = TokenLedger(data_dir=DATA_DIR, script="deepseek_optimized")
+        self.last_usage = None   # 最近一次调用的台账记录
     
-    def _load_cache(self):
-        """加载缓存"""
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r") as f:
-                self.cache = json.load(f)
-        else:
-            self.cache = {}
+    def load_aggregate(self, days: int = None):
+        """融合统计（指定 days 时查询订单库汇总立方体近N天，否则取最新导出的统计）"""
+        return load_aggregate(DATA_DIR, days)
     
-    def _save_cache(self):
-        """保存缓存"""
-        with open(CACHE_FILE, "w") as f:
-            json.dump(self.cache, f)
+    def load_baskets(self, days: int = None):
+        """菜品同购统计（指定 days 时挖掘订单库近N天，否则挖掘最新导出）"""
+        return load_baskets(DATA_DIR, days)
     
-    def _get_data_hash(self, data: dict) -> str:
-        """生成数据哈希"""
-        import hashlib
-        key = f"{data.get('total_orders', 0)}_{data.get('total_revenue', 0)}"
-        return hashlib.md5(key.encode()).hexdigest()[:8]
+    def calculate_metrics(self, orders) -> dict:
+        """计算关键指标（精简版，单次遍历）"""
+        return aggregate(orders).compact_metrics()
     
-    def calculate_metrics(self, orders: list) -> dict:
-        """计算关键指标（精简版）"""
-        completed = [o for o in orders if o["status"] == "已完成"]
-        if not completed:
-            return {"error": "无完成订单"}
-        
-        total_revenue = sum(o["total_amount"] for o in completed)
-        
-        # 按时段统计
-        hourly = {}
-        for o in completed:
-            hour = datetime.fromisoformat(o["order_time"]).hour
-            hourly[hour] = hourly.get(hour, 0) + 1
-        
-        return {
-            "orders": len(orders),
-            "completed": len(completed),
-            "cancel_rate": round((len(orders) - len(completed)) / len(orders) * 100, 1),
-            "revenue": round(total_revenue, 2),
-            "avg_value": round(total_revenue / len(completed), 2),
-            "rating": round(sum(o["customer_rating"] for o in completed) / len(completed), 2),
-            "delivery": round(sum(o["delivery_time_minutes"] for o in completed) / len(completed), 1),
-            "peak": max(hourly.items(), key=lambda x: x[1])[0] if hourly else 0,
-            "hourly": hourly
-        }
-    
-    def _get_period_name(self, hour: int) -> str:
-        """获取时段名称"""
-        if 7 <= hour < 9:
-            return "早餐"
-        elif 11 <= hour < 13:
-            return "午餐"
-        elif 17 <= hour < 19:
-            return "晚餐"
-        elif 21 <= hour < 23:
-            return "夜宵"
-        return "其他"
-    
-    def prepare_compact_prompt(self, metrics: dict) -> str:
-        """准备精简提示词（节省 60-70% tokens）"""
+    def prepare_compact_prompt(self, metrics: dict, budget: int = PROMPT_BUDGET) -> str:
+        """准备精简提示词（超出 token 预算时依次裁剪：组合 → 单量少的时段 → 长尾分位数）"""
         
         # 时段分布摘要
-        hourly_str = ", ".join([f"{h}:00({self._get_period_name(h)}){c}单" 
-                               for h, c in sorted(metrics.get("hourly", {}).items())])
+        calendar = load_calendar(config_file=CONFIG_FILE)
+        hourly = sorted(metrics.get("hourly", {}).items())
+        
+        # 长尾分位数（p50/p90/p99）与同购组合（菜品×提升度），无数据时省略
+        tail = []
+        if metrics.get("delivery_pct"):
+            tail.append(f"配送p50/p90/p99 {'/'.join(f'{v:g}' for v in metrics['delivery_pct'])}分钟")
+        if metrics.get("value_pct"):
+            tail.append(f"客单p50/p90/p99 {'/'.join(f'¥{v:g}' for v in metrics['value_pct'])}")
         
-        return f"""分析外卖数据，给3条优化建议。
+        head = f"""分析外卖数据，给3条优化建议。
 
 【指标】
 订单{metrics['orders']}单，完成{metrics['completed']}单，取消率{metrics['cancel_rate']}%，
 营收¥{metrics['revenue']}，客单¥{metrics['avg_value']}，评分{metrics['rating']}⭐，
 配送{metrics['delivery']}分钟，高峰{metrics['peak']}:00。
-
-【时段】{hourly_str}
+"""
+        sections = [
+            Section("指标", header=head),
+            Section("长尾", header=f"\n【长尾】{'，'.join(tail)}", priority=1, atomic=True) if tail else None,
+            Section("组合", metrics.get("combos") or [], header="\n【组合】", sep=", ", priority=3),
+            Section("时段", [f"{h}:00({calendar.name_of_hour(h)}){c}单" for h, c in hourly],
+                    header="\n【时段】", sep=", ", priority=2, ranks=[c for _, c in hourly]),
+            Section("格式", header="""
 
 请用JSON返回：
-{{"summary":"一句话","problems":["问题1","问题2"],"recommendations":["建议1","建议2","建议3"],"actions":["行动1","行动2"]}}"""
+{"summary":"一句话","problems":["问题1","问题2"],"recommendations":["建议1","建议2","建议3"],"actions":["行动1","行动2"]}"""),
+        ]
+        prompt, fit = fit_sections([s for s in sections if s], budget, self.model,
+                                   self.ledger.calibration(self.model))
+        print(f"\n📊 提示词: {describe_fit(fit)}")
+        return prompt
     
-    @lru_cache(maxsize=10)
-    def _cached_analysis(self, prompt_hash: str, prompt: str) -> dict:
-        """缓存分析结果"""
+    def build_payload(self, prompt: str) -> dict:
+        """请求体（同时是缓存键的来源）"""
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 800,  # ✅ 降低到 800 (原2000)
+            "temperature": 0.5,
+            "top_p": 0.9
+        }
+    
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _record(self, payload: dict, usage: dict = None, content: str = None, cache_hit: bool = False):
+        """记入台账（估算 vs 接口返回的 usage）"""
+        estimated = estimate_messages(payload["messages"], self.model)
+        self.last_usage = self.ledger.record(self.model, estimated, usage, task="analysis",
+                                             completion_text=content, cache_hit=cache_hit)
+    
+    def call_api(self, payload: dict) -> dict:
+        """调用 DeepSeek 并解析 JSON 结果"""
         try:
-            response = requests.post(
+            response = get_client("deepseek").post(
                 self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 800,  # ✅ 降低到 800 (原2000)
-                    "temperature": 0.5,
-                    "top_p": 0.9
-                },
+                headers=self.headers(),
+                json=payload,
                 timeout=60
             )
             
             if response.status_code == 200:
                 result = response.json()
                 content = result["choices"][0]["message"]["content"]
+                self._record(payload, result.get("usage"), content)
                 
                 start, end = content.find("{"), content.rfind("}") + 1
                 if start != -1 and end != 0:
@@ -139,41 +139,83 @@ class OptimizedAnalyzer:
         except Exception as e:
             return {"error": str(e)}
     
-    def analyze(self) -> dict:
-        """执行分析"""
+    def call_stream(self, payload: dict) -> dict:
+        """流式调用，每个字段解析完成即打印；JSON 闭合后继续读到最后的 usage 分片再记台账"""
+        outcome = stream_chat(self.api_url, self.headers(), payload, on_field=self.print_field)
+        if outcome["content"]:
+            self._record(payload, outcome["usage"], outcome["content"])
+        if outcome["error"]:
+            return {"error": outcome["error"]}
+        if outcome["first_field_seconds"] is not None:
+            print(f"\n⏱️ 首个字段 {outcome['first_field_seconds']}秒, 对象完整 {outcome['object_seconds']}秒, "
+                  f"共 {outcome['seconds']}秒")
+        return outcome["result"]
+    
+    def print_field(self, name: str, value):
+        """打印结果的一个字段（分类的 {类别: [建议]} 展开成一个列表）"""
+        if name == "summary":
+            print(f"\n🔍 {value or ''}")
+            return
+        if isinstance(value, dict):
+            value = [item for items in value.values() for item in (items if isinstance(items, list) else [items])]
+        for field, title, limit in RESULT_FIELDS:
+            if field == name and value:
+                print(f"\n{title}:")
+                for i, item in enumerate(value[:limit], 1):
+                    print(f"   {i}. {item}")
+    
+    def print_usage(self):
+        """本次调用的 token 与费用"""
+        usage = self.last_usage
+        if usage is None:
+            return
+        if usage["cache_hit"]:
+            print(f"📊 Token: 缓存命中，未调用接口（省输入约 {usage['estimated']}）")
+            return
+        source = "接口实测" if usage["measured"] else "估算（未返回 usage）"
+        line = (f"📊 Token: 输入 {usage['prompt_tokens']}（缓存命中 {usage['cached_tokens']}）"
+                f" + 输出 {usage['completion_tokens']}，{source}")
+        if usage["deviation"] is not None:
+            line += f"；本地估算 {usage['estimated']}（偏差 {usage['deviation'] * 100:+.0f}%）"
+        print(line)
+        if usage["cost"] is not None:
+            print(f"💰 费用: ¥{usage['cost']:.4f}")
+    
+    def analyze(self, days: int = None, stream: bool = False) -> dict:
+        """执行分析（指定 days 时从订单库读取近N天；stream 时边生成边打印）"""
         print("=" * 60)
         print("🧠 DeepSeek AI 智能分析（优化版）")
         print("=" * 60)
         
-        # 加载订单
-        files = [f for f in os.listdir(DATA_DIR) if f.startswith("orders_") and f.endswith(".json")]
-        if not files:
+        # 加载融合统计（下载时已算好则不再读取订单）
+        agg = self.load_aggregate(days)
+        if agg is None:
             print("❌ 无订单数据")
             return {"error": "无订单数据"}
         
-        latest_file = max(files)
-        with open(os.path.join(DATA_DIR, latest_file), "r") as f:
-            data = json.load(f)
-        
         # 计算指标
-        metrics = self.calculate_metrics(data.get("orders", []))
+        metrics = agg.compact_metrics()
+        baskets = self.load_baskets(days)
+        if baskets:
+            metrics["combos"] = baskets.compact()
+        
+        # 生成精简提示词
+        prompt = self.prepare_compact_prompt(metrics)
         
-        # 检查缓存
-        data_hash = self._get_data_hash({"orders": data.get("orders", []), "revenue": metrics.get("revenue")})
-        if data_hash in self.cache:
+        # AI 分析（先查响应缓存；流式调用时字段已随到随打印）
+        payload = self.build_payload(prompt)
+        key = cache_key(payload)
+        result = self.cache.get(key) if self.cache else None
+        streamed = False
+        self.last_usage = None
+        if result is not None:
             print("✅ 使用缓存结果")
-            result = self.cache[data_hash]
+            self._record(payload, cache_hit=True)
         else:
-            # 生成精简提示词
-            prompt = self.prepare_compact_prompt(metrics)
-            print(f"\n📊 提示词长度: {len(prompt)} tokens")
-            
-            # AI 分析
-            result = self._cached_analysis(data_hash, prompt)
-            
-            if "error" not in result:
-                self.cache[data_hash] = result
-                self._save_cache()
+            streamed = stream
+            result = self.call_stream(payload) if stream else self.call_api(payload)
+            if self.cache and "error" not in result:
+                self.cache.put(key, result, self.model)
                 print("✅ 已保存缓存")
         
         # 打印结果
@@ -181,25 +223,10 @@ class OptimizedAnalyzer:
             print(f"\n❌ {result['error']}")
             return result
         
-        print(f"\n🔍 {result.get('summary', '')}")
-        
-        problems = result.get("problems", [])
-        if problems:
-            print(f"\n⚠️ 问题:")
-            for i, p in enumerate(problems[:2], 1):
-                print(f"   {i}. {p}")
-        
-        recs = result.get("recommendations", [])
-        if recs:
-            print(f"\n💡 建议:")
-            for i, r in enumerate(recs[:3], 1):
-                print(f"   {i}. {r}")
-        
-        actions = result.get("actions", [])
-        if actions:
-            print(f"\n🎯 行动:")
-            for i, a in enumerate(actions[:2], 1):
-                print(f"   {i}. {a}")
+        if not streamed:
+            self.print_field("summary", result.get("summary", ""))
+            for field, _, _ in RESULT_FIELDS:
+                self.print_field(field, result.get(field, []))
         
         print("\n" + "=" * 60)
         
@@ -213,17 +240,27 @@ class OptimizedAnalyzer:
         output_file = f"{DATA_DIR}/opt_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(output_file, "w") as f:
             json.dump(output, f, indent=2, ensure_ascii=False)
+        DataManifest(DATA_DIR).register("opt_analysis", output_file)
         
         print(f"✅ 结果: {output_file}")
-        print(f"📊 Token 消耗: 约 {len(prompt) + 800} (原 2500-3000)")
-        print(f"💰 节省: 约 60%")
+        self.print_usage()
         
         return output
 
 
 def main():
-    analyzer = OptimizedAnalyzer()
-    analyzer.analyze()
+    parser = argparse.ArgumentParser(description="饿了么运营智能分析（优化版）")
+    parser.add_argument("--days", type=int, help="从订单库分析近N天（默认最新导出）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用响应缓存")
+    parser.add_argument("--stream", action="store_true", help="流式调用，字段生成即打印")
+    args = parser.parse_args()
+    
+    analyzer = OptimizedAnalyzer(use_cache=not args.no_cache)
+    analyzer.analyze(args.days, stream=args.stream)
+    if analyzer.cache is not None:
+        stats = analyzer.cache.stats()
+        rate = f"{stats['hit_rate'] * 100:.0f}%" if stats["hit_rate"] is not None else "-"
+        print(f"🗄️ 缓存: {stats['entries']}条, 累计命中{stats['hits']}/未命中{stats['misses']} (命中率{rate})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+饿了么小时需求预测
+用订单库汇总立方体的 店铺 × 日期 × 小时 下单量，预测某天每小时的单量和 80% 区间，
+取代 CORE_STRATEGY.json 里固定的 高峰备货（提前30%库存）和 固定出价倍数：
+
+    同时段昨日      seasonal naive，昨天同一小时
+    上周同日        weekly naive，7 天前同一小时
+    指数平滑        每小时一条跨天的 EWMA
+    星期效应平滑    先除以（星期 × 小时）系数再做指数平滑，节假日按周日算
+
+所有模型在 (店铺, 天, 小时) 数组上整体计算；每个店铺取最近 7 天滚动回测误差最小的模型，
+区间宽度取该模型回测残差（不低于泊松波动）。当天预测会用已过去小时的实际单量校正剩余小时，
+500 家店铺整体重算一次不到 0.1 秒，可以每小时给所有店铺重算。
+
+    PromotionAutoManager  按当前小时预测单量相对全天的高低定出价倍数，按全天预测单量定日预算
+    stock_plan            按时段汇总预测上限，给出备货量（有菜品数据时细到菜品）
+
+使用方法:
+    python3 ele_me_forecast.py                       # 明天各店铺每小时预测 + 备货计划
+    python3 ele_me_forecast.py --today --shop-id shop001
+    python3 ele_me_forecast.py --bench --shops 500   # 多店铺批量拟合耗时与回测误差
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from ele_me_calendar import DEFAULT_TIME_STRATEGY, HOLIDAY, PeriodCalendar, load_calendar
+from ele_me_order_db import OrderDB
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+HISTORY_DAYS = 56         # 拟合用的历史天数（8 周，覆盖星期效应）
+BACKTEST_DAYS = 7         # 滚动回测天数（选模型、估区间）
+MIN_WEEKLY_DAYS = 14      # 少于两周历史时不用星期相关模型
+ALPHA = 0.3               # 指数平滑系数（跨天）
+WEEKDAY_PRIOR = 2.0       # 星期系数向 1 收缩的先验天数
+INTERVAL_Z = 1.2816       # 80% 区间
+INTRADAY_PRIOR = 10.0     # 当天校正的先验单量（已过去小时单量少时不大幅校正）
+HOURS = 24
+
+MODELS = ("seasonal_naive", "weekly_naive", "smoothing", "weekday_smoothing")
+MODEL_NAMES = {
+    "seasonal_naive": "同时段昨日",
+    "weekly_naive": "上周同日",
+    "smoothing": "指数平滑",
+    "weekday_smoothing": "星期效应平滑",
+}
+
+
+def weekday_index(days: List[date], calendar: PeriodCalendar = None) -> np.ndarray:
+    """日期 → 星期下标（0=周一；节假日按周日）"""
+    calendar = calendar or load_calendar()
+    return np.array([6 if calendar.day_type(d) == HOLIDAY else d.weekday() for d in days])
+
+
+def _shift(demand: np.ndarray, lag: int) -> np.ndarray:
+    """滞后预测 (S, D, 24)：第 d 天用第 d-lag 天（不足为 NaN）"""
+    out = np.full(demand.shape, np.nan)
+    out[:, lag:] = demand[:, :max(demand.shape[1] - lag, 0)]
+    return out
+
+
+def _smooth(demand: np.ndarray, alpha: float = ALPHA):
+    """逐小时跨天 EWMA → (一步预测 (S, D, 24)：第 d 天只用前 d 天, 最终水平 (S, 24))"""
+    out = np.full(demand.shape, np.nan)
+    level = demand[:, 0].astype(np.float64)
+    for d in range(1, demand.shape[1]):
+        out[:, d] = level
+        level = level + alpha * (demand[:, d] - level)
+    return out, level
+
+
+def weekday_factors(demand: np.ndarray, weekdays: np.ndarray, prior: float = WEEKDAY_PRIOR) -> np.ndarray:
+    """(星期 × 小时) 系数 (S, 7, 24)：该星期该小时均值 / 该小时总均值，向 1 收缩"""
+    mean = demand.mean(axis=1)                                         # (S, 24)
+    factors = np.ones((demand.shape[0], 7, demand.shape[2]))
+    for w in range(7):
+        selected = weekdays == w
+        sums = demand[:, selected].sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = (sums + prior * mean) / ((selected.sum() + prior) * mean)
+        factors[:, w] = np.where(mean > 0, ratio, 1.0)
+    return np.clip(factors, 0.2, 5.0)
+
+
+def _weekday_smooth(demand: np.ndarray, weekdays: np.ndarray, fit_days: int):
+    """星期效应平滑 → (一步预测 (S, D, 24), 除去星期效应的最终水平, 系数)；系数只用前 fit_days 天估计"""
+    days = demand.shape[1]
+    factors = weekday_factors(demand[:, :fit_days], weekdays[:fit_days])
+    seasonal = factors[:, weekdays[:days]]                             # (S, D, 24)
+    predictions, level = _smooth(demand / seasonal)
+    return predictions * seasonal, level, factors
+
+
+class DemandForecaster:
+    """多店铺 × 小时 的日需求预测"""
+
+    def __init__(self, alpha: float = ALPHA, backtest_days: int = BACKTEST_DAYS):
+        self.alpha = alpha
+        self.backtest_days = backtest_days
+
+    def fit(self, demand: np.ndarray, first_day: date, calendar: PeriodCalendar = None,
+            horizon: int = 1) -> "DemandForecaster":
+        """demand: (店铺, 天, 24) 下单量，天从 first_day 起连续；预测历史之后第 horizon 天"""
+        shops, days, _ = demand.shape
+        self.target_day = first_day + timedelta(days=days + horizon - 1)
+        weekdays = weekday_index([first_day + timedelta(days=d) for d in range(days + horizon)], calendar)
+        target_weekday = weekdays[-1]
+        backtest = min(self.backtest_days, days - 1)
+
+        # 各模型：回测用的一步预测 (S, D, 24) + 目标日预测 (S, 24)
+        smoothed, level = _smooth(demand, self.alpha)
+        predictions = {"seasonal_naive": _shift(demand, 1), "smoothing": smoothed}
+        targets = {"seasonal_naive": demand[:, -1], "smoothing": level}
+        if days >= MIN_WEEKLY_DAYS and horizon <= 7:
+            predictions["weekly_naive"] = _shift(demand, 7)
+            targets["weekly_naive"] = demand[:, days + horizon - 1 - 7]
+            # 回测部分的系数不含回测天，目标日的系数用全部历史
+            predictions["weekday_smoothing"] = _weekday_smooth(demand, weekdays, days - backtest)[0]
+            _, level, factors = _weekday_smooth(demand, weekdays, days)
+            targets["weekday_smoothing"] = level * factors[:, target_weekday]
+        self.models = [m for m in MODELS if m in predictions]
+
+        # 滚动回测：最近 backtest 天的一步预测误差，每个店铺选 MAE 最小的模型
+        if backtest > 0:
+            window = slice(days - backtest, days)
+            errors = np.stack([predictions[m][:, window] for m in self.models]) - demand[None, :, window]
+            with np.errstate(invalid="ignore"):
+                self.mae = np.nanmean(np.abs(errors), axis=(2, 3))     # (M, S)
+            self.mae = np.where(np.isnan(self.mae), np.inf, self.mae)
+            self.best = self.mae.argmin(axis=0)
+            chosen = errors[self.best, np.arange(shops)]               # (S, B, 24)
+            sigma = np.sqrt(np.nanmean(chosen ** 2, axis=1))
+        else:
+            self.mae = np.full((len(self.models), shops), np.inf)
+            self.best = np.full(shops, self.models.index("smoothing"))
+            sigma = np.zeros((shops, HOURS))
+
+        stacked = np.stack([targets[m] for m in self.models])          # (M, S, 24)
+        self.forecast = np.maximum(stacked[self.best, np.arange(shops)], 0)
+        self.sigma = np.maximum(np.nan_to_num(sigma), np.sqrt(self.forecast))
+        self.observed_hours = 0
+        return self
+
+    def update_today(self, observed: np.ndarray, hours_done: int):
+        """当天校正：已过去小时换成实际单量，剩余小时按 实际/预测 的比例（带先验收缩）缩放"""
+        if hours_done <= 0:
+            return self
+        done = slice(0, hours_done)
+        ratio = ((observed[:, done].sum(axis=1) + INTRADAY_PRIOR)
+                 / (self.forecast[:, done].sum(axis=1) + INTRADAY_PRIOR))[:, None]
+        self.forecast[:, hours_done:] *= ratio
+        self.sigma[:, hours_done:] *= np.sqrt(ratio)
+        self.forecast[:, done] = observed[:, done]
+        self.sigma[:, done] = 0
+        self.observed_hours = hours_done
+        return self
+
+    def result(self, shop: int, shop_id: str = None, avg_order_value: float = None) -> Dict[str, Any]:
+        """单个店铺的预测 dict"""
+        forecast, sigma = self.forecast[shop], self.sigma[shop]
+        lower = np.maximum(forecast - INTERVAL_Z * sigma, 0)
+        upper = forecast + INTERVAL_Z * sigma
+        total = float(forecast.sum())
+        total_sigma = math.sqrt(float((sigma ** 2).sum()))
+        model = self.models[self.best[shop]]
+        mae = float(self.mae[self.best[shop], shop])
+        return {
+            "shop_id": shop_id,
+            "date": self.target_day.isoformat(),
+            "model": model,
+            "model_name": MODEL_NAMES[model],
+            "backtest_mae": round(mae, 2) if math.isfinite(mae) else None,
+            "observed_hours": self.observed_hours,
+            "total": round(total, 1),
+            "total_range": [round(max(total - INTERVAL_Z * total_sigma, 0), 1),
+                            round(total + INTERVAL_Z * total_sigma, 1)],
+            "avg_order_value": avg_order_value,
+            "hours": [{"hour": h, "forecast": round(float(forecast[h]), 2), "std": round(float(sigma[h]), 2),
+                       "lower": round(float(lower[h]), 2), "upper": round(float(upper[h]), 2)}
+                      for h in range(HOURS)],
+        }
+
+
+def _to_date(day: Union[str, date, None]) -> date:
+    if day is None:
+        return date.today()
+    return date.fromisoformat(day) if isinstance(day, str) else day
+
+
+def forecast_shops(day: Union[str, date] = None, shop_id: str = None, now: datetime = None,
+                   data_dir: str = None, history_days: int = HISTORY_DAYS,
+                   by_shop: bool = True) -> Dict[Optional[str], Dict[str, Any]]:
+    """各店铺 day（默认今天）每小时的需求预测 {店铺: 预测}；当天预测用 now 之前的实际单量校正
+
+    by_shop=False 时把全部店铺合并成一条需求（键为 None）
+    """
+    now = now or datetime.now()
+    day = _to_date(day or now.date())
+    # 历史只取完整的天：预测明天时今天还没过完，不计入
+    last_day = min(day, now.date()) - timedelta(days=1)
+
+    with OrderDB(data_dir=data_dir or DATA_DIR) as db:
+        rows = db.hourly_demand((last_day - timedelta(days=history_days - 1)).isoformat(), last_day.isoformat(),
+                                shop_id)
+        today = db.hourly_demand(day.isoformat(), day.isoformat(), shop_id) if day == now.date() else []
+    if not rows:
+        return {}
+    if not by_shop:
+        for r in rows + today:
+            r["shop_id"] = None
+
+    # 从最早有单的一天开始（新店只用开业后的历史）
+    first_day = min(date.fromisoformat(r["day"]) for r in rows)
+    shops = sorted({r["shop_id"] for r in rows}, key=lambda s: s or "")
+    index = {s: i for i, s in enumerate(shops)}
+    demand = np.zeros((len(shops), (last_day - first_day).days + 1, HOURS))
+    completed, revenue = np.zeros(len(shops)), np.zeros(len(shops))
+    for r in rows:
+        s = index[r["shop_id"]]
+        demand[s, (date.fromisoformat(r["day"]) - first_day).days, r["hour"]] += r["total"]
+        completed[s] += r["completed"]
+        revenue[s] += r["revenue"]
+
+    forecaster = DemandForecaster().fit(demand, first_day, load_calendar(shop_id), (day - last_day).days)
+    if today:
+        observed = np.zeros((len(shops), HOURS))
+        for r in today:
+            if r["shop_id"] in index:
+                observed[index[r["shop_id"]], r["hour"]] += r["total"]
+        forecaster.update_today(observed, now.hour)
+
+    return {s: forecaster.result(i, s, round(float(revenue[i] / completed[i]), 2) if completed[i] else None)
+            for s, i in index.items()}
+
+
+def forecast_shop(shop_id: str = None, day: Union[str, date] = None, now: datetime = None,
+                  data_dir: str = None) -> Optional[Dict[str, Any]]:
+    """单个店铺的预测（shop_id 为空时为全部店铺合计；订单库无历史返回 None）"""
+    return forecast_shops(day, shop_id, now, data_dir, by_shop=shop_id is not None).get(shop_id)
+
+
+def stock_plan(forecast: Dict[str, Any], calendar: PeriodCalendar = None, baskets=None) -> List[Dict[str, Any]]:
+    """按时段汇总预测：预计单量、80% 上限（备货量）、比预计多备的比例；
+    传入菜品同购统计时按各菜品在该时段的出现率给出备货份数"""
+    calendar = calendar or load_calendar(forecast["shop_id"])
+    day = forecast["date"]
+
+    periods: Dict[str, List[float]] = {}
+    peaks = set()
+    for h in forecast["hours"]:
+        label = calendar.label_of_hour(h["hour"], day)
+        stats = periods.setdefault(label, [0.0, 0.0])
+        stats[0] += h["forecast"]
+        stats[1] += h["std"] ** 2
+        if calendar.is_peak(f"{day}T{h['hour']:02d}:00"):
+            peaks.add(label)
+
+    plan = []
+    for label in calendar.labels:
+        if label not in periods or periods[label][0] < 1:
+            continue
+        expected, variance = periods[label]
+        upper = expected + INTERVAL_Z * math.sqrt(variance)
+        row = {"period": label, "peak": label in peaks, "expected": round(expected, 1),
+               "prepare": math.ceil(upper), "buffer": round(upper / expected - 1, 3)}
+        if baskets is not None:
+            p = baskets.periods.index(label) if label in baskets.periods else None
+            if p is not None and baskets.orders[p]:
+                shares = sorted(((item, counts[p] / baskets.orders[p]) for item, counts in baskets.item_counts.items()
+                                 if counts[p]), key=lambda x: x[1], reverse=True)[:5]
+                row["items"] = {item: math.ceil(upper * share) for item, share in shares}
+        plan.append(row)
+    return plan
+
+
+def print_forecast(forecast: Dict[str, Any], plan: List[Dict[str, Any]]):
+    low, high = forecast["total_range"]
+    print(f"\n🏪 {forecast['shop_id'] or '本店'} {forecast['date']}: 预计 {forecast['total']:g}单"
+          f"（80%区间 {low:g}-{high:g}），模型 {forecast['model_name']}"
+          f"（回测MAE {forecast['backtest_mae']}单/小时）")
+    for h in forecast["hours"]:
+        if h["upper"] >= 0.5:
+            mark = "✓" if h["hour"] < forecast["observed_hours"] else " "
+            print(f"   {h['hour']:02d}点{mark} {h['forecast']:6.1f}单  [{h['lower']:.1f}, {h['upper']:.1f}]")
+    print(f"   📦 备货计划:")
+    for row in plan:
+        items = "，".join(f"{k}×{v}" for k, v in row.get("items", {}).items())
+        print(f"   {'⭐' if row['peak'] else '  '} {row['period']}: 预计{row['expected']:g}单, "
+              f"按{row['prepare']}单备货(+{row['buffer'] * 100:.0f}%){'  ' + items if items else ''}")
+
+
+def run_benchmark(shops: int, days: int = HISTORY_DAYS):
+    """多店铺批量拟合耗时 + 各模型回测误差"""
+    from ele_me_synthetic import demand_curve_from_strategy
+
+    rng = np.random.default_rng(7)
+    curve = demand_curve_from_strategy({"时间策略": DEFAULT_TIME_STRATEGY})
+    # 每店规模不同，周末系数不同，叠加缓慢趋势和泊松噪声
+    scale = rng.uniform(50, 600, size=(shops, 1, 1))
+    weekend = rng.uniform(0.8, 1.5, size=(shops, 1, 1))
+    first_day = date(2026, 1, 5)
+    is_weekend = np.array([(first_day + timedelta(days=d)).weekday() >= 5 for d in range(days + 1)])
+    trend = np.linspace(0.9, 1.1, days + 1)[None, :, None]
+    rate = scale * curve[None, None, :] * np.where(is_weekend[None, :, None], weekend, 1.0) * trend
+    actual = rng.poisson(rate).astype(np.float64)
+    history, target = actual[:, :days], actual[:, days]
+
+    print("=" * 60)
+    print(f"📈 小时需求预测（{shops}店 × {days}天 × 24小时）")
+    print("=" * 60)
+
+    began = time.perf_counter()
+    forecaster = DemandForecaster().fit(history, first_day, PeriodCalendar())
+    secs = time.perf_counter() - began
+    print(f"   拟合+回测+预测: {secs * 1000:.0f}ms（{secs / shops * 1e6:.0f}µs/店）")
+
+    for m, model in enumerate(forecaster.models):
+        chosen = int((forecaster.best == m).sum())
+        print(f"   {MODEL_NAMES[model]}: 回测MAE {np.mean(forecaster.mae[m]):.2f}单/小时, 被{chosen}店选用")
+
+    lower = forecaster.forecast - INTERVAL_Z * forecaster.sigma
+    upper = forecaster.forecast + INTERVAL_Z * forecaster.sigma
+    covered = np.mean((target >= lower) & (target <= upper))
+    mae = np.mean(np.abs(forecaster.forecast - target))
+    naive = np.mean(np.abs(history[:, -1] - target))
+    print(f"   目标日 MAE: {mae:.2f}单/小时（同时段昨日 {naive:.2f}）, 80%区间覆盖率 {covered * 100:.0f}%")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么小时需求预测")
+    parser.add_argument("--date", type=str, help="预测日期 YYYY-MM-DD（默认明天）")
+    parser.add_argument("--today", action="store_true", help="预测今天（用已过去小时校正）")
+    parser.add_argument("--shop-id", type=str, help="只预测指定店铺")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    parser.add_argument("--bench", action="store_true", help="多店铺批量拟合耗时与误差")
+    parser.add_argument("--shops", type=int, default=500, help="压测店铺数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.shops)
+        return
+
+    day = date.today() if args.today else _to_date(args.date) if args.date else date.today() + timedelta(days=1)
+    forecasts = forecast_shops(day, args.shop_id)
+    if args.json:
+        print(json.dumps(forecasts, indent=2, ensure_ascii=False))
+        return
+
+    print("=" * 60)
+    print("📈 饿了么小时需求预测")
+    print("=" * 60)
+    if not forecasts:
+        print("❌ 订单库无历史订单")
+    for forecast in forecasts.values():
+        print_forecast(forecast, stock_plan(forecast))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
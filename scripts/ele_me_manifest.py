@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+饿了么数据目录清单（manifest）
+每次写入订单导出、摘要、分析报告时登记一条记录（时间范围、行数、店铺、文件），
+加载脚本通过清单直接拿到"最新"数据集，不再 listdir + stat 扫描整个 data/
+
+    manifest_latest.json   每类数据集（及每个店铺）的最新记录，原子替换
+    manifest.jsonl         全部历史记录，追加写，用于时间范围查询
+"""
+
+import fcntl
+import json
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+LATEST_FILE = "manifest_latest.json"
+HISTORY_FILE = "manifest.jsonl"
+LOCK_FILE = ".manifest.lock"
+
+# 文件名前缀 → 数据集类型（重建清单时使用，长前缀优先匹配）
+# 文件名格式: <前缀>_<时间戳>[_<店铺ID>].<扩展名>
+_STAMP = r"(?P<stamp>\d{8}_\d{6})(?:_(?P<shop>[\w-]+))?"
+KIND_PATTERNS = [
+    ("multi_shop", re.compile(rf"^multi_shop_{_STAMP}\.(?P<fmt>json)$")),
+    ("deepseek_analysis", re.compile(rf"^deepseek_analysis_{_STAMP}\.(?P<fmt>json)$")),
+    ("deepseek_alert", re.compile(rf"^deepseek_alert_{_STAMP}\.(?P<fmt>json)$")),
+    ("llm_batch", re.compile(rf"^llm_batch_{_STAMP}\.(?P<fmt>jsonl)$")),
+    ("opt_analysis", re.compile(rf"^opt_analysis_{_STAMP}\.(?P<fmt>json)$")),
+    ("analysis", re.compile(rf"^analysis_{_STAMP}\.(?P<fmt>json)$")),
+    ("summary", re.compile(rf"^summary_{_STAMP}\.(?P<fmt>json)$")),
+    ("orders", re.compile(rf"^orders_{_STAMP}\.(?:(?P<fmt>jsonl|json|npz|csv)(?:\.(?:gz|zst))?|agg\.json)$")),
+]
+
+
+class DataManifest:
+    """数据集清单"""
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self.latest_path = os.path.join(data_dir, LATEST_FILE)
+        self.history_path = os.path.join(data_dir, HISTORY_FILE)
+        self.lock_path = os.path.join(data_dir, LOCK_FILE)
+
+    @contextmanager
+    def _locked(self):
+        """跨进程写锁（cron 任务可能并发写）"""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_latest(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.latest_path):
+            return {}
+        with open(self.latest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_latest(self, latest: Dict[str, Dict[str, Any]]):
+        tmp = f"{self.latest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(latest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.latest_path)
+
+    @staticmethod
+    def _key(kind: str, shop_id: Optional[str] = None) -> str:
+        return f"{kind}@{shop_id}" if shop_id else kind
+
+    def _apply(self, latest: Dict[str, Dict[str, Any]], entry: Dict[str, Any]):
+        for key in {self._key(entry["kind"]), self._key(entry["kind"], entry.get("shop_id"))}:
+            if key not in latest or latest[key]["created"] <= entry["created"]:
+                latest[key] = entry
+
+    def register(self, kind: str, path: str, rows: int = None, start_time: str = None,
+                 end_time: str = None, shop_id: str = None, formats: Dict[str, str] = None,
+                 created: str = None) -> Dict[str, Any]:
+        """登记一个新写入的数据集"""
+        entry = {
+            "kind": kind,
+            "path": os.path.basename(path),
+            "created": created or datetime.now().isoformat(),
+            "shop_id": shop_id,
+            "rows": rows,
+            "start_time": start_time,
+            "end_time": end_time,
+        }
+        if formats:
+            entry["formats"] = {fmt: os.path.basename(p) for fmt, p in formats.items() if p}
+
+        with self._locked():
+            # 首次使用清单：先补登 data/ 中已有的旧文件（本次登记的文件除外）
+            if not os.path.exists(self.history_path):
+                self._rebuild(exclude={entry["path"], *entry.get("formats", {}).values()})
+            latest = self._read_latest()
+            self._apply(latest, entry)
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._write_latest(latest)
+
+        return entry
+
+    def latest(self, kind: str, shop_id: str = None) -> Optional[Dict[str, Any]]:
+        """某类数据集的最新记录（没有返回 None；清单缺失或记录的文件已删除时重建一次）"""
+        if os.path.exists(self.latest_path):
+            entry = self._read_latest().get(self._key(kind, shop_id))
+            if entry is None or os.path.exists(self.resolve(entry)):
+                return entry
+
+        self.rebuild()
+        return self._read_latest().get(self._key(kind, shop_id))
+
+    def query(self, kind: str, start: str = None, end: str = None, shop_id: str = None) -> List[Dict[str, Any]]:
+        """时间范围与 [start, end] 有交集的数据集（按写入时间排序）"""
+        if not os.path.exists(self.history_path):
+            self.rebuild()
+        if not os.path.exists(self.history_path):
+            return []
+
+        # 同一文件可能先被其他进程的重建按文件名补登、再被正式登记：按文件去重，后写的记录为准
+        entries = {}
+        with open(self.history_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                entries[entry["path"]] = entry
+
+        matched = []
+        for entry in entries.values():
+            if entry["kind"] != kind or (shop_id and entry.get("shop_id") != shop_id):
+                continue
+            entry_start = entry.get("start_time") or entry["created"]
+            entry_end = entry.get("end_time") or entry["created"]
+            if (start and entry_end < start) or (end and entry_start > end):
+                continue
+            if os.path.exists(self.resolve(entry)):
+                matched.append(entry)
+
+        return sorted(matched, key=lambda e: e["created"])
+
+    def resolve(self, entry: Dict[str, Any], fmt: str = None) -> str:
+        """记录 → 绝对路径（fmt 指定格式，如 npz/jsonl）"""
+        name = entry.get("formats", {}).get(fmt, entry["path"]) if fmt else entry["path"]
+        return os.path.join(self.data_dir, name)
+
+    def rebuild(self, exclude=()):
+        """扫描 data/ 重建清单（仅在清单缺失或失效时执行）
+
+        已登记且文件仍存在的记录原样保留（含店铺/行数/时间范围），
+        未登记的旧文件按文件名补登。读历史、扫描目录、重写在同一把锁内，
+        不会丢掉其他进程同时登记的记录。
+        """
+        with self._locked():
+            self._rebuild(exclude)
+
+    def _rebuild(self, exclude=()):
+        """rebuild 的实际逻辑（调用方已持有锁）"""
+        kept, registered = {}, set(exclude)
+        if os.path.exists(self.history_path):
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if os.path.exists(self.resolve(entry)):
+                        kept[entry["path"]] = entry       # 同一文件登记多次时保留最后一条
+                        registered.add(entry["path"])
+                        registered.update(entry.get("formats", {}).values())
+
+        datasets: Dict[str, Dict[str, Any]] = {}
+        for name in os.listdir(self.data_dir):
+            if name in registered:
+                continue
+            for kind, pattern in KIND_PATTERNS:
+                match = pattern.match(name)
+                if not match:
+                    continue
+                stamp, shop = match.group("stamp"), match.group("shop")
+                entry = datasets.setdefault(f"{kind}_{stamp}_{shop}", {
+                    "kind": kind,
+                    "path": name,
+                    "created": datetime.strptime(stamp, "%Y%m%d_%H%M%S").isoformat(),
+                    "shop_id": shop,
+                    "rows": None,
+                    "start_time": None,
+                    "end_time": None,
+                })
+                if kind == "orders":
+                    fmt = match.group("fmt") or "agg"      # .agg.json 为融合统计
+                    entry.setdefault("formats", {})[fmt] = name
+                    # 主路径优先级：jsonl > json > npz > csv
+                    for primary in ("jsonl", "json", "npz", "csv"):
+                        if primary in entry["formats"]:
+                            entry["path"] = entry["formats"][primary]
+                            break
+                break
+
+        # 只剩统计文件、订单导出已删除的不再登记
+        datasets = {key: entry for key, entry in datasets.items()
+                    if entry["kind"] != "orders" or set(entry["formats"]) != {"agg"}}
+        entries = sorted(list(kept.values()) + list(datasets.values()), key=lambda e: e["created"])
+        latest = {}
+        tmp = f"{self.history_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in entries:
+                self._apply(latest, entry)
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.history_path)
+        self._write_latest(latest)
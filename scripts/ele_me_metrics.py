@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+饿了么向量化指标引擎（NumPy）
+直接在列式存档的列数组上计算融合统计：时间戳批量换算小时，状态用布尔掩码，
+时段/区域统计用 bincount 分组求和；结果与逐单 OrderAggregate 相同。
+load_latest_aggregate 在 .agg.json 缺失或过期时用它从列式存档重算
+
+使用方法:
+    python3 ele_me_metrics.py --bench --orders 1000000   # 与逐单 dict 计算对比
+"""
+
+import argparse
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from ele_me_aggregator import CANCELED, COMPLETED, OrderAggregate
+from ele_me_calendar import PeriodCalendar
+from ele_me_sketch import ALL
+
+
+def hours(order_time: np.ndarray) -> np.ndarray:
+    """datetime64 列 → 小时（0-23）"""
+    return (order_time.astype("datetime64[h]") - order_time.astype("datetime64[D]")).astype(np.int64)
+
+
+def status_mask(columns: Dict[str, np.ndarray], status: str) -> np.ndarray:
+    """指定状态的掩码（只比较字典，不逐单比较字符串）"""
+    codes = np.flatnonzero(columns["status_dict"] == status)
+    return np.isin(columns["status"], codes)
+
+
+def completed_mask(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """完成订单掩码"""
+    return status_mask(columns, COMPLETED)
+
+
+def _grouped(keys: np.ndarray, amounts: np.ndarray, labels) -> Dict[str, Dict[str, Any]]:
+    """按组计数/求和，只返回出现过的组"""
+    counts = np.bincount(keys, minlength=len(labels))
+    sums = np.bincount(keys, weights=amounts, minlength=len(labels))
+    return {labels[i]: {"count": int(counts[i]), "amount": float(sums[i])} for i in np.flatnonzero(counts)}
+
+
+def aggregate_columns(columns: Dict[str, np.ndarray], calendar: PeriodCalendar = None) -> OrderAggregate:
+    """列数组 → 融合统计（与逐单 OrderAggregate.add 结果相同；calendar 缺省为默认日历）"""
+    agg = OrderAggregate(calendar)
+    mask = completed_mask(columns)
+    canceled = status_mask(columns, CANCELED)
+    agg.total = len(mask)
+    if not agg.total:
+        return agg
+
+    amounts = columns["total_amount"][mask]
+    agg.completed = int(mask.sum())
+    agg.canceled = int(canceled.sum())
+    agg.revenue = float(amounts.sum())
+    agg.rating_sum = float(np.nansum(columns["customer_rating"][mask].astype(np.float64)))
+    deliveries = columns["delivery_time_minutes"][mask]
+    has_delivery = deliveries >= 0                          # 缺失为 -1
+    agg.delivery_sum = int(deliveries[has_delivery].sum(dtype=np.int64))
+
+    order_hours = hours(columns["order_time"])
+    area_labels = columns["address_area_dict"].tolist()
+    periods = agg.calendar.bucket(columns["order_time"][mask])
+    agg.hourly = _grouped(order_hours[mask], amounts, range(24))
+    agg.areas = _grouped(columns["address_area"][mask], amounts, area_labels)
+    agg.periods = _grouped(periods, amounts, agg.calendar.labels)
+    cancel_counts = np.bincount(order_hours[canceled], minlength=24)
+    agg.cancel_hourly = {int(h): int(cancel_counts[h]) for h in np.flatnonzero(cancel_counts)}
+
+    # 分位数草图：按组批量灌入
+    agg.sketches.add_many(ALL, amounts, deliveries[has_delivery])
+    for codes, labels in ((periods, agg.calendar.labels),
+                          (columns["address_area"][mask], area_labels)):
+        for code in np.unique(codes):
+            selected = codes == code
+            agg.sketches.add_many(labels[code] or "未知", amounts[selected], deliveries[selected & has_delivery])
+
+    order_time = columns["order_time"]
+    agg.start_time = str(np.datetime_as_string(order_time.min(), unit="s"))
+    agg.end_time = str(np.datetime_as_string(order_time.max(), unit="s"))
+    return agg
+
+
+def _same_groups(a: Dict[str, Dict[str, Any]], b: Dict[str, Dict[str, Any]]) -> bool:
+    """分组统计逐组比较：组相同、单量相同、金额在浮点误差内"""
+    return a.keys() == b.keys() and all(
+        a[k]["count"] == v["count"] and abs(a[k]["amount"] - v["amount"]) < 1e-6 for k, v in b.items())
+
+
+def run_benchmark(count: int):
+    """向量化引擎 vs 逐单融合统计"""
+    from ele_me_columnar import iter_orders_from_columns
+    from ele_me_aggregator import aggregate
+    from ele_me_synthetic import SyntheticOrderGenerator
+
+    generator = SyntheticOrderGenerator(days=30, orders_per_day=count // 30, hourly_curve=np.ones(24))
+    columns = generator.generate_shop("shop001")
+    columns = {k: v for k, v in columns.items() if not k.startswith("item_")}
+    n = len(columns["order_id"])
+
+    print("=" * 60)
+    print(f"🔢 指标计算对比（{n}单）")
+    print("=" * 60)
+
+    began = time.perf_counter()
+    vector = aggregate_columns(columns)
+    sections = {"metrics": vector.report_metrics(), "time_analysis": vector.time_analysis(),
+                "area_analysis": vector.area_analysis()}
+    vector_secs = time.perf_counter() - began
+    print(f"   向量化: {vector_secs * 1000:.0f}ms")
+
+    orders = list(iter_orders_from_columns(columns))
+    began = time.perf_counter()
+    agg = aggregate(orders)
+    metrics = agg.report_metrics()
+    time_analysis = agg.time_analysis()
+    area_analysis = agg.area_analysis()
+    dict_secs = time.perf_counter() - began
+    print(f"   逐单 dict: {dict_secs * 1000:.0f}ms  ({dict_secs / vector_secs:.0f}×)")
+
+    # 分位数为草图估计，两条路径灌入顺序不同，单独打印对比
+    percentile_keys = ("delivery_time_p50_p90_p99", "order_value_p50_p90_p99")
+    for key in percentile_keys:
+        print(f"   {key}: {sections['metrics'].get(key)} / {metrics.get(key)}")
+    same = ({k: v for k, v in sections["metrics"].items() if k not in percentile_keys}
+            == {k: v for k, v in metrics.items() if k not in percentile_keys}
+            and _same_groups(sections["time_analysis"], time_analysis)
+            and _same_groups(sections["area_analysis"], area_analysis))
+    print(f"   结果一致: {'✅' if same else '❌'}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么向量化指标引擎")
+    parser.add_argument("--bench", action="store_true", help="与逐单 dict 计算对比")
+    parser.add_argument("--orders", type=int, default=1000000, help="对比用订单数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.orders)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+饿了么开放平台本地模拟服务
+模拟 order/list + order/detail 接口，用于离线联调和吞吐基准测试
+
+使用方法:
+    python3 ele_me_mock_server.py --port 8765 --days 3 --orders-per-day 2000
+    python3 ele_me_mock_server.py --latency-ms 20    # 模拟网络延迟
+"""
+
+import argparse
+import bisect
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from ele_me_order_download import ElemeOrderDownloader
+
+DEFAULT_PORT = 8765
+API_PREFIX = "/bizapi"
+
+
+class MockOrderBook:
+    """模拟平台订单库（按下单时间排序，支持时间窗口分页）"""
+
+    def __init__(self, days: int = 3, orders_per_day: int = 200, end_date: datetime = None):
+        end_date = end_date or datetime.now()
+        generator = ElemeOrderDownloader()
+
+        orders = []
+        for day_offset in range(days):
+            date = end_date - timedelta(days=days - day_offset)
+            orders.extend(generator._generate_mock_orders(date, count=orders_per_day))
+
+        orders.sort(key=lambda o: (o["order_time"], o["order_id"]))
+        self.orders: List[Dict] = orders
+        self.times = [o["order_time"] for o in orders]
+        self.by_id = {o["order_id"]: o for o in orders}
+
+    def list_page(self, start_time: str, end_time: str, page: int, page_size: int) -> Dict:
+        """时间窗口内的一页订单（仅返回列表摘要字段）"""
+        lo = bisect.bisect_left(self.times, start_time) if start_time else 0
+        hi = bisect.bisect_right(self.times, end_time) if end_time else len(self.times)
+        offset = lo + (page - 1) * page_size
+        rows = self.orders[offset:min(offset + page_size, hi)]
+
+        return {
+            "total": max(hi - lo, 0),
+            "page": page,
+            "page_size": page_size,
+            "list": [
+                {"order_id": o["order_id"], "order_time": o["order_time"], "status": o["status"]}
+                for o in rows
+            ],
+        }
+
+
+class MockOpenPlatformHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 处理器（保持长连接，便于测试连接池复用）"""
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分两次写出：不关 Nagle 时第二次写要等客户端延迟 ACK（约 40ms），测出来的是模拟服务本身
+    disable_nagle_algorithm = True
+    book: MockOrderBook = None
+    latency: float = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body: Dict, status: int = 200):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply({"code": 400, "message": "请求体不是合法JSON"}, status=400)
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        endpoint = self.path[len(API_PREFIX):].strip("/") if self.path.startswith(API_PREFIX) else ""
+
+        if endpoint == "order/list":
+            data = self.book.list_page(
+                params.get("start_time", ""),
+                params.get("end_time", ""),
+                max(int(params.get("page", 1)), 1),
+                max(int(params.get("page_size", 50)), 1),
+            )
+            self._reply({"code": 0, "message": "ok", "data": data})
+        elif endpoint == "order/detail":
+            order = self.book.by_id.get(params.get("order_id"))
+            if order is None:
+                self._reply({"code": 404, "message": "订单不存在"})
+            else:
+                self._reply({"code": 0, "message": "ok", "data": order})
+        else:
+            self._reply({"code": 404, "message": f"未知接口: {self.path}"}, status=404)
+
+
+def start_mock_server(port: int = 0, days: int = 3, orders_per_day: int = 200,
+                      latency_ms: float = 0) -> ThreadingHTTPServer:
+    """后台线程启动模拟服务，返回 server（server.base_url 为接口前缀）"""
+    handler = type("BoundMockHandler", (MockOpenPlatformHandler,), {
+        "book": MockOrderBook(days=days, orders_per_day=orders_per_day),
+        "latency": latency_ms / 1000,
+    })
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}{API_PREFIX}"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么开放平台本地模拟服务")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--days", type=int, default=3, help="模拟订单天数")
+    parser.add_argument("--orders-per-day", type=int, default=200, help="每天订单数")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的模拟延迟(毫秒)")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.port, args.days, args.orders_per_day, args.latency_ms)
+
+    print("=" * 60)
+    print("🧪 饿了么开放平台模拟服务")
+    print("=" * 60)
+    print(f"   接口地址: {server.base_url}")
+    print(f"   订单数量: {len(server.RequestHandlerClass.book.orders)}")
+    print(f"   模拟延迟: {args.latency_ms}ms")
+    print("   Ctrl+C 退出")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+饿了么多店铺并行下载与分析
+下载在线程池中并发执行（I/O 为主，有并发上限），每个店铺下载完成后立即提交到
+进程池做分析，总耗时取决于最慢的店铺而不是各店铺之和；输出分店报告和汇总报告
+
+店铺配置 shops.json:
+    [{"shop_id": "shop001", "name": "徐汇店", "api_token": "..."}, ...]
+
+使用方法:
+    python3 ele_me_multi_shop.py                          # 读取 shops.json
+    python3 ele_me_multi_shop.py --shop shop001 --shop shop002 --days 3
+    python3 ele_me_multi_shop.py --ai                     # 分析完成后各店铺 AI 分析并发调用
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List
+
+from ele_me_data_analysis import ElemeAnalyzer
+from ele_me_manifest import DataManifest
+from ele_me_order_download import ElemeOrderDownloader
+from ele_me_sketch import OrderSketches
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+SHOPS_FILE = "/home/michael/projects/ele-me-operation/shops.json"
+
+MAX_DOWNLOAD_WORKERS = 4                       # 同时下载的店铺数（受平台限流约束）
+MAX_ANALYSIS_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def load_shop_configs(path: str = SHOPS_FILE) -> List[Dict[str, Any]]:
+    """读取店铺配置列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        shops = json.load(f)
+    for shop in shops:
+        if not shop.get("shop_id"):
+            raise ValueError(f"店铺配置缺少 shop_id: {shop}")
+    return shops
+
+
+def download_shop(shop: Dict[str, Any], days: int, data_dir: str) -> Dict[str, Any]:
+    """下载一个店铺的订单到 data_dir（线程池中执行）"""
+    began = time.perf_counter()
+    downloader = ElemeOrderDownloader(api_token=shop.get("api_token"), shop_id=shop["shop_id"], data_dir=data_dir)
+    jsonl_file, _, _ = downloader.save_orders(downloader.iter_orders(days))
+    return {"shop_id": shop["shop_id"], "orders_file": jsonl_file,
+            "download_seconds": round(time.perf_counter() - began, 3)}
+
+
+def analyze_shop(shop_id: str, days: int, data_dir: str) -> Dict[str, Any]:
+    """分析一个店铺近N天订单并保存分店报告（进程池中执行）"""
+    began = time.perf_counter()
+    analyzer = ElemeAnalyzer(shop_id=shop_id, data_dir=data_dir)
+    agg = analyzer.load_aggregate(days)
+    if agg is None:
+        return {"shop_id": shop_id, "error": "无订单数据"}
+    report = analyzer.build_report(days, agg)
+
+    # 可累加的原始汇总（分店指标已格式化，汇总报告据此重新计算）
+    report["totals"] = {key: getattr(agg, key)
+                        for key in ("total", "completed", "canceled", "revenue", "rating_sum", "delivery_sum")}
+
+    report["report_file"] = analyzer.save_report(report)
+    # 分位数草图可跨店铺合并（只回传给汇总，不写入分店报告）
+    report["sketches"] = agg.sketches.to_dict()
+    report["analysis_seconds"] = round(time.perf_counter() - began, 3)
+    return report
+
+
+def aggregate_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并分店报告：总数/营收按库内汇总累加，时段/区域按 count/amount 累加，分位数合并草图"""
+    totals = defaultdict(float)
+    sketches = OrderSketches()
+    time_analysis = defaultdict(lambda: {"count": 0, "amount": 0})
+    area_analysis = defaultdict(lambda: {"count": 0, "amount": 0})
+
+    for report in reports:
+        for key in ("total", "completed", "canceled", "revenue", "rating_sum", "delivery_sum"):
+            totals[key] += report["totals"][key]
+        for merged, part in ((time_analysis, report["time_analysis"]), (area_analysis, report["area_analysis"])):
+            for name, stats in part.items():
+                merged[name]["count"] += stats["count"]
+                merged[name]["amount"] += stats["amount"]
+        sketches.merge(OrderSketches.from_dict(report.get("sketches")))
+
+    completed = totals["completed"]
+    metrics = {
+        "total_orders": int(totals["total"]),
+        "completed_orders": int(completed),
+        "cancellation_rate": f"{totals['canceled'] / totals['total'] * 100:.1f}%" if totals["total"] else "0.0%",
+        "total_revenue": round(totals["revenue"], 2),
+        "avg_order_value": round(totals["revenue"] / completed, 2) if completed else 0,
+        "avg_rating": round(totals["rating_sum"] / completed, 2) if completed else 0,
+        "avg_delivery_time": f"{round(totals['delivery_sum'] / completed)}分钟" if completed else "0分钟",
+    }
+    delivery = sketches.percentiles("delivery")
+    if delivery:
+        metrics["delivery_time_p50_p90_p99"] = "/".join(f"{v:g}" for v in delivery.values()) + "分钟"
+    value = sketches.percentiles("value")
+    if value:
+        metrics["order_value_p50_p90_p99"] = "/".join(f"¥{v:g}" for v in value.values())
+
+    ranking = sorted(({"shop_id": r["shop_id"], "revenue": round(r["totals"]["revenue"], 2),
+                       "completed": r["totals"]["completed"]} for r in reports),
+                     key=lambda x: x["revenue"], reverse=True)
+
+    return {
+        "metrics": metrics,
+        "time_analysis": {k: {"count": v["count"], "amount": round(v["amount"], 2)}
+                          for k, v in sorted(time_analysis.items())},
+        "area_analysis": {k: {"count": v["count"], "amount": round(v["amount"], 2)}
+                          for k, v in sorted(area_analysis.items(), key=lambda x: x[1]["count"], reverse=True)},
+        "percentiles": sketches.table(),
+        "shop_ranking": ranking,
+    }
+
+
+class MultiShopRunner:
+    """多店铺 下载 → 分析 流水线"""
+
+    def __init__(self, shops: List[Dict[str, Any]], days: int = 3, data_dir: str = None,
+                 download_workers: int = MAX_DOWNLOAD_WORKERS, analysis_workers: int = MAX_ANALYSIS_WORKERS):
+        self.shops = shops
+        self.days = days
+        self.data_dir = data_dir or DATA_DIR
+        self.download_workers = download_workers
+        self.analysis_workers = analysis_workers
+
+    def run(self) -> Dict[str, Any]:
+        began = time.perf_counter()
+        downloads, reports, errors = {}, [], []
+
+        # 分析进程用 spawn 启动：fork 会复制下载线程持有的 orders.db 连接和锁，子进程可能锁死
+        with ThreadPoolExecutor(self.download_workers) as download_pool, \
+                ProcessPoolExecutor(self.analysis_workers, mp_context=multiprocessing.get_context("spawn")) \
+                as analysis_pool:
+            pending = {download_pool.submit(download_shop, shop, self.days, self.data_dir):
+                       ("download", shop["shop_id"]) for shop in self.shops}
+
+            # 下载完一个店铺就提交分析，下载与分析重叠执行
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, shop_id = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append({"shop_id": shop_id, "stage": stage, "error": str(e)})
+                        print(f"   ❌ {shop_id} {stage}失败: {e}")
+                        continue
+
+                    if stage == "download":
+                        downloads[shop_id] = result
+                        print(f"   📥 {shop_id} 下载完成 ({result['download_seconds']}秒)")
+                        pending[analysis_pool.submit(analyze_shop, shop_id, self.days, self.data_dir)] = \
+                            ("analysis", shop_id)
+                    elif "error" in result:
+                        errors.append({"shop_id": shop_id, "stage": stage, "error": result["error"]})
+                    else:
+                        result.update(downloads[shop_id])
+                        reports.append(result)
+                        print(f"   📊 {shop_id} 分析完成 ({result['analysis_seconds']}秒)")
+
+        reports.sort(key=lambda r: r["shop_id"])
+        wall = time.perf_counter() - began
+        return {
+            "report_time": datetime.now().isoformat(),
+            "days": self.days,
+            "shops": [r["shop_id"] for r in reports],
+            "aggregate": aggregate_reports(reports) if reports else {},
+            "per_shop": {r["shop_id"]: {"metrics": r["metrics"], "report_file": os.path.basename(r["report_file"]),
+                                        "orders_file": os.path.basename(r["orders_file"])} for r in reports},
+            "errors": errors,
+            "timing": {
+                "wall_seconds": round(wall, 3),
+                "sum_of_shops_seconds": round(sum(r["download_seconds"] + r["analysis_seconds"] for r in reports), 3),
+                "slowest_shop_seconds": round(max((r["download_seconds"] + r["analysis_seconds"] for r in reports),
+                                                  default=0), 3),
+            },
+        }
+
+    def run_ai(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """各店铺 DeepSeek 分析批量并发调用，结果写入 result["ai_analysis"]"""
+        from llm_batch import run_jobs, shop_analysis_jobs
+        from llm_cache import LLMCache
+        from token_budget import TokenLedger
+
+        jobs = shop_analysis_jobs(result["shops"], self.days)
+        out_file = os.path.join(self.data_dir, f"llm_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        batch, summary = run_jobs(jobs, out_file, resume=False, cache=LLMCache(data_dir=self.data_dir),
+                                  ledger=TokenLedger(data_dir=self.data_dir, script="multi_shop"))
+        if batch:
+            DataManifest(self.data_dir).register("llm_batch", out_file, rows=len(batch))
+        result["ai_analysis"] = {r["id"]: r["result"] if r["ok"] else {"error": r.get("error")} for r in batch}
+        result["timing"]["ai_seconds"] = summary["wall_seconds"]
+        result["timing"]["ai_sum_of_calls_seconds"] = summary["sum_seconds"]
+        return result
+
+    def save(self, result: Dict[str, Any]) -> str:
+        """保存汇总报告并登记到数据清单"""
+        report_file = os.path.join(self.data_dir, f"multi_shop_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        DataManifest(self.data_dir).register("multi_shop", report_file)
+        return report_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么多店铺并行下载与分析")
+    parser.add_argument("--shops-file", type=str, default=SHOPS_FILE, help="店铺配置文件")
+    parser.add_argument("--shop", action="append", help="店铺ID（可重复，无 token 时使用模拟数据）")
+    parser.add_argument("--days", type=int, default=3, help="下载/分析近N天订单")
+    parser.add_argument("--download-workers", type=int, default=MAX_DOWNLOAD_WORKERS, help="并发下载店铺数")
+    parser.add_argument("--analysis-workers", type=int, default=MAX_ANALYSIS_WORKERS, help="分析进程数")
+    parser.add_argument("--ai", action="store_true", help="各店铺 DeepSeek 分析（并发调用）")
+    args = parser.parse_args()
+
+    shops = [{"shop_id": s} for s in args.shop] if args.shop else load_shop_configs(args.shops_file)
+
+    print("=" * 60)
+    print(f"🏪 多店铺并行分析（{len(shops)}家店, 近{args.days}天）")
+    print("=" * 60)
+
+    runner = MultiShopRunner(shops, days=args.days, download_workers=args.download_workers,
+                             analysis_workers=args.analysis_workers)
+    result = runner.run()
+
+    metrics = result["aggregate"].get("metrics", {})
+    print(f"\n📈 汇总指标:")
+    for k, v in metrics.items():
+        print(f"   {k}: {v}")
+
+    print(f"\n🏆 店铺营收排名:")
+    for rank in result["aggregate"].get("shop_ranking", []):
+        print(f"   {rank['shop_id']}: ¥{rank['revenue']} ({rank['completed']}单)")
+
+    if args.ai and result["shops"]:
+        print(f"\n🧠 AI 分析（{len(result['shops'])}家店并发）:")
+        runner.run_ai(result)
+        for shop_id, analysis in result["ai_analysis"].items():
+            print(f"   {shop_id}: {analysis.get('summary') or analysis.get('error', '')}")
+        print(f"   AI 耗时 {result['timing']['ai_seconds']}秒（逐个调用合计 {result['timing']['ai_sum_of_calls_seconds']}秒）")
+
+    timing = result["timing"]
+    print(f"\n⏱️ 总耗时 {timing['wall_seconds']}秒（最慢店铺 {timing['slowest_shop_seconds']}秒,"
+          f" 串行合计 {timing['sum_of_shops_seconds']}秒）")
+
+    report_file = runner.save(result)
+    print(f"\n📄 汇总报告: {report_file}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+饿了么订单库（SQLite，WAL 模式）
+按 order_id upsert 去重，重叠窗口的重复下载不会重复计数；
+order_time / status / address_area 建索引，分析脚本把状态和时间过滤下推到 SQL
+
+汇总立方体 order_cube 按 (店铺, 日期, 小时, 区域, 状态) 存订单数/营收/评分和/配送时长和，
+由 orders 表上的触发器在同一事务内增量维护（upsert 覆盖旧订单时先扣减旧值），
+报告按小时粒度查询立方体，耗时与历史订单量无关
+
+分位数草图按 (店铺, 日期) 缓存在 day_sketches，首次查询时从当天完成订单构建，
+该日订单有变动时由同一组触发器作废，跨天/跨店铺合并即得区间分位数
+
+使用方法:
+    python3 ele_me_order_db.py --stats                 # 订单库概况
+    python3 ele_me_order_db.py --import orders_xxx.jsonl
+    python3 ele_me_order_db.py --rebuild-cube          # 从订单全量重建汇总立方体
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from ele_me_calendar import load_calendar
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+DB_FILE = "orders.db"
+
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    shop_id TEXT,
+    order_time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_amount NUMERIC,
+    delivery_fee NUMERIC,
+    discount NUMERIC,
+    customer_rating NUMERIC,
+    delivery_time_minutes INTEGER,
+    address_area TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_orders_time ON orders(order_time);
+CREATE INDEX IF NOT EXISTS idx_orders_status_time ON orders(status, order_time);
+CREATE INDEX IF NOT EXISTS idx_orders_area ON orders(address_area);
+CREATE INDEX IF NOT EXISTS idx_orders_shop_time ON orders(shop_id, order_time);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id TEXT NOT NULL REFERENCES orders(order_id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity INTEGER,
+    price NUMERIC,
+    PRIMARY KEY (order_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_items_name ON order_items(name);
+
+CREATE TABLE IF NOT EXISTS order_cube (
+    shop_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    area TEXT NOT NULL,
+    status TEXT NOT NULL,
+    order_count INTEGER NOT NULL,
+    revenue NUMERIC NOT NULL,
+    rating_sum NUMERIC NOT NULL,
+    delivery_sum INTEGER NOT NULL,
+    PRIMARY KEY (shop_id, day, hour, area, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cube_day ON order_cube(day, hour);
+
+CREATE TABLE IF NOT EXISTS day_sketches (
+    shop_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (shop_id, day)
+) WITHOUT ROWID;
+"""
+
+# 立方体版本（PRAGMA user_version），低于此版本时打开数据库会全量重建一次
+# 2: 触发器同时作废 day_sketches
+CUBE_VERSION = 2
+
+# 订单行 → 立方体维度/度量（row 为触发器中的 NEW / OLD）
+_CUBE_KEY = ("COALESCE({row}.shop_id, '')", "substr({row}.order_time, 1, 10)",
+             "CAST(substr({row}.order_time, 12, 2) AS INTEGER)", "COALESCE({row}.address_area, '未知')",
+             "{row}.status")
+_CUBE_MEASURES = ("COALESCE({row}.total_amount, 0)", "COALESCE({row}.customer_rating, 0)",
+                  "COALESCE({row}.delivery_time_minutes, 0)")
+_CUBE_COLUMNS = ("shop_id", "day", "hour", "area", "status")
+
+
+def _cube_add(row: str) -> str:
+    values = ", ".join(e.format(row=row) for e in _CUBE_KEY + ("1",) + _CUBE_MEASURES)
+    return f"""INSERT INTO order_cube VALUES ({values})
+        ON CONFLICT({", ".join(_CUBE_COLUMNS)}) DO UPDATE SET
+            order_count = order_count + 1, revenue = revenue + excluded.revenue,
+            rating_sum = rating_sum + excluded.rating_sum, delivery_sum = delivery_sum + excluded.delivery_sum;"""
+
+
+def _cube_retract(row: str) -> str:
+    match = " AND ".join(f"{c} = {e.format(row=row)}" for c, e in zip(_CUBE_COLUMNS, _CUBE_KEY))
+    revenue, rating, delivery = (e.format(row=row) for e in _CUBE_MEASURES)
+    return f"""UPDATE order_cube SET order_count = order_count - 1, revenue = revenue - {revenue},
+            rating_sum = rating_sum - {rating}, delivery_sum = delivery_sum - {delivery}
+        WHERE {match};
+        DELETE FROM order_cube WHERE {match} AND order_count <= 0;"""
+
+
+def _sketch_invalidate(row: str) -> str:
+    shop, day = (e.format(row=row) for e in _CUBE_KEY[:2])
+    return f"DELETE FROM day_sketches WHERE shop_id = {shop} AND day = {day};"
+
+
+_CUBE_CHANGED = " OR ".join(f"OLD.{f} IS NOT NEW.{f}" for f in (
+    "shop_id", "order_time", "status", "total_amount", "customer_rating", "delivery_time_minutes", "address_area"))
+
+CUBE_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS cube_after_insert AFTER INSERT ON orders BEGIN
+    {_cube_add("NEW")}
+    {_sketch_invalidate("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS cube_after_update AFTER UPDATE ON orders WHEN {_CUBE_CHANGED} BEGIN
+    {_cube_retract("OLD")}
+    {_cube_add("NEW")}
+    {_sketch_invalidate("OLD")}
+    {_sketch_invalidate("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS cube_after_delete AFTER DELETE ON orders BEGIN
+    {_cube_retract("OLD")}
+    {_sketch_invalidate("OLD")}
+END;
+"""
+
+DROP_CUBE_TRIGGERS = """
+DROP TRIGGER IF EXISTS cube_after_insert;
+DROP TRIGGER IF EXISTS cube_after_update;
+DROP TRIGGER IF EXISTS cube_after_delete;
+"""
+
+REBUILD_CUBE = f"""
+INSERT INTO order_cube
+SELECT {", ".join(e.format(row="orders") for e in _CUBE_KEY)}, COUNT(*),
+       {", ".join(f"SUM({e.format(row='orders')})" for e in _CUBE_MEASURES)}
+FROM orders GROUP BY 1, 2, 3, 4, 5
+"""
+
+ORDER_FIELDS = ("order_id", "shop_id", "order_time", "status", "total_amount", "delivery_fee",
+                "discount", "customer_rating", "delivery_time_minutes", "address_area")
+
+UPSERT_ORDER = f"""
+INSERT INTO orders ({", ".join(ORDER_FIELDS)})
+VALUES ({", ".join("?" * len(ORDER_FIELDS))})
+ON CONFLICT(order_id) DO UPDATE SET
+    {", ".join(f"{f} = excluded.{f}" for f in ORDER_FIELDS[1:])}
+"""
+
+
+class OrderDB:
+    """SQLite 订单库"""
+
+    def __init__(self, path: str = None, data_dir: str = DATA_DIR):
+        self.path = path or os.path.join(data_dir, DB_FILE)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        outdated = self.conn.execute("PRAGMA user_version").fetchone()[0] < CUBE_VERSION
+        if outdated:
+            # 旧版本触发器的定义不同，删除后按当前版本重建
+            self.conn.executescript(DROP_CUBE_TRIGGERS)
+        self.conn.executescript(CUBE_TRIGGERS)
+        if outdated:
+            self.rebuild_cube()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ==================== 写入 ====================
+
+    def upsert_batch(self, orders: List[Dict[str, Any]], shop_id: str = None):
+        """一个事务内 upsert 一批订单（菜品整单替换）"""
+        if not orders:
+            return
+
+        order_rows, item_rows = [], []
+        for o in orders:
+            order_rows.append((
+                o["order_id"], o.get("shop_id", shop_id), o["order_time"], o["status"],
+                o.get("total_amount"), o.get("delivery_fee"), o.get("discount"),
+                o.get("customer_rating"), o.get("delivery_time_minutes"), o.get("address_area"),
+            ))
+            item_rows.extend((o["order_id"], seq, item["name"], item.get("quantity"), item.get("price"))
+                             for seq, item in enumerate(o.get("items", [])))
+
+        with self.conn:
+            self.conn.executemany(UPSERT_ORDER, order_rows)
+            self.conn.executemany("DELETE FROM order_items WHERE order_id = ?",
+                                  ((row[0],) for row in order_rows))
+            self.conn.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?)", item_rows)
+
+    def upsert_orders(self, orders: Iterable[Dict[str, Any]], shop_id: str = None,
+                      batch_size: int = BATCH_SIZE) -> int:
+        """分批 upsert（orders 可以是生成器），返回写入条数"""
+        batch, count = [], 0
+        for order in orders:
+            batch.append(order)
+            if len(batch) >= batch_size:
+                self.upsert_batch(batch, shop_id)
+                count += len(batch)
+                batch = []
+        self.upsert_batch(batch, shop_id)
+        return count + len(batch)
+
+    def rebuild_cube(self):
+        """从订单全量重建汇总立方体（升级旧库或校验时使用）"""
+        with self.conn:
+            self.conn.execute("DELETE FROM order_cube")
+            self.conn.execute("DELETE FROM day_sketches")
+            self.conn.execute(REBUILD_CUBE)
+            self.conn.execute(f"PRAGMA user_version = {CUBE_VERSION}")
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def _where(start: str = None, end: str = None, status: str = None, area: str = None,
+               shop_id: str = None, alias: str = ""):
+        """过滤条件 → (WHERE 子句, 参数)，全部命中索引列"""
+        clauses, params = [], []
+        for column, op, value in (("status", "=", status), ("shop_id", "=", shop_id),
+                                  ("address_area", "=", area),
+                                  ("order_time", ">=", start), ("order_time", "<=", end)):
+            if value is not None:
+                clauses.append(f"{alias}{column} {op} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def iter_orders(self, start: str = None, end: str = None, status: str = None, area: str = None,
+                    shop_id: str = None, with_items: bool = True) -> Iterator[Dict[str, Any]]:
+        """按条件流式读取订单（JSON 导出格式），按下单时间排序"""
+        where, params = self._where(start, end, status, area, shop_id, alias="o.")
+        order_by = " ORDER BY o.order_time, o.order_id"
+
+        rows = self.conn.execute(f"SELECT {', '.join('o.' + f for f in ORDER_FIELDS)} FROM orders o"
+                                 + where + order_by, params)
+
+        items = iter(())
+        if with_items:
+            # 与订单游标同序的菜品游标，归并连接，无需一次性加载
+            items = self.conn.execute(
+                "SELECT i.order_id, i.name, i.quantity, i.price FROM order_items i "
+                "JOIN orders o ON o.order_id = i.order_id" + where + order_by + ", i.seq", params)
+        pending = next(items, None)
+
+        for row in rows:
+            order = dict(zip(ORDER_FIELDS, row))
+            if order["shop_id"] is None:
+                del order["shop_id"]
+            if with_items:
+                order["items"] = []
+                while pending is not None and pending[0] == order["order_id"]:
+                    order["items"].append({"name": pending[1], "quantity": pending[2], "price": pending[3]})
+                    pending = next(items, None)
+            yield order
+
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """按 order_id 批量取已入库的订单（主键查询，不存在的不返回）"""
+        ids = list(dict.fromkeys(order_ids))
+        found = {}
+        for i in range(0, len(ids), BATCH_SIZE // 2):
+            chunk = ids[i:i + BATCH_SIZE // 2]
+            marks = ", ".join("?" * len(chunk))
+            for row in self.conn.execute(
+                    f"SELECT {', '.join(ORDER_FIELDS)} FROM orders WHERE order_id IN ({marks})", chunk):
+                order = dict(zip(ORDER_FIELDS, row))
+                if order["shop_id"] is None:
+                    del order["shop_id"]
+                order["items"] = []
+                found[order["order_id"]] = order
+            for order_id, name, quantity, price in self.conn.execute(
+                    f"SELECT order_id, name, quantity, price FROM order_items WHERE order_id IN ({marks}) "
+                    "ORDER BY order_id, seq", chunk):
+                found[order_id]["items"].append({"name": name, "quantity": quantity, "price": price})
+        return found
+
+    def query(self, **filters) -> "OrderQuery":
+        """可重复迭代的查询结果（每次迭代重新执行 SQL）"""
+        return OrderQuery(self, **filters)
+
+    def summary(self, start: str = None, end: str = None, shop_id: str = None) -> Dict[str, Any]:
+        """在 SQL 中完成的汇总（总数/完成数/营收/评分和/配送时长和）"""
+        where, params = self._where(start, end, shop_id=shop_id)
+        row = self.conn.execute(
+            "SELECT COUNT(*),"
+            " SUM(status = '已完成'),"
+            " SUM(status = '已取消'),"
+            " SUM(CASE WHEN status = '已完成' THEN total_amount END),"
+            " SUM(CASE WHEN status = '已完成' THEN customer_rating END),"
+            " SUM(CASE WHEN status = '已完成' THEN delivery_time_minutes END),"
+            " MIN(order_time), MAX(order_time)"
+            " FROM orders" + where, params).fetchone()
+
+        return {
+            "total": row[0],
+            "completed": row[1] or 0,
+            "canceled": row[2] or 0,
+            "revenue": row[3] or 0,
+            "rating_sum": row[4] or 0,
+            "delivery_sum": row[5] or 0,
+            "start_time": row[6],
+            "end_time": row[7],
+        }
+
+
+    # ==================== 汇总立方体 ====================
+
+    @staticmethod
+    def _cube_where(start: str = None, end: str = None, shop_id: str = None, status: str = None,
+                    area: str = None):
+        """时间范围按小时对齐（start/end 所在小时整体计入）→ (WHERE 子句, 参数)"""
+        clauses, params = [], []
+        for column, value in (("shop_id", shop_id), ("status", status), ("area", area)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            clauses.append("(day > ? OR (day = ? AND hour >= ?))")
+            params += [start[:10], start[:10], int(start[11:13] or 0)]
+        if end is not None:
+            clauses.append("(day < ? OR (day = ? AND hour <= ?))")
+            params += [end[:10], end[:10], int(end[11:13] or 23)]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def rollup(self, start: str = None, end: str = None, shop_id: str = None):
+        """时间范围内的融合统计（查询汇总立方体，不扫描订单）"""
+        from ele_me_aggregator import OrderAggregate
+
+        agg = OrderAggregate(load_calendar(shop_id))
+        where, params = self._cube_where(start, end, shop_id)
+        # 按日期分组：时段随日类型（工作日/周末/节假日）变化
+        rows = self.conn.execute(
+            "SELECT day, hour, area, status, SUM(order_count), SUM(revenue), SUM(rating_sum), SUM(delivery_sum)"
+            " FROM order_cube" + where + " GROUP BY day, hour, area, status ORDER BY day, hour", params)
+        for day, hour, *row in rows:
+            agg.add_group(hour, *row, period=agg.calendar.label_of_hour(hour, day))
+        agg.sketches = self.sketches(start, end, shop_id)
+
+        # 首末下单时间走 order_time 索引（与立方体相同的小时对齐范围）
+        time_where, time_params = self._where(start and start[:13], end and f"{end[:13]}:59:59.999999",
+                                              shop_id=shop_id)
+        agg.start_time, agg.end_time = self.conn.execute(
+            "SELECT MIN(order_time), MAX(order_time) FROM orders" + time_where, time_params).fetchone()
+        agg.source = f"orders.db 汇总 {start or ''}~{end or ''}"
+        return agg
+
+    def sketches(self, start: str = None, end: str = None, shop_id: str = None):
+        """时间范围内完成订单的分位数草图（整天取 day_sketches 缓存，首末不完整的小时段现算）"""
+        from ele_me_sketch import OrderSketches
+
+        merged = OrderSketches()
+        where, params = self._cube_where(start, end, shop_id, status="已完成")
+        days = self.conn.execute("SELECT DISTINCT shop_id, day FROM order_cube" + where, params).fetchall()
+        first_hour = int(start[11:13] or 0) if start else 0
+        last_hour = int(end[11:13] or 23) if end else 23
+
+        for shop, day in days:
+            hours = (first_hour if start and day == start[:10] else 0,
+                     last_hour if end and day == end[:10] else 23)
+            if hours != (0, 23):
+                merged.merge(self._build_sketches(shop, day, *hours))
+                continue
+            row = self.conn.execute("SELECT data FROM day_sketches WHERE shop_id = ? AND day = ?",
+                                    (shop, day)).fetchone()
+            if row:
+                merged.merge(OrderSketches.from_dict(json.loads(row[0])))
+                continue
+            sketches = self._build_sketches(shop, day)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO day_sketches VALUES (?, ?, ?)",
+                                  (shop, day, json.dumps(sketches.to_dict(), ensure_ascii=False)))
+            merged.merge(sketches)
+        return merged
+
+    def _build_sketches(self, shop: str, day: str, first_hour: int = 0, last_hour: int = 23):
+        """从一天（指定小时段）的完成订单构建草图，走 (shop_id, order_time) 索引"""
+        from ele_me_sketch import OrderSketches
+
+        calendar = load_calendar(shop or None)
+        sketches = OrderSketches()
+        rows = self.conn.execute(
+            "SELECT order_time, address_area, total_amount, delivery_time_minutes FROM"
+            " (SELECT CAST(substr(order_time, 12, 2) AS INTEGER) AS hour, order_time, address_area,"
+            "  total_amount, delivery_time_minutes FROM orders"
+            "  WHERE shop_id IS ? AND order_time >= ? AND order_time < ? AND status = '已完成')"
+            " WHERE hour BETWEEN ? AND ?",
+            (shop or None, day, day + "~", first_hour, last_hour))
+        for order_time, area, amount, delivery in rows:
+            sketches.add(calendar.label_at(order_time), area or "未知", amount or 0, delivery)
+        return sketches
+
+    def daily_rollup(self, start: str = None, end: str = None, shop_id: str = None) -> List[Dict[str, Any]]:
+        """按日汇总（趋势对比用，查询汇总立方体）"""
+        where, params = self._cube_where(start, end, shop_id)
+        rows = self.conn.execute(
+            "SELECT day, SUM(order_count),"
+            " SUM(CASE WHEN status = '已完成' THEN order_count END),"
+            " SUM(CASE WHEN status = '已取消' THEN order_count END),"
+            " SUM(CASE WHEN status = '已完成' THEN revenue END),"
+            " SUM(CASE WHEN status = '已完成' THEN rating_sum END),"
+            " SUM(CASE WHEN status = '已完成' THEN delivery_sum END)"
+            " FROM order_cube" + where + " GROUP BY day ORDER BY day", params)
+        return [{"day": row[0], "total": row[1], "completed": row[2] or 0, "canceled": row[3] or 0,
+                 "revenue": row[4] or 0, "rating_sum": row[5] or 0, "delivery_sum": row[6] or 0}
+                for row in rows]
+
+    def hourly_demand(self, start: str = None, end: str = None, shop_id: str = None) -> List[Dict[str, Any]]:
+        """按 店铺 × 日期 × 小时 汇总下单量（需求预测用，查询汇总立方体）"""
+        where, params = self._cube_where(start, end, shop_id)
+        rows = self.conn.execute(
+            "SELECT shop_id, day, hour, SUM(order_count),"
+            " SUM(CASE WHEN status = '已完成' THEN order_count END),"
+            " SUM(CASE WHEN status = '已完成' THEN revenue END)"
+            " FROM order_cube" + where + " GROUP BY shop_id, day, hour", params)
+        return [{"shop_id": row[0] or None, "day": row[1], "hour": row[2], "total": row[3],
+                 "completed": row[4] or 0, "revenue": row[5] or 0}
+                for row in rows]
+
+
+class OrderQuery:
+    """OrderDB 查询的可迭代视图，可直接传给各分析器的指标计算"""
+
+    def __init__(self, db: OrderDB, **filters):
+        self.db = db
+        self.filters = filters
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.db.iter_orders(**self.filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么订单库")
+    parser.add_argument("--db", type=str, help="数据库路径（默认 data/orders.db）")
+    parser.add_argument("--import", dest="import_file", type=str, help="导入订单文件（jsonl/json/npz）")
+    parser.add_argument("--shop-id", type=str, help="导入时标记的店铺ID")
+    parser.add_argument("--stats", action="store_true", help="显示订单库概况")
+    parser.add_argument("--rebuild-cube", action="store_true", help="从订单全量重建汇总立方体")
+    args = parser.parse_args()
+
+    with OrderDB(args.db) as db:
+        if args.rebuild_cube:
+            db.rebuild_cube()
+            print("✅ 汇总立方体已重建")
+
+        if args.import_file:
+            from ele_me_order_io import OrderFile
+            count = db.upsert_orders(OrderFile(args.import_file), shop_id=args.shop_id)
+            print(f"✅ 已导入 {count} 单: {args.import_file}")
+
+        if args.stats or not (args.import_file or args.rebuild_cube):
+            stats = db.summary(shop_id=args.shop_id)
+            print("=" * 60)
+            print("🗄️ 订单库概况")
+            print("=" * 60)
+            print(f"   订单总数: {stats['total']}")
+            print(f"   完成/取消: {stats['completed']}/{stats['canceled']}")
+            print(f"   完成营收: ¥{round(stats['revenue'], 2)}")
+            print(f"   时间范围: {stats['start_time']} ~ {stats['end_time']}")
+            print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,37 +5,70 @@
 """
 
 import requests
+import argparse
 import json
 import csv
+import gzip
 import os
 from datetime import datetime, timedelta
 
+from ele_me_aggregator import OrderAggregate, aggregate
+from ele_me_calendar import load_calendar
+from ele_me_manifest import DataManifest
+from ele_me_order_db import BATCH_SIZE as DB_BATCH_SIZE, OrderDB
+from ele_me_order_io import COMPRESSED_SUFFIX, JsonlOrderWriter
+
 # 配置
 DATA_DIR = "/home/michael/projects/ele-me-operation/data"
 LOG_DIR = "/home/michael/projects/ele-me-operation/logs"
 
 class ElemeOrderDownloader:
-    def __init__(self, api_token=None, shop_id=None):
+    def __init__(self, api_token=None, shop_id=None, data_dir=None):
         self.api_token = api_token
         self.shop_id = shop_id
+        self.data_dir = data_dir or DATA_DIR      # 导出文件、订单库、数据清单所在目录
         self.base_url = "https://open.ele.me/bizapi"
+        self.last_aggregate = None                 # 最近一次 save_orders 顺带算出的融合统计
         
     def download_orders(self, days=3):
         """下载近N天订单"""
+        return list(self.iter_orders(days))
+    
+    def iter_orders(self, days=3):
+        """逐单产出近N天订单（流式，不在内存中累积订单列表）"""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
-        orders = []
-        
         print(f"📥 下载订单: {start_date.strftime('%Y-%m-%d')} ~ {end_date.strftime('%Y-%m-%d')}")
         
+        # 有 Token 时走开放平台 order/list + order/detail（异步连接池抓取）
+        if self.api_token:
+            from ele_me_order_fetcher import iter_orders
+            yield from iter_orders(start_date, end_date, api_token=self.api_token,
+                                   shop_id=self.shop_id, base_url=self.base_url)
+            return
+        
         # 模拟订单数据（实际需要API）
         for day_offset in range(days):
             date = start_date + timedelta(days=day_offset)
             
             # 生成模拟订单（实际应调用API）
-            daily_orders = self._generate_mock_orders(date, count=20 + day_offset * 5)
-            orders.extend(daily_orders)
+            yield from self._generate_mock_orders(date, count=20 + day_offset * 5)
+    
+    def download_range(self, start_time, end_time):
+        """下载指定时间窗口内的订单（增量同步使用）"""
+        if self.api_token:
+            from ele_me_order_fetcher import fetch_orders
+            return fetch_orders(start_time, end_time, api_token=self.api_token,
+                                shop_id=self.shop_id, base_url=self.base_url)
+        
+        # 模拟订单数据：按天生成后截取窗口
+        start, end = start_time.isoformat(), end_time.isoformat()
+        orders = []
+        date = start_time
+        while date.date() <= end_time.date():
+            orders.extend(o for o in self._generate_mock_orders(date) if start <= o["order_time"] <= end)
+            date += timedelta(days=1)
         
         return orders
     
@@ -43,12 +76,13 @@ class ElemeOrderDownloader:
         """生成模拟订单数据（实际使用中替换为真实API调用）"""
         orders = []
         base_time = datetime.combine(date.date(), datetime.min.time())
+        prefix = f"EM{self.shop_id}" if self.shop_id else "EM"  # 订单号全平台唯一
         
         for i in range(count):
             order_time = base_time + timedelta(hours=11 + i % 12, minutes=i * 3 % 60)
             
             order = {
-                "order_id": f"EM{date.strftime('%Y%m%d')}{str(i+1).zfill(4)}",
+                "order_id": f"{prefix}{date.strftime('%Y%m%d')}{str(i+1).zfill(4)}",
                 "order_time": order_time.isoformat(),
                 "status": ["已完成", "已完成", "已完成", "已取消"][i % 4],
                 "items": [
@@ -67,74 +101,136 @@ class ElemeOrderDownloader:
         return orders
     
     def save_orders(self, orders):
-        """保存订单到CSV和JSON"""
+        """流式保存订单到压缩 JSONL、CSV、列式存档和订单库（orders 可以是生成器）
+
+        写盘的同一次遍历中累加融合统计，存为 .agg.json 供分析脚本直接使用
+        """
+        # 多店铺并发保存时按店铺区分文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.shop_id:
+            timestamp = f"{timestamp}_{self.shop_id}"
         
-        # 保存JSON
-        json_file = f"{DATA_DIR}/orders_{timestamp}.json"
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump({
-                "export_time": datetime.now().isoformat(),
-                "total_orders": len(orders),
-                "orders": orders
-            }, f, indent=2, ensure_ascii=False)
+        # JSONL 按块压缩分帧（zstd 优先，否则 gzip），CSV 整体 gzip
+        jsonl_file = f"{self.data_dir}/orders_{timestamp}.jsonl{COMPRESSED_SUFFIX}"
+        csv_file = f"{self.data_dir}/orders_{timestamp}.csv.gz"
+        npz_file = f"{self.data_dir}/orders_{timestamp}.npz"
+        agg_file = f"{self.data_dir}/orders_{timestamp}.agg.json"
         
-        # 保存CSV
-        csv_file = f"{DATA_DIR}/orders_{timestamp}.csv"
-        if orders:
-            keys = orders[0].keys()
-            with open(csv_file, "w", newline="", encoding="utf-8-sig") as f:
-                writer = csv.DictWriter(f, fieldnames=keys)
-                writer.writeheader()
-                writer.writerows(orders)
+        # 列式存档（没有 NumPy 时跳过）
+        try:
+            from ele_me_columnar import ColumnBuilder, save_columnar
+            columns = ColumnBuilder()
+        except ImportError:
+            columns = None
         
-        return json_file, csv_file
-    
-    def generate_summary(self, orders):
-        """生成订单摘要"""
-        if not orders:
-            return {"error": "无订单数据"}
+        csv_handle, csv_writer = None, None
+        agg = OrderAggregate(load_calendar(self.shop_id))
+        db_batch = []
+        with JsonlOrderWriter(jsonl_file) as writer, OrderDB(data_dir=self.data_dir) as db:
+            try:
+                for order in orders:
+                    writer.write(order)
+                    
+                    # 订单库：按批 upsert（重叠窗口的订单按 order_id 去重）
+                    db_batch.append(order)
+                    if len(db_batch) >= DB_BATCH_SIZE:
+                        db.upsert_batch(db_batch, self.shop_id)
+                        db_batch = []
+                    
+                    agg.add(order)
+                    
+                    if csv_writer is None:
+                        csv_handle = gzip.open(csv_file, "wt", newline="", encoding="utf-8-sig")
+                        csv_writer = csv.DictWriter(csv_handle, fieldnames=order.keys())
+                        csv_writer.writeheader()
+                    csv_writer.writerow(order)
+                    
+                    if columns is not None:
+                        columns.add(order)
+                db.upsert_batch(db_batch, self.shop_id)
+            finally:
+                if csv_handle:
+                    csv_handle.close()
         
-        completed = [o for o in orders if o["status"] == "已完成"]
-        canceled = [o for o in orders if o["status"] == "已取消"]
+        if columns is not None:
+            save_columnar(None, npz_file, columns=columns.finish())
+        else:
+            npz_file = None
         
-        total_amount = sum(o["total_amount"] for o in completed)
-        avg_amount = total_amount / len(completed) if completed else 0
-        avg_rating = sum(o["customer_rating"] for o in completed) / len(completed) if completed else 0
-        avg_delivery = sum(o["delivery_time_minutes"] for o in completed) / len(completed) if completed else 0
+        agg.source = datetime.now().isoformat()
+        agg.save(agg_file)
+        self.last_aggregate = agg
         
-        summary = {
-            "统计时间": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "总订单数": len(orders),
-            "完成订单": len(completed),
-            "取消订单": len(canceled),
-            "完成率": f"{len(completed)/len(orders)*100:.1f}%" if orders else "0%",
-            "总营业额": round(total_amount, 2),
-            "客单价": round(avg_amount, 2),
-            "平均评分": round(avg_rating, 2),
-            "平均配送时间": f"{round(avg_delivery)}分钟"
-        }
+        # 登记到数据清单（加载脚本据此找最新导出）
+        DataManifest(self.data_dir).register(
+            "orders", jsonl_file, rows=writer.count, start_time=agg.start_time, end_time=agg.end_time,
+            shop_id=self.shop_id,
+            formats={"jsonl": jsonl_file, "csv": csv_file if csv_handle else None, "npz": npz_file,
+                     "agg": agg_file},
+        )
         
-        return summary
+        return jsonl_file, csv_file, npz_file
+    
+    def generate_summary(self, orders):
+        """生成订单摘要（单次遍历，orders 可以是生成器）"""
+        return aggregate(orders, calendar=load_calendar(self.shop_id)).summary()
 
-def main():
+def run_sync(downloader, ai_on_alert=False):
+    """增量同步：只拉取游标之后的新订单/变化订单，并做流式异常检测"""
+    from ele_me_anomaly import AnomalyDetector, analyze_alerts, print_alerts
+    from ele_me_order_sync import OrderSync
+    
     print("=" * 60)
-    print("🍜 饿了么订单下载")
+    print("🔄 饿了么订单增量同步")
     print("=" * 60)
     
+    stats = OrderSync(downloader, detector=AnomalyDetector()).sync()
+    
+    print(f"   窗口起点: {stats['window_start']}")
+    print(f"   拉取订单: {stats['fetched']}")
+    print(f"   新增/变化/未变: {stats['new']}/{stats['updated']}/{stats['unchanged']}")
+    print(f"   订单库总数: {stats['store_total']}")
+    print(f"   游标: {stats['cursor']['order_time']} {stats['cursor']['order_id']}")
+    print(f"\n🚨 异常检测:")
+    print_alerts(stats["alerts"])
+    print("=" * 60)
+    
+    # 有告警时立即做一次针对性的 AI 分析，不等下一次定时分析
+    if ai_on_alert and stats["alerts"]:
+        analysis = analyze_alerts(stats["alerts"])
+        if "error" in analysis:
+            print(f"❌ 告警分析失败: {analysis['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么订单下载")
+    parser.add_argument("--days", type=int, default=3, help="下载近N天订单")
+    parser.add_argument("--sync", action="store_true", help="增量同步模式（按游标拉取新订单）")
+    parser.add_argument("--ai-on-alert", action="store_true", help="同步发现异常时立即调用 DeepSeek 分析")
+    args = parser.parse_args()
+    
     downloader = ElemeOrderDownloader()
     
-    # 下载订单（默认3天）
-    orders = downloader.download_orders(days=3)
+    if args.sync:
+        run_sync(downloader, ai_on_alert=args.ai_on_alert)
+        return
+    
+    print("=" * 60)
+    print("🍜 饿了么订单下载")
+    print("=" * 60)
+    
+    # 下载订单（默认3天），边下载边写盘
+    orders = downloader.iter_orders(days=args.days)
     
     # 保存
-    json_file, csv_file = downloader.save_orders(orders)
+    jsonl_file, csv_file, npz_file = downloader.save_orders(orders)
     print(f"\n✅ 已保存:")
-    print(f"   JSON: {json_file}")
+    print(f"   JSONL: {jsonl_file}")
     print(f"   CSV: {csv_file}")
+    if npz_file:
+        print(f"   列式: {npz_file}")
     
-    # 生成摘要
-    summary = downloader.generate_summary(orders)
+    # 生成摘要（保存时已顺带统计，无需重读文件）
+    summary = downloader.last_aggregate.summary()
     
     print(f"\n📊 订单摘要:")
     for k, v in summary.items():
@@ -144,6 +240,7 @@ def main():
     summary_file = f"{DATA_DIR}/summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     with open(summary_file, "w", encoding="utf-8") as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
+    DataManifest(DATA_DIR).register("summary", summary_file, shop_id=downloader.shop_id)
     
     print(f"\n📄 摘要: {summary_file}")
     print("=" * 60)
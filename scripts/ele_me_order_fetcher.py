@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+饿了么订单异步抓取器
+复用 keep-alive 连接池，分页请求流水线化，订单详情并发拉取（有并发上限）；
+防限制规则 配置了 订单查询频率 时按它限流：协程在进程内的限流器排队取令牌，
+限流器每次从共享令牌桶（跨进程，data/http_state.json）成批预取，事件循环里不做文件锁读写
+
+使用方法:
+    python3 ele_me_order_fetcher.py --bench                     # 对本地模拟平台做吞吐测试
+    python3 ele_me_order_fetcher.py --bench --orders-per-day 5000 --latency-ms 20
+    python3 ele_me_order_fetcher.py --bench --rate-limit 200                 # 同时测 200次/秒 限流下的吞吐
+"""
+
+import argparse
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import aiohttp
+
+from http_client import MAX_WAIT, RateLimitExceeded, StateStore, TokenBucket, get_client
+
+BASE_URL = "https://open.ele.me/bizapi"
+
+# 并发配置
+PAGE_SIZE = 100
+MAX_CONNECTIONS = 32       # 连接池上限（keep-alive 复用）
+PAGE_CONCURRENCY = 4       # 同时在途的分页请求
+DETAIL_CONCURRENCY = 24    # 同时在途的详情请求
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 2
+RATE_BATCH = 10            # 限流器每次从共享令牌桶预取的令牌数
+
+
+class AsyncRateLimiter:
+    """协程限流器：进程内按令牌排队，从共享令牌桶成批预取（每批只读写一次共享状态）"""
+
+    def __init__(self, bucket: TokenBucket, batch: int = RATE_BATCH):
+        self.bucket = bucket
+        self.batch = max(1, min(batch, bucket.capacity))
+        self.tokens = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while not self.tokens:
+                # 共享令牌桶带文件锁，放到线程池里执行，不阻塞事件循环
+                wait = await asyncio.get_running_loop().run_in_executor(None, self.bucket.try_acquire, self.batch)
+                if wait == 0:
+                    self.tokens = self.batch
+                elif wait > MAX_WAIT:
+                    raise RateLimitExceeded(f"{self.bucket.key} 限流: 需等待 {wait:.0f} 秒")
+                else:
+                    await asyncio.sleep(wait)
+            self.tokens -= 1
+
+
+class OpenPlatformError(Exception):
+    """开放平台接口错误"""
+
+
+class AsyncOrderFetcher:
+    """order/list + order/detail 异步抓取"""
+
+    def __init__(self, api_token: str = None, shop_id: str = None, base_url: str = BASE_URL,
+                 page_size: int = PAGE_SIZE, max_connections: int = MAX_CONNECTIONS,
+                 page_concurrency: int = PAGE_CONCURRENCY,
+                 detail_concurrency: int = DETAIL_CONCURRENCY,
+                 timeout: float = REQUEST_TIMEOUT, bucket: Optional[TokenBucket] = None):
+        self.api_token = api_token
+        self.shop_id = shop_id
+        self.base_url = base_url.rstrip("/")
+        self.page_size = page_size
+        self.max_connections = max_connections
+        self.page_concurrency = page_concurrency
+        self.detail_concurrency = detail_concurrency
+        self.timeout = timeout
+        self.request_count = 0
+        # 平台订单接口频率：默认取 防限制规则 的 订单查询频率（未配置则不限流）
+        bucket = bucket or get_client("eleme").buckets.get("order")
+        self.limiter = AsyncRateLimiter(bucket) if bucket else None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_token:
+            headers["Authorization"] = f"Bearer {self.api_token}"
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._page_sem = asyncio.Semaphore(self.page_concurrency)
+        self._detail_sem = asyncio.Semaphore(self.detail_concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def _post(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST 开放平台接口，返回 data 字段（网络错误重试，重试不再占用限流令牌）"""
+        url = f"{self.base_url}/{endpoint}"
+        if self.limiter is not None:
+            await self.limiter.acquire()
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                self.request_count += 1
+                async with self._session.post(url, json=payload) as response:
+                    if response.status != 200:
+                        raise OpenPlatformError(f"{endpoint} HTTP {response.status}")
+                    body = await response.json(content_type=None)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(0.5 * (attempt + 1))
+
+        if body.get("code", 0) != 0:
+            raise OpenPlatformError(f"{endpoint}: {body.get('message', body.get('code'))}")
+        return body.get("data") or {}
+
+    async def fetch_page(self, start_time: str, end_time: str, page: int) -> Dict[str, Any]:
+        """查询一页订单列表"""
+        async with self._page_sem:
+            return await self._post("order/list", {
+                "shop_id": self.shop_id,
+                "start_time": start_time,
+                "end_time": end_time,
+                "page": page,
+                "page_size": self.page_size,
+            })
+
+    async def fetch_detail(self, order_id: str) -> Dict[str, Any]:
+        """查询订单详情"""
+        async with self._detail_sem:
+            return await self._post("order/detail", {"shop_id": self.shop_id, "order_id": order_id})
+
+    async def fetch_orders(self, start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
+        """抓取时间窗口内全部订单详情
+
+        第一页拿到 total 后其余分页同时发出（受 PAGE_CONCURRENCY 限制），
+        每页一返回就为其订单派发详情请求，分页和详情请求在同一连接池上重叠执行。
+        """
+        start, end = start_time.isoformat(), end_time.isoformat()
+
+        first = await self.fetch_page(start, end, 1)
+        pages = max(1, math.ceil(int(first.get("total", 0)) / self.page_size))
+
+        detail_tasks = [asyncio.ensure_future(self.fetch_detail(o["order_id"]))
+                        for o in first.get("list", [])]
+
+        page_tasks = [asyncio.ensure_future(self.fetch_page(start, end, p)) for p in range(2, pages + 1)]
+        for next_page in asyncio.as_completed(page_tasks):
+            page = await next_page
+            detail_tasks.extend(asyncio.ensure_future(self.fetch_detail(o["order_id"]))
+                                for o in page.get("list", []))
+
+        orders = await asyncio.gather(*detail_tasks)
+        orders.sort(key=lambda o: (o.get("order_time", ""), o.get("order_id", "")))
+        return orders
+
+    async def iter_orders(self, start_time: datetime, end_time: datetime) -> AsyncIterator[Dict[str, Any]]:
+        """逐页产出订单详情（流式，内存只保留在途的几页）"""
+        start, end = start_time.isoformat(), end_time.isoformat()
+
+        first = await self.fetch_page(start, end, 1)
+        pages = max(1, math.ceil(int(first.get("total", 0)) / self.page_size))
+
+        # 预取窗口：最多 PAGE_CONCURRENCY 页在途，按页序产出
+        pending = deque()
+        next_page = 2
+        current = first
+        while True:
+            while next_page <= pages and len(pending) < self.page_concurrency:
+                pending.append(asyncio.ensure_future(self.fetch_page(start, end, next_page)))
+                next_page += 1
+
+            for order in await asyncio.gather(*(self.fetch_detail(o["order_id"])
+                                                 for o in current.get("list", []))):
+                yield order
+
+            if not pending:
+                return
+            current = await pending.popleft()
+
+
+def iter_orders(start_time: datetime, end_time: datetime, **kwargs) -> Iterator[Dict[str, Any]]:
+    """同步生成器入口：边抓取边产出订单"""
+    loop = asyncio.new_event_loop()
+    fetcher = AsyncOrderFetcher(**kwargs)
+    try:
+        loop.run_until_complete(fetcher.__aenter__())
+        stream = fetcher.iter_orders(start_time, end_time).__aiter__()
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        if fetcher._session is not None:
+            loop.run_until_complete(fetcher.__aexit__(None, None, None))
+        loop.close()
+
+
+def fetch_orders(start_time: datetime, end_time: datetime, **kwargs) -> List[Dict[str, Any]]:
+    """同步入口（供 ElemeOrderDownloader 调用）"""
+    async def _run():
+        async with AsyncOrderFetcher(**kwargs) as fetcher:
+            return await fetcher.fetch_orders(start_time, end_time)
+
+    return asyncio.run(_run())
+
+
+def _sequential_baseline(base_url: str, start_time: datetime, end_time: datetime,
+                         page_size: int) -> int:
+    """旧方式基线：逐页 requests.post，每次新建连接"""
+    import requests
+
+    count, page = 0, 1
+    while True:
+        data = requests.post(f"{base_url}/order/list", json={
+            "start_time": start_time.isoformat(), "end_time": end_time.isoformat(),
+            "page": page, "page_size": page_size,
+        }, timeout=REQUEST_TIMEOUT).json()["data"]
+
+        for o in data["list"]:
+            requests.post(f"{base_url}/order/detail", json={"order_id": o["order_id"]},
+                          timeout=REQUEST_TIMEOUT).json()
+            count += 1
+
+        if page * page_size >= data["total"]:
+            return count
+        page += 1
+
+
+def run_benchmark(days: int, orders_per_day: int, latency_ms: float, baseline: bool,
+                  rate_limit: Optional[int] = None):
+    """对本地模拟开放平台测吞吐（单/秒）；rate_limit 为每秒请求数时另测限流下的吞吐"""
+    from ele_me_mock_server import start_mock_server
+
+    server = start_mock_server(days=days, orders_per_day=orders_per_day, latency_ms=latency_ms)
+    end_time = datetime.now()
+    start_time = end_time - timedelta(days=days + 1)
+
+    print("=" * 60)
+    print("⚡ 订单抓取吞吐测试")
+    print("=" * 60)
+    print(f"   模拟平台: {server.base_url}  ({days}天 × {orders_per_day}单, 延迟{latency_ms}ms)")
+
+    try:
+        began = time.perf_counter()
+        orders = fetch_orders(start_time, end_time, base_url=server.base_url)
+        elapsed = time.perf_counter() - began
+        print(f"\n🚀 异步抓取: {len(orders)}单, {elapsed:.2f}秒, {len(orders) / elapsed:.0f}单/秒")
+
+        if rate_limit:
+            # 与生产同一条限流路径，令牌桶状态放内存，不写 data/http_state.json
+            bucket = TokenBucket("bench:order", rate_limit, 1, StateStore(None))
+            began = time.perf_counter()
+            orders = fetch_orders(start_time, end_time, base_url=server.base_url, bucket=bucket)
+            elapsed = time.perf_counter() - began
+            print(f"🚦 限流 {rate_limit}次/秒: {len(orders)}单, {elapsed:.2f}秒, {len(orders) / elapsed:.0f}单/秒")
+
+        if baseline:
+            began = time.perf_counter()
+            count = _sequential_baseline(server.base_url, start_time, end_time, PAGE_SIZE)
+            elapsed = time.perf_counter() - began
+            print(f"🐢 逐个请求: {count}单, {elapsed:.2f}秒, {count / elapsed:.0f}单/秒")
+    finally:
+        server.shutdown()
+
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么订单异步抓取器")
+    parser.add_argument("--bench", action="store_true", help="对本地模拟平台做吞吐测试")
+    parser.add_argument("--baseline", action="store_true", help="同时测试逐个 requests.post 的旧方式")
+    parser.add_argument("--days", type=int, default=3, help="订单天数")
+    parser.add_argument("--orders-per-day", type=int, default=2000, help="模拟平台每天订单数")
+    parser.add_argument("--latency-ms", type=float, default=5, help="模拟平台每个请求的延迟(毫秒)")
+    parser.add_argument("--rate-limit", type=int, help="压测时另测该频率(次/秒)限流下的吞吐")
+    parser.add_argument("--base-url", type=str, default=BASE_URL, help="开放平台接口地址")
+    parser.add_argument("--token", type=str, help="API Token")
+    parser.add_argument("--shop-id", type=str, help="店铺ID")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.days, args.orders_per_day, args.latency_ms, args.baseline, args.rate_limit)
+        return
+
+    end_time = datetime.now()
+    orders = fetch_orders(end_time - timedelta(days=args.days), end_time,
+                          api_token=args.token, shop_id=args.shop_id, base_url=args.base_url)
+    print(f"📥 抓取完成: {len(orders)}单")
+
+
+if __name__ == "__main__":
+    main()
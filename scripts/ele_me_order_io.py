@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+饿了么订单流式读写
+订单以 JSONL（每行一单）追加写入，读取时逐行产出，
+下载 → 保存 → 摘要/分析全程不需要把整个订单列表放进内存
+
+压缩存档（.jsonl.zst / .jsonl.gz）按块分帧：每 CHUNK_ORDERS 单压缩成一个独立的
+zstd 帧或 gzip member 追加到文件末尾，读取时流式解压，分析脚本无需感知。
+
+使用方法:
+    python3 ele_me_order_io.py --bench --orders 100000   # 与原格式（json indent=2 + csv）对比体积和加载耗时
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Sequence
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+CHUNK_ORDERS = 1000     # 每个压缩帧包含的订单数
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 6
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 新导出默认的压缩后缀（有 zstandard 用 zstd，否则 gzip）
+COMPRESSED_SUFFIX = ".zst" if zstandard is not None else ".gz"
+
+
+def _compress_frame(data: bytes, path: str) -> bytes:
+    """一块数据 → 独立的压缩帧"""
+    if path.endswith(".zst"):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def open_text(path: str) -> IO[str]:
+    """按扩展名打开文本文件（.zst / .gz 流式解压，多帧/多 member 连续读取）"""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"读取 {path} 需要安装 zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                            closefd=True)
+        return io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def base_format(path: str) -> str:
+    """orders_x.jsonl.gz → jsonl；orders_x.npz → npz"""
+    name = os.path.basename(path)
+    for suffix in (".zst", ".gz"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name.rsplit(".", 1)[-1]
+
+
+class JsonlOrderWriter:
+    """追加写 JSONL 订单文件（路径以 .zst / .gz 结尾时按块压缩分帧写入）"""
+
+    def __init__(self, path: str, chunk_orders: int = CHUNK_ORDERS):
+        self.path = path
+        self.count = 0
+        self.compressed = path.endswith((".zst", ".gz"))
+        self.chunk_orders = chunk_orders
+        self._chunk = []
+        if self.compressed:
+            if path.endswith(".zst") and zstandard is None:
+                raise ImportError(f"写入 {path} 需要安装 zstandard")
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, order: Dict[str, Any]):
+        if not isinstance(order, dict):
+            order = order.to_dict()  # ele_me_order_model.Order
+        line = json.dumps(order, ensure_ascii=False) + "\n"
+        self.count += 1
+        if not self.compressed:
+            self._file.write(line)
+            return
+        self._chunk.append(line)
+        if len(self._chunk) >= self.chunk_orders:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if self._chunk:
+            self._file.write(_compress_frame("".join(self._chunk).encode("utf-8"), self.path))
+            self._chunk = []
+
+    def write_all(self, orders: Iterable[Dict[str, Any]]) -> int:
+        for order in orders:
+            self.write(order)
+        return self.count
+
+    def close(self):
+        if self.compressed:
+            self._flush_chunk()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OrderFile:
+    """可重复迭代的订单文件（每次迭代重新流式读取）
+
+    支持 .jsonl（逐行读取，可为 .zst/.gz 压缩存档）、.npz 列式存档（只加载 columns 指定的列）
+    以及旧版 .json 导出（需整体解析，仅做兼容）。
+    compact=True 时产出 ele_me_order_model.Order 而不是 dict。
+    """
+
+    def __init__(self, path: str, columns: Optional[Sequence[str]] = None, compact: bool = False):
+        self.path = path
+        self.columns = columns
+        self.compact = compact
+
+    @property
+    def export_time(self) -> str:
+        if self.path.endswith(".npz"):
+            import numpy as np
+            with np.load(self.path) as archive:
+                if "export_time" in archive.files:
+                    return str(archive["export_time"])
+        elif base_format(self.path) == "json":
+            with open_text(self.path) as f:
+                return json.load(f).get("export_time", "")
+        return datetime.fromtimestamp(os.path.getmtime(self.path)).isoformat()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.compact:
+            from ele_me_order_model import iter_models, orders_from_columns
+            if self.path.endswith(".npz"):
+                from ele_me_columnar import load_columns
+                yield from orders_from_columns(load_columns(self.path, self.columns))
+            else:
+                yield from iter_models(self._iter_dicts())
+            return
+        yield from self._iter_dicts()
+
+    def _iter_dicts(self) -> Iterator[Dict[str, Any]]:
+        if self.path.endswith(".npz"):
+            from ele_me_columnar import iter_orders_from_columns, load_columns
+            yield from iter_orders_from_columns(load_columns(self.path, self.columns))
+        elif base_format(self.path) == "json":
+            with open_text(self.path) as f:
+                yield from json.load(f).get("orders", [])
+        else:
+            with open_text(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def _has_numpy() -> bool:
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _readable(path: str) -> bool:
+    """当前环境能否读取（zstd 需要 zstandard，npz 需要 NumPy）"""
+    if path.endswith(".zst"):
+        return zstandard is not None
+    return base_format(path) in ("jsonl", "json") or (base_format(path) == "npz" and _has_numpy())
+
+
+def latest_order_export(data_dir: str = DATA_DIR, prefer_columnar: bool = True,
+                        shop_id: str = None) -> Optional[str]:
+    """最新一次订单导出的路径（查清单，同一次导出优先列式存档）"""
+    from ele_me_manifest import DataManifest
+
+    manifest = DataManifest(data_dir)
+    entry = manifest.latest("orders", shop_id)
+    if entry is None:
+        return None
+
+    formats = entry.get("formats", {})
+    candidates = (("npz",) if prefer_columnar else ()) + ("jsonl", "json")
+    for fmt in candidates:
+        path = manifest.resolve(entry, fmt) if fmt in formats else None
+        if path and _readable(path) and os.path.exists(path):
+            return path
+    path = manifest.resolve(entry)
+    return path if _readable(path) else None
+
+
+def open_latest_orders(data_dir: str = DATA_DIR, columns: Optional[Sequence[str]] = None,
+                       shop_id: str = None) -> Optional[Dict[str, Any]]:
+    """最新订单导出 → {"export_time", "orders": 可迭代订单}"""
+    path = latest_order_export(data_dir, shop_id=shop_id)
+    if path is None:
+        return None
+
+    orders = OrderFile(path, columns)
+    return {"export_time": orders.export_time, "orders": orders, "path": path}
+
+
+def run_benchmark(count: int):
+    """压缩存档 vs 原格式（json indent=2 + csv）：体积与完整加载耗时"""
+    import csv
+    import tempfile
+
+    from datetime import timedelta
+
+    if _has_numpy():
+        # 合成订单（菜品/金额/区域有真实分布，压缩率更接近线上数据）
+        from ele_me_columnar import iter_orders_from_columns
+        from ele_me_synthetic import SyntheticOrderGenerator
+        generator = SyntheticOrderGenerator(days=30, orders_per_day=count // 30 + 1, hourly_curve=[1] * 24)
+        orders = list(iter_orders_from_columns(generator.generate_shop("shop001")))[:count]
+    else:
+        from ele_me_order_download import ElemeOrderDownloader
+        downloader, orders = ElemeOrderDownloader(), []
+        while len(orders) < count:
+            day = datetime.now() - timedelta(days=len(orders) // 500)
+            orders.extend(downloader._generate_mock_orders(day, count=min(500, count - len(orders))))
+
+    print("=" * 60)
+    print(f"🗜️ 订单存档格式对比（{len(orders)}单）")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 原格式：整体 json（indent=2）+ csv
+        legacy = os.path.join(tmp, "orders.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump({"export_time": datetime.now().isoformat(), "orders": orders}, f,
+                      indent=2, ensure_ascii=False)
+        legacy_csv = os.path.join(tmp, "orders.csv")
+        with open(legacy_csv, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=orders[0].keys())
+            writer.writeheader()
+            writer.writerows(orders)
+
+        paths = {"json(indent=2)": legacy, "jsonl": os.path.join(tmp, "orders.jsonl"),
+                 "jsonl.gz": os.path.join(tmp, "orders.jsonl.gz")}
+        if zstandard is not None:
+            paths["jsonl.zst"] = os.path.join(tmp, "orders.jsonl.zst")
+        for name, path in paths.items():
+            if name != "json(indent=2)":
+                with JsonlOrderWriter(path) as writer:
+                    writer.write_all(orders)
+
+        baseline = os.path.getsize(legacy) + os.path.getsize(legacy_csv)
+        print(f"   原格式 json+csv 合计: {baseline / 1024:.0f}KB")
+        for name, path in paths.items():
+            began = time.perf_counter()
+            loaded = sum(1 for _ in OrderFile(path))
+            elapsed = time.perf_counter() - began
+            size = os.path.getsize(path)
+            print(f"   {name:<15} {size / 1024:>8.0f}KB  ({baseline / size:>5.1f}× 小于原格式)"
+                  f"  加载 {elapsed * 1000:.0f}ms ({loaded}单)")
+
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么订单流式读写")
+    parser.add_argument("--bench", action="store_true", help="压缩存档与原格式对比")
+    parser.add_argument("--orders", type=int, default=100000, help="对比用订单数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.orders)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+饿了么紧凑订单模型
+Order / OrderItem 使用 __slots__，状态为枚举单例，区域和菜名做字符串驻留，
+金额以整数"分"存储（超过两位小数的金额四舍五入到分）；与现有 JSON 订单格式互转，
+并支持 order["status"] / order.get(...) 访问，现有分析器可直接消费
+
+下载、汇总都是逐单流式处理或直接读列式存档/汇总，不在内存中保留订单列表；
+需要把一批订单常驻内存多次遍历时用 load_orders / OrderFile(compact=True)，
+如同购挖掘读取 JSONL 导出时（Apriori 每层一遍扫描）
+
+使用方法:
+    python3 ele_me_order_model.py --bench --orders 200000   # dict 与 Order 的内存/遍历对比
+"""
+
+import argparse
+import sys
+import time
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class OrderStatus(str, Enum):
+    """订单状态（str 枚举：与 "已完成" 等字符串比较仍然相等）"""
+    COMPLETED = "已完成"
+    CANCELED = "已取消"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+    @classmethod
+    def parse(cls, value: Optional[str]):
+        """字符串 → 枚举；未知状态保留原字符串（驻留）以保证无损"""
+        if value is None or isinstance(value, cls):
+            return value
+        try:
+            return cls(value)
+        except ValueError:
+            return sys.intern(value)
+
+
+def _to_cents(value) -> Optional[int]:
+    """元 → 整数分（超过两位小数时四舍五入到分）"""
+    if value is None:
+        return None
+    return int(round(value * 100))
+
+
+def _from_cents(cents: Optional[int]):
+    """整数分 → 元（整元还原为 int，与原始导出一致）"""
+    if cents is None:
+        return None
+    return cents // 100 if cents % 100 == 0 else cents / 100
+
+
+def _cents_column(values):
+    """金额列（元）→ 整数分列，规则同 _to_cents"""
+    import numpy as np
+
+    return np.rint(values * 100).astype(np.int64).tolist()
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+
+class OrderItem:
+    """订单菜品"""
+
+    __slots__ = ("name", "quantity", "price_cents")
+
+    def __init__(self, name: str, quantity: int = 1, price_cents: int = 0):
+        self.name = name
+        self.quantity = quantity
+        self.price_cents = price_cents
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "OrderItem":
+        return cls(sys.intern(item["name"]), item.get("quantity", 1), _to_cents(item.get("price", 0)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "quantity": self.quantity, "price": _from_cents(self.price_cents)}
+
+    @property
+    def price(self):
+        return _from_cents(self.price_cents)
+
+    def __getitem__(self, key: str):
+        return getattr(self, key) if key in ("name", "quantity", "price") else self._missing(key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in ("name", "quantity", "price") else default
+
+    @staticmethod
+    def _missing(key: str):
+        raise KeyError(key)
+
+    def __eq__(self, other):
+        if isinstance(other, OrderItem):
+            return (self.name, self.quantity, self.price_cents) == (other.name, other.quantity, other.price_cents)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"OrderItem({self.name!r}, {self.quantity}, {self.price!r})"
+
+
+class Order:
+    """紧凑订单
+
+    金额字段（total_amount / delivery_fee / discount）以 *_cents 整数存储，
+    通过同名属性或 order["total_amount"] 读取时换算为元。
+    JSON 格式之外的字段（如 shop_id）放在 extra 中原样保留。
+    """
+
+    __slots__ = ("order_id", "order_time", "status", "total_cents", "delivery_fee_cents",
+                 "discount_cents", "customer_rating", "delivery_time_minutes", "address_area",
+                 "items", "extra")
+
+    def __init__(self, order_id: str, order_time: str, status, total_cents: Optional[int] = None,
+                 delivery_fee_cents: Optional[int] = None, discount_cents: Optional[int] = None,
+                 customer_rating=None, delivery_time_minutes: Optional[int] = None,
+                 address_area: Optional[str] = None, items: Optional[Tuple[OrderItem, ...]] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.order_id = order_id
+        self.order_time = order_time
+        self.status = OrderStatus.parse(status)
+        self.total_cents = total_cents
+        self.delivery_fee_cents = delivery_fee_cents
+        self.discount_cents = discount_cents
+        self.customer_rating = customer_rating
+        self.delivery_time_minutes = delivery_time_minutes
+        self.address_area = _intern(address_area)
+        self.items = items
+        self.extra = extra
+
+    # ==================== 互转 ====================
+
+    @classmethod
+    def from_dict(cls, o: Dict[str, Any]) -> "Order":
+        """JSON 订单 dict → Order（缺失的列为 None，如按列加载的存档）"""
+        items = o.get("items")
+        extra = {k: v for k, v in o.items() if k not in _FIELDS} or None
+        return cls(
+            o.get("order_id"), o.get("order_time"), o.get("status"),
+            _to_cents(o.get("total_amount")), _to_cents(o.get("delivery_fee")),
+            _to_cents(o.get("discount")), o.get("customer_rating"), o.get("delivery_time_minutes"),
+            o.get("address_area"),
+            None if items is None else tuple(OrderItem.from_dict(i) for i in items),
+            extra,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Order → JSON 订单 dict（字段顺序与下载导出一致）"""
+        o = {
+            "order_id": self.order_id,
+            "order_time": self.order_time,
+            "status": self.status.value if isinstance(self.status, OrderStatus) else self.status,
+        }
+        if self.items is not None:
+            o["items"] = [item.to_dict() for item in self.items]
+        o.update({
+            "total_amount": _from_cents(self.total_cents),
+            "delivery_fee": _from_cents(self.delivery_fee_cents),
+            "discount": _from_cents(self.discount_cents),
+            "customer_rating": self.customer_rating,
+            "delivery_time_minutes": self.delivery_time_minutes,
+            "address_area": self.address_area,
+        })
+        if self.extra:
+            o.update(self.extra)
+        return o
+
+    # ==================== 常用判断 ====================
+
+    @property
+    def completed(self) -> bool:
+        return self.status is OrderStatus.COMPLETED
+
+    @property
+    def hour(self) -> int:
+        """下单小时（直接取 ISO 字符串，免去 fromisoformat）"""
+        return int(self.order_time[11:13])
+
+    @property
+    def total_amount(self):
+        return _from_cents(self.total_cents)
+
+    @property
+    def delivery_fee(self):
+        return _from_cents(self.delivery_fee_cents)
+
+    @property
+    def discount(self):
+        return _from_cents(self.discount_cents)
+
+    # ==================== dict 兼容 ====================
+
+    def __getitem__(self, key: str):
+        getter = _GETTERS.get(key)
+        if getter is not None:
+            return getter(self)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None and key == "items" else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in _GETTERS or bool(self.extra and key in self.extra)
+
+    def __eq__(self, other):
+        if isinstance(other, Order):
+            return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Order({self.order_id!r}, {self.order_time!r}, {str(self.status)!r})"
+
+
+_GETTERS = {
+    "order_id": lambda o: o.order_id,
+    "order_time": lambda o: o.order_time,
+    "status": lambda o: o.status,
+    "items": lambda o: o.items,
+    "total_amount": lambda o: _from_cents(o.total_cents),
+    "delivery_fee": lambda o: _from_cents(o.delivery_fee_cents),
+    "discount": lambda o: _from_cents(o.discount_cents),
+    "customer_rating": lambda o: o.customer_rating,
+    "delivery_time_minutes": lambda o: o.delivery_time_minutes,
+    "address_area": lambda o: o.address_area,
+}
+_FIELDS = frozenset(_GETTERS)
+
+
+def iter_models(orders: Iterable[Dict[str, Any]]) -> Iterator[Order]:
+    """订单 dict 流 → Order 流（已是 Order 的原样产出）"""
+    for o in orders:
+        yield o if isinstance(o, Order) else Order.from_dict(o)
+
+
+def load_orders(orders: Iterable[Dict[str, Any]]) -> List[Order]:
+    """一次解析、常驻内存的紧凑订单列表（适合需要多次遍历的分析）"""
+    return list(iter_models(orders))
+
+
+def orders_from_columns(columns) -> List[Order]:
+    """列式存档的列数组 → Order 列表（按列批量换算，不经过中间 dict）"""
+    import numpy as np
+
+    n = len(next(v for k, v in columns.items() if k != "export_time"))
+    missing = [None] * n
+
+    def encoded(name, parse):
+        if name not in columns:
+            return missing
+        values = [parse(v) for v in columns[f"{name}_dict"].tolist()]
+        return [values[c] for c in columns[name].tolist()]
+
+    def cents(name):
+        return _cents_column(columns[name]) if name in columns else missing
+
+    ids = columns["order_id"].tolist() if "order_id" in columns else missing
+    times = ([t.isoformat() for t in columns["order_time"].astype(object)]
+             if "order_time" in columns else missing)
+    ratings = ([None if r != r else (int(r) if r == int(r) else r) for r in columns["customer_rating"].tolist()]
+               if "customer_rating" in columns else missing)
+    minutes = ([None if m < 0 else m for m in columns["delivery_time_minutes"].tolist()]
+               if "delivery_time_minutes" in columns else missing)
+
+    items = missing
+    if "item_offsets" in columns:
+        offsets = columns["item_offsets"].tolist()
+        names = encoded("item_name", sys.intern)
+        qty, price = columns["item_quantity"].tolist(), cents("item_price")
+        items = [tuple(OrderItem(names[j], qty[j], price[j]) for j in range(offsets[i], offsets[i + 1]))
+                 for i in range(n)]
+
+    return [Order(*row) for row in zip(
+        ids, times, encoded("status", OrderStatus.parse), cents("total_amount"), cents("delivery_fee"),
+        cents("discount"), ratings, minutes, encoded("address_area", sys.intern), items)]
+
+
+def run_benchmark(count: int):
+    """dict 订单与 Order 的内存占用、过滤汇总耗时对比"""
+    import json
+    import tracemalloc
+    from datetime import datetime, timedelta
+
+    base = datetime(2026, 1, 1)
+    areas, statuses = ["浦东新区", "徐汇区", "静安区", "长宁区"], ["已完成", "已完成", "已完成", "已取消"]
+
+    # 与 OrderFile 读取 JSONL 一致：每单都是独立解析出的 dict
+    lines = [json.dumps({
+        "order_id": f"EM{i:010d}",
+        "order_time": (base + timedelta(minutes=i)).isoformat(),
+        "status": statuses[i % 4],
+        "items": [{"name": "招牌炒饭", "quantity": 1, "price": 18}, {"name": "可乐", "quantity": 1, "price": 3}],
+        "total_amount": round(21 + i % 10 + 0.5, 2),
+        "delivery_fee": 3 + i % 3,
+        "discount": i % 5,
+        "customer_rating": 5,
+        "delivery_time_minutes": 25 + i % 20,
+        "address_area": areas[i % 4],
+    }, ensure_ascii=False) for i in range(count)]
+
+    def make_dicts():
+        return [json.loads(line) for line in lines]
+
+    def measure(build):
+        tracemalloc.start()
+        data = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return data, size
+
+    # Order 从各自新解析的 dict 构建：order_id / order_time 字符串归 Order 所有，计入其内存
+    dicts, dict_bytes = measure(make_dicts)
+    models, model_bytes = measure(lambda: load_orders(make_dicts()))
+
+    began = time.perf_counter()
+    revenue = sum(o["total_amount"] for o in dicts if o["status"] == "已完成")
+    dict_secs = time.perf_counter() - began
+
+    began = time.perf_counter()
+    cents = sum(o.total_cents for o in models if o.status is OrderStatus.COMPLETED)
+    model_secs = time.perf_counter() - began
+
+    assert all(m.to_dict() == d for m, d in zip(models, dicts))
+    assert abs(cents / 100 - revenue) < 1e-6
+
+    print("=" * 60)
+    print(f"🧮 订单模型对比（{count}单）")
+    print("=" * 60)
+    print(f"   dict 订单:  {dict_bytes / count:.0f} 字节/单, 过滤汇总 {dict_secs * 1000:.1f}ms")
+    print(f"   Order 订单: {model_bytes / count:.0f} 字节/单, 过滤汇总 {model_secs * 1000:.1f}ms")
+    print(f"   内存节省: {dict_bytes / model_bytes:.1f}×")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么紧凑订单模型")
+    parser.add_argument("--bench", action="store_true", help="dict 与 Order 的内存/遍历对比")
+    parser.add_argument("--orders", type=int, default=100000, help="对比用订单数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.orders)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
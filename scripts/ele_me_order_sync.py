@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+饿了么订单增量同步
+持久化高水位游标（最后的 order_time/order_id），每次只拉取游标之后的新订单
+以及回看窗口内状态有变化的订单，合并进按 order_id 去重的订单库（orders.db）
+
+去重只按主键查本次拉取到的订单，不读取历史；整个同步持有跨进程文件锁，
+每分钟的 cron 任务重叠时后一次等前一次结束再基于新游标运行。
+传入 AnomalyDetector 时顺带做流式异常检测。
+"""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ele_me_aggregator import CANCELED, COMPLETED
+from ele_me_order_db import ORDER_FIELDS, OrderDB
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+CURSOR_FILE = "sync_cursor.json"
+LOCK_FILE = ".sync.lock"
+
+OVERLAP_MINUTES = 120      # 回看窗口：捕获近期订单的取消/评分变化
+FIRST_SYNC_DAYS = 3        # 首次同步（无游标）拉取天数
+
+# 判断订单是否变化时比较的字段（店铺由同步方指定，不参与比较）
+SNAPSHOT_FIELDS = tuple(f for f in ORDER_FIELDS if f not in ("order_id", "shop_id"))
+
+
+def _atomic_write_json(path: str, data: Any):
+    """先写临时文件再 rename，避免中途崩溃留下半个文件"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _snapshot(order: Dict[str, Any]) -> Tuple:
+    """订单内容快照（缺失字段与 None 等价，与订单库读出的格式可直接比较）"""
+    items = tuple((i["name"], i.get("quantity"), i.get("price")) for i in order.get("items") or ())
+    return tuple(order.get(f) for f in SNAPSHOT_FIELDS) + (items,)
+
+
+def diff_orders(db: OrderDB, orders: Iterable[Dict]) -> Tuple[Dict[str, int], List[Dict], List[Dict]]:
+    """与订单库比对一批订单 → (统计, 新增或有变化的订单, 本次首次进入 已完成/已取消 的订单)"""
+    latest = {o["order_id"]: o for o in orders}          # 同一批内重复的订单以最后一次为准
+    stored = db.get_orders(latest)
+    stats = {"new": 0, "updated": 0, "unchanged": 0}
+    delta, finalized = [], []
+
+    for order_id, order in latest.items():
+        old = stored.get(order_id)
+        if old is not None and _snapshot(old) == _snapshot(order):
+            stats["unchanged"] += 1
+            continue
+        stats["updated" if old else "new"] += 1
+        delta.append(order)
+        if order.get("status") in (COMPLETED, CANCELED) and (old is None or old["status"] != order["status"]):
+            finalized.append(order)
+
+    return stats, delta, finalized
+
+
+class OrderSync:
+    """高水位增量同步"""
+
+    def __init__(self, downloader, data_dir: str = DATA_DIR, overlap_minutes: int = OVERLAP_MINUTES,
+                 detector=None):
+        self.downloader = downloader
+        self.detector = detector                    # 可选的 AnomalyDetector，逐单检测新完成/取消的订单
+        self.data_dir = data_dir
+        self.cursor_file = os.path.join(data_dir, CURSOR_FILE)
+        self.lock_path = os.path.join(data_dir, LOCK_FILE)
+        self.overlap = timedelta(minutes=overlap_minutes)
+
+    @contextmanager
+    def _locked(self):
+        """跨进程同步锁（游标读取到写回之间不允许另一次同步插入）"""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load_cursor(self) -> Optional[Dict[str, str]]:
+        """读取游标（不存在返回 None）"""
+        if not os.path.exists(self.cursor_file):
+            return None
+        with open(self.cursor_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def sync(self, now: datetime = None) -> Dict[str, Any]:
+        """拉取游标之后（含回看窗口）的订单并合并"""
+        with self._locked():
+            return self._sync(now or datetime.now())
+
+    def _sync(self, now: datetime) -> Dict[str, Any]:
+        cursor = self.load_cursor()
+
+        if cursor:
+            start = datetime.fromisoformat(cursor["order_time"]) - self.overlap
+        else:
+            start = now - timedelta(days=FIRST_SYNC_DAYS)
+
+        orders = self.downloader.download_range(start, now)
+
+        # 只把新增/变化的订单写入订单库
+        shop_id = self.downloader.shop_id
+        with OrderDB(data_dir=self.data_dir) as db:
+            stats, delta, finalized = diff_orders(db, orders)
+            db.upsert_orders(delta, shop_id=shop_id)
+            total = db.summary(shop_id=shop_id)["total"]
+
+        # 异常检测：每个订单只在状态首次落定时计入一次
+        alerts = []
+        if self.detector is not None:
+            alerts = self.detector.observe_many(finalized, shop_id=shop_id)
+            self.detector.save()
+
+        # 高水位只前进不后退
+        mark = (cursor["order_time"], cursor["order_id"]) if cursor else ("", "")
+        for o in orders:
+            mark = max(mark, (o["order_time"], o["order_id"]))
+
+        new_cursor = {"order_time": mark[0], "order_id": mark[1], "synced_at": now.isoformat()}
+        if mark[0]:
+            _atomic_write_json(self.cursor_file, new_cursor)
+
+        return {
+            "window_start": start.isoformat(),
+            "fetched": len(orders),
+            **stats,
+            "store_total": total,
+            "cursor": new_cursor,
+            "alerts": alerts,
+        }
@@ -1,29 +1,39 @@
 #!/usr/bin/env python3
 """
 饿了么推广自动调整脚本
-根据时段自动调整推广出价和预算
+根据当前小时的需求预测调整推广出价和预算（订单库无历史时按固定时段出价）
 """
 
 import json
 import os
-from datetime import datetime, time
+from datetime import datetime
 from enum import Enum
 
+from ele_me_calendar import bid_multiplier, load_calendar
+from http_client import RateLimitExceeded, get_client
+
 # 配置
 CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
 LOG_DIR = "/home/michael/projects/ele-me-operation/logs"
 
+MIN_HOURLY_ORDERS = 0.5   # 预测不足半单的小时暂停推广
+BASE_BID = 1.0            # 出价倍数为 1 时的出价（元/点击）
+
 class TimePeriod(Enum):
+    """取值为 ele_me_calendar 的时段名称（时间范围由 CORE_STRATEGY.json 决定）"""
     MORNING = "早餐"      # 07:00-09:00
     LUNCH = "午餐"        # 11:00-13:00
-    AFTERNOON = "下午"    # 14:00-16:00
+    AFTERNOON = "下午"    # 14:00-17:00
     DINNER = "晚餐"       # 17:00-19:00
     NIGHT = "夜宵"        # 21:00-23:00
     OFF_PEAK = "深夜"     # 23:00-07:00
+    REGULAR = "其他"      # 高峰之间的空档（09-11、13-14、19-21），不投放
 
 class PromotionAutoManager:
-    def __init__(self):
+    def __init__(self, shop_id=None):
+        self.shop_id = shop_id
         self.load_strategy()
+        self.daily_budget = self.calculate_budget()
         
     def load_strategy(self):
         """加载策略配置"""
@@ -32,23 +42,12 @@ class PromotionAutoManager:
         
         self.promotion = self.strategy.get("推广策略", {})
         self.limits = self.strategy.get("防限制规则", {})
+        self.calendar = load_calendar(self.shop_id, CONFIG_FILE)
         
-    def get_current_period(self):
-        """获取当前时段"""
-        now = datetime.now().time()
-        
-        if time(7, 0) <= now < time(9, 0):
-            return TimePeriod.MORNING
-        elif time(11, 0) <= now < time(13, 0):
-            return TimePeriod.LUNCH
-        elif time(14, 0) <= now < time(16, 0):
-            return TimePeriod.AFTERNOON
-        elif time(17, 0) <= now < time(19, 0):
-            return TimePeriod.DINNER
-        elif time(21, 0) <= now < time(23, 0):
-            return TimePeriod.NIGHT
-        else:
-            return TimePeriod.OFF_PEAK
+    def get_current_period(self, now=None):
+        """获取当前时段（共用营业时段日历，含周末/节假日覆盖）"""
+        name = self.calendar.period_at(now or datetime.now())
+        return next((p for p in TimePeriod if p.value == name), TimePeriod.REGULAR)
     
     def get_bid_config(self, period):
         """获取出价配置"""
@@ -89,6 +88,12 @@ class PromotionAutoManager:
                 "action": "正常推广",
                 "reason": "夜宵，维持正常出价"
             },
+            TimePeriod.REGULAR: {
+                "bid_multiplier": 0,
+                "budget_multiplier": 0,
+                "action": "暂停推广",
+                "reason": "高峰间空档，暂停节省预算"
+            },
             TimePeriod.OFF_PEAK: {
                 "bid_multiplier": 0,
                 "budget_multiplier": 0,
@@ -99,12 +104,67 @@ class PromotionAutoManager:
         
         return configs.get(period, configs[TimePeriod.OFF_PEAK])
     
+    def load_forecast(self, now=None):
+        """今天的小时需求预测（订单库无历史或没有 NumPy 时返回 None）"""
+        try:
+            from ele_me_forecast import forecast_shop
+        except ImportError:
+            return None
+        return forecast_shop(self.shop_id, now=now)
+    
+    def bid_range(self):
+        """出价倍数上下限，取 时段策略 中非暂停时间点的最低/最高倍数（默认 0.7-1.5）"""
+        multipliers = [m for m in map(bid_multiplier, self.promotion.get("时段策略", {}).values()) if m > 0]
+        return (min(multipliers), max(multipliers)) if multipliers else (0.7, 1.5)
+    
+    def get_forecast_bid_config(self, forecast, now):
+        """按预测定出价：本小时预测单量 / 营业小时平均预测单量，限制在 bid_range 内"""
+        expected = forecast["hours"][now.hour]["forecast"]
+        open_hours = [h["forecast"] for h in forecast["hours"] if h["forecast"] >= MIN_HOURLY_ORDERS]
+        if expected < MIN_HOURLY_ORDERS or not open_hours:
+            return {
+                "bid_multiplier": 0,
+                "budget_multiplier": 0,
+                "action": "暂停推广",
+                "reason": f"预测本小时不足{MIN_HOURLY_ORDERS}单，暂停节省预算"
+            }
+        
+        mean = sum(open_hours) / len(open_hours)
+        floor, ceiling = self.bid_range()
+        multiplier = round(min(max(expected / mean, floor), ceiling), 2)
+        action = "高峰模式" if multiplier >= 1.2 else "降低出价" if multiplier < 1 else "正常推广"
+        return {
+            "bid_multiplier": multiplier,
+            "budget_multiplier": multiplier,
+            "action": action,
+            "reason": f"预测本小时{expected:.1f}单（营业小时平均{mean:.1f}单），出价×{multiplier}"
+        }
+    
     def calculate_budget(self, target_orders=30, avg_order_value=25):
         """计算日预算"""
         formula = self.promotion.get("预算控制", {}).get("日预算公式", "")
         base_budget = target_orders * avg_order_value * 0.1
         return round(base_budget, 2)
     
+    def target_bid(self, bid_config):
+        """出价配置 → (出价, 预算)"""
+        return (round(BASE_BID * bid_config["bid_multiplier"], 2),
+                round(self.daily_budget * bid_config["budget_multiplier"], 2))
+    
+    def last_applied(self):
+        """今天最近一次生效的 (出价, 预算)（被限流跳过的不算；今天没有时返回 None）"""
+        log_file = f"{LOG_DIR}/promotion_adjustments.jsonl"
+        if not os.path.exists(log_file):
+            return None
+        
+        today, applied = datetime.now().strftime("%Y-%m-%d"), None
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["timestamp"].startswith(today) and entry.get("action") != "SKIP":
+                    applied = (entry.get("bid", 0), entry.get("budget", 0))
+        return applied
+    
     def simulate_api_call(self, bid_config, period):
         """模拟API调用（实际需对接饿了么API）"""
         period_name = period.value
@@ -117,9 +177,7 @@ class PromotionAutoManager:
                 "budget": 0
             }
         
-        base_bid = 1.0
-        new_bid = round(base_bid * bid_config["bid_multiplier"], 2)
-        budget = round(75 * bid_config["budget_multiplier"], 2)
+        new_bid, budget = self.target_bid(bid_config)
         
         return {
             "action": bid_config["action"],
@@ -129,11 +187,43 @@ class PromotionAutoManager:
             "period": period_name
         }
     
-    def adjust_promotion(self):
-        """执行推广调整"""
-        period = self.get_current_period()
-        bid_config = self.get_bid_config(period)
-        result = self.simulate_api_call(bid_config, period)
+    def adjust_promotion(self, now=None):
+        """执行推广调整（有需求预测时按预测出价，日预算按全天预测单量）"""
+        now = now or datetime.now()
+        period = self.get_current_period(now)
+        forecast = self.load_forecast(now)
+        if forecast:
+            bid_config = self.get_forecast_bid_config(forecast, now)
+            self.daily_budget = self.calculate_budget(forecast["total"], forecast["avg_order_value"] or 25)
+        else:
+            bid_config = self.get_bid_config(period)
+        
+        # 推广调整频率受 防限制规则 约束：只有真正改动出价/预算的调用占用额度，
+        # 暂停推广和出价未变时不消耗；额度用完时不再调用接口
+        target = self.target_bid(bid_config)
+        if bid_config["bid_multiplier"] == 0:
+            result = self.simulate_api_call(bid_config, period)
+        elif target == self.last_applied():
+            result = {
+                "action": "KEEP",
+                "message": f"[{period.value}] 出价{target[0]}元、预算{target[1]}元未变，无需调整",
+                "bid": target[0],
+                "budget": target[1],
+                "period": period.value
+            }
+        else:
+            try:
+                get_client("eleme").acquire("promotion", block=False)
+            except RateLimitExceeded as e:
+                result = {
+                    "action": "SKIP",
+                    "message": f"[{period.value}] {e}",
+                    "bid": 0,
+                    "budget": 0,
+                    "period": period.value
+                }
+            else:
+                result = self.simulate_api_call(bid_config, period)
         
         # 记录日志
         self.log_adjustment(result)
@@ -175,7 +265,7 @@ class PromotionAutoManager:
         
         return {
             "date": today,
-            "total_adjustments": len(adjustments),
+            "total_adjustments": sum(1 for a in adjustments if a.get("action") != "KEEP"),
             "last_action": adjustments[-1].get("action", ""),
             "current_bid": adjustments[-1].get("bid", 0),
             "history": adjustments[-5:]  # 最近5条
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+饿了么订单多维查询（OLAP group-by）
+声明式指定 维度 × 过滤 × 度量，引擎自动选择执行方式：
+    cube    只用到小时级维度/度量且时间范围按小时对齐 → 查汇总立方体 order_cube
+    orders  需要订单级字段（满减/金额分档等）→ 按 order_time 索引取范围内的列
+    items   需要菜品维度/度量 → 订单 JOIN 菜品
+取回的列转成 NumPy 数组，维度编码后合成分组键，bincount 一次算出全部度量
+
+度量按过滤后的全部订单计算（只看完成订单时加 --status 已完成）；
+rating / delivery 与报告口径一致，只对完成订单求平均；delivery_bucket 不含配送时长缺失的订单；
+菜品查询每行是 订单×菜品，订单级度量（orders/revenue/rating/...）在每个分组内按订单去重，
+按菜品分组时 orders 即含该菜品的订单数，不按菜品分组时与订单查询结果相同
+
+使用方法:
+    python3 ele_me_query.py --by item,period,area --measures orders,quantity --status 已完成 --limit 20
+    python3 ele_me_query.py --by weekday,hour --measures orders,canceled,cancel_rate
+    python3 ele_me_query.py --by discount_bucket --measures orders,revenue,avg_value --start 2026-09-01
+    python3 ele_me_query.py --by area --sort revenue --explain
+"""
+
+import argparse
+import json
+import re
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from ele_me_aggregator import CANCELED, COMPLETED
+from ele_me_calendar import PeriodCalendar, load_calendar
+from ele_me_order_db import OrderDB
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+# 执行方式（数值越大需要的数据越细）
+PLAN_CUBE, PLAN_ORDERS, PLAN_ITEMS = 0, 1, 2
+PLAN_NAMES = ("cube", "orders", "items")
+
+WEEKDAY_LABELS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+# 分档维度：字段 → (分档边界, 标签)
+BUCKETS = {
+    "discount_bucket": ("discount", [0.01, 5, 10, 20], ["无满减", "¥0-5", "¥5-10", "¥10-20", "¥20+"]),
+    "amount_bucket": ("revenue", [20, 30, 50, 80], ["<¥20", "¥20-30", "¥30-50", "¥50-80", "¥80+"]),
+    "delivery_bucket": ("delivery_sum", [30, 45, 60], ["<30分钟", "30-45分钟", "45-60分钟", "60分钟+"]),
+}
+
+# 维度 → 最低执行方式
+DIMENSIONS = {
+    "date": PLAN_CUBE,
+    "weekday": PLAN_CUBE,
+    "hour": PLAN_CUBE,
+    "period": PLAN_CUBE,
+    "area": PLAN_CUBE,
+    "status": PLAN_CUBE,
+    "shop": PLAN_CUBE,
+    "discount_bucket": PLAN_ORDERS,
+    "amount_bucket": PLAN_ORDERS,
+    "delivery_bucket": PLAN_ORDERS,
+    "item": PLAN_ITEMS,
+}
+
+# 度量 → 最低执行方式
+MEASURES = {
+    "orders": PLAN_CUBE,
+    "completed": PLAN_CUBE,
+    "canceled": PLAN_CUBE,
+    "cancel_rate": PLAN_CUBE,
+    "revenue": PLAN_CUBE,
+    "avg_value": PLAN_CUBE,
+    "rating": PLAN_CUBE,
+    "delivery": PLAN_CUBE,
+    "discount": PLAN_ORDERS,
+    "quantity": PLAN_ITEMS,
+    "item_revenue": PLAN_ITEMS,
+}
+
+# 可直接求和的基础列（比率类度量由它们推出）
+_SUMS = ("n", "completed", "canceled", "revenue", "rating_sum", "delivery_sum", "discount",
+         "quantity", "item_revenue")
+
+# 菜品级基础列（其余为订单级，菜品查询中每个分组内每单只计一次）
+_ITEM_SUMS = ("quantity", "item_revenue")
+
+_ITEM_SOURCE = "orders o LEFT JOIN order_items i ON i.order_id = o.order_id"
+
+_HOUR_START = re.compile(r"(:00(:00(\.0+)?)?)?")
+_HOUR_END = re.compile(r":59:59(\.9+)?")
+
+
+def normalize_range(start: str = None, end: str = None):
+    """只给日期时补全为整天（end 含当天）"""
+    if start is not None and len(start) == 10:
+        start = f"{start}T00:00:00"
+    if end is not None and len(end) == 10:
+        end = f"{end}T23:59:59.999999"
+    return start, end
+
+
+def hour_aligned(start: str = None, end: str = None) -> bool:
+    """时间范围是否与立方体的小时粒度对齐"""
+    return ((start is None or _HOUR_START.fullmatch(start[13:]) is not None)
+            and (end is None or _HOUR_END.fullmatch(end[13:]) is not None))
+
+
+class QueryEngine:
+    """订单库上的多维分组查询"""
+
+    def __init__(self, db: OrderDB = None, data_dir: str = None):
+        self.db = db or OrderDB(data_dir=data_dir or DATA_DIR)
+
+    # ==================== 计划 ====================
+
+    def plan(self, group_by: Sequence[str], measures: Sequence[str], start: str = None, end: str = None) -> int:
+        """选择能回答查询的最粗粒度数据源"""
+        for name in group_by:
+            if name not in DIMENSIONS:
+                raise ValueError(f"未知维度: {name}（可选: {', '.join(DIMENSIONS)}）")
+        for name in measures:
+            if name not in MEASURES:
+                raise ValueError(f"未知度量: {name}（可选: {', '.join(MEASURES)}）")
+
+        plan = max([DIMENSIONS[d] for d in group_by] + [MEASURES[m] for m in measures] + [PLAN_CUBE])
+        if plan == PLAN_CUBE and not hour_aligned(start, end):
+            plan = PLAN_ORDERS
+        return plan
+
+    # ==================== 取数 ====================
+
+    def _fetch_cube(self, group_by, start, end, status, area, shop_id) -> Dict[str, np.ndarray]:
+        """立方体按所需维度在 SQL 中预聚合"""
+        keys = ["status"]
+        if {"date", "weekday", "period"} & set(group_by):
+            keys.append("day")                                  # 时段随日类型变化
+        if {"hour", "period"} & set(group_by):
+            keys.append("hour")
+        if "area" in group_by:
+            keys.append("area")
+        if "shop" in group_by:
+            keys.append("shop_id")
+
+        where, params = self.db._cube_where(start, end, shop_id, status, area)
+        rows = self.db.conn.execute(
+            f"SELECT {', '.join(keys)}, SUM(order_count), SUM(revenue), SUM(rating_sum), SUM(delivery_sum)"
+            f" FROM order_cube{where} GROUP BY {', '.join(keys)}", params).fetchall()
+
+        values = list(zip(*rows)) if rows else [()] * (len(keys) + 4)
+        facts = {key: np.array(col, dtype=object) for key, col in zip(keys, values)}
+        for name, col in zip(("n", "revenue", "rating_sum", "delivery_sum"), values[len(keys):]):
+            facts[name] = np.array(col, dtype=np.float64)
+        if "day" in facts:
+            facts["day"] = facts["day"].astype("datetime64[D]")
+        if "hour" in facts:
+            facts["hour"] = facts["hour"].astype(np.int64)
+        return facts
+
+    def _fetch_orders(self, plan, group_by, measures, start, end, status, area, shop_id) -> Dict[str, np.ndarray]:
+        """按 order_time 索引取范围内订单的列，只取查询用到的列（菜品查询每行为 订单×菜品）"""
+        wanted = set(group_by) | set(measures)
+        fields = {"status": "o.status"}
+        if wanted & {"date", "weekday", "hour", "period"}:
+            fields["order_time"] = "o.order_time"
+        if wanted & {"revenue", "avg_value", "amount_bucket"}:
+            fields["revenue"] = "o.total_amount"
+        if "rating" in wanted:
+            fields["rating_sum"] = "o.customer_rating"
+        if wanted & {"delivery", "delivery_bucket"}:
+            fields["delivery_sum"] = "o.delivery_time_minutes"
+        if "area" in wanted:
+            fields["area"] = "o.address_area"
+        if "shop" in wanted:
+            fields["shop_id"] = "o.shop_id"
+        if wanted & {"discount", "discount_bucket"}:
+            fields["discount"] = "o.discount"
+        source = "orders o"
+        if plan == PLAN_ITEMS:
+            fields.update({"order_id": "o.order_id", "item": "i.name", "quantity": "i.quantity",
+                           "item_revenue": "i.quantity * i.price"})
+            source = _ITEM_SOURCE
+
+        where, params = self.db._where(start, end, status, area, shop_id, alias="o.")
+        rows = self.db.conn.execute(f"SELECT {', '.join(fields.values())} FROM {source}{where}", params).fetchall()
+        values = dict(zip(fields, zip(*rows))) if rows else dict.fromkeys(fields, ())
+
+        facts = {"n": np.ones(len(rows))}
+        for name, col in values.items():
+            if name == "order_time":
+                order_time = facts["order_time"] = np.array(col, dtype="datetime64[s]")
+                facts["day"] = order_time.astype("datetime64[D]")
+                facts["hour"] = (order_time - facts["day"]).astype("timedelta64[h]").astype(np.int64)
+            elif name in ("status", "area", "shop_id", "item", "order_id"):
+                facts[name] = np.array(col, dtype=object)
+            else:
+                values = np.array(col, dtype=np.float64)
+                if name == "delivery_sum":
+                    facts["delivery_known"] = ~np.isnan(values)
+                facts[name] = np.nan_to_num(values)
+        return facts
+
+    # ==================== 分组 ====================
+
+    @staticmethod
+    def _encode(name: str, facts: Dict[str, np.ndarray], calendar: PeriodCalendar):
+        """维度 → (整数编码, 标签列表)；有固定顺序的维度按自然顺序编码，时段按店铺日历"""
+        if name == "hour":
+            return facts["hour"], [f"{h:02d}:00" for h in range(24)]
+        if name == "period":
+            if "order_time" in facts:
+                return calendar.bucket(facts["order_time"]), calendar.labels
+            return calendar.bucket_hours(facts["day"], facts["hour"]), calendar.labels
+        if name == "weekday":
+            return (facts["day"].astype(np.int64) + 3) % 7, WEEKDAY_LABELS    # 1970-01-01 为周四
+        if name in BUCKETS:
+            column, edges, labels = BUCKETS[name]
+            return np.digitize(facts[column], edges), labels
+        if name == "date":
+            labels, codes = np.unique(facts["day"], return_inverse=True)
+            return codes, [str(d) for d in labels]
+
+        column = {"shop": "shop_id"}.get(name, name)
+        values = facts[column]
+        fallback = "未知" if name in ("area", "item") else "-"
+        values = np.array([fallback if v is None or v == "" else v for v in values], dtype=object)
+        labels, codes = np.unique(values.astype(str), return_inverse=True)
+        return codes, labels.tolist()
+
+    def query(self, group_by: Sequence[str], measures: Sequence[str] = ("orders", "revenue"),
+              start: str = None, end: str = None, status: str = None, area: str = None, shop_id: str = None,
+              order_by: str = None, descending: bool = True, limit: int = None) -> Dict[str, Any]:
+        """分组查询，返回 {plan, rows, seconds}；rows 为 [{维度..., 度量...}]"""
+        began = time.perf_counter()
+        group_by, measures = list(group_by), list(measures)
+        start, end = normalize_range(start, end)
+        plan = self.plan(group_by, measures, start, end)
+
+        if plan == PLAN_CUBE:
+            facts = self._fetch_cube(group_by, start, end, status, area, shop_id)
+        else:
+            facts = self._fetch_orders(plan, group_by, measures, start, end, status, area, shop_id)
+        known = facts.pop("delivery_known", None)
+        if "delivery_bucket" in group_by:
+            facts = {name: values[known] for name, values in facts.items()}   # 配送时长缺失的订单不分档
+        n = facts["n"]
+        completed = facts["status"] == COMPLETED
+        facts["completed"] = n * completed
+        facts["canceled"] = n * (facts["status"] == CANCELED)
+
+        # 各维度编码合成一个分组键
+        calendar = load_calendar(shop_id)
+        encoded = [self._encode(name, facts, calendar) for name in group_by]
+
+        # 评分/配送只累计完成订单（取消、未评价的订单缺失值按 0 存储，不能拉低均值）
+        for name in ("rating_sum", "delivery_sum"):
+            if name in facts:
+                facts[name] = facts[name] * completed
+        if encoded:
+            flat = np.ravel_multi_index([codes for codes, _ in encoded], [len(labels) for _, labels in encoded])
+            keys, groups = np.unique(flat, return_inverse=True)
+        else:
+            keys, groups = np.zeros(1, dtype=np.int64), np.zeros(len(n), dtype=np.int64)
+        size = len(keys) if len(n) else 0
+
+        # 菜品查询：订单级列在每个分组内只取该订单的第一行
+        once = self._first_per_order(groups, facts["order_id"]) if "order_id" in facts else 1
+        sums = {name: np.bincount(groups, weights=facts[name] * (1 if name in _ITEM_SUMS else once),
+                                  minlength=size)[:size]
+                for name in _SUMS if name in facts}
+        coords = np.unravel_index(keys[:size], [len(labels) for _, labels in encoded]) if encoded else []
+
+        rows = []
+        for g in range(size):
+            row = {name: labels[int(coords[i][g])] for i, (name, (_, labels)) in enumerate(zip(group_by, encoded))}
+            for m in measures:
+                row[m] = self._measure(m, sums, g)
+            rows.append(row)
+
+        if order_by:
+            if order_by not in measures and order_by not in group_by:
+                raise ValueError(f"排序字段不在查询中: {order_by}")
+            rows.sort(key=lambda r: r[order_by], reverse=descending)
+        if limit:
+            rows = rows[:limit]
+
+        return {"plan": PLAN_NAMES[plan], "rows": rows, "seconds": round(time.perf_counter() - began, 4)}
+
+    @staticmethod
+    def _first_per_order(groups: np.ndarray, order_ids: np.ndarray) -> np.ndarray:
+        """每个 (分组, 订单) 的第一行为 1，其余为 0"""
+        _, orders = np.unique(order_ids.astype(str), return_inverse=True)
+        _, first = np.unique(groups * (orders.max(initial=0) + 1) + orders, return_index=True)
+        once = np.zeros(len(groups))
+        once[first] = 1
+        return once
+
+    @staticmethod
+    def _measure(name: str, sums: Dict[str, np.ndarray], g: int):
+        count = sums["n"][g]
+        if name == "orders":
+            return int(count)
+        if name in ("completed", "canceled"):
+            return int(sums[name][g])
+        if name == "cancel_rate":
+            return round(sums["canceled"][g] / count * 100, 1) if count else 0.0
+        if name == "avg_value":
+            return round(sums["revenue"][g] / count, 2) if count else 0.0
+        completed = sums["completed"][g]
+        if name == "rating":
+            return round(sums["rating_sum"][g] / completed, 2) if completed else 0.0
+        if name == "delivery":
+            return round(sums["delivery_sum"][g] / completed, 1) if completed else 0.0
+        if name == "quantity":
+            return int(sums["quantity"][g])
+        return round(float(sums[name][g]), 2)
+
+    def explain(self, group_by: Sequence[str], measures: Sequence[str], start: str = None, end: str = None,
+                status: str = None, area: str = None, shop_id: str = None) -> List[str]:
+        """SQLite 对取数语句的执行计划（确认命中时间索引）"""
+        start, end = normalize_range(start, end)
+        plan = self.plan(group_by, measures, start, end)
+        if plan == PLAN_CUBE:
+            where, params = self.db._cube_where(start, end, shop_id, status, area)
+            sql = f"SELECT * FROM order_cube{where}"
+        else:
+            where, params = self.db._where(start, end, status, area, shop_id, alias="o.")
+            source = _ITEM_SOURCE if plan == PLAN_ITEMS else "orders o"
+            sql = f"SELECT * FROM {source}{where}"
+        return [f"{PLAN_NAMES[plan]}: {row[-1]}" for row in self.db.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def print_rows(rows: List[Dict[str, Any]]):
+    """对齐打印结果表"""
+    if not rows:
+        print("   （无数据）")
+        return
+    headers = list(rows[0].keys())
+    widths = [max(len(str(h)), *(len(str(r[h])) for r in rows)) for h in headers]
+    print("   " + "  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("   " + "  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么订单多维查询")
+    parser.add_argument("--by", type=str, default="", help=f"分组维度，逗号分隔（{', '.join(DIMENSIONS)}）")
+    parser.add_argument("--measures", type=str, default="orders,revenue",
+                        help=f"度量，逗号分隔（{', '.join(MEASURES)}）")
+    parser.add_argument("--start", type=str, help="起始时间（YYYY-MM-DD 或 ISO 时间）")
+    parser.add_argument("--end", type=str, help="结束时间（只给日期时含当天）")
+    parser.add_argument("--status", type=str, help="订单状态过滤，如 已完成")
+    parser.add_argument("--area", type=str, help="区域过滤")
+    parser.add_argument("--shop-id", type=str, help="店铺过滤")
+    parser.add_argument("--sort", type=str, help="按度量/维度排序（降序）")
+    parser.add_argument("--asc", action="store_true", help="升序排序")
+    parser.add_argument("--limit", type=int, help="只显示前N行")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    parser.add_argument("--explain", action="store_true", help="显示执行方式和 SQL 执行计划")
+    args = parser.parse_args()
+
+    group_by = [d for d in args.by.split(",") if d]
+    measures = [m for m in args.measures.split(",") if m]
+    filters = {"start": args.start, "end": args.end, "status": args.status, "area": args.area,
+               "shop_id": args.shop_id}
+
+    engine = QueryEngine()
+    try:
+        result = engine.query(group_by, measures, order_by=args.sort, descending=not args.asc,
+                              limit=args.limit, **filters)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    print("=" * 60)
+    print(f"🔎 订单多维查询（{' × '.join(group_by) or '全部'}）")
+    print("=" * 60)
+    print_rows(result["rows"])
+    print(f"\n⏱️ {len(result['rows'])}行, {result['seconds'] * 1000:.1f}ms（{result['plan']}）")
+    if args.explain:
+        for line in engine.explain(group_by, measures, **filters):
+            print(f"   📋 {line}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
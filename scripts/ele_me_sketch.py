@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+饿了么分位数草图（KLL）
+配送时长、客单价只看均值会掩盖长尾（差评多来自最慢的那 10% 订单）。
+KLL 草图流式接收数值，内存有上界（约 3k + 缓冲 个数），可跨天/跨店铺合并，
+不保存也不排序原始值即可给出 p50/p90/p99
+
+    KLLSketch       单个数值序列的草图
+    OrderSketches   按 全部/时段/区域 分组的 配送时长 与 客单价 草图（融合统计的一部分）
+
+使用方法:
+    python3 ele_me_sketch.py --bench --orders 1000000   # 与精确分位数对比误差和内存
+"""
+
+import argparse
+import json
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_K = 200                   # 顶层容量，误差约 1.7/k（k=200 时秩误差约 1%）
+GROUP_K = 100                     # 分组草图用较小的 k，控制统计文件体积
+MIN_CAPACITY = 8
+BUFFER = 512                      # 第 0 层额外缓冲，攒够再排序压缩（摊薄逐个追加的开销）
+PENDING_SIZE = 2048               # OrderSketches 逐单追加时每组攒批的上限
+DECAY = 2 / 3                     # 逐层容量衰减
+QUANTILES = (0.5, 0.9, 0.99)
+
+ALL = "全部"
+
+
+class KLLSketch:
+    """KLL 分位数草图（可合并，内存 O(k)）"""
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]      # 第 h 层每个值代表 2^h 个原始值
+        self._size = 0                             # 各层数值总数
+        self._max_size = self._total_capacity()
+        self._flips = 0                            # 压缩时交替取奇/偶位置，保持无偏
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - h - 1
+        return max(MIN_CAPACITY, math.ceil(self.k * DECAY ** depth))
+
+    def _total_capacity(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels))) + BUFFER
+
+    def _compress(self):
+        """惰性压缩：总数超出总容量时，把最低的超容量层两两合一推到上一层"""
+        while self._size >= self._max_size:
+            h = next(h for h, level in enumerate(self.levels)
+                     if len(level) >= self._capacity(h) + (BUFFER if h == 0 else 0))
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+            level = sorted(self.levels[h])
+            # 奇数个时留一个在本层，总权重保持不变
+            keep = [level.pop()] if len(level) % 2 else []
+            promoted = level[self._flips & 1::2]
+            self._flips += 1
+            self.levels[h + 1].extend(promoted)
+            self.levels[h] = keep
+            self._size -= len(level) - len(promoted)
+            self._max_size = self._total_capacity()
+
+    def update(self, value: float):
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]):
+        """批量追加；大批 NumPy 数组先整体排序，逐层隔位抽取到容量以内再放入对应层"""
+        h = 0
+        if hasattr(values, "tolist"):
+            self.n += len(values)
+            if len(values) > self.k:
+                values = values.copy()
+                values.sort()
+                while len(values) > self.k:
+                    if len(values) % 2:
+                        self._put(h, values[-1:].tolist())
+                        values = values[:-1]
+                    values = values[self._flips & 1::2]
+                    self._flips += 1
+                    h += 1
+            values = values.tolist()
+        else:
+            values = list(values)
+            self.n += len(values)
+        self._put(h, values)
+        self._compress()
+
+    def _put(self, h: int, values: List[float]):
+        while len(self.levels) <= h:
+            self.levels.append([])
+        self.levels[h].extend(values)
+        self._size += len(values)
+        self._max_size = self._total_capacity()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, level in enumerate(other.levels):
+            self.levels[h].extend(level)
+        self.n += other.n
+        self._size += other.size
+        self._max_size = self._total_capacity()
+        self._compress()
+        return self
+
+    def quantiles(self, qs: Iterable[float] = QUANTILES) -> List[Optional[float]]:
+        """按秩估计分位数（空草图返回 None）"""
+        qs = list(qs)
+        if not self.n:
+            return [None] * len(qs)
+
+        weighted = sorted((value, 1 << h) for h, level in enumerate(self.levels) for value in level)
+        total = sum(w for _, w in weighted)
+        result, cumulative, i = [], 0, 0
+        for q in qs:
+            target = q * total
+            while i < len(weighted) - 1 and cumulative + weighted[i][1] < target:
+                cumulative += weighted[i][1]
+                i += 1
+            result.append(weighted[i][0])
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    @property
+    def size(self) -> int:
+        """实际保存的数值个数"""
+        return sum(len(level) for level in self.levels)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "n": self.n, "levels": [[round(v, 2) for v in level] for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [list(level) for level in data["levels"]] or [[]]
+        sketch._size = sketch.size
+        sketch._max_size = sketch._total_capacity()
+        return sketch
+
+
+class OrderSketches:
+    """完成订单的 配送时长/客单价 草图，按 全部、时段、区域 分组"""
+
+    METRICS = ("delivery", "value")
+
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, KLLSketch]] = {metric: {} for metric in self.METRICS}
+        self._pending: Dict[str, tuple] = {}          # 逐单追加的待灌入值 {分组: ([客单价], [配送时长])}
+
+    def _sketch(self, metric: str, group: str) -> KLLSketch:
+        sketches = self.groups[metric]
+        sketch = sketches.get(group)
+        if sketch is None:
+            sketch = sketches[group] = KLLSketch(DEFAULT_K if group == ALL else GROUP_K)
+        return sketch
+
+    def add(self, period: str, area: str, amount: float, delivery: Optional[float]):
+        """累加一个完成订单（delivery 缺失时只计客单价）；先攒批，满 PENDING_SIZE 再灌入草图"""
+        for group in (ALL, period, area):
+            pending = self._pending.get(group)
+            if pending is None:
+                pending = self._pending[group] = ([], [])
+            pending[0].append(amount)
+            if delivery is not None:
+                pending[1].append(delivery)
+            if len(pending[0]) >= PENDING_SIZE:
+                self._flush(group)
+
+    def add_many(self, group: str, amounts, deliveries):
+        """批量累加同一分组的完成订单（列式计算用，分组由调用方划分）"""
+        self._sketch("value", group).update_many(amounts)
+        if len(deliveries):
+            self._sketch("delivery", group).update_many(deliveries)
+
+    def _flush(self, group: str = None):
+        for group in [group] if group else list(self._pending):
+            amounts, deliveries = self._pending.pop(group)
+            self.add_many(group, amounts, deliveries)
+
+    def merge(self, other: "OrderSketches") -> "OrderSketches":
+        self._flush()
+        other._flush()
+        for metric, sketches in other.groups.items():
+            for group, sketch in sketches.items():
+                mine = self.groups[metric].get(group)
+                if mine is None:
+                    self.groups[metric][group] = KLLSketch.from_dict(sketch.to_dict())
+                else:
+                    mine.merge(sketch)
+        return self
+
+    def __bool__(self) -> bool:
+        return bool(self.groups["value"] or self._pending)
+
+    def percentiles(self, metric: str, group: str = ALL) -> Optional[Dict[str, float]]:
+        """{p50, p90, p99}（该组无数据返回 None）"""
+        self._flush()
+        sketch = self.groups[metric].get(group)
+        if sketch is None or not sketch.n:
+            return None
+        return {f"p{round(q * 100)}": round(v, 1) for q, v in zip(QUANTILES, sketch.quantiles(QUANTILES))}
+
+    def table(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """报告用的分位数表 {配送时长/客单价: {分组: {p50, p90, p99}}}"""
+        self._flush()
+        names = {"delivery": "delivery_time", "value": "order_value"}
+        return {names[metric]: {group: self.percentiles(metric, group) for group in sketches}
+                for metric, sketches in self.groups.items() if sketches}
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._flush()
+        return {metric: {group: sketch.to_dict() for group, sketch in sketches.items()}
+                for metric, sketches in self.groups.items()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "OrderSketches":
+        sketches = cls()
+        for metric, groups in (data or {}).items():
+            sketches.groups[metric] = {group: KLLSketch.from_dict(d) for group, d in groups.items()}
+        return sketches
+
+
+def run_benchmark(count: int):
+    """草图分位数 vs 精确分位数"""
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    # 配送时长：对数正态，带长尾
+    values = np.round(rng.lognormal(mean=3.4, sigma=0.35, size=count), 1)
+
+    print("=" * 60)
+    print(f"📐 KLL 分位数草图（{count}个配送时长）")
+    print("=" * 60)
+
+    began = time.perf_counter()
+    sketch = KLLSketch()
+    for chunk in np.array_split(values, max(1, count // 10000)):
+        sketch.update_many(chunk)
+    secs = time.perf_counter() - began
+
+    # 分 30 天构建后合并，结果应同样准确
+    merged = KLLSketch()
+    for chunk in np.array_split(values, 30):
+        part = KLLSketch()
+        part.update_many(chunk)
+        merged.merge(part)
+
+    exact = np.quantile(values, QUANTILES)
+    ordered = np.sort(values)
+    for q, e, s, m in zip(QUANTILES, exact, sketch.quantiles(), merged.quantiles()):
+        errors = [abs(np.searchsorted(ordered, v) / count - q) * 100 for v in (s, m)]
+        print(f"   p{round(q * 100)}: 精确 {e:.1f}  草图 {s:.1f}  合并 {m:.1f}"
+              f"  (秩误差 {errors[0]:.2f}% / {errors[1]:.2f}%)")
+    print(f"   保存数值: {sketch.size}个（原始 {count}个）, 序列化 {len(json.dumps(sketch.to_dict())) / 1024:.1f}KB")
+    print(f"   构建耗时: {secs * 1000:.0f}ms")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么分位数草图")
+    parser.add_argument("--bench", action="store_true", help="与精确分位数对比")
+    parser.add_argument("--orders", type=int, default=1000000, help="对比用数值个数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.orders)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
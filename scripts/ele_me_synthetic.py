@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+饿了么合成订单生成器（NumPy 向量化）
+按 CORE_STRATEGY.json 的高峰时段构造小时需求曲线，叠加取消率、客单菜品数、
+区域分布和满减规则，秒级生成百万级订单，直接写入列式存档/JSONL/订单库，
+用于 10×/100× 量级下的 下载→分析→AI提示词 全流程压测
+
+使用方法:
+    python3 ele_me_synthetic.py --shops 5 --days 30 --orders-per-day 2000 --format npz
+    python3 ele_me_synthetic.py --bench --scale 100     # 端到端压测（当前量级的100倍）
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
+
+# 当前单店日均订单（ElemeOrderDownloader 模拟数据量级）
+CURRENT_DAILY_ORDERS = 25
+
+# 高峰时段需求倍数（相对平峰）
+PEAK_WEIGHTS = {"早餐高峰": 2.0, "午餐高峰": 4.0, "晚餐高峰": 3.5, "夜宵高峰": 2.0}
+OPEN_WEIGHT = 1.0       # 营业平峰
+CLOSED_WEIGHT = 0.05    # 凌晨
+OPEN_HOURS = (7, 24)
+
+CANCEL_RATE = 0.08
+PEAK_CANCEL_BOOST = 1.5   # 高峰期取消率放大
+BASKET_MEAN = 2.2         # 平均每单菜品数
+AREA_MIX = {"浦东新区": 0.35, "徐汇区": 0.25, "静安区": 0.2, "长宁区": 0.2}
+DELIVERY_FEES = (3, 4, 5)
+RATING_PROBS = (0.02, 0.02, 0.06, 0.2, 0.7)   # 1~5 星
+
+# 菜单：(菜名, 单价, 热度)
+MENU = [
+    ("招牌炒饭", 18, 10), ("宫保鸡丁饭", 22, 8), ("红烧牛肉面", 26, 7), ("酸辣土豆丝", 12, 5),
+    ("可乐", 3, 9), ("卤蛋", 2, 6), ("米饭", 2, 6), ("豆浆", 4, 4), ("鲜肉包", 3, 4), ("烤串", 5, 3),
+]
+
+# 满减：(门槛, 减免)，按门槛从高到低匹配
+FULL_REDUCTION = [(80, 15), (50, 8), (35, 5)]
+
+
+def demand_curve_from_strategy(strategy: Dict, peak_weights: Dict[str, float] = None) -> np.ndarray:
+    """由 时间策略 构造 24 小时需求概率曲线"""
+    peak_weights = peak_weights or PEAK_WEIGHTS
+    curve = np.full(24, CLOSED_WEIGHT)
+    curve[OPEN_HOURS[0]:OPEN_HOURS[1]] = OPEN_WEIGHT
+
+    for name, window in strategy.get("时间策略", {}).items():
+        start, end = (int(t.split(":")[0]) for t in window.split("-"))
+        curve[start:end] = np.maximum(curve[start:end], peak_weights.get(name, OPEN_WEIGHT))
+
+    return curve / curve.sum()
+
+
+class SyntheticOrderGenerator:
+    """向量化合成订单生成"""
+
+    def __init__(self, shops: int = 1, days: int = 3, orders_per_day: int = CURRENT_DAILY_ORDERS,
+                 start_date: datetime = None, seed: int = 42, hourly_curve: Sequence[float] = None,
+                 cancel_rate: float = CANCEL_RATE, basket_mean: float = BASKET_MEAN,
+                 area_mix: Dict[str, float] = None):
+        self.shops = shops
+        self.days = days
+        self.orders_per_day = orders_per_day
+        self.start_date = (start_date or datetime.now() - timedelta(days=days)).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        self.rng = np.random.default_rng(seed)
+        self.cancel_rate = cancel_rate
+        self.basket_mean = basket_mean
+
+        if hourly_curve is None:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                hourly_curve = demand_curve_from_strategy(json.load(f))
+        self.hourly_curve = np.asarray(hourly_curve, dtype=np.float64) / np.sum(hourly_curve)
+
+        area_mix = area_mix or AREA_MIX
+        self.areas = np.array(list(area_mix.keys()))
+        self.area_probs = np.array(list(area_mix.values())) / sum(area_mix.values())
+
+        self.menu_names = np.array([m[0] for m in MENU])
+        self.menu_prices = np.array([m[1] for m in MENU], dtype=np.float64)
+        self.menu_probs = np.array([m[2] for m in MENU], dtype=np.float64)
+        self.menu_probs /= self.menu_probs.sum()
+
+    def shop_ids(self) -> List[str]:
+        return [f"shop{i + 1:03d}" for i in range(self.shops)]
+
+    def generate_shop(self, shop_id: str) -> Dict[str, np.ndarray]:
+        """生成一个店铺的订单列（ele_me_columnar 列布局，按下单时间排序）"""
+        rng = self.rng
+
+        # 每天订单数 ~ Poisson，店铺间规模有差异
+        shop_scale = rng.uniform(0.6, 1.4)
+        daily = rng.poisson(self.orders_per_day * shop_scale, size=self.days)
+        n = int(daily.sum())
+
+        day = np.repeat(np.arange(self.days), daily)
+        hour = rng.choice(24, size=n, p=self.hourly_curve)
+        seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, size=n)
+        order = np.argsort(seconds, kind="stable")
+        seconds, hour = seconds[order], hour[order]
+        order_time = np.datetime64(self.start_date, "us") + seconds.astype("timedelta64[s]")
+
+        # 高峰时段：取消率和配送时长上浮
+        is_peak = self.hourly_curve[hour] > self.hourly_curve.mean() * 1.5
+        cancel_p = np.where(is_peak, self.cancel_rate * PEAK_CANCEL_BOOST, self.cancel_rate)
+        canceled = rng.random(n) < cancel_p
+
+        # 菜品：每单 1 + Poisson(basket_mean - 1) 个
+        basket = 1 + rng.poisson(max(self.basket_mean - 1, 0), size=n)
+        offsets = np.concatenate(([0], np.cumsum(basket))).astype(np.int32)
+        item_code = rng.choice(len(MENU), size=int(offsets[-1]), p=self.menu_probs)
+        item_qty = 1 + (rng.random(len(item_code)) < 0.15).astype(np.int32)
+        item_price = self.menu_prices[item_code]
+        subtotal = np.add.reduceat(item_price * item_qty, offsets[:-1]) if n else np.zeros(0)
+
+        # 满减 + 配送费
+        discount = np.select([subtotal >= t for t, _ in FULL_REDUCTION],
+                             [float(r) for _, r in FULL_REDUCTION], default=0.0)
+        delivery_fee = rng.choice(np.array(DELIVERY_FEES, dtype=np.float64), size=n)
+
+        delivery = rng.normal(28, 6, size=n) + np.where(is_peak, 8, 0)
+        delivery = np.clip(np.rint(delivery), 10, 90).astype(np.int32)
+
+        rating = rng.choice(np.arange(1, 6), size=n, p=RATING_PROBS).astype(np.float32)
+        rating = np.where(delivery > 45, np.maximum(rating - 1, 1), rating).astype(np.float32)
+
+        status_dict = np.array(["已取消", "已完成"])
+        seq = np.char.zfill(np.arange(1, n + 1).astype(str), 8)
+
+        return {
+            "order_id": np.char.add(f"EM{shop_id.upper()}", seq),
+            "order_time": order_time,
+            "status": (~canceled).astype(np.uint8),
+            "status_dict": status_dict,
+            "address_area": rng.choice(len(self.areas), size=n, p=self.area_probs).astype(np.uint8),
+            "address_area_dict": self.areas,
+            "total_amount": np.round(subtotal - discount + delivery_fee, 2),
+            "delivery_fee": delivery_fee,
+            "discount": discount,
+            "customer_rating": rating,
+            "delivery_time_minutes": delivery,
+            "item_offsets": offsets,
+            "item_name": item_code.astype(np.uint8),
+            "item_name_dict": self.menu_names,
+            "item_quantity": item_qty,
+            "item_price": item_price,
+        }
+
+    def iter_shops(self) -> Iterator[Tuple[str, Dict[str, np.ndarray]]]:
+        """逐店铺产出 (shop_id, 列数组)，内存只保留一个店铺"""
+        for shop_id in self.shop_ids():
+            yield shop_id, self.generate_shop(shop_id)
+
+
+# ==================== 输出 ====================
+
+def write_shop(columns: Dict[str, np.ndarray], shop_id: str, fmt: str, data_dir: str = DATA_DIR) -> str:
+    """写入一个店铺的合成订单，并登记到数据清单"""
+    from ele_me_columnar import iter_orders_from_columns, save_columnar
+    from ele_me_manifest import DataManifest
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    n = len(columns["order_id"])
+    bounds = np.datetime_as_string(columns["order_time"][[0, -1]], unit="s") if n else [None, None]
+
+    if fmt == "db":
+        from ele_me_order_db import OrderDB
+        with OrderDB(data_dir=data_dir) as db:
+            db.upsert_orders(iter_orders_from_columns(columns), shop_id=shop_id)
+        return os.path.join(data_dir, "orders.db")
+
+    path = os.path.join(data_dir, f"orders_{timestamp}_{shop_id}.{fmt}")
+    if fmt == "npz":
+        save_columnar(None, path, columns=dict(columns))
+    else:
+        from ele_me_order_io import COMPRESSED_SUFFIX, JsonlOrderWriter
+        path += COMPRESSED_SUFFIX
+        with JsonlOrderWriter(path) as writer:
+            writer.write_all(iter_orders_from_columns(columns))
+
+    DataManifest(data_dir).register("orders", path, rows=n, shop_id=shop_id,
+                                    formats={fmt: path}, start_time=bounds[0], end_time=bounds[1])
+    return path
+
+
+def run_benchmark(scale: int, days: int, shops: int):
+    """端到端压测：逐店铺 生成 → 写存档 → 读取分析，合并后构建 AI 提示词"""
+    import tempfile
+
+    from ele_me_aggregator import OrderAggregate
+    from ele_me_columnar import load_columns, save_columnar
+    from ele_me_data_analysis import ElemeAnalyzer
+    from ele_me_deepseek_analysis import ElemeDeepSeekAnalyzer
+    from ele_me_metrics import aggregate_columns
+
+    orders_per_day = CURRENT_DAILY_ORDERS * scale
+    timings = dict.fromkeys(("生成", "写列式存档", "按列加载", "融合统计", "构建AI提示词"), 0.0)
+
+    print("=" * 60)
+    print(f"🏋️ 合成订单端到端压测（{scale}× 当前量级, {shops}个店铺）")
+    print("=" * 60)
+
+    total = OrderAggregate()
+    n = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = SyntheticOrderGenerator(shops=shops, days=days, orders_per_day=orders_per_day)
+        shop_iter = generator.iter_shops()
+        while True:
+            began = time.perf_counter()
+            shop = next(shop_iter, None)
+            timings["生成"] += time.perf_counter() - began
+            if shop is None:
+                break
+            shop_id, columns = shop
+            n += len(columns["order_id"])
+
+            began = time.perf_counter()
+            npz_path = os.path.join(tmp, f"orders_{shop_id}.npz")
+            save_columnar(None, npz_path, columns=dict(columns))
+            timings["写列式存档"] += time.perf_counter() - began
+            del columns
+
+            began = time.perf_counter()
+            load_columns(npz_path, ElemeAnalyzer.ORDER_COLUMNS)
+            timings["按列加载"] += time.perf_counter() - began
+
+            began = time.perf_counter()
+            agg = aggregate_columns(load_columns(npz_path, ElemeAnalyzer.ORDER_COLUMNS))
+            metrics = agg.report_metrics()
+            total.merge(agg)
+            timings["融合统计"] += time.perf_counter() - began
+            print(f"   {shop_id}: {agg.total}单, 完成 {metrics.get('completed_orders')}, "
+                  f"取消率 {metrics.get('cancellation_rate')}")
+
+        analyzer = ElemeDeepSeekAnalyzer()
+        began = time.perf_counter()
+        prompt = analyzer.prepare_analysis_data({}, analyzer.load_strategy(), metrics=total.deepseek_metrics())
+        timings["构建AI提示词"] += time.perf_counter() - began
+
+    metrics = total.report_metrics()
+    print(f"\n   店铺: {shops}  天数: {days}  订单: {n}  提示词: {len(prompt)}字符")
+    print(f"   完成订单: {metrics.get('completed_orders')}  取消率: {metrics.get('cancellation_rate')}")
+    for stage, seconds in timings.items():
+        print(f"   {stage}: {seconds:.3f}秒")
+    print(f"   合计: {sum(timings.values()):.3f}秒")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="饿了么合成订单生成器")
+    parser.add_argument("--shops", type=int, default=1, help="店铺数")
+    parser.add_argument("--days", type=int, default=3, help="天数")
+    parser.add_argument("--orders-per-day", type=int, default=CURRENT_DAILY_ORDERS, help="单店日均订单")
+    parser.add_argument("--format", choices=["npz", "jsonl", "db"], default="npz", help="输出格式")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--bench", action="store_true", help="端到端压测")
+    parser.add_argument("--scale", type=int, default=10, help="压测量级（当前日均订单的倍数）")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.scale, args.days, args.shops)
+        return
+
+    generator = SyntheticOrderGenerator(shops=args.shops, days=args.days,
+                                        orders_per_day=args.orders_per_day, seed=args.seed)
+
+    print("=" * 60)
+    print("🧪 合成订单生成")
+    print("=" * 60)
+
+    began = time.perf_counter()
+    total = 0
+    for shop_id, columns in generator.iter_shops():
+        path = write_shop(columns, shop_id, args.format)
+        total += len(columns["order_id"])
+        print(f"   {shop_id}: {len(columns['order_id'])}单 → {path}")
+
+    print(f"\n✅ 共 {total} 单, 耗时 {time.perf_counter() - began:.2f}秒")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 客户端
+所有平台接口与大模型调用统一走这里：
+  - 连接池复用（requests.Session + HTTPAdapter）
+  - 按接口的令牌桶限流（平台接口频率取自 CORE_STRATEGY.json 的 防限制规则）
+  - 指数退避 + 抖动重试（网络错误 / 429 / 5xx，遵守 Retry-After）
+  - 熔断器（连续失败后短路，冷却后半开试探）
+  - 每次调用的耗时记录与 p50/p90/p99 统计
+
+限流和熔断状态持久化到 data/http_state.json，cron 每次新进程启动也能延续。
+
+使用方法:
+    from http_client import get_client
+    response = get_client("deepseek").post(url, json=payload, timeout=60)
+
+    python3 http_client.py --stats        # 查看限流/熔断状态和调用耗时统计
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONFIG_FILE = "/home/michael/projects/ele-me-operation/CORE_STRATEGY.json"
+STATE_FILE = "/home/michael/projects/ele-me-operation/data/http_state.json"
+METRICS_FILE = "/home/michael/projects/ele-me-operation/logs/http_calls.jsonl"
+
+POOL_SIZE = 16
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5          # 秒
+BACKOFF_CAP = 8.0
+MAX_WAIT = 30.0             # 限流时最多排队等待的秒数，超过则直接拒绝
+BREAKER_THRESHOLD = 5       # 连续失败次数
+BREAKER_COOLDOWN = 60.0     # 熔断后冷却秒数
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 防限制规则 → 接口限流键
+PLATFORM_RULES = {
+    "价格修改频率": "price",
+    "菜单更新频率": "menu",
+    "推广调整频率": "promotion",
+    "订单查询频率": "order",
+}
+
+PERIOD_SECONDS = {"秒": 1, "分钟": 60, "分": 60, "小时": 3600, "天": 86400, "日": 86400}
+
+# 各客户端默认限流：接口键 → (次数, 周期秒)
+CLIENTS = {
+    "deepseek": {"limits": {"chat": (60, 60)}},
+    "minimax": {"limits": {"chat": (30, 60)}},
+    "openai": {"limits": {"chat": (60, 60)}},
+    "claude": {"limits": {"chat": (50, 60)}},
+    "eleme": {"limits": {}, "strategy_rules": True},
+}
+
+
+class HttpClientError(Exception):
+    """共享客户端错误"""
+
+
+class RateLimitExceeded(HttpClientError):
+    """限流额度不足（等待时间超过上限）"""
+
+
+class CircuitOpenError(HttpClientError):
+    """熔断中，请求被短路"""
+
+
+def parse_rate_rule(text: str) -> Optional[Tuple[int, int]]:
+    """"≤20次/天" → (20, 86400)；无法解析的规则（如"避免频繁开关"）返回 None"""
+    match = re.search(r"(\d+)\s*次\s*/\s*(秒|分钟|分|小时|天|日)", text)
+    if not match:
+        return None
+    return int(match.group(1)), PERIOD_SECONDS[match.group(2)]
+
+
+def load_platform_limits(config_file: str = None) -> Dict[str, Tuple[int, int]]:
+    """从 防限制规则 读取平台接口限流"""
+    config_file = config_file or CONFIG_FILE
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, "r", encoding="utf-8") as f:
+        rules = json.load(f).get("防限制规则", {})
+
+    limits = {}
+    for name, text in rules.items():
+        rate = parse_rate_rule(str(text))
+        if rate and name in PLATFORM_RULES:
+            limits[PLATFORM_RULES[name]] = rate
+    return limits
+
+
+class StateStore:
+    """限流/熔断状态（JSON 文件 + 跨进程文件锁）"""
+
+    def __init__(self, path: Optional[str] = STATE_FILE):
+        self.path = path
+        self._memory: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        """读-改-写整个状态；无法写文件时退化为进程内状态"""
+        with self._lock:
+            if not self.path:
+                yield self._memory
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                lock = open(f"{self.path}.lock", "a")
+            except OSError:
+                yield self._memory
+                return
+
+            with lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    state = {}
+                    if os.path.exists(self.path):
+                        with open(self.path, "r", encoding="utf-8") as f:
+                            state = json.load(f)
+                    yield state
+                    tmp = f"{self.path}.tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(state, f, ensure_ascii=False)
+                    os.replace(tmp, self.path)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class TokenBucket:
+    """令牌桶：容量 capacity，每 period 秒补满"""
+
+    def __init__(self, key: str, capacity: int, period: float, store: StateStore):
+        self.key = key
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.store = store
+
+    def _refill(self, bucket: Dict[str, float], now: float):
+        bucket["tokens"] = min(self.capacity, bucket["tokens"] + (now - bucket["updated"]) * self.rate)
+        bucket["updated"] = now
+
+    def try_acquire(self, count: int = 1) -> float:
+        """取 count 个令牌（不超过容量）；成功返回 0，否则返回还需等待的秒数（不扣令牌）"""
+        now = time.time()
+        with self.store.transaction() as state:
+            bucket = state.setdefault("buckets", {}).setdefault(
+                self.key, {"tokens": float(self.capacity), "updated": now})
+            self._refill(bucket, now)
+            if bucket["tokens"] >= count:
+                bucket["tokens"] -= count
+                return 0.0
+            return (count - bucket["tokens"]) / self.rate
+
+    def acquire(self, max_wait: float = MAX_WAIT):
+        """阻塞取令牌；需要等待超过 max_wait 秒时抛 RateLimitExceeded"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            if wait > max_wait:
+                raise RateLimitExceeded(f"{self.key} 限流: 需等待 {wait:.0f} 秒（上限 {self.capacity} 次）")
+            time.sleep(wait)
+
+    def remaining(self) -> float:
+        now = time.time()
+        with self.store.transaction() as state:
+            bucket = state.get("buckets", {}).get(self.key)
+            if bucket is None:
+                return float(self.capacity)
+            self._refill(bucket, now)
+            return bucket["tokens"]
+
+
+class CircuitBreaker:
+    """熔断器：closed → (连续失败) → open → (冷却) → half-open → 成功则 closed"""
+
+    def __init__(self, key: str, store: StateStore, threshold: int = BREAKER_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN):
+        self.key = key
+        self.store = store
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def before_call(self):
+        with self.store.transaction() as state:
+            breaker = state.get("breakers", {}).get(self.key)
+            if breaker and breaker["failures"] >= self.threshold:
+                remaining = breaker["opened_at"] + self.cooldown - time.time()
+                if remaining > 0:
+                    raise CircuitOpenError(f"{self.key} 熔断中，{remaining:.0f} 秒后重试")
+
+    def record(self, success: bool):
+        with self.store.transaction() as state:
+            breakers = state.setdefault("breakers", {})
+            if success:
+                breakers.pop(self.key, None)
+                return
+            breaker = breakers.setdefault(self.key, {"failures": 0, "opened_at": 0})
+            breaker["failures"] += 1
+            if breaker["failures"] >= self.threshold:
+                breaker["opened_at"] = time.time()  # 半开试探失败也会重新计时
+
+
+class LatencyStats:
+    """每个接口的调用耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, key: str, seconds: float, ok: bool):
+        self.samples.setdefault(key, []).append(seconds)
+        if not ok:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            key: {
+                "calls": len(values),
+                "errors": self.errors.get(key, 0),
+                "avg_ms": round(sum(values) / len(values) * 1000, 1),
+                "p50_ms": round(self._percentile(values, 0.5) * 1000, 1),
+                "p90_ms": round(self._percentile(values, 0.9) * 1000, 1),
+                "p99_ms": round(self._percentile(values, 0.99) * 1000, 1),
+            }
+            for key, values in self.samples.items()
+        }
+
+
+class HttpClient:
+    """带连接池、限流、重试、熔断和耗时统计的 HTTP 客户端"""
+
+    def __init__(self, name: str, limits: Dict[str, Tuple[int, int]] = None,
+                 state_file: Optional[str] = STATE_FILE, metrics_file: Optional[str] = METRICS_FILE,
+                 max_retries: int = MAX_RETRIES, pool_size: int = POOL_SIZE, max_wait: float = MAX_WAIT):
+        self.name = name
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.metrics_file = metrics_file
+        self.store = StateStore(state_file)
+        self.stats = LatencyStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.buckets = {endpoint: TokenBucket(f"{name}:{endpoint}", capacity, period, self.store)
+                        for endpoint, (capacity, period) in (limits or {}).items()}
+        self.breaker = CircuitBreaker(name, self.store)
+
+    def acquire(self, endpoint: str, block: bool = True):
+        """为一次调用取限流令牌（未配置限流的接口直接放行）"""
+        bucket = self.buckets.get(endpoint)
+        if bucket is not None:
+            bucket.acquire(self.max_wait if block else 0)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """全抖动指数退避；服务端给了 Retry-After 时以它为准"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), BACKOFF_CAP * 4)
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def _log_call(self, endpoint: str, method: str, status: Any, seconds: float, attempt: int):
+        self.stats.record(f"{self.name}:{endpoint}", seconds, isinstance(status, int) and status < 400)
+        if not self.metrics_file:
+            return
+        try:
+            with open(self.metrics_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "time": datetime.now().isoformat(timespec="seconds"),
+                    "client": self.name, "endpoint": endpoint, "method": method,
+                    "status": status, "ms": round(seconds * 1000, 1), "attempt": attempt,
+                }, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def request(self, method: str, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        """发送请求；网络错误/429/5xx 退避重试，最终仍失败时返回最后一次响应或抛出异常
+
+        一次调用只取一个限流令牌：重试是同一次调用，靠退避（和 Retry-After）控制节奏，不再重复扣额度
+        """
+        endpoint = endpoint or next(iter(self.buckets), "default")
+        self.breaker.before_call()
+        self.acquire(endpoint)
+
+        for attempt in range(self.max_retries + 1):
+            began = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._log_call(endpoint, method, type(e).__name__, time.perf_counter() - began, attempt)
+                if attempt == self.max_retries:
+                    self.breaker.record(False)
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._log_call(endpoint, method, response.status_code, time.perf_counter() - began, attempt)
+            if response.status_code not in RETRY_STATUS:
+                self.breaker.record(True)
+                return response
+            if attempt == self.max_retries:
+                self.breaker.record(False)
+                return response
+            time.sleep(self._backoff(attempt, response))
+
+    def post(self, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def get(self, url: str, endpoint: str = None, **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+
+_clients: Dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str) -> HttpClient:
+    """进程内共享的客户端（同名复用同一连接池和限流状态）"""
+    with _clients_lock:
+        if name not in _clients:
+            config = CLIENTS.get(name, {})
+            limits = dict(config.get("limits", {}))
+            if config.get("strategy_rules"):
+                limits.update(load_platform_limits())
+            _clients[name] = HttpClient(name, limits, state_file=STATE_FILE, metrics_file=METRICS_FILE)
+        return _clients[name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享 HTTP 客户端")
+    parser.add_argument("--stats", action="store_true", help="查看限流/熔断状态和调用耗时统计")
+    parser.add_argument("--last", type=int, default=1000, help="统计最近N次调用")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🌐 HTTP 客户端状态")
+    print("=" * 60)
+
+    print("\n🪣 平台限流（防限制规则）:")
+    client = get_client("eleme")
+    for endpoint, bucket in client.buckets.items():
+        print(f"   {endpoint}: 剩余 {bucket.remaining():.1f}/{bucket.capacity}")
+
+    with client.store.transaction() as state:
+        breakers = dict(state.get("breakers", {}))
+    print(f"\n🔌 熔断器: {breakers or '全部正常'}")
+
+    if os.path.exists(METRICS_FILE):
+        stats = LatencyStats()
+        with open(METRICS_FILE, "r", encoding="utf-8") as f:
+            lines = f.readlines()[-args.last:]
+        for line in lines:
+            call = json.loads(line)
+            stats.record(f"{call['client']}:{call['endpoint']}", call["ms"] / 1000,
+                         isinstance(call["status"], int) and call["status"] < 400)
+        print(f"\n⏱️ 调用耗时（最近{len(lines)}次）:")
+        for key, s in stats.summary().items():
+            print(f"   {key}: {s['calls']}次, 失败{s['errors']}, p50 {s['p50_ms']}ms,"
+                  f" p90 {s['p90_ms']}ms, p99 {s['p99_ms']}ms")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+大模型批量并发调用（asyncio + aiohttp）
+一批分析任务（多店铺 / 多提示词 / 多模型）同时在途：全局并发上限 + 各服务商令牌桶限流
+（与 http_client 共用 data/http_state.json 的额度，cron 进程之间也不会超限），
+429/5xx/网络错误/无法解析的返回按任务单独退避重试，某个任务失败不影响其余任务；
+每个任务一完成就追加写入结果 JSONL，中断后重跑会跳过已成功的任务；
+传入 ledger 时每个任务的估算与实际 token（usage）记入 token_budget 台账。
+总耗时从 各任务耗时之和 降到约等于最慢的一个
+
+任务（JSONL 每行一个）:
+    {"id": "shop001", "provider": "deepseek", "prompt": "...", "system": "...", "max_tokens": 800}
+    {"id": "x", "provider": "deepseek", "payload": {...完整请求体...}, "json": true}
+
+使用方法:
+    python3 llm_batch.py --shop shop001 --shop shop002 --days 7     # 多店铺 AI 分析
+    python3 llm_batch.py --jobs jobs.jsonl --concurrency 8
+    python3 llm_batch.py --bench --jobs-count 40                    # 本地模拟服务：串行 vs 并发
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from http_client import (BACKOFF_BASE, BACKOFF_CAP, CLIENTS, MAX_WAIT, RETRY_STATUS, STATE_FILE,
+                         CircuitBreaker, CircuitOpenError, RateLimitExceeded, StateStore, TokenBucket)
+from ele_me_manifest import DataManifest
+from llm_cache import LLMCache, cache_key
+from model_analyst import CONFIG as PROVIDER_CONFIG
+from token_budget import TokenLedger, estimate_messages, estimate_tokens
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+
+CONCURRENCY = 8             # 同时在途的请求数
+MAX_RETRIES = 2
+REQUEST_TIMEOUT = 60
+
+# 各服务商的接口路径与请求/返回格式
+ENDPOINTS = {
+    "deepseek": ("/chat/completions", "openai"),
+    "openai": ("/chat/completions", "openai"),
+    "minimax": ("/text/chatcompletion_v2", "openai"),
+    "claude": ("/messages", "claude"),
+}
+
+
+class JobError(Exception):
+    """任务本身的错误（参数/返回无法解析），可重试"""
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """读取任务队列（JSONL），缺 id 的按行号编号"""
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                job = json.loads(line)
+                job.setdefault("id", f"job{n}")
+                jobs.append(job)
+    return jobs
+
+
+def finished_ids(path: str) -> set:
+    """结果文件中已成功的任务 id（重跑时跳过）"""
+    if not path or not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # 中断时写了一半的行
+            if result.get("ok"):
+                done.add(result["id"])
+    return done
+
+
+def extract_json(content: str) -> Any:
+    """从模型回复中取出 JSON 对象"""
+    start, end = content.find("{"), content.rfind("}") + 1
+    if start == -1 or end == 0:
+        raise JobError("无法解析AI返回结果")
+    try:
+        return json.loads(content[start:end])
+    except ValueError as e:
+        raise JobError(f"JSON 解析失败: {e}")
+
+
+def build_request(job: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """任务 → (url, headers, 请求体)"""
+    provider = job.get("provider", "deepseek")
+    if provider not in ENDPOINTS:
+        raise ValueError(f"不支持的模型: {provider}")
+    config = PROVIDER_CONFIG[provider]
+    path, fmt = ENDPOINTS[provider]
+    url = job.get("url") or config["base_url"] + path
+    api_key = job.get("api_key") or config["api_key"]
+
+    payload = job.get("payload")
+    if payload is None:
+        messages = [{"role": "user", "content": job["prompt"]}]
+        if job.get("system"):
+            messages.insert(0, {"role": "system", "content": job["system"]})
+        payload = {"model": job.get("model") or config["model"], "messages": messages,
+                   "max_tokens": job.get("max_tokens") or config["max_tokens"]}
+        if job.get("temperature") is not None:
+            payload["temperature"] = job["temperature"]
+
+    headers = {"Content-Type": "application/json"}
+    if fmt == "claude":
+        headers["x-api-key"] = api_key
+        headers["anthropic-version"] = "2023-06-01"
+        # Claude 的 system 是顶层字段
+        system = [m["content"] for m in payload["messages"] if m["role"] == "system"]
+        if system:
+            payload = dict(payload, system="\n".join(system),
+                           messages=[m for m in payload["messages"] if m["role"] != "system"])
+    else:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return url, headers, payload
+
+
+def parse_response(provider: str, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """返回体 → (回复文本, usage)"""
+    try:
+        if ENDPOINTS[provider][1] == "claude":
+            return body["content"][0]["text"], body.get("usage", {})
+        return body["choices"][0]["message"]["content"], body.get("usage", {})
+    except (KeyError, IndexError, TypeError):
+        raise JobError(f"返回格式错误: {str(body)[:200]}")
+
+
+def estimate_payload(payload: Dict[str, Any]) -> int:
+    """请求体的输入 token 估算（含 Claude 的顶层 system）"""
+    model = payload.get("model")
+    return estimate_messages(payload.get("messages", []), model) + estimate_tokens(payload.get("system") or "", model)
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    """全抖动指数退避（与 http_client 相同），服务端给了 Retry-After 时以它为准"""
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_CAP * 4)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class BatchRunner:
+    """并发执行一批大模型任务"""
+
+    def __init__(self, concurrency: int = CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 timeout: float = REQUEST_TIMEOUT, out_file: str = None, cache: LLMCache = None,
+                 state_file: Optional[str] = STATE_FILE, limits: Dict[str, Tuple[int, int]] = None,
+                 ledger: TokenLedger = None):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.out_file = out_file
+        self.cache = cache
+        self.ledger = ledger
+        # 限流/熔断与同步客户端共用状态文件（state_file=None 时只在进程内）
+        self.store = StateStore(state_file)
+        self.limits = limits or {name: c["limits"]["chat"] for name, c in CLIENTS.items() if "chat" in c["limits"]}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def _bucket(self, provider: str) -> Optional[TokenBucket]:
+        if provider not in self.buckets and provider in self.limits:
+            capacity, period = self.limits[provider]
+            self.buckets[provider] = TokenBucket(f"{provider}:chat", capacity, period, self.store)
+        return self.buckets.get(provider)
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker(provider, self.store)
+        return self.breakers[provider]
+
+    async def _acquire(self, provider: str):
+        """异步取令牌：额度不足时让出事件循环等待，超过 MAX_WAIT 抛 RateLimitExceeded"""
+        bucket = self._bucket(provider)
+        while bucket is not None:
+            wait = bucket.try_acquire()
+            if wait == 0:
+                return
+            if wait > MAX_WAIT:
+                raise RateLimitExceeded(f"{bucket.key} 限流: 需等待 {wait:.0f} 秒")
+            await asyncio.sleep(wait)
+
+    async def _call(self, session: aiohttp.ClientSession, job: Dict[str, Any]) -> Dict[str, Any]:
+        """执行单个任务（含重试），总是返回结果 dict"""
+        provider = job.get("provider", "deepseek")
+        result = {"id": job["id"], "provider": provider, "ok": False, "attempts": 0, "cached": False,
+                  "meta": job.get("meta")}
+        began = time.perf_counter()
+        try:
+            url, headers, payload = build_request(job)
+        except (ValueError, KeyError) as e:
+            return dict(result, error=str(e), seconds=0.0)
+
+        key = cache_key(payload) if self.cache else None
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            if self.ledger:
+                self.ledger.record(payload.get("model"), estimate_payload(payload), task=job["id"], cache_hit=True)
+            return dict(result, ok=True, cached=True, seconds=0.0, **cached)
+
+        breaker = self._breaker(provider)
+        for attempt in range(self.max_retries + 1):
+            result["attempts"] = attempt + 1
+            retry_after = None
+            try:
+                breaker.before_call()
+                await self._acquire(provider)
+                async with session.post(url, headers=headers, json=payload) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    body = await response.json(content_type=None) if status == 200 else None
+            except (CircuitOpenError, RateLimitExceeded) as e:
+                result["error"] = str(e)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                breaker.record(False)
+                result["error"] = f"调用失败: {str(e) or type(e).__name__}"
+            else:
+                # 429/5xx 计入熔断并重试；其余 4xx 是请求本身的问题，不重试
+                breaker.record(status not in RETRY_STATUS)
+                if status == 200:
+                    try:
+                        content, usage = parse_response(provider, body)
+                        if self.ledger:
+                            self.ledger.record(payload.get("model"), estimate_payload(payload), usage,
+                                               task=job["id"], completion_text=content)
+                        answer = {"content": content, "usage": usage,
+                                  "result": extract_json(content) if job.get("json") else None}
+                    except JobError as e:
+                        result["error"] = str(e)      # 回复被截断/格式不对，重新生成一次
+                    else:
+                        if self.cache:
+                            self.cache.put(key, answer, payload.get("model"))
+                        result.update(answer, ok=True)
+                        result.pop("error", None)
+                        break
+                else:
+                    result["error"] = f"API调用失败: {status}"
+                    if status not in RETRY_STATUS:
+                        break
+            if attempt < self.max_retries:
+                await asyncio.sleep(_backoff(attempt, retry_after))
+
+        result["seconds"] = round(time.perf_counter() - began, 3)
+        return result
+
+    def _write(self, result: Dict[str, Any]):
+        if not self.out_file:
+            return
+        with open(self.out_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(result, time=datetime.now().isoformat(timespec="seconds")),
+                               ensure_ascii=False) + "\n")
+
+    async def run(self, jobs: Iterable[Dict[str, Any]], on_result=None) -> List[Dict[str, Any]]:
+        """并发执行，结果按完成顺序写入文件/回调，返回按任务顺序排列的结果"""
+        jobs = list(jobs)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            async def worker(job):
+                async with semaphore:
+                    result = await self._call(session, job)
+                self._write(result)
+                if on_result:
+                    on_result(result)
+                return result
+
+            return await asyncio.gather(*(worker(job) for job in jobs))
+
+    def run_sync(self, jobs: Iterable[Dict[str, Any]], on_result=None) -> List[Dict[str, Any]]:
+        """同步入口"""
+        return asyncio.run(self.run(jobs, on_result))
+
+
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    """成功/失败数、墙钟时间与各任务耗时之和"""
+    seconds = [r.get("seconds", 0) for r in results]
+    return {
+        "jobs": len(results),
+        "ok": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+        "cached": sum(r.get("cached", False) for r in results),
+        "retried": sum(r.get("attempts", 0) > 1 for r in results),
+        "wall_seconds": round(wall, 3),
+        "sum_seconds": round(sum(seconds), 3),
+        "slowest_seconds": round(max(seconds, default=0), 3),
+    }
+
+
+def run_jobs(jobs: List[Dict[str, Any]], out_file: str = None, resume: bool = True,
+             **kwargs) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """执行任务队列（resume 时跳过结果文件中已成功的任务），返回 (结果, 汇总)"""
+    done = finished_ids(out_file) if resume else set()
+    pending = [job for job in jobs if job["id"] not in done]
+    if done:
+        print(f"   ⏭️ 跳过已完成 {len(jobs) - len(pending)} 个任务")
+
+    def progress(result):
+        status = "✅" if result["ok"] else "❌"
+        note = "缓存" if result.get("cached") else f"{result.get('seconds', 0)}秒, 第{result['attempts']}次"
+        print(f"   {status} {result['id']} ({note}){'' if result['ok'] else ': ' + result.get('error', '')}")
+
+    began = time.perf_counter()
+    results = BatchRunner(out_file=out_file, **kwargs).run_sync(pending, progress)
+    return results, summarize(results, time.perf_counter() - began)
+
+
+def shop_analysis_jobs(shop_ids: List[str], days: int = None) -> List[Dict[str, Any]]:
+    """每个店铺一个 DeepSeek 完整分析任务（提示词与 ElemeDeepSeekAnalyzer 相同）"""
+    from ele_me_deepseek_analysis import ElemeDeepSeekAnalyzer
+
+    analyzer = ElemeDeepSeekAnalyzer()
+    jobs = []
+    for shop_id in shop_ids:
+        prompt = analyzer.shop_prompt(days, shop_id)
+        if prompt is None:
+            print(f"   ⚠️ {shop_id} 无订单数据，跳过")
+            continue
+        jobs.append({"id": shop_id, "provider": "deepseek", "url": analyzer.api_url, "api_key": analyzer.api_key,
+                     "payload": analyzer.build_payload(prompt), "json": True, "meta": {"days": days}})
+    return jobs
+
+
+# ==================== 压测 ====================
+
+async def _start_mock_llm(latency: Tuple[float, float], failure_rate: float):
+    """本地模拟 OpenAI 兼容接口：随机延迟，按比例返回 503"""
+    from aiohttp import web
+
+    async def chat(request):
+        body = await request.json()
+        await asyncio.sleep(random.uniform(*latency))
+        if random.random() < failure_rate:
+            return web.json_response({"error": "overloaded"}, status=503)
+        prompt = body["messages"][-1]["content"]
+        content = json.dumps({"summary": f"已分析: {prompt[:20]}", "problems": [], "recommendations": {}},
+                             ensure_ascii=False)
+        return web.json_response({"choices": [{"message": {"content": content}}],
+                                  "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content)}})
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/chat/completions"
+
+
+def run_benchmark(count: int, concurrency: int, latency: Tuple[float, float], failure_rate: float):
+    """串行（并发 1）vs 并发执行同一批任务"""
+    async def _bench():
+        server, url = await _start_mock_llm(latency, failure_rate)
+        jobs = [{"id": f"shop{i:03d}", "provider": "deepseek", "url": url, "json": True,
+                 "prompt": f"店铺 shop{i:03d} 近7天运营数据分析"} for i in range(count)]
+        timings = {}
+        try:
+            for label, n in (("串行", 1), ("并发", concurrency)):
+                runner = BatchRunner(concurrency=n, state_file=None, limits={"deepseek": (600, 60)})
+                began = time.perf_counter()
+                results = await runner.run(jobs)
+                timings[label] = summarize(results, time.perf_counter() - began)
+        finally:
+            await server.cleanup()
+        return timings
+
+    print("=" * 60)
+    print(f"⚡ 大模型批量调用（{count}个任务, 延迟{latency[0]}-{latency[1]}秒, 失败率{failure_rate:.0%}）")
+    print("=" * 60)
+    timings = asyncio.run(_bench())
+    for label, s in timings.items():
+        print(f"   {label}: {s['wall_seconds']:.2f}秒  成功{s['ok']}/{s['jobs']}  重试{s['retried']}  "
+              f"最慢任务{s['slowest_seconds']:.2f}秒")
+    print(f"   加速: {timings['串行']['wall_seconds'] / timings['并发']['wall_seconds']:.1f}×")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型批量并发调用")
+    parser.add_argument("--jobs", type=str, help="任务队列文件（JSONL）")
+    parser.add_argument("--shop", action="append", help="店铺ID（可重复）：每个店铺一个 AI 分析任务")
+    parser.add_argument("--days", type=int, help="分析近N天（默认最新导出）")
+    parser.add_argument("--out", type=str, help="结果文件（JSONL，默认 data/llm_batch_<时间>.jsonl）")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="同时在途的请求数")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="每个任务的重试次数")
+    parser.add_argument("--no-resume", action="store_true", help="不跳过结果文件中已成功的任务")
+    parser.add_argument("--no-cache", action="store_true", help="不使用响应缓存")
+    parser.add_argument("--bench", action="store_true", help="本地模拟服务：串行 vs 并发")
+    parser.add_argument("--jobs-count", type=int, default=40, help="压测任务数")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="压测模拟失败率")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.jobs_count, args.concurrency, (0.2, 1.0), args.failure_rate)
+        return
+
+    if args.jobs:
+        jobs = load_jobs(args.jobs)
+    elif args.shop:
+        jobs = shop_analysis_jobs(args.shop, args.days)
+    else:
+        parser.print_help()
+        return
+
+    default_out = os.path.join(DATA_DIR, f"llm_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    out_file = args.out or default_out
+    print("=" * 60)
+    print(f"🧠 大模型批量分析（{len(jobs)}个任务, 并发{args.concurrency}）")
+    print("=" * 60)
+
+    cache = None if args.no_cache else LLMCache(data_dir=DATA_DIR)
+    results, summary = run_jobs(jobs, out_file, resume=not args.no_resume, concurrency=args.concurrency,
+                                max_retries=args.retries, cache=cache,
+                                ledger=TokenLedger(data_dir=DATA_DIR, script="llm_batch"))
+    if results and out_file == default_out:
+        DataManifest(DATA_DIR).register("llm_batch", out_file, rows=len(results))
+    for result in results:
+        if result["ok"] and result.get("result"):
+            print(f"\n🔍 {result['id']}: {result['result'].get('summary', '')}")
+
+    print(f"\n⏱️ 总耗时 {summary['wall_seconds']}秒（最慢任务 {summary['slowest_seconds']}秒,"
+          f" 串行合计 {summary['sum_seconds']}秒）, 成功 {summary['ok']}/{summary['jobs']}")
+    print(f"✅ 结果: {out_file}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
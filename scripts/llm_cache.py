@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+大模型响应缓存（SQLite，WAL 模式）
+键为 (模型, 规范化后的完整消息, 采样参数) 的 SHA-256，数据相同提示词相同才命中；
+结果 zlib 压缩后存入 data/llm_cache.db，按过期时间 TTL 失效，
+总大小超过上限时按最近访问时间淘汰（LRU），命中/未命中/写入/淘汰次数持久化统计
+
+多个 cron 进程并发读写由 SQLite 的文件锁保证（WAL + busy timeout），
+淘汰在同一个写事务内完成
+
+使用方法:
+    from llm_cache import LLMCache, cache_key
+    cache = LLMCache()
+    result = cache.get_or_call(payload, lambda: call_api(payload))
+
+    python3 llm_cache.py --stats         # 条目数/大小/命中率
+    python3 llm_cache.py --purge         # 删除过期条目
+    python3 llm_cache.py --clear         # 清空缓存
+    python3 llm_cache.py --bench         # 读写与淘汰耗时
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+DATA_DIR = "/home/michael/projects/ele-me-operation/data"
+DB_FILE = "llm_cache.db"
+
+DEFAULT_TTL = 7 * 86400          # 秒；同一份数据的分析一周内复用
+MAX_BYTES = 50 * 1024 * 1024     # 压缩后总大小上限
+EVICT_TO = 0.9                   # 超限时淘汰到上限的 90%，避免每次写入都触发淘汰
+KEY_VERSION = 1                  # 规范化规则变化时递增，旧键自然失效
+
+# 参与键计算的请求参数（其余如 stream 不影响结果）
+KEY_PARAMS = ("model", "max_tokens", "temperature", "top_p", "response_format", "stop")
+
+COUNTERS = ("hits", "misses", "stores", "evictions", "expired")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    expires REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    value BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed);
+CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries(expires);
+
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 按最近访问从新到旧累加大小，超出上限的部分淘汰
+EVICT_LRU = """
+DELETE FROM entries WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS running FROM entries
+    ) WHERE running > ?
+)
+"""
+
+
+def normalize_prompt(text: str) -> str:
+    """提示词规范化：Unicode NFC、统一换行、去行尾空白、合并连续空行"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """请求体 → 缓存键（模型、全部消息、采样参数都参与哈希）"""
+    messages = [{"role": m.get("role", "user"), "content": normalize_prompt(m.get("content") or "")}
+                for m in payload.get("messages", [])]
+    params = {k: payload[k] for k in KEY_PARAMS if payload.get(k) is not None}
+    canonical = json.dumps({"v": KEY_VERSION, "messages": messages, "params": params},
+                           ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """持久化大模型响应缓存"""
+
+    def __init__(self, path: str = None, data_dir: str = None, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = MAX_BYTES):
+        self.path = path or os.path.join(data_dir or DATA_DIR, DB_FILE)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.session = dict.fromkeys(COUNTERS, 0)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count(self, name: str, n: int = 1):
+        """累加统计（本进程 + 持久化）"""
+        if n:
+            self.session[name] += n
+            self.conn.execute("INSERT INTO stats (name, value) VALUES (?, ?) "
+                              "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, n))
+
+    # ==================== 读写 ====================
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中返回缓存的结果并刷新访问时间；未命中或已过期返回 None"""
+        now = time.time()
+        row = self.conn.execute("SELECT expires, value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        if row[0] <= now:
+            self.conn.execute("DELETE FROM entries WHERE key = ? AND expires <= ?", (key, now))
+            self._count("expired")
+            self._count("misses")
+            return None
+        self.conn.execute("UPDATE entries SET accessed = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, key: str, value: Any, model: str = None, ttl: float = None):
+        """写入结果（同键覆盖），超出大小上限时在同一事务内淘汰最久未访问的条目"""
+        now = time.time()
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, model, created, accessed, expires, size, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, now, now, now + (self.ttl if ttl is None else ttl), len(blob), blob))
+            self._count("stores")
+            self._evict(now)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, now: float):
+        expired = self.conn.execute("DELETE FROM entries WHERE expires <= ?", (now,)).rowcount
+        self._count("expired", expired)
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            self._count("evictions", self.conn.execute(EVICT_LRU, (self.max_bytes * EVICT_TO,)).rowcount)
+
+    def get_or_call(self, payload: Dict[str, Any], call: Callable[[], Any],
+                    ttl: float = None) -> Any:
+        """按请求体查缓存，未命中时调用 call()；结果含 error 的不缓存"""
+        key = cache_key(payload)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result = call()
+        if not (isinstance(result, dict) and "error" in result):
+            self.put(key, result, payload.get("model"), ttl)
+        return result
+
+    # ==================== 维护 ====================
+
+    def purge(self) -> int:
+        """删除过期条目，返回删除数"""
+        deleted = self.conn.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),)).rowcount
+        self._count("expired", deleted)
+        return deleted
+
+    def clear(self):
+        """清空条目和统计"""
+        self.conn.execute("DELETE FROM entries")
+        self.conn.execute("DELETE FROM stats")
+
+    def stats(self) -> Dict[str, Any]:
+        """条目数、压缩后大小、累计命中率与本进程命中/未命中"""
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        totals = dict.fromkeys(COUNTERS, 0)
+        totals.update(self.conn.execute("SELECT name, value FROM stats").fetchall())
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            **totals,
+            "hit_rate": round(totals["hits"] / lookups, 3) if lookups else None,
+            "session": dict(self.session),
+        }
+
+
+def print_stats(stats: Dict[str, Any]):
+    print("=" * 60)
+    print("🗄️ 大模型响应缓存")
+    print("=" * 60)
+    print(f"   条目: {stats['entries']}  大小: {stats['bytes'] / 1024:.1f}KB / {stats['max_bytes'] / 1024 / 1024:.0f}MB")
+    rate = f"{stats['hit_rate'] * 100:.1f}%" if stats["hit_rate"] is not None else "-"
+    print(f"   命中: {stats['hits']}  未命中: {stats['misses']}  命中率: {rate}")
+    print(f"   写入: {stats['stores']}  LRU淘汰: {stats['evictions']}  过期: {stats['expired']}")
+    print("=" * 60)
+
+
+def run_benchmark(count: int):
+    """读写/淘汰耗时（临时库）"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp, LLMCache(data_dir=tmp, max_bytes=count * 40) as cache:
+        value = {"summary": "午餐高峰出餐慢", "recommendations": ["建议" * 20] * 3}
+        payloads = [{"model": "deepseek-chat", "messages": [{"role": "user", "content": f"分析 {i}"}],
+                     "temperature": 0.5} for i in range(count)]
+
+        print("=" * 60)
+        print(f"🗄️ 缓存压测（{count}条）")
+        print("=" * 60)
+        began = time.perf_counter()
+        for p in payloads:
+            cache.put(cache_key(p), value, p["model"])
+        put_secs = time.perf_counter() - began
+        began = time.perf_counter()
+        found = sum(cache.get(cache_key(p)) is not None for p in payloads)
+        get_secs = time.perf_counter() - began
+        stats = cache.stats()
+        print(f"   写入: {put_secs / count * 1e6:.0f}µs/条  读取: {get_secs / count * 1e6:.0f}µs/条")
+        print(f"   上限 {cache.max_bytes / 1024:.0f}KB → 保留 {stats['entries']} 条 ({stats['bytes'] / 1024:.0f}KB)，"
+              f"淘汰 {stats['evictions']}，命中 {found}")
+        print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型响应缓存")
+    parser.add_argument("--stats", action="store_true", help="查看缓存统计")
+    parser.add_argument("--purge", action="store_true", help="删除过期条目")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    parser.add_argument("--bench", action="store_true", help="读写与淘汰耗时")
+    parser.add_argument("--count", type=int, default=2000, help="压测条目数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.count)
+        return
+    with LLMCache() as cache:
+        if args.clear:
+            cache.clear()
+            print("✅ 已清空缓存")
+        elif args.purge:
+            print(f"✅ 删除过期条目 {cache.purge()} 条")
+        print_stats(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+大模型流式输出（SSE）+ 增量 JSON 字段解析
+OpenAI 兼容接口（DeepSeek/OpenAI/MiniMax）以 stream=true 调用，边接收边解析回复中的 JSON 对象：
+顶层字段（summary / problems / recommendations / action_plan …）一旦完整就回调，
+终端报告或自动操作不必等整段生成完；结构出错（字段后出现非法字符、值无法解析、单个字段异常冗长）时立即终止。
+JSON 对象闭合后默认继续读完（不再解析），拿到最后一个分片里的 usage 供台账记实际 token；
+stop_early=True 时对象一闭合就断开（后面的解释文字不再生成，但拿不到 usage，台账按估算记账）
+
+使用方法:
+    from llm_stream import stream_chat
+    result = stream_chat(url, headers, payload, on_field=lambda key, value: print(key, value))
+
+    python3 llm_stream.py --bench        # 本地模拟 SSE：首个字段耗时 vs 完整生成耗时，读完 vs 提前断开
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from http_client import HttpClientError, get_client
+
+REQUEST_TIMEOUT = 60
+MAX_FIELD_CHARS = 8000          # 单个字段超过这个长度视为模型跑偏
+
+WHITESPACE = " \t\r\n"
+
+
+class StreamFormatError(Exception):
+    """流式回复的 JSON 结构错误"""
+
+
+class JSONFieldStream:
+    """增量解析回复中的第一个 JSON 对象，按顶层字段逐个产出
+
+    对象之前的文字（如 ```json）忽略；对象闭合后 done=True，其后的内容不再解析；
+    结构出错时 error 为错误说明（出错前已完整的字段照常产出）
+    """
+
+    def __init__(self, fields: Iterable[str] = None, max_field_chars: int = MAX_FIELD_CHARS):
+        self.fields = set(fields) if fields else None
+        self.max_field_chars = max_field_chars
+        self.result: Dict[str, Any] = {}
+        self.done = False
+        self.error: Optional[str] = None
+        self._state = "preamble"
+        self._buf: List[str] = []
+        self._key = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _fail(self, message: str):
+        raise StreamFormatError(f"{message}（已解析字段: {', '.join(self.result) or '无'}）")
+
+    def _emit(self, emitted: List[Tuple[str, Any]]):
+        text = "".join(self._buf)
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._fail(f"字段 {self._key} 的值无法解析: {text[:50]}")
+        self.result[self._key] = value
+        if self.fields is None or self._key in self.fields:
+            emitted.append((self._key, value))
+        self._buf = []
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """喂入一段文本，返回这段文本里完整了的 (字段, 值)"""
+        emitted = []
+        if self.done or self.error:
+            return emitted
+        try:
+            self._scan(text, emitted)
+        except StreamFormatError as e:
+            self.error = str(e)
+        return emitted
+
+    def _scan(self, text: str, emitted: List[Tuple[str, Any]]):
+        for ch in text:
+            state = self._state
+            if state == "done":
+                break
+
+            if state == "value":
+                self._buf.append(ch)
+                if len(self._buf) > self.max_field_chars:
+                    self._fail(f"字段 {self._key} 超过 {self.max_field_chars} 字符")
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == "\\":
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                        if self._depth == 0:
+                            self._emit(emitted)
+                            self._state = "after_value"
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]" and self._depth > 0:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit(emitted)
+                        self._state = "after_value"
+                elif self._depth == 0 and (ch in ",}" or ch in WHITESPACE):
+                    # 数字/true/false/null 由后面的分隔符结束
+                    self._buf.pop()
+                    self._emit(emitted)
+                    self._state = "after_value"
+                    if ch != " ":
+                        self._scan(ch, emitted)
+                continue
+
+            if state == "key":
+                self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._key = json.loads('"' + "".join(self._buf))
+                    self._buf = []
+                    self._state = "colon"
+                continue
+
+            if ch in WHITESPACE:
+                continue
+            if state == "preamble":
+                if ch == "{":
+                    self._state = "key_or_end"
+            elif state == "key_or_end":
+                if ch == '"':
+                    self._state = "key"
+                elif ch == "}":
+                    self._close()
+                else:
+                    self._fail(f"期望字段名，收到 {ch!r}")
+            elif state == "colon":
+                if ch != ":":
+                    self._fail(f"字段 {self._key} 后期望冒号，收到 {ch!r}")
+                self._state = "value_start"
+            elif state == "value_start":
+                self._buf = [ch]
+                self._in_string = ch == '"'
+                self._depth = 1 if ch in "{[" else 0
+                if ch in ",}]:":
+                    self._fail(f"字段 {self._key} 缺少值")
+                self._state = "value"
+            elif state == "after_value":
+                if ch == ",":
+                    self._state = "key_or_end"
+                elif ch == "}":
+                    self._close()
+                else:
+                    self._fail(f"字段 {self._key} 之后出现 {ch!r}")
+
+    def _close(self):
+        self.done = True
+        self._state = "done"
+
+
+def extract_json(content: str) -> Optional[Dict[str, Any]]:
+    """非流式回退：取回复中第一个 { 到最后一个 } 之间的 JSON"""
+    start, end = content.find("{"), content.rfind("}") + 1
+    if start == -1 or end == 0:
+        return None
+    try:
+        return json.loads(content[start:end])
+    except ValueError:
+        return None
+
+
+def iter_sse_content(response: requests.Response) -> Iterable[Tuple[str, Optional[Dict[str, Any]]]]:
+    """SSE 行 → (增量文本, usage)；遇到 [DONE] 结束"""
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        text = "".join((choice.get("delta") or {}).get("content") or "" for choice in chunk.get("choices") or [])
+        yield text, chunk.get("usage")
+
+
+def stream_chat(url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                on_field: Callable[[str, Any], None] = None, fields: Iterable[str] = None,
+                client: str = "deepseek", timeout: float = REQUEST_TIMEOUT,
+                stop_early: bool = False) -> Dict[str, Any]:
+    """流式调用并增量解析 JSON 字段
+
+    对象闭合后默认读完剩余分片（只收 usage 不解析）；stop_early 时立即断开，usage 为 None
+    返回 {"result": 已解析字段, "complete": 对象是否闭合, "content": 收到的全文, "usage",
+          "first_field_seconds", "object_seconds": 对象闭合耗时, "seconds",
+          "stopped_early": 是否在服务端结束前断开, "error"}
+    """
+    parser = JSONFieldStream(fields)
+    began = time.perf_counter()
+    outcome = {"result": parser.result, "complete": False, "content": "", "usage": None,
+               "first_field_seconds": None, "object_seconds": None, "seconds": None,
+               "stopped_early": False, "error": None}
+
+    body = dict(payload, stream=True, stream_options={"include_usage": True})
+    try:
+        response = get_client(client).post(url, headers=headers, json=body, stream=True, timeout=timeout)
+    except (requests.RequestException, HttpClientError) as e:
+        outcome["error"] = str(e)
+        return outcome
+
+    content = []
+    try:
+        if response.status_code != 200:
+            outcome["error"] = f"API调用失败: {response.status_code}"
+            return outcome
+        for text, usage in iter_sse_content(response):
+            outcome["usage"] = usage or outcome["usage"]
+            content.append(text)
+            if parser.done:
+                continue      # 对象已完整，只等最后的 usage 分片
+            for key, value in parser.feed(text):
+                if outcome["first_field_seconds"] is None:
+                    outcome["first_field_seconds"] = round(time.perf_counter() - began, 3)
+                if on_field:
+                    on_field(key, value)
+            if parser.error:
+                outcome["error"] = f"返回格式错误，已提前终止: {parser.error}"
+                outcome["stopped_early"] = True
+                break
+            if parser.done:
+                outcome["object_seconds"] = round(time.perf_counter() - began, 3)
+                if stop_early:
+                    # 断开连接，后面的文字不再生成（也收不到 usage）
+                    outcome["stopped_early"] = True
+                    break
+    except (requests.RequestException, ValueError) as e:
+        outcome["error"] = f"流式读取失败: {e}"
+    finally:
+        response.close()
+        outcome["content"] = "".join(content)
+        outcome["seconds"] = round(time.perf_counter() - began, 3)
+
+    outcome["complete"] = parser.done
+    if not parser.done and not outcome["error"]:
+        # 流正常结束但对象没闭合（如被 max_tokens 截断）：尽量整段解析
+        fallback = extract_json(outcome["content"])
+        if fallback is None:
+            outcome["error"] = "无法解析AI返回结果"
+        else:
+            outcome["result"].update(fallback)
+            outcome["complete"] = True
+    return outcome
+
+
+# ==================== 压测 ====================
+
+def _mock_reply(tail_chars: int, malformed: bool) -> str:
+    reply = {
+        "summary": "午餐高峰出餐偏慢，取消率高于目标",
+        "problems": ["12点取消率8.5%", "配送p90超过45分钟"],
+        "recommendations": {"price": ["起送价维持20元"], "timing": ["11:30前备好招牌炒饭"],
+                            "promotion": ["午餐出价×1.3"], "operations": ["高峰增加一名打包"]},
+        "action_plan": ["明天11点前完成备货", "午餐时段开启出餐提醒", "观察3天取消率"],
+        "risk_warnings": ["推广调整不超过每天2次"],
+        "confidence": "中",
+    }
+    text = "```json\n" + json.dumps(reply, ensure_ascii=False, indent=2) + "\n```\n"
+    if malformed:
+        text = text.replace('],\n  "recommendations"', '] 另外建议关注\n  "recommendations"')
+    return text + "以上建议基于近7天数据。" * (tail_chars // 12)
+
+
+def start_mock_sse(chars_per_chunk: int = 4, chunk_delay: float = 0.01, tail_chars: int = 600,
+                   malformed: bool = False) -> ThreadingHTTPServer:
+    """本地模拟流式 chat/completions（每个分片延迟 chunk_delay 秒）"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            text = _mock_reply(tail_chars, malformed)
+            sent = 0
+            try:
+                for i in range(0, len(text), chars_per_chunk):
+                    time.sleep(chunk_delay)
+                    chunk = {"choices": [{"delta": {"content": text[i:i + chars_per_chunk]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    sent += 1
+                usage = {"prompt_tokens": 500, "completion_tokens": sent}
+                self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\ndata: [DONE]\n\n".encode())
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                self.server.sent_chunks.append((sent, len(range(0, len(text), chars_per_chunk))))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.sent_chunks = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_benchmark(chunk_delay: float, tail_chars: int):
+    print("=" * 60)
+    print(f"⚡ 流式输出（模拟每分片 {chunk_delay * 1000:.0f}ms, 对象后还有 {tail_chars} 字解释）")
+    print("=" * 60)
+
+    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "分析"}], "max_tokens": 2000}
+    for label, malformed, stop_early in (("正常回复，读完取 usage", False, False),
+                                         ("正常回复，对象闭合即断开", False, True),
+                                         ("中途格式错误", True, False)):
+        server = start_mock_sse(chunk_delay=chunk_delay, tail_chars=tail_chars, malformed=malformed)
+        try:
+            arrivals = []
+            began = time.perf_counter()
+            outcome = stream_chat(server.url, {}, payload, client="mock", stop_early=stop_early,
+                                  on_field=lambda k, v: arrivals.append((k, time.perf_counter() - began)))
+            time.sleep(chunk_delay * 3)
+            sent, total = server.sent_chunks[0] if server.sent_chunks else (0, 0)
+        finally:
+            server.shutdown()
+
+        print(f"\n   【{label}】")
+        for key, at in arrivals:
+            print(f"   {at:6.2f}秒  {key}")
+        if outcome["object_seconds"] is not None:
+            print(f"   对象闭合 {outcome['object_seconds']:.2f}秒")
+        print(f"   完整生成需 {total * chunk_delay:.2f}秒, 实际 {outcome['seconds']:.2f}秒; "
+              f"收到 {sent}/{total} 个分片（省 {1 - sent / total:.0%}）; "
+              f"usage: {'已收到' if outcome['usage'] else '无（台账按估算）'}")
+        if outcome["error"]:
+            print(f"   ⚠️ {outcome['error']}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型流式输出 + 增量 JSON 字段解析")
+    parser.add_argument("--bench", action="store_true", help="本地模拟 SSE 对比")
+    parser.add_argument("--chunk-ms", type=float, default=10, help="模拟每个分片的间隔(毫秒)")
+    parser.add_argument("--tail-chars", type=int, default=600, help="模拟 JSON 之后的解释文字长度")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.chunk_ms / 1000, args.tail_chars)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
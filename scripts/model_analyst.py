@@ -59,9 +59,22 @@ class ModelAnalyst:
             raise ValueError(f"不支持的模型: {model_name}")
     
     def analyze(self, prompt: str, system_prompt: str = None) -> Dict[str, Any]:
-        """调用AI模型进行分析"""
-        import requests
+        """调用AI模型进行分析（估算与实际 token 记入台账）"""
+        from token_budget import TokenLedger, estimate_messages
         
+        result = self._request(prompt, system_prompt)
+        if result["success"]:
+            messages = [{"content": system_prompt}] if system_prompt else []
+            messages.append({"content": prompt})
+            with TokenLedger(script="model_analyst") as ledger:
+                ledger.record(self.config["model"], estimate_messages(messages, self.config["model"]),
+                              result.get("usage"), task=self.model_name, completion_text=result.get("response"))
+        return result
+    
+    def _request(self, prompt: str, system_prompt: str = None) -> Dict[str, Any]:
+        from http_client import get_client
+        
+        client = get_client(self.model_name)
         headers = {
             "Content-Type": "application/json"
         }
@@ -76,7 +89,7 @@ class ModelAnalyst:
         try:
             if self.model_name == "deepseek":
                 headers["Authorization"] = f"Bearer {self.config['api_key']}"
-                response = requests.post(
+                response = client.post(
                     f"{self.config['base_url']}/chat/completions",
                     headers=headers,
                     json={
@@ -98,7 +111,7 @@ class ModelAnalyst:
                 
             elif self.model_name == "minimax":
                 headers["Authorization"] = f"Bearer {self.config['api_key']}"
-                response = requests.post(
+                response = client.post(
                     f"{self.config['base_url']}/text/chatcompletion_v2",
                     headers=headers,
                     json={
@@ -115,12 +128,12 @@ class ModelAnalyst:
                     "model": self.model_name,
                     "response": result["choices"][0]["message"]["content"],
                     "usage": result.get("usage", {}),
-                    "time": time.time() - start_start_time
+                    "time": time.time() - start_time
                 }
                 
             elif self.model_name == "openai":
                 headers["Authorization"] = f"Bearer {self.config['api_key']}"
-                response = requests.post(
+                response = client.post(
                     f"{self.config['base_url']}/chat/completions",
                     headers=headers,
                     json={
@@ -143,7 +156,7 @@ class ModelAnalyst:
             elif self.model_name == "claude":
                 headers["x-api-key"] = self.config["api_key"]
                 headers["anthropic-version"] = "2023-06-01"
-                response = requests.post(
+                response = client.post(
                     f"{self.config['base_url']}/messages",
                     headers=headers,
                     json={
@@ -171,22 +184,30 @@ class ModelAnalyst:
                 "time": time.time() - start_time
             }
     
-    def compare(self, prompt: str, models: List[str] = None) -> Dict[str, Any]:
-        """对比多个模型的分析结果"""
+    def compare(self, prompt: str, models: List[str] = None, system_prompt: str = None) -> Dict[str, Any]:
+        """对比多个模型的分析结果（各模型并发调用，总耗时约等于最慢的模型）"""
+        from llm_batch import run_jobs
+        from token_budget import TokenLedger
+        
         if models is None:
             models = list(CONFIG.keys())
         
-        results = {}
+        jobs = [{"id": model, "provider": model.lower(), "prompt": prompt, "system": system_prompt}
+                for model in models]
+        batch, _ = run_jobs(jobs, resume=False, concurrency=len(jobs) or 1, timeout=30,
+                            ledger=TokenLedger(script="model_analyst"))
         
-        for model in models:
-            try:
-                analyst = ModelAnalyst(model)
-                result = analyst.analyze(prompt)
-                results[model] = result
-            except Exception as e:
-                results[model] = {"success": False, "error": str(e)}
-        
-        return results
+        return {
+            r["id"]: {
+                "success": r["ok"],
+                "model": r["provider"],
+                "response": r.get("content"),
+                "usage": r.get("usage", {}),
+                "time": r.get("seconds", 0),
+                **({} if r["ok"] else {"error": r.get("error")}),
+            }
+            for r in batch
+        }
 
 
 # ==================== 分析器 ====================
@@ -271,7 +292,7 @@ def main():
     if args.all:
         # 对比所有模型
         analyst = ModelAnalyst("deepseek")
-        results = analyst.compare(prompt)
+        results = analyst.compare(prompt, system_prompt=system_prompt)
         
         for model, result in results.items():
             print(f"\n{'='*40}")
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+两级缓存：进程内 LRU（条数 + 字节上限）在前，分片磁盘存储在后
+磁盘按键前两位分目录（ab/abcdef….json.gz，gzip 压缩），index.json 记录每个条目的
+大小/创建/访问时间/命中次数和累计统计；超过最大保存时间的条目过期，
+总大小超过上限时按最近访问时间淘汰（LRU）到上限的 90%
+
+多进程共用同一目录：条目文件原子写入（临时文件 + rename），文件本身即可命中；
+索引攒批后在文件锁内与磁盘上的版本合并再写回（进程退出时自动写回）
+
+使用方法:
+    from tiered_cache import get_cache
+    cache = get_cache(cache_dir)
+    value = cache.get(key)
+    cache.put(key, value, task="logic_analysis")
+
+    python3 tiered_cache.py --bench      # 内存/磁盘命中耗时与淘汰
+"""
+
+import argparse
+import atexit
+import fcntl
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".index.lock"
+INDEX_VERSION = 1
+
+MEMORY_ITEMS = 256
+MEMORY_BYTES = 16 * 1024 * 1024      # 内存层按未压缩 JSON 字节计
+MAX_BYTES = 64 * 1024 * 1024         # 磁盘层按压缩后字节计
+MAX_AGE = 30 * 86400                 # 秒
+EVICT_TO = 0.9
+FLUSH_INTERVAL = 5.0                 # 秒；索引最多这么久（或攒够 FLUSH_PENDING 次写入）合并一次
+FLUSH_PENDING = 64
+COMPRESS_LEVEL = 6
+
+COUNTERS = ("memory_hits", "disk_hits", "misses", "stores", "evictions", "expired", "bytes_saved")
+
+# 旧版平铺缓存文件（16 位 md5 前缀命名，新键不会再命中）
+LEGACY_FILE = re.compile(r"^[0-9a-f]{16}\.json$")
+
+
+class TieredCache:
+    """内存 LRU + 分片磁盘两级缓存"""
+
+    def __init__(self, cache_dir: str, memory_items: int = MEMORY_ITEMS, memory_bytes: int = MEMORY_BYTES,
+                 max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.lock_path = os.path.join(cache_dir, LOCK_FILE)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_size = 0
+        # 尚未写回索引的改动
+        self._touched: Dict[str, Dict[str, Any]] = {}
+        self._hits: Counter = Counter()
+        self._removed = set()
+        self._delta: Counter = Counter()
+        self._flushed = time.time()
+
+        with self._locked():
+            self.entries, self.totals = self._read_index()
+            self._remove_legacy()
+
+    # ==================== 索引 ====================
+
+    @contextmanager
+    def _locked(self):
+        """跨进程索引锁"""
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}, Counter()
+        if index.get("version") != INDEX_VERSION:
+            return {}, Counter()
+        return index["entries"], Counter(index.get("stats", {}))
+
+    def _write_index(self, entries: Dict[str, Dict[str, Any]], totals: Counter):
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "entries": entries, "stats": dict(totals)}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.index_path)
+
+    def _remove_legacy(self):
+        for name in os.listdir(self.cache_dir):
+            if LEGACY_FILE.match(name):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def flush(self):
+        """把本进程的访问/写入/统计与磁盘索引合并，过期与超限淘汰后写回"""
+        with self._lock:
+            if not (self._touched or self._removed or self._delta):
+                return
+            with self._locked():
+                entries, totals = self._read_index()
+                for key in self._removed:
+                    entries.pop(key, None)
+                for key, entry in self._touched.items():
+                    current = entries.get(key)
+                    if current is None or current["created"] < entry["created"]:
+                        current = entries[key] = dict(entry, hits=current["hits"] if current else 0)
+                    current["accessed"] = max(current["accessed"], entry["accessed"])
+                    current["hits"] += self._hits[key]
+                totals.update(self._delta)
+                for key in self._evict(entries, totals):
+                    self._forget(key)
+                self._write_index(entries, totals)
+            self.entries, self.totals = entries, totals
+            self._touched, self._hits, self._removed, self._delta = {}, Counter(), set(), Counter()
+            self._flushed = time.time()
+
+    def _evict(self, entries: Dict[str, Dict[str, Any]], totals: Counter) -> List[str]:
+        """删除过期条目，再按最近访问淘汰到上限的 90%；返回删除的键"""
+        now = time.time()
+        removed = [k for k, e in entries.items() if now - e["created"] > self.max_age]
+        totals["expired"] += len(removed)
+        for key in removed:
+            del entries[key]
+
+        size = sum(e["size"] for e in entries.values())
+        if size > self.max_bytes:
+            target = self.max_bytes * EVICT_TO
+            for key in sorted(entries, key=lambda k: entries[k]["accessed"]):
+                if size <= target:
+                    break
+                size -= entries.pop(key)["size"]
+                removed.append(key)
+                totals["evictions"] += 1
+
+        for key in removed:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        return removed
+
+    # ==================== 内存层 ====================
+
+    def _remember(self, key: str, text: str):
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = text
+        self._memory_size += len(text)
+        while self._memory and (len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes):
+            self._memory_size -= len(self._memory.popitem(last=False)[1])
+
+    def _forget(self, key: str):
+        text = self._memory.pop(key, None)
+        if text is not None:
+            self._memory_size -= len(text)
+
+    # ==================== 读写 ====================
+
+    def _touch(self, key: str, entry: Dict[str, Any], now: float):
+        entry["accessed"] = now
+        self._touched[key] = entry
+        self._hits[key] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """先查内存再查磁盘，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._touched.get(key) or self.entries.get(key)
+            path = self._path(key)
+            if entry is None and os.path.exists(path):
+                # 其他进程新写入、本进程索引里还没有的条目
+                stat = os.stat(path)
+                entry = {"size": stat.st_size, "raw": 0, "created": stat.st_mtime,
+                         "accessed": stat.st_mtime, "hits": 0, "task": None}
+            if entry is None:
+                self._delta["misses"] += 1
+                return None
+            if now - entry["created"] > self.max_age:
+                self._forget(key)
+                self._removed.add(key)
+                self._touched.pop(key, None)
+                self._delta["expired"] += 1
+                self._delta["misses"] += 1
+                return None
+
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self._delta["memory_hits"] += 1
+            else:
+                try:
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        text = f.read()
+                except (OSError, EOFError):
+                    self._removed.add(key)
+                    self._touched.pop(key, None)
+                    self._delta["misses"] += 1
+                    return None
+                self._remember(key, text)
+                self._delta["disk_hits"] += 1
+                entry["raw"] = entry["raw"] or len(text.encode("utf-8"))
+            self._delta["bytes_saved"] += entry["raw"]
+            self._touch(key, entry, now)
+        return json.loads(text)
+
+    def put(self, key: str, value: Any, task: str = None):
+        """写入两级缓存；索引按批合并（超限淘汰在合并时进行）"""
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        data = gzip.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        now = time.time()
+        with self._lock:
+            self._remember(key, text)
+            self._removed.discard(key)
+            self._touched[key] = {"size": len(data), "raw": len(text.encode("utf-8")), "created": now,
+                                  "accessed": now, "hits": 0, "task": task}
+            self._delta["stores"] += 1
+            due = self._delta["stores"] >= FLUSH_PENDING or time.time() - self._flushed >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """条目数/磁盘字节/内存占用，内存与磁盘命中、命中率和节省的响应字节"""
+        with self._lock:
+            entries = {**self.entries, **self._touched}
+            for key in self._removed:
+                entries.pop(key, None)
+            totals = Counter(dict.fromkeys(COUNTERS, 0))
+            totals.update(self.totals)
+            totals.update(self._delta)
+            hits = totals["memory_hits"] + totals["disk_hits"]
+            lookups = hits + totals["misses"]
+            return {
+                "cache_dir": self.cache_dir,
+                "entries": len(entries),
+                "disk_bytes": sum(e["size"] for e in entries.values()),
+                "max_bytes": self.max_bytes,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_size,
+                **{name: totals[name] for name in COUNTERS},
+                "hit_rate": round(hits / lookups, 3) if lookups else None,
+            }
+
+    def clear(self):
+        """清空两级缓存和统计"""
+        with self._lock, self._locked():
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif name != LOCK_FILE:
+                    os.remove(path)
+            self._memory.clear()
+            self._memory_size = 0
+            self.entries, self.totals = {}, Counter()
+            self._touched, self._hits, self._removed, self._delta = {}, Counter(), set(), Counter()
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cache_dir: str, **kwargs) -> TieredCache:
+    """进程内共享的缓存（同一目录复用同一个内存层）"""
+    path = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if path not in _caches:
+            if not _caches:
+                atexit.register(flush_all)
+            _caches[path] = TieredCache(path, **kwargs)
+        return _caches[path]
+
+
+def flush_all():
+    """写回所有缓存的访问记录（进程退出前调用）"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.flush()
+
+
+def run_benchmark(count: int):
+    """内存命中 / 磁盘命中 / 写入耗时与超限淘汰（临时目录）"""
+    import tempfile
+
+    value = {"summary": "优化概述", "changes": ["改动" * 30] * 4,
+             "code_suggestions": [{"before": "x = []\nfor o in orders: x.append(o)", "after": "x = list(orders)"}] * 3}
+    keys = [f"{i:064x}" for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(tmp, memory_items=count // 4, max_bytes=count * 120)
+        print("=" * 60)
+        print(f"🗄️ 两级缓存压测（{count}条）")
+        print("=" * 60)
+
+        began = time.perf_counter()
+        for key in keys:
+            cache.put(key, value, task="bench")
+        cache.flush()
+        put_secs = time.perf_counter() - began
+
+        recent = keys[-count // 4:]
+        began = time.perf_counter()
+        for key in recent:
+            cache.get(key)
+        memory_secs = time.perf_counter() - began
+
+        reader = TieredCache(tmp, max_bytes=cache.max_bytes)
+        began = time.perf_counter()
+        found = sum(reader.get(key) is not None for key in keys)
+        disk_secs = time.perf_counter() - began
+        reader.flush()
+
+        stats = reader.stats()
+        print(f"   写入: {put_secs / count * 1e6:.0f}µs/条")
+        print(f"   内存命中: {memory_secs / len(recent) * 1e6:.1f}µs/条  磁盘读取: {disk_secs / count * 1e6:.0f}µs/条")
+        print(f"   上限 {cache.max_bytes / 1024:.0f}KB → 保留 {stats['entries']} 条 ({stats['disk_bytes'] / 1024:.0f}KB)，"
+              f"淘汰 {stats['evictions']}，命中 {found}，命中率 {stats['hit_rate'] * 100:.0f}%")
+        print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="两级缓存（内存 LRU + 分片磁盘）")
+    parser.add_argument("--bench", action="store_true", help="内存/磁盘命中耗时与淘汰")
+    parser.add_argument("--count", type=int, default=2000, help="压测条目数")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.count)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""融合统计文件：缺失或过期时由列式存档向量化重算并写回"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_aggregator import load_latest_aggregate  # noqa: E402
+from ele_me_order_download import ElemeOrderDownloader  # noqa: E402
+
+
+def _export(tmp_path):
+    downloader = ElemeOrderDownloader(data_dir=str(tmp_path))
+    downloader.save_orders(downloader._generate_mock_orders(datetime(2026, 3, 2), count=40))
+    (agg_file,) = tmp_path.glob("orders_*.agg.json")
+    return downloader.last_aggregate, agg_file
+
+
+def _same(a, b):
+    return (a.report_metrics() == b.report_metrics() and a.periods.keys() == b.periods.keys()
+            and a.areas == b.areas and a.cancel_hourly == b.cancel_hourly)
+
+
+def test_fresh_agg_file_is_used(tmp_path, monkeypatch):
+    saved, _ = _export(tmp_path)
+    monkeypatch.setattr("ele_me_metrics.aggregate_columns", None)       # 统计文件有效时不重算
+    assert _same(load_latest_aggregate(str(tmp_path)), saved)
+
+
+def test_missing_or_stale_agg_file_is_rebuilt_from_columns(tmp_path):
+    saved, agg_file = _export(tmp_path)
+
+    os.remove(agg_file)
+    assert _same(load_latest_aggregate(str(tmp_path)), saved)
+    assert agg_file.exists()
+
+    # 旧版格式（没有时段/草图）视为过期
+    data = json.loads(agg_file.read_text(encoding="utf-8"))
+    del data["periods"], data["sketches"]
+    agg_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    rebuilt = load_latest_aggregate(str(tmp_path))
+    assert _same(rebuilt, saved) and rebuilt.report_metrics()["delivery_time_p50_p90_p99"]
+    assert "sketches" in json.loads(agg_file.read_text(encoding="utf-8"))
+
+    # 早于订单导出的统计文件视为过期
+    (npz_file,) = tmp_path.glob("orders_*.npz")
+    stamp = os.path.getmtime(npz_file)
+    agg_file.write_text(json.dumps({**data, "periods": {}, "sketches": None}), encoding="utf-8")
+    os.utime(agg_file, (stamp - 10, stamp - 10))
+    assert _same(load_latest_aggregate(str(tmp_path)), saved)
@@ -0,0 +1,48 @@
+"""流式异常检测：正常期不误报，注入异常后各指标及时告警；状态持久化后可续跑"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_anomaly import COOLDOWN_MINUTES, METRICS, AnomalyDetector, _bench_orders  # noqa: E402
+
+DAYS = 10
+INJECTED = (datetime(2026, 1, 1) + timedelta(days=DAYS - 1, hours=12)).isoformat()
+
+
+def test_detects_injected_shifts_without_false_alarms(tmp_path):
+    detector = AnomalyDetector(data_dir=str(tmp_path), log_dir=str(tmp_path), sink=False)
+    alerts = [a for order in _bench_orders(DAYS, 40) for a in detector.observe(order, "shop001")]
+
+    assert [a for a in alerts if a["order_time"] < INJECTED] == []
+    for metric in METRICS:
+        hit = next(a for a in alerts if a["metric"] == metric)
+        delay = datetime.fromisoformat(hit["order_time"]) - datetime.fromisoformat(INJECTED)
+        assert delay <= timedelta(hours=2), (metric, delay)
+        assert hit["shop_id"] == "shop001" and hit["hour"] >= 12
+
+    # 同一序列告警后静默 COOLDOWN_MINUTES
+    for metric in METRICS:
+        times = [datetime.fromisoformat(a["order_time"]) for a in alerts if a["metric"] == metric]
+        assert all(b - a >= timedelta(minutes=COOLDOWN_MINUTES) for a, b in zip(times, times[1:]))
+
+
+def test_state_round_trip_and_alert_log(tmp_path):
+    orders = list(_bench_orders(DAYS, 40))
+    split = next(i for i, o in enumerate(orders) if o["order_time"] >= INJECTED)
+
+    whole = AnomalyDetector(data_dir=str(tmp_path / "a"), log_dir=str(tmp_path), sink=False)
+    expected = [a["order_time"] for o in orders for a in whole.observe(o)]
+
+    os.makedirs(tmp_path / "b")
+    first = AnomalyDetector(data_dir=str(tmp_path / "b"), log_dir=str(tmp_path))
+    assert first.observe_many(orders[:split]) == []
+    first.save()
+
+    resumed = AnomalyDetector(data_dir=str(tmp_path / "b"), log_dir=str(tmp_path))
+    assert resumed.baselines.keys() == first.baselines.keys()
+    alerts = resumed.observe_many(orders[split:])
+    assert [a["order_time"] for a in alerts] == expected
+    assert [a["message"] for a in resumed.recent_alerts()] == [a["message"] for a in alerts]
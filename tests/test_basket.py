@@ -0,0 +1,45 @@
+"""购物篮挖掘：逐单分块位图与列式位图结果一致，且与逐单暴力计数一致"""
+
+import os
+import sys
+from datetime import datetime
+from itertools import combinations
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_basket import ALL, BasketMiner  # noqa: E402
+from ele_me_columnar import iter_orders_from_columns  # noqa: E402
+from ele_me_synthetic import SyntheticOrderGenerator  # noqa: E402
+
+
+def _columns():
+    generator = SyntheticOrderGenerator(days=7, orders_per_day=1500, start_date=datetime(2026, 3, 2),
+                                        hourly_curve=np.ones(24))
+    return generator.generate_shop("shop001")
+
+
+def test_streaming_and_columnar_miners_agree():
+    columns = _columns()
+    orders = list(iter_orders_from_columns(columns))
+
+    streamed = BasketMiner(min_support=0.005, chunk_orders=1000).mine(orders)    # 跨多个分块
+    columnar = BasketMiner(min_support=0.005).mine_columns(columns)
+    assert streamed.orders == columnar.orders
+    assert streamed.item_counts == columnar.item_counts
+    assert streamed.itemsets == columnar.itemsets
+    assert streamed.prices.keys() == columnar.prices.keys()
+    assert all(abs(streamed.prices[k] - columnar.prices[k]) <= 0.01 for k in streamed.prices)
+    assert any(len(itemset) == 3 for itemset in streamed.itemsets)
+
+    # 与逐单暴力计数对照（全部订单一列）
+    brute = {}
+    for o in orders:
+        if o["status"] == "已完成":
+            for pair in combinations(sorted({i["name"] for i in o["items"]}), 2):
+                brute[pair] = brute.get(pair, 0) + 1
+    every = streamed.periods.index(ALL)
+    for itemset, counts in streamed.itemsets.items():
+        if len(itemset) == 2:
+            assert counts[every] == brute[itemset]
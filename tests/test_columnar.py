@@ -0,0 +1,31 @@
+"""列式构建：order_id / order_time 分块编码后与逐单输入一致"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import ele_me_columnar  # noqa: E402
+from ele_me_columnar import ColumnBuilder, iter_orders_from_columns  # noqa: E402
+
+
+def test_string_columns_across_chunks(monkeypatch):
+    monkeypatch.setattr(ele_me_columnar, "STRING_CHUNK", 3)
+    orders = [{"order_id": oid, "order_time": f"2026-01-0{i + 1}T12:30:00", "status": "completed",
+               "total_amount": 10.0 + i} for i, oid in enumerate(["EM001", "EM002", "单号003", "EM004", "EM005"])]
+
+    builder = ColumnBuilder()
+    for order in orders:
+        builder.add(order)
+    assert len(builder.id_chunks) == 1 and len(builder.order_ids) == 2
+    columns = builder.finish()
+
+    rows = list(iter_orders_from_columns(columns))
+    assert [r["order_id"] for r in rows] == [o["order_id"] for o in orders]
+    assert [r["order_time"] for r in rows] == [o["order_time"] for o in orders]
+    assert [r["total_amount"] for r in rows] == [o["total_amount"] for o in orders]
+
+
+def test_empty_builder():
+    columns = ColumnBuilder().finish()
+    assert len(columns["order_id"]) == 0 and len(columns["order_time"]) == 0
@@ -0,0 +1,77 @@
+"""小时需求预测：星期效应选模型、当天校正、从订单库预测并生成备货计划"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_forecast import INTRADAY_PRIOR, DemandForecaster, forecast_shop, stock_plan  # noqa: E402
+from ele_me_order_db import OrderDB  # noqa: E402
+
+FIRST_DAY = date(2026, 3, 2)                                            # 周一
+HOURLY = np.array([0] * 7 + [4, 6, 2, 1, 10, 12, 3, 2, 2, 3, 9, 11, 4, 6, 3, 1, 0], dtype=float)
+WEEKDAY = np.array([1.0, 1.0, 1.0, 1.0, 1.2, 2.0, 2.0])                 # 周末翻倍
+
+
+def _demand(days, rng=None):
+    weekdays = [(FIRST_DAY + timedelta(days=d)).weekday() for d in range(days)]
+    demand = HOURLY[None, :] * WEEKDAY[weekdays][:, None]
+    if rng is not None:
+        demand = rng.poisson(demand * 5).astype(float)
+    return demand
+
+
+def test_weekly_pattern_picks_weekday_model():
+    rng = np.random.default_rng(5)
+    demand = np.stack([_demand(28, rng), np.tile(HOURLY * 5, (28, 1))])  # 店铺 0 有星期效应，店铺 1 恒定
+    forecaster = DemandForecaster().fit(demand, FIRST_DAY)               # 预测第 29 天（周一）
+    assert forecaster.target_day == date(2026, 3, 30)
+
+    assert forecaster.models[forecaster.best[0]] in ("weekly_naive", "weekday_smoothing")
+    truth = HOURLY.sum() * 5
+    assert abs(forecaster.forecast[0].sum() - truth) < 0.15 * truth
+    np.testing.assert_allclose(forecaster.forecast[1], HOURLY * 5)
+    assert (forecaster.sigma >= np.sqrt(forecaster.forecast) - 1e-9).all()
+
+    result = forecaster.result(0, "s1")
+    low, high = result["total_range"]
+    assert low <= result["total"] <= high and len(result["hours"]) == 24
+
+
+def test_update_today_scales_remaining_hours():
+    forecaster = DemandForecaster().fit(np.tile(HOURLY, (1, 14, 1)), FIRST_DAY)
+    before = forecaster.forecast.copy()
+    observed = np.zeros((1, 24))
+    observed[0, :12] = HOURLY[:12] * 2
+    forecaster.update_today(observed, 12)
+
+    ratio = (observed[0, :12].sum() + INTRADAY_PRIOR) / (before[0, :12].sum() + INTRADAY_PRIOR)
+    np.testing.assert_allclose(forecaster.forecast[0, :12], observed[0, :12])
+    np.testing.assert_allclose(forecaster.forecast[0, 12:], before[0, 12:] * ratio)
+    assert (forecaster.sigma[0, :12] == 0).all() and forecaster.observed_hours == 12
+
+
+def test_forecast_from_order_db_and_stock_plan(tmp_path):
+    demand = _demand(21)
+    orders = []
+    for d in range(21):
+        day = FIRST_DAY + timedelta(days=d)
+        for h in range(24):
+            for i in range(int(demand[d, h])):
+                orders.append({"order_id": f"EM{d:02d}{h:02d}{i:02d}", "order_time": f"{day}T{h:02d}:{i:02d}:00",
+                               "status": "已完成", "items": [], "total_amount": 30, "address_area": "徐汇区"})
+    with OrderDB(data_dir=str(tmp_path)) as db:
+        db.upsert_orders(orders, shop_id="s1")
+
+    now = datetime.combine(FIRST_DAY + timedelta(days=21), datetime.min.time()) + timedelta(hours=1)
+    forecast = forecast_shop("s1", now.date(), now=now, data_dir=str(tmp_path))
+    assert forecast["shop_id"] == "s1" and forecast["date"] == "2026-03-23"
+    assert forecast["avg_order_value"] == 30
+    assert abs(forecast["total"] - HOURLY.sum()) < 0.1 * HOURLY.sum()
+
+    plan = stock_plan(forecast)
+    assert plan and all(row["prepare"] >= row["expected"] for row in plan)
+    assert abs(sum(row["expected"] for row in plan) - forecast["total"]) <= 1.5
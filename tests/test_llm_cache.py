@@ -0,0 +1,89 @@
+"""大模型响应缓存：键规范化、TTL 过期、超限按 LRU 淘汰、统计持久化"""
+
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import llm_cache  # noqa: E402
+from llm_cache import LLMCache, cache_key  # noqa: E402
+
+
+def _payload(content, **params):
+    return {"model": "deepseek-chat", "messages": [{"role": "user", "content": content}], **params}
+
+
+def _clock(monkeypatch, start=1000.0):
+    """可控时钟：每次读取前进 1 秒，访问顺序即时间顺序"""
+    now = SimpleNamespace(value=start)
+    ticks = itertools.count()
+
+    def time():
+        return now.value + next(ticks)
+
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=time, perf_counter=time))
+    return now
+
+
+def test_cache_key_normalizes_prompt_but_not_params():
+    base = cache_key(_payload("分析订单\n\n\n\n午餐高峰  ", temperature=0.5))
+    assert cache_key(_payload("分析订单\r\n\r\n午餐高峰", temperature=0.5, stream=True)) == base
+    assert cache_key(_payload("分析订单\n\n午餐高峰", temperature=0.7)) != base
+    assert cache_key({**_payload("分析订单\n\n午餐高峰", temperature=0.5), "model": "other"}) != base
+
+
+def test_get_put_and_ttl_expiry(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    with LLMCache(data_dir=str(tmp_path), ttl=100) as cache:
+        assert cache.path == str(tmp_path / "llm_cache.db")
+        value = {"summary": "午餐高峰出餐慢", "recommendations": ["加派骑手"]}
+        cache.put("k1", value, "deepseek-chat")
+        cache.put("k2", value, ttl=1000)
+        assert cache.get("k1") == value and cache.get("missing") is None
+
+        now.value += 200                                   # k1 过期，k2 仍有效
+        assert cache.get("k1") is None and cache.get("k2") == value
+        assert cache.stats()["entries"] == 1 and cache.session["expired"] == 1
+
+        now.value += 2000
+        assert cache.purge() == 1 and cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, monkeypatch):
+    _clock(monkeypatch)
+    values = {f"k{i}": os.urandom(300).hex() for i in range(10)}   # 十六进制文本压缩后每条约 350 字节
+    with LLMCache(data_dir=str(tmp_path), max_bytes=2000) as cache:
+        for key in ("k0", "k1", "k2", "k3", "k4"):
+            cache.put(key, values[key])
+        assert cache.get("k0") == values["k0"]             # 刷新 k0 的访问时间
+        for key in ("k5", "k6"):
+            cache.put(key, values[key])                    # 超过上限，淘汰到 90%
+
+        stats = cache.stats()
+        assert stats["bytes"] <= cache.max_bytes * llm_cache.EVICT_TO and stats["evictions"] >= 1
+        kept = {key for key in values if cache.get(key) is not None}
+        assert {"k0", "k5", "k6"} <= kept and "k1" not in kept
+
+
+def test_get_or_call_skips_errors_and_stats_persist(tmp_path):
+    calls = []
+
+    def call(result):
+        calls.append(result)
+        return result
+
+    with LLMCache(data_dir=str(tmp_path)) as cache:
+        payload = _payload("分析订单")
+        assert cache.get_or_call(payload, lambda: call({"error": "超时"})) == {"error": "超时"}
+        assert cache.get_or_call(payload, lambda: call({"summary": "正常"})) == {"summary": "正常"}
+        assert cache.get_or_call(payload, lambda: call({"summary": "不应调用"})) == {"summary": "正常"}
+        assert len(calls) == 2
+
+    with LLMCache(data_dir=str(tmp_path)) as reopened:     # 统计跨进程累计，本进程计数从零开始
+        stats = reopened.stats()
+        assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 2, 1, 1)
+        assert stats["hit_rate"] == round(1 / 3, 3) and stats["session"]["hits"] == 0
+        reopened.clear()
+        assert reopened.stats()["hit_rate"] is None
@@ -0,0 +1,92 @@
+"""增量 JSON 字段解析：任意位置切分分片，产出与 json.loads 一致；格式错误即停"""
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from llm_stream import JSONFieldStream, _mock_reply  # noqa: E402
+
+REPLY = {
+    "summary": "含 {括号} 和 [方括号]、\"引号\" 与 \\反斜杠\\ 的说明",
+    "problems": ["12点取消率8.5%", {"hour": 12, "rate": 0.085, "note": "见 }] 注释"}],
+    "score": -12.5e-1,
+    "count": 42,
+    "flags": {"urgent": True, "owner": None, "nested": [[1, 2], {"a": []}]},
+    "ok": False,
+    "empty": "",
+    "unicode": "午餐\t高峰 \U0001f35c",
+    "esc\"aped key": "值",
+    "last": None,
+}
+
+
+def _text(indent=None):
+    return "```json\n" + json.dumps(REPLY, ensure_ascii=False, indent=indent) + "\n```\n以上建议基于近7天数据。{\"x\": 1}"
+
+
+def _feed(chunks, fields=None):
+    parser = JSONFieldStream(fields)
+    emitted = [pair for chunk in chunks for pair in parser.feed(chunk)]
+    return parser, emitted
+
+
+def _check(parser, emitted):
+    assert parser.error is None and parser.done
+    assert parser.result == REPLY
+    assert [key for key, _ in emitted] == list(REPLY)
+    assert dict(emitted) == REPLY
+
+
+def test_every_split_point():
+    for indent in (None, 2):
+        text = _text(indent)
+        for i in range(len(text) + 1):
+            _check(*_feed([text[:i], text[i:]]))
+        _check(*_feed(list(text)))                           # 逐字符
+
+
+def test_random_chunk_sizes():
+    rng = random.Random(20260302)
+    for indent in (None, 2):
+        text = _text(indent)
+        for _ in range(200):
+            chunks, pos = [], 0
+            while pos < len(text):
+                size = rng.randint(1, 12)
+                chunks.append(text[pos:pos + size])
+                pos += size
+            _check(*_feed(chunks))
+
+
+def test_fields_filter_and_text_after_object():
+    text = _mock_reply(tail_chars=120, malformed=False)
+    parser, emitted = _feed([text[i:i + 3] for i in range(0, len(text), 3)], fields=["summary", "action_plan"])
+    expected = json.loads(text[text.index("{"):text.rindex("}") + 1])
+    assert parser.done and parser.result == expected
+    assert [key for key, _ in emitted] == ["summary", "action_plan"]
+    assert parser.feed('{"more": 1}') == [] and parser.result == expected
+
+
+def test_malformed_reply_stops_with_completed_fields():
+    text = _mock_reply(tail_chars=0, malformed=True)
+    parser, emitted = _feed([text[i:i + 5] for i in range(0, len(text), 5)])
+    assert parser.error and not parser.done
+    assert [key for key, _ in emitted] == ["summary", "problems"]
+    assert "summary, problems" in parser.error
+
+    parser, _ = _feed(['{"summary": "x", "problems": ', "]"])
+    assert parser.error and "problems" in parser.error
+
+    parser = JSONFieldStream(max_field_chars=20)
+    parser.feed('{"a": 1, "summary": "' + "长" * 30)
+    assert parser.result == {"a": 1} and "超过 20 字符" in parser.error
+
+
+def test_unclosed_object_is_not_done():
+    text = json.dumps(REPLY, ensure_ascii=False)
+    parser, emitted = _feed([text[:-1]])                      # 最后一个值 null 之后缺少 }
+    assert not parser.done and parser.error is None
+    assert [key for key, _ in emitted] == list(REPLY)[:-1]
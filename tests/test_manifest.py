@@ -0,0 +1,54 @@
+"""数据清单：查不到的类型不触发重建；并发登记与重建不丢记录"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_manifest import DataManifest  # noqa: E402
+
+
+def _touch(path):
+    with open(path, "w") as f:
+        f.write("{}")
+
+
+def test_missing_kind_does_not_rebuild(tmp_path):
+    manifest = DataManifest(str(tmp_path))
+    _touch(tmp_path / "summary_20260101_000000.json")
+    manifest.register("summary", str(tmp_path / "summary_20260101_000000.json"))
+    before = os.stat(manifest.history_path).st_ino, os.stat(manifest.latest_path).st_ino
+
+    assert manifest.latest("analysis") is None
+    assert manifest.latest("summary", shop_id="s9") is None
+    assert (os.stat(manifest.history_path).st_ino, os.stat(manifest.latest_path).st_ino) == before
+
+    # 记录的文件被删除时才重建
+    os.remove(tmp_path / "summary_20260101_000000.json")
+    assert manifest.latest("summary") is None
+
+
+def _register_many(data_dir, worker, count):
+    manifest = DataManifest(data_dir)
+    for i in range(count):
+        name = f"analysis_20260101_{worker:02d}{i:04d}.json"
+        _touch(os.path.join(data_dir, name))
+        manifest.register("analysis", os.path.join(data_dir, name), shop_id=f"w{worker}")
+        if i % 5 == 0:
+            manifest.rebuild()
+
+
+def test_concurrent_register_and_rebuild(tmp_path):
+    workers, count = 4, 25
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_register_many, args=(str(tmp_path), w, count)) for w in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    entries = DataManifest(str(tmp_path)).query("analysis")
+    assert len(entries) == workers * count
+    assert len({e["path"] for e in entries}) == workers * count
@@ -0,0 +1,26 @@
+"""多店铺流水线端到端：下载线程 + spawn 分析进程，全部读写指定的 data_dir"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_multi_shop import MultiShopRunner  # noqa: E402
+
+
+def test_three_shops_end_to_end(tmp_path):
+    shops = [{"shop_id": "s1"}, {"shop_id": "s2"}, {"shop_id": "s3"}]
+    runner = MultiShopRunner(shops, days=2, data_dir=str(tmp_path), download_workers=3, analysis_workers=2)
+    result = runner.run()
+
+    assert result["errors"] == []
+    assert result["shops"] == ["s1", "s2", "s3"]
+    # 下载（导出文件 + 订单库）和分析都在同一个 data_dir
+    for shop in result["per_shop"].values():
+        assert (tmp_path / shop["orders_file"]).exists()
+        assert (tmp_path / shop["report_file"]).exists()
+    assert (tmp_path / "orders.db").exists()
+
+    per_shop_orders = [r["completed"] for r in result["aggregate"]["shop_ranking"]]
+    assert all(n > 0 for n in per_shop_orders)
+    assert result["aggregate"]["metrics"]["completed_orders"] == sum(per_shop_orders)
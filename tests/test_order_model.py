@@ -0,0 +1,37 @@
+"""紧凑订单模型：金额四舍五入到分；同购挖掘读 JSONL 导出时以 Order 常驻内存"""
+
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_basket import load_baskets, mine_baskets  # noqa: E402
+from ele_me_order_download import ElemeOrderDownloader  # noqa: E402
+from ele_me_order_model import Order, _cents_column, load_orders  # noqa: E402
+
+
+def test_amounts_round_to_cents():
+    order = Order.from_dict({"order_id": "EM1", "order_time": "2026-03-02T12:00:00", "status": "已完成",
+                             "items": [{"name": "可乐", "quantity": 1, "price": 2.996}],
+                             "total_amount": 21.004, "discount": 1.5})
+    assert (order.total_cents, order.discount_cents, order.items[0].price_cents) == (2100, 150, 300)
+    assert order.to_dict()["total_amount"] == 21
+    assert _cents_column(np.array([21.004, 2.996, 1.5])) == [2100, 300, 150]
+
+
+def test_basket_mining_from_jsonl_export(tmp_path):
+    downloader = ElemeOrderDownloader(data_dir=str(tmp_path))
+    orders = [o for day in range(1, 4) for o in downloader._generate_mock_orders(datetime(2026, 3, day), count=40)]
+    downloader.save_orders(iter(orders))
+    for npz in tmp_path.glob("orders_*.npz"):
+        os.remove(npz)                                   # 只剩 JSONL 导出
+
+    expected = mine_baskets(orders, min_support=0.05)
+    stats = load_baskets(str(tmp_path), min_support=0.05)
+    assert mine_baskets(load_orders(orders), min_support=0.05).itemsets == expected.itemsets
+    assert (stats.orders, stats.item_counts, stats.itemsets, stats.prices) == (
+        expected.orders, expected.item_counts, expected.itemsets, expected.prices)
+    assert stats.itemsets
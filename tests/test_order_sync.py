@@ -0,0 +1,87 @@
+"""增量同步：按订单库去重；重叠运行的同步互斥执行"""
+
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_order_db import OrderDB  # noqa: E402
+from ele_me_order_sync import OrderSync  # noqa: E402
+
+NOW = datetime(2026, 3, 1, 20, 0)
+
+
+class FakeDownloader:
+    """固定的一批订单；log 不为空时记录每次拉取的开始/结束"""
+
+    shop_id = "shop001"
+
+    def __init__(self, orders, log=None):
+        self.orders = orders
+        self.log = log
+
+    def download_range(self, start, end):
+        if self.log:
+            with open(self.log, "a") as f:
+                f.write(f"start {os.getpid()}\n")
+            time.sleep(0.05)
+            with open(self.log, "a") as f:
+                f.write(f"end {os.getpid()}\n")
+        return [dict(o) for o in self.orders if start.isoformat() <= o["order_time"] <= end.isoformat()]
+
+
+def _orders(count, status="已完成"):
+    return [{
+        "order_id": f"EM{i:06d}",
+        "order_time": (NOW - timedelta(minutes=5 * (count - i))).isoformat(),
+        "status": status,
+        "items": [{"name": "招牌炒饭", "quantity": 1, "price": 18}],
+        "total_amount": 21.5,
+        "customer_rating": 5,
+        "delivery_time_minutes": 28,
+        "address_area": "徐汇区",
+    } for i in range(count)]
+
+
+def test_dedup_against_order_db(tmp_path):
+    orders = _orders(10, status="配送中")
+    stats = OrderSync(FakeDownloader(orders), data_dir=str(tmp_path)).sync(now=NOW)
+    assert (stats["new"], stats["updated"], stats["unchanged"], stats["store_total"]) == (10, 0, 0, 10)
+
+    stats = OrderSync(FakeDownloader(orders), data_dir=str(tmp_path)).sync(now=NOW)
+    assert (stats["new"], stats["updated"], stats["unchanged"]) == (0, 0, 10)
+
+    orders[-1]["status"] = "已取消"
+    stats = OrderSync(FakeDownloader(orders), data_dir=str(tmp_path)).sync(now=NOW)
+    assert (stats["new"], stats["updated"], stats["unchanged"]) == (0, 1, 9)
+    with OrderDB(data_dir=str(tmp_path)) as db:
+        assert db.get_orders([orders[-1]["order_id"]])[orders[-1]["order_id"]]["status"] == "已取消"
+
+
+def _run_sync(data_dir, log, rounds):
+    downloader = FakeDownloader(_orders(50), log=log)
+    for _ in range(rounds):
+        OrderSync(downloader, data_dir=data_dir).sync(now=NOW)
+
+
+def test_overlapping_runs_are_serialized(tmp_path):
+    log = str(tmp_path / "fetch.log")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_run_sync, args=(str(tmp_path), log, 3)) for _ in range(3)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+    assert all(p.exitcode == 0 for p in workers)
+
+    lines = open(log).read().split()
+    events = list(zip(lines[::2], lines[1::2]))
+    assert len(events) == 18
+    # 每次拉取都在下一次开始之前结束（start/end 成对且同一进程）
+    for (kind, pid), (next_kind, next_pid) in zip(events[::2], events[1::2]):
+        assert (kind, next_kind, pid) == ("start", "end", next_pid)
+    with OrderDB(data_dir=str(tmp_path)) as db:
+        assert db.summary()["total"] == 50
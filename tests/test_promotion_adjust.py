@@ -0,0 +1,33 @@
+"""推广调整：按店铺日历取时段；高峰间空档与深夜一样暂停"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import ele_me_promotion_adjust  # noqa: E402
+from ele_me_promotion_adjust import PromotionAutoManager, TimePeriod  # noqa: E402
+
+
+def _manager(tmp_path, monkeypatch, shop_id):
+    with open(os.path.join(ROOT, "CORE_STRATEGY.json"), encoding="utf-8") as f:
+        strategy = json.load(f)
+    strategy["时段日历"] = {"店铺": {"shop002": {"时间策略": {"早餐高峰": "09:00-11:00"}}}}
+    config = tmp_path / "CORE_STRATEGY.json"
+    config.write_text(json.dumps(strategy, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(ele_me_promotion_adjust, "CONFIG_FILE", str(config))
+    return PromotionAutoManager(shop_id)
+
+
+def test_shop_calendar_and_gap_pause(tmp_path, monkeypatch):
+    monday_10am = datetime(2026, 3, 2, 10, 0)
+    default = _manager(tmp_path, monkeypatch, None)
+    shop = _manager(tmp_path, monkeypatch, "shop002")
+
+    assert default.get_current_period(monday_10am) == TimePeriod.REGULAR
+    assert default.get_bid_config(TimePeriod.REGULAR)["bid_multiplier"] == 0
+    assert shop.get_current_period(monday_10am) == TimePeriod.MORNING
+    assert shop.get_bid_config(shop.get_current_period(monday_10am))["bid_multiplier"] == 1.2
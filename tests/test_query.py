@@ -0,0 +1,59 @@
+"""多维查询：菜品度量不放大订单级度量"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_order_db import OrderDB  # noqa: E402
+from ele_me_query import QueryEngine  # noqa: E402
+
+
+def _order(i, hour, status="已完成", items=(("招牌炒饭", 1, 18), ("可乐", 2, 3))):
+    return {
+        "order_id": f"EM{i:04d}",
+        "order_time": f"2026-03-02T{hour:02d}:{i % 60:02d}:00",
+        "status": status,
+        "items": [{"name": n, "quantity": q, "price": p} for n, q, p in items],
+        "total_amount": 20 + i,
+        "customer_rating": 5 if status == "已完成" else None,
+        "delivery_time_minutes": 30 if status == "已完成" else None,
+        "address_area": "徐汇区",
+    }
+
+
+def _engine(tmp_path, orders):
+    db = OrderDB(data_dir=str(tmp_path))
+    db.upsert_orders(orders)
+    return QueryEngine(db)
+
+
+def test_item_measure_does_not_inflate_order_measures(tmp_path):
+    orders = [_order(i, 12) for i in range(5)] + [_order(i, 18, items=()) for i in range(5, 8)]
+    orders.append(_order(8, 12, items=(("可乐", 1, 3), ("可乐", 1, 3))))
+    engine = _engine(tmp_path, orders)
+
+    plain = engine.query(["period"], ["orders", "revenue", "rating"])
+    with_items = engine.query(["period"], ["orders", "revenue", "rating", "quantity"])
+    assert (plain["plan"], with_items["plan"]) == ("cube", "items")
+    assert [{k: r[k] for k in ("period", "orders", "revenue", "rating")} for r in with_items["rows"]] == plain["rows"]
+    assert [(r["period"][:2], r["orders"], r["quantity"]) for r in with_items["rows"]] == [("午餐", 6, 17),
+                                                                                          ("晚餐", 3, 0)]
+
+    # 按菜品分组：orders 为含该菜品的订单数（同一单出现两次只计一次）
+    by_item = {r["item"]: r for r in engine.query(["item"], ["orders", "quantity"])["rows"]}
+    assert (by_item["可乐"]["orders"], by_item["可乐"]["quantity"]) == (6, 12)
+    assert by_item["招牌炒饭"]["orders"] == 5
+
+
+def test_rating_and_delivery_ignore_missing_values(tmp_path):
+    orders = [_order(i, 12) for i in range(4)] + [_order(i, 12, status="已取消") for i in range(4, 8)]
+    orders[0]["delivery_time_minutes"] = 50
+    engine = _engine(tmp_path, orders)
+
+    for plan_measures in (["orders", "rating", "delivery"], ["orders", "rating", "delivery", "discount"]):
+        (row,) = engine.query([], plan_measures)["rows"]
+        assert (row["orders"], row["rating"], row["delivery"]) == (8, 5.0, 35.0)
+
+    buckets = {r["delivery_bucket"]: r["orders"] for r in engine.query(["delivery_bucket"], ["orders"])["rows"]}
+    assert buckets == {"30-45分钟": 3, "45-60分钟": 1}
@@ -0,0 +1,111 @@
+"""限流：重试不重复扣令牌；订单抓取成批预取令牌、默认不限流；推广暂停/出价不变不占调整额度"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import ele_me_promotion_adjust  # noqa: E402
+from ele_me_mock_server import start_mock_server  # noqa: E402
+from ele_me_order_fetcher import AsyncOrderFetcher  # noqa: E402
+from http_client import HttpClient, StateStore, TokenBucket  # noqa: E402
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """前两次返回 503（Retry-After: 0），之后返回 200"""
+
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        status = 503 if self.hits <= 2 else 200
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_retries_take_one_token():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = HttpClient("flaky", {"api": (5, 3600)}, state_file=None, metrics_file=None)
+        response = client.get(f"http://127.0.0.1:{server.server_address[1]}/", endpoint="api", timeout=5)
+    finally:
+        server.shutdown()
+
+    assert response.status_code == 200 and FlakyHandler.hits == 3
+    assert 4 <= client.buckets["api"].remaining() < 4.01
+
+
+def test_fetcher_takes_order_tokens():
+    server = start_mock_server(days=1, orders_per_day=30)
+    bucket = TokenBucket("eleme:order", 5, 0.25, StateStore(None))      # 突发 5 次，之后 20 次/秒
+    shared_takes = []
+    take = bucket.try_acquire
+    bucket.try_acquire = lambda count=1: shared_takes.append(count) or take(count)
+    end = datetime.now()
+
+    async def fetch():
+        async with AsyncOrderFetcher(base_url=server.base_url, bucket=bucket) as fetcher:
+            return await fetcher.fetch_orders(end - timedelta(days=2), end), fetcher.request_count
+
+    try:
+        began = time.perf_counter()
+        orders, requests = asyncio.run(fetch())
+        elapsed = time.perf_counter() - began
+    finally:
+        server.shutdown()
+
+    assert len(orders) == 30 and requests == 31                           # 1 页列表 + 30 个详情
+    assert elapsed >= (requests - 5) / 20 * 0.9
+    # 每批 5 个令牌只读写一次共享状态（等待后的重试除外）
+    assert set(shared_takes) == {5}
+    assert len(shared_takes) <= 2 * ((requests + 4) // 5)
+
+
+def test_order_limit_off_unless_configured():
+    fetcher = AsyncOrderFetcher(base_url="http://127.0.0.1:1")
+    assert fetcher.limiter is None
+
+
+class CountingClient:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, endpoint, block=True):
+        assert endpoint == "promotion"
+        self.acquired += 1
+
+
+def test_promotion_token_only_for_bid_changes(tmp_path, monkeypatch):
+    client = CountingClient()
+    monkeypatch.setattr(ele_me_promotion_adjust, "CONFIG_FILE", os.path.join(ROOT, "CORE_STRATEGY.json"))
+    monkeypatch.setattr(ele_me_promotion_adjust, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(ele_me_promotion_adjust, "get_client", lambda name: client)
+
+    manager = ele_me_promotion_adjust.PromotionAutoManager()
+    monkeypatch.setattr(manager, "load_forecast", lambda now=None: None)
+    config = {"bid_multiplier": 0, "budget_multiplier": 0, "action": "暂停推广", "reason": "深夜"}
+    monkeypatch.setattr(manager, "get_bid_config", lambda period: config)
+
+    assert manager.adjust_promotion()["action"] == "PAUSE"
+    assert client.acquired == 0
+
+    config.update(bid_multiplier=1.2, budget_multiplier=1.2, action="高峰模式", reason="午餐")
+    assert manager.adjust_promotion()["action"] == "高峰模式"
+    assert manager.adjust_promotion()["action"] == "KEEP"
+    assert client.acquired == 1
+
+    config.update(bid_multiplier=0.8, budget_multiplier=0.8, action="降低出价")
+    assert manager.adjust_promotion()["action"] == "降低出价"
+    assert client.acquired == 2
@@ -0,0 +1,81 @@
+"""店铺日历：汇总、同购挖掘、多维查询、分析器的时段都按店铺的 时段日历 覆盖划分"""
+
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import ele_me_calendar  # noqa: E402
+from ele_me_aggregator import load_latest_aggregate  # noqa: E402
+from ele_me_basket import load_baskets  # noqa: E402
+from ele_me_order_db import OrderDB  # noqa: E402
+from ele_me_order_download import ElemeOrderDownloader  # noqa: E402
+from ele_me_query import QueryEngine  # noqa: E402
+
+SHOP_BREAKFAST = "早餐(09-11)"
+
+
+def _orders(count=30):
+    return [{
+        "order_id": f"EMshop002{i:04d}",
+        "order_time": f"2026-03-02T10:{i:02d}:00",
+        "status": "已完成",
+        "items": [{"name": "豆浆", "quantity": 1, "price": 4}, {"name": "油条", "quantity": 1, "price": 3}],
+        "total_amount": 7,
+        "customer_rating": 5,
+        "delivery_time_minutes": 25,
+        "address_area": "徐汇区",
+    } for i in range(count)]
+
+
+def _setup(tmp_path, monkeypatch):
+    with open(os.path.join(ROOT, "CORE_STRATEGY.json"), encoding="utf-8") as f:
+        strategy = json.load(f)
+    strategy["时段日历"] = {"店铺": {"shop002": {"时间策略": {"早餐高峰": "09:00-11:00"}}}}
+    config = tmp_path / "CORE_STRATEGY.json"
+    config.write_text(json.dumps(strategy, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(ele_me_calendar, "CONFIG_FILE", str(config))
+    monkeypatch.setattr(ele_me_calendar, "_CALENDARS", {})
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    ElemeOrderDownloader(shop_id="shop002", data_dir=str(data_dir)).save_orders(_orders())
+    return data_dir
+
+
+def test_aggregate_uses_shop_calendar(tmp_path, monkeypatch):
+    data_dir = _setup(tmp_path, monkeypatch)
+    assert list(load_latest_aggregate(str(data_dir), "shop002").periods) == [SHOP_BREAKFAST]
+
+    # 统计文件缺失时从列式存档重算，同样按店铺日历
+    for agg_file in data_dir.glob("orders_*.agg.json"):
+        os.remove(agg_file)
+    assert list(load_latest_aggregate(str(data_dir), "shop002").periods) == [SHOP_BREAKFAST]
+
+
+def test_baskets_and_query_use_shop_calendar(tmp_path, monkeypatch):
+    data_dir = _setup(tmp_path, monkeypatch)
+    assert list(load_baskets(str(data_dir), shop_id="shop002").table()) == [SHOP_BREAKFAST, "全部"]
+    assert list(load_baskets(str(data_dir), days=100000, shop_id="shop002").table()) == [SHOP_BREAKFAST, "全部"]
+
+    engine = QueryEngine(OrderDB(data_dir=str(data_dir)))
+    for measures in (["orders"], ["orders", "discount"]):           # 汇总立方体 / 订单明细
+        rows = engine.query(["period"], measures, shop_id="shop002")["rows"]
+        assert [(r["period"], r["orders"]) for r in rows] == [(SHOP_BREAKFAST, 30)]
+
+
+def test_analyzer_time_and_area_wrappers(tmp_path, monkeypatch):
+    from ele_me_data_analysis import ElemeAnalyzer
+
+    _setup(tmp_path, monkeypatch)
+    orders = _orders(4)
+    orders[1]["order_time"] = "2026-03-02T15:00:00"
+    orders[2]["order_time"] = "2026-03-02T23:30:00"
+    orders[3]["status"] = "已取消"
+
+    analyzer = ElemeAnalyzer(shop_id="shop002")
+    assert {k: v["count"] for k, v in analyzer.analyze_by_time(orders).items()} == {
+        SHOP_BREAKFAST: 1, "下午(14-17)": 1, "深夜(23-07)": 1}
+    assert analyzer.analyze_by_area(orders) == {"徐汇区": {"count": 3, "amount": 21}}
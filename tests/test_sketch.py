@@ -0,0 +1,77 @@
+"""KLL 分位数草图：秩误差、合并、批量抽取、序列化往返"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from ele_me_sketch import KLLSketch  # noqa: E402
+
+QS = (0.01, 0.1, 0.5, 0.9, 0.99)
+MAX_RANK_ERROR = 0.02          # k=200 时理论秩误差约 1%
+
+
+def _values(n, seed=7):
+    return np.round(np.random.default_rng(seed).lognormal(3.3, 0.4, n), 2)
+
+
+def _rank_errors(sketch, values):
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(QS)
+    return [abs(np.searchsorted(ordered, est, side="right") / len(ordered) - q) for est, q in zip(estimates, QS)]
+
+
+def _weight(sketch):
+    return sum(len(level) << h for h, level in enumerate(sketch.levels))
+
+
+def test_rank_error_against_exact_quantiles():
+    values = _values(100000)
+    streamed = KLLSketch()
+    for v in values.tolist():
+        streamed.update(v)
+    assert max(_rank_errors(streamed, values)) < MAX_RANK_ERROR
+    assert streamed.size < 3 * streamed.k + 512
+    assert abs(streamed.quantile(0.5) - np.quantile(values, 0.5)) < 0.05 * np.quantile(values, 0.5)
+
+
+def test_update_many_decimates_with_exact_weight():
+    values = _values(50001)                                      # 奇数个，逐层抽取会留下单个值
+    sketch = KLLSketch()
+    sketch.update_many(values)
+    assert sketch.n == len(values) and _weight(sketch) == len(values)
+    assert sketch.size < 3 * sketch.k + 512
+    assert max(_rank_errors(sketch, values)) < MAX_RANK_ERROR
+
+    sketch.update_many(values[:10].tolist())                     # 非数组直接放入第 0 层
+    assert sketch.n == _weight(sketch) == len(values) + 10
+
+
+def test_merge_matches_whole_stream():
+    values = _values(120000, seed=11)
+    parts = [KLLSketch() for _ in range(3)]
+    for part, chunk in zip(parts, np.array_split(values, 3)):
+        part.update_many(chunk)
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    assert merged.n == _weight(merged) == len(values)
+    assert merged.size < 3 * merged.k + 512
+    assert max(_rank_errors(merged, values)) < MAX_RANK_ERROR
+
+
+def test_from_dict_round_trip():
+    values = _values(30000, seed=3)
+    sketch = KLLSketch(100)
+    sketch.update_many(values)
+    data = sketch.to_dict()
+
+    restored = KLLSketch.from_dict(data)
+    assert restored.to_dict() == data
+    assert restored.quantiles() == sketch.quantiles()
+
+    # 还原后可继续累加、合并
+    restored.update_many(values)
+    assert restored.n == _weight(restored) == 2 * len(values)
+    assert max(_rank_errors(restored, np.concatenate([values, values]))) < MAX_RANK_ERROR
+    assert KLLSketch.from_dict({"k": 100, "n": 0, "levels": []}).quantiles() == [None] * 3
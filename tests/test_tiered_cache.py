@@ -0,0 +1,102 @@
+"""两级缓存：内存/磁盘命中、跨实例索引合并、超限 LRU 淘汰与过期、统计"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import tiered_cache  # noqa: E402
+from tiered_cache import INDEX_FILE, TieredCache, get_cache  # noqa: E402
+
+
+def _key(i):
+    return f"{i:064x}"
+
+
+def _clock(monkeypatch, start=1000.0):
+    now = SimpleNamespace(value=start)
+    monkeypatch.setattr(tiered_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_memory_then_disk_hits(tmp_path):
+    value = {"summary": "优化概述", "changes": ["改动"] * 5}
+    cache = TieredCache(str(tmp_path), memory_items=2)
+    for i in range(3):
+        cache.put(_key(i), value, task="logic_analysis")
+    assert (tmp_path / "00" / f"{_key(0)}.json.gz").exists()
+    assert cache.get(_key(2)) == value                     # 内存层
+    assert cache.get(_key(0)) == value                     # 已被内存 LRU 挤出，读磁盘
+    assert cache.get(_key(9)) is None
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["entries"] == 3 and stats["memory_items"] == 2
+    assert stats["hit_rate"] == round(2 / 3, 3) and stats["bytes_saved"] > 0
+
+    # 另一个进程还没合并索引时，条目文件本身即可命中
+    other = TieredCache(str(tmp_path))
+    assert other.entries == {} and other.get(_key(1)) == value
+    assert other.stats()["disk_hits"] == 1
+
+
+def test_index_merges_across_instances(tmp_path):
+    first, second = TieredCache(str(tmp_path)), TieredCache(str(tmp_path))
+    first.put(_key(1), "a")
+    second.put(_key(2), "b")
+    first.get(_key(1))
+    first.flush()
+    second.get(_key(1))
+    second.flush()
+
+    reopened = TieredCache(str(tmp_path))
+    assert set(reopened.entries) == {_key(1), _key(2)}
+    assert reopened.entries[_key(1)]["hits"] == 2 and reopened.entries[_key(1)]["task"] is None
+    assert reopened.totals["stores"] == 2 and reopened.totals["memory_hits"] == 1
+    assert reopened.totals["disk_hits"] == 1
+    assert (tmp_path / INDEX_FILE).exists()
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    cache = TieredCache(str(tmp_path), max_bytes=2500)
+    values = {i: os.urandom(400).hex() for i in range(6)}  # 压缩后每条约 450 字节
+    for i in range(5):
+        now.value += 1
+        cache.put(_key(i), values[i])
+    now.value += 1
+    cache.get(_key(0))                                     # 刷新 0 的访问时间
+    now.value += 1
+    cache.put(_key(5), values[5])                          # 超过上限，合并索引时淘汰到 90%
+    cache.flush()
+
+    stats = cache.stats()
+    assert stats["disk_bytes"] <= cache.max_bytes * tiered_cache.EVICT_TO and stats["evictions"] >= 1
+    assert _key(0) in cache.entries and _key(5) in cache.entries and _key(1) not in cache.entries
+    assert not os.path.exists(cache._path(_key(1)))
+    assert TieredCache(str(tmp_path)).get(_key(1)) is None
+
+
+def test_expired_entries_and_legacy_files(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    (tmp_path / "0123456789abcdef.json").write_text("{}")  # 旧版平铺缓存
+    cache = TieredCache(str(tmp_path), max_age=100)
+    assert not (tmp_path / "0123456789abcdef.json").exists()
+
+    cache.put(_key(1), "old")
+    now.value += 50
+    cache.put(_key(2), "new")
+    now.value += 60
+    assert cache.get(_key(1)) is None and cache.get(_key(2)) == "new"
+    cache.flush()
+    assert set(cache.entries) == {_key(2)} and cache.stats()["expired"] == 1
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and os.listdir(tmp_path) == [tiered_cache.LOCK_FILE]
+
+
+def test_get_cache_shares_instance_per_directory(tmp_path):
+    cache = get_cache(str(tmp_path / "a"))
+    assert get_cache(os.path.join(str(tmp_path), "b", "..", "a")) is cache
+    assert get_cache(str(tmp_path / "b")) is not cache
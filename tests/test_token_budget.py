@@ -0,0 +1,79 @@
+"""Token 预算与台账：按优先级裁剪提示词；data 目录不可用时分析器照常构建、调用不记账"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import ds_assistant  # noqa: E402
+import ele_me_deepseek_analysis  # noqa: E402
+import ele_me_deepseek_optimized  # noqa: E402
+from token_budget import TokenLedger, _sample_sections, estimate_tokens, fit_sections  # noqa: E402
+
+
+def test_ledger_falls_back_when_data_dir_missing(tmp_path, monkeypatch):
+    missing = str(tmp_path / "missing")
+    for module in (ds_assistant, ele_me_deepseek_analysis, ele_me_deepseek_optimized):
+        monkeypatch.setattr(module, "DATA_DIR", missing)
+    monkeypatch.setattr(ds_assistant, "CACHE_DIR", str(tmp_path / "cache"))
+
+    analyzers = [ds_assistant.DeepSeekAssistant(), ele_me_deepseek_analysis.ElemeDeepSeekAnalyzer(),
+                 ele_me_deepseek_optimized.OptimizedAnalyzer(use_cache=False)]
+    for analyzer in analyzers:
+        ledger = analyzer.ledger
+        assert ledger.calibration() == 1.0
+        row = ledger.record("deepseek-chat", 100, {"prompt_tokens": 120, "completion_tokens": 30})
+        assert (row["prompt_tokens"], row["completion_tokens"]) == (120, 30)
+        assert ledger.disabled and ledger.report() == []
+    assert not os.path.exists(missing)
+
+
+def test_ledger_opens_on_first_use(tmp_path):
+    ledger = TokenLedger(data_dir=str(tmp_path), script="test")
+    assert not os.listdir(tmp_path)
+    ledger.record("deepseek-chat", 100, {"prompt_tokens": 120, "completion_tokens": 30})
+    (row,) = ledger.report()
+    assert (row["script"], row["calls"], row["prompt_tokens"]) == ("test", 1, 120)
+    ledger.close()
+
+
+def _fit(budget):
+    sections = _sample_sections()
+    prompt, fit = fit_sections(sections, budget)
+    return {s.name: s for s in sections}, prompt, fit
+
+
+def test_fit_sections_trims_by_priority_then_rank():
+    _, full_prompt, _ = _fit(10 ** 6)
+    full = estimate_tokens(full_prompt)
+    _, prompt, fit = _fit(full)
+    assert prompt == full_prompt and fit["trimmed"] == {} and not fit["over_budget"]
+
+    # 优先级最高的「组合」先裁，默认靠后的行先去掉
+    sections, prompt, fit = _fit(full - 1)
+    assert fit["trimmed"] == {"组合": 1} and "冰红茶7" not in prompt and "冰红茶6" in prompt
+
+    previous = {}
+    for budget in range(full - 1, 0, -10):
+        sections, prompt, fit = _fit(budget)
+        trimmed = fit["trimmed"]
+        assert fit["tokens"] == estimate_tokens(prompt)
+        assert fit["over_budget"] or fit["tokens"] <= budget
+        # 前一段没裁完不会动下一段；必留段永远不裁
+        if "时段" in trimmed:
+            assert trimmed["组合"] == 8 and "菜品同购" not in prompt
+        if "策略" in trimmed:
+            assert trimmed["时段"] == 14 and "时段分布" not in prompt and "当前策略配置" not in prompt
+        assert "核心" not in trimmed and "要求" not in trimmed
+        assert all(trimmed.get(name, 0) >= n for name, n in previous.items())
+        previous = trimmed
+
+        # 「时段」按单量排名去掉低峰时段，并注明省略数
+        hours = sections["时段"]
+        if 0 < hours.removed < len(hours.lines):
+            kept = [rank for rank, keep in zip(hours.ranks, hours.keep) if keep]
+            dropped = [rank for rank, keep in zip(hours.ranks, hours.keep) if not keep]
+            assert min(kept) >= max(dropped)
+            assert f"其余{hours.removed}个时段单量较少" in prompt
+    assert fit["over_budget"] and set(trimmed) == {"组合", "时段", "策略"}
+    assert "核心指标" in prompt and "分析要求" in prompt